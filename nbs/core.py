@@ -1,8 +1,8 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/00core.ipynb.
 
 # %% auto 0
-__all__ = ['folder', 'host', 'mapbox_access_token', 'SCMGraph', 'co2', 'time_delta', 'add_seconds', 'compute_durations',
-           'make_time_df', 'make_durations']
+__all__ = ['folder', 'host', 'mapbox_access_token', 'SCMGraph', 'co2', 'time_delta', 'add_seconds', 'osrm_table',
+           'compute_durations', 'make_time_df', 'make_durations', 'write_time_df', 'read_time_df']
 
 # %% ../nbs/00core.ipynb 2
 from typing import List, Optional, Union, Tuple, Dict, Set, Any, DefaultDict
@@ -298,60 +298,94 @@ def add_seconds(start, seconds):
         return finish.strftime("%H:%M")
 
 # %% ../nbs/00core.ipynb 17
-def compute_durations(cust_df, plnt_df=None, toll=True, host="localhost"):
+_osrm_sessions = {}
+
+def _osrm_session(pool_size=8, retries=3, backoff_factor=0.5):
+    """OSRM用の共有HTTPセッション（コネクションプールと429/5xxの再試行付き）"""
+    key = (pool_size, retries, backoff_factor)
+    if key not in _osrm_sessions:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _osrm_sessions[key] = session
+    return _osrm_sessions[key]
+
+def osrm_table(ROUTE, toll=True, host="localhost", port=5000, tile_size=100, max_workers=8, timeout=30):
+    """
+    OSRMのtable APIで地点間の移動時間（秒）と距離（m）の行列を計算する．
+    ROUTEは[緯度,経度]のリスト．行列を出発地・到着地のタイル（tile_size地点ずつ）に分けて
+    並列に取得するので，URL長やタイムアウトの制限を受けない．経路がない組はNaNとする．
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    points = np.array(ROUTE, dtype=float).reshape(-1, 2)
+    n = len(points)
+    durations = np.full((n, n), np.nan)
+    distances = np.full((n, n), np.nan)
+    session = _osrm_session(max_workers)
+
+    def fetch(tile):
+        s0, s1, d0, d1 = tile
+        params = {"annotations": "distance,duration"}
+        if (s0, s1) == (d0, d1):
+            block = points[s0:s1]
+        else:
+            block = np.vstack([points[s0:s1], points[d0:d1]])
+            params["sources"] = ";".join(str(i) for i in range(s1 - s0))
+            params["destinations"] = ";".join(str(i) for i in range(s1 - s0, len(block)))
+        if not toll:
+            params["exclude"] = "toll"
+        route_str = ";".join(f"{lon},{lat}" for lat, lon in block)
+        response = session.get(f"http://{host}:{port}/table/v1/driving/" + route_str, params=params, timeout=timeout)
+        result = response.json()
+        try:
+            durations[s0:s1, d0:d1] = np.array(result["durations"], dtype=float)
+            distances[s0:s1, d0:d1] = np.array(result["distances"], dtype=float)
+        except:
+            raise ValueError
+
+    tiles = [(s0, min(s0 + tile_size, n), d0, min(d0 + tile_size, n))
+             for s0 in range(0, n, tile_size) for d0 in range(0, n, tile_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(fetch, tiles))
+    return durations, distances
+
+def compute_durations(cust_df, plnt_df=None, toll=True, host="localhost", port=5000):
     
     if plnt_df is not None:
         node_df = pd.concat( [cust_df[["name","lat","lon"]], plnt_df[["name","lat","lon"] ] ] )
     else:
         node_df = cust_df.copy()
-    n=len(node_df)
-    ROUTE =[]
-    for row in node_df.itertuples():
-        ROUTE.append( [row.lat, row.lon] )
-    route_str =""
-    for (i,j) in ROUTE[:]:
-        route_str += str(j)+","+str(i)+";"
-    #print(f"http://{host}:5000/table/v1/driving/'"+route_str[:-1]+"?annotations=distance,duration")
-    #response = requests.get('http://localhost:5000/table/v1/driving/'+route_str[:-1]+"?annotations=distance,duration&exclude=motorway")
-    if toll:
-        response = requests.get(f'http://{host}:5000/table/v1/driving/'+route_str[:-1]+"?annotations=distance,duration")
-    else:
-        response = requests.get(f'http://{host}:5000/table/v1/driving/'+route_str[:-1]+"?annotations=distance,duration&exclude=toll")
-    result = response.json()
-
-    try:
-        durations = result["durations"]
-        distances = result["distances"]
-    except:
-        raise ValueError 
-    for i in range(n):
-        for j in range(n):
-            if durations[i][j] is None:
-                #print(i,j)
-                durations[i][j] = 3600*24
-                distances[i][j] = 1000000
-    return  durations, distances, node_df
+    ROUTE = node_df[["lat","lon"]].values
+    durations, distances = osrm_table(ROUTE, toll=toll, host=host, port=port)
+    #経路がない場合
+    unreachable = np.isnan(durations)
+    durations[unreachable] = 3600*24
+    distances[unreachable] = 1000000
+    return  durations.tolist(), distances.tolist(), node_df
 
 # %% ../nbs/00core.ipynb 21
 def make_time_df(node_df, durations, distances):
+    """
+    移動時間・距離の行列から地点間のデータフレーム（from_node×to_nodeの縦持ち）を生成する．
+    np.repeat/np.tileで全組を一括に作り，番号・時間・距離はint32で保持する．
+    """
     try:
         node_df.reset_index(inplace=True)
     except:
         pass
     
+    durations = np.asarray(durations)
     n = len(durations)
-    name_dic = node_df.name.to_dict() #番号を顧客名に写像
-    from_id, to_id, duration, distance =[],[],[],[]
-    from_name, to_name = [], [] 
-    for i in range(n):
-        for j in range(n):
-            from_id.append(i)
-            to_id.append(j)
-            from_name.append(name_dic[i])
-            to_name.append(name_dic[j])
-            duration.append( int(durations[i][j]) )
-            distance.append( int(distances[i][j]) )
-    time_df = pd.DataFrame({"from_node": from_id, "from_name": from_name, "to_node":to_id, "to_name":to_name, "time": duration, "distance": distance })
+    names = node_df.name.to_numpy() #番号を顧客名に写像
+    nodes = np.arange(n, dtype=np.int32)
+    from_id, to_id = np.repeat(nodes, n), np.tile(nodes, n)
+    time_df = pd.DataFrame({"from_node": from_id, "from_name": names[from_id], "to_node": to_id, "to_name": names[to_id],
+                            "time": durations.astype(np.int32).ravel(), "distance": np.asarray(distances).astype(np.int32).ravel()})
     return time_df
 
 # %% ../nbs/00core.ipynb 25
@@ -359,7 +393,21 @@ def make_durations(time_df):
     n = time_df.from_node.max() + 1
     durations = np.zeros((n,n))
     distances = np.zeros((n,n))
-    for row in time_df.itertuples():
-        durations[ int(row.from_node), int(row.to_node) ] = int(row.time)
-        distances[ int(row.from_node), int(row.to_node) ] = int(row.distance)
+    from_id, to_id = time_df.from_node.to_numpy(dtype=np.intp), time_df.to_node.to_numpy(dtype=np.intp)
+    durations[from_id, to_id] = np.trunc(time_df.time.to_numpy(dtype=float))
+    distances[from_id, to_id] = np.trunc(time_df.distance.to_numpy(dtype=float))
     return durations, distances
+
+def write_time_df(time_df, fname):
+    """time_dfをParquet形式で保存する（pyarrowが必要）．番号・時間・距離はint32で書き出す．"""
+    int_cols = [col for col in time_df.columns if col not in ("from_name", "to_name")]
+    time_df.astype({col: np.int32 for col in int_cols}).to_parquet(fname, engine="pyarrow", index=False)
+
+def read_time_df(fname, categorical_names=True):
+    """
+    write_time_dfで保存したtime_dfを読み込む（pyarrowが必要）．
+    categorical_names=Trueなら地点名をcategory型で読む（文字列オブジェクトを作らないので高速）．
+    """
+    import pyarrow.parquet as pq
+    read_dictionary = ["from_name", "to_name"] if categorical_names else None
+    return pq.read_table(fname, read_dictionary=read_dictionary).to_pandas()
@@ -3,10 +3,13 @@
 """
 
 from fastapi import APIRouter
-from .endpoints import abc, vrp, inventory, logistics
+from .endpoints import abc, vrp, inventory, logistics, system, jobs, streams
 
 api_router = APIRouter()
 api_router.include_router(abc.router, prefix="/abc", tags=["ABC分析"])
 api_router.include_router(vrp.router, prefix="/vrp", tags=["配送計画システム"])
 api_router.include_router(inventory.router, prefix="/inventory", tags=["在庫最適化"])
-api_router.include_router(logistics.router, prefix="/logistics", tags=["物流ネットワーク設計"])
\ No newline at end of file
+api_router.include_router(logistics.router, prefix="/logistics", tags=["物流ネットワーク設計"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["非同期ジョブ"])
+api_router.include_router(streams.router, prefix="/stream", tags=["進捗ストリーム"])
+api_router.include_router(system.router, prefix="/system", tags=["システム"])
\ No newline at end of file
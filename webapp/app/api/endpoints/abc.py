@@ -2,8 +2,8 @@
 ABC分析用FastAPIエンドポイント - 01abc.ipynbの機能を薄いラッパーでAPIとして提供
 """
 
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, File, Form, UploadFile
+from typing import List, Dict, Any, Optional
 import pandas as pd
 import json
 
@@ -20,6 +20,9 @@ from ...services.abc_service import (
     show_prod_inv_demand, plot_demands, 
     risk_pooling_analysis_detailed, mean_cv_analysis
 )
+from ...utils.demand_io import analyze_demand_file, detect_format
+from ...utils.executor import run_cpu_bound
+from ...utils.result_cache import cached_endpoint
 
 router = APIRouter()
 
@@ -41,12 +44,13 @@ async def create_tree_map(request: TreeMapRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/analysis", response_model=ABCAnalysisResult)
+@cached_endpoint("abc/analysis")
 async def perform_abc_analysis(request: ABCAnalysisRequest):
     """ABC分析を実行"""
     try:
         demand_df = convert_demand_records_to_df(request.demand_data)
-        agg_df, new_df, category = abc_analysis(
-            demand_df, request.threshold, request.agg_col, 
+        agg_df, new_df, category = await run_cpu_bound(
+            "analysis", abc_analysis, demand_df, request.threshold, request.agg_col, 
             request.value_col, request.abc_name, request.rank_name
         )
         
@@ -58,6 +62,33 @@ async def perform_abc_analysis(request: ABCAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/analysis/upload", response_model=ABCAnalysisResult)
+async def perform_abc_analysis_upload(
+    file: UploadFile = File(..., description="需要データ（CSV / Parquet、DemandRecord と同じ列）"),
+    threshold: str = Form("0.7, 0.2, 0.1", description="ABC分類の閾値（カンマ区切り）"),
+    agg_col: str = Form("prod", description="集約対象列"),
+    value_col: str = Form("demand", description="分析対象値列"),
+    abc_name: str = Form("abc", description="分類結果列名"),
+    rank_name: str = Form("rank", description="ランク結果列名"),
+    file_format: Optional[str] = Form(None, description="csv / parquet（省略時は拡張子で判定）")
+):
+    """需要データファイルをアップロードしてABC分析を実行"""
+    try:
+        file_format = detect_format(file.filename, file_format)
+        thresholds = [float(value) for value in threshold.split(",")]
+        agg_df, new_df, category = await run_cpu_bound(
+            "analysis", analyze_demand_file, await file.read(), file_format, abc_analysis,
+            thresholds, agg_col, value_col, abc_name, rank_name
+        )
+        
+        return ABCAnalysisResult(
+            aggregated_data=agg_df.to_dict(),
+            new_data=new_df.to_dict(),
+            categories=category
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/analysis-all", response_model=Dict[str, Any])
 async def perform_abc_analysis_all(request: Dict[str, Any]):
     """全体のABC分析を実行"""
@@ -66,7 +97,7 @@ async def perform_abc_analysis_all(request: Dict[str, Any]):
         threshold = request["threshold"]
         
         demand_df = convert_demand_records_to_df(demand_data)
-        agg_df, category = abc_analysis_all(demand_df, threshold)
+        agg_df, category = await run_cpu_bound("analysis", abc_analysis_all, demand_df, threshold)
         
         return {
             "aggregated_data": agg_df.to_dict(),
@@ -87,8 +118,8 @@ async def generate_abc_figures(request: Dict[str, Any]):
         cust_thres = request.get("cust_thres", "0.7, 0.2, 0.1")
         prod_thres = request.get("prod_thres", "0.7, 0.2, 0.1")
         
-        fig_prod, fig_cust, agg_df_prod, agg_df_cust, new_df, category_prod, category_cust = generate_figures_for_abc_analysis(
-            demand_df, value, cumsum, cust_thres, prod_thres
+        fig_prod, fig_cust, agg_df_prod, agg_df_cust, new_df, category_prod, category_cust = await run_cpu_bound(
+            "analysis", generate_figures_for_abc_analysis, demand_df, value, cumsum, cust_thres, prod_thres
         )
         
         return {
@@ -114,6 +145,25 @@ async def perform_rank_analysis(request: RankAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/rank-analysis/upload", response_model=Dict[str, Any])
+async def perform_rank_analysis_upload(
+    file: UploadFile = File(..., description="需要データ（CSV / Parquet、DemandRecord と同じ列）"),
+    value: str = Form("demand", description="分析対象値"),
+    top_rank: int = Form(10, description="上位ランク数"),
+    file_format: Optional[str] = Form(None, description="csv / parquet（省略時は拡張子で判定）")
+):
+    """需要データファイルをアップロードしてランク分析を実行"""
+    try:
+        file_format = detect_format(file.filename, file_format)
+        fig = await run_cpu_bound(
+            "analysis", analyze_demand_file, await file.read(), file_format, show_rank_analysis,
+            None, value, "1m", top_rank
+        )
+        
+        return {"figure": fig.to_json()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/risk-pooling", response_model=Dict[str, Any])
 async def analyze_risk_pooling(request: Dict[str, Any]):
     """リスク共同管理の分析"""
@@ -122,7 +172,29 @@ async def analyze_risk_pooling(request: Dict[str, Any]):
         demand_df = convert_demand_records_to_df(demand_data)
         
         agg_period = request.get("agg_period", "1w")
-        reduction_df = risk_pooling_analysis(demand_df, agg_period)
+        reduction_df = await run_cpu_bound("analysis", risk_pooling_analysis, demand_df, agg_period)
+        fig = show_inventory_reduction(reduction_df)
+        
+        return {
+            "reduction_data": reduction_df.to_dict(),
+            "figure": fig.to_json()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/risk-pooling/upload", response_model=Dict[str, Any])
+async def analyze_risk_pooling_upload(
+    file: UploadFile = File(..., description="需要データ（CSV / Parquet、DemandRecord と同じ列）"),
+    agg_period: str = Form("1w", description="集約期間"),
+    file_format: Optional[str] = Form(None, description="csv / parquet（省略時は拡張子で判定）")
+):
+    """需要データファイルをアップロードしてリスク共同管理の分析を実行"""
+    try:
+        file_format = detect_format(file.filename, file_format)
+        reduction_df = await run_cpu_bound(
+            "analysis", analyze_demand_file, await file.read(), file_format, risk_pooling_analysis,
+            agg_period
+        )
         fig = show_inventory_reduction(reduction_df)
         
         return {
@@ -156,7 +228,8 @@ async def analyze_risk_pooling_detailed(request: RiskPoolingRequest):
     try:
         demand_df = convert_demand_records_to_df(request.demand_data)
         
-        result = risk_pooling_analysis_detailed(
+        result = await run_cpu_bound(
+            "analysis", risk_pooling_analysis_detailed,
             demand_df,
             request.pool_groups,
             request.product,
@@ -173,7 +246,8 @@ async def analyze_mean_cv_detailed(request: MeanCVAnalysisRequest):
     try:
         demand_df = convert_demand_records_to_df(request.demand_data)
         
-        result = mean_cv_analysis(
+        result = await run_cpu_bound(
+            "analysis", mean_cv_analysis,
             demand_df,
             request.segment_by,
             request.period,
@@ -192,10 +266,10 @@ async def perform_inventory_analysis(request: InventoryAnalysisRequest):
         prod_df = pd.DataFrame(request.prod_data)
         
         # リスク共同管理分析を先に実行
-        reduction_df = risk_pooling_analysis(demand_df)
+        reduction_df = await run_cpu_bound("analysis", risk_pooling_analysis, demand_df)
         
-        result_df = inventory_analysis(
-            prod_df, demand_df, reduction_df, 
+        result_df = await run_cpu_bound(
+            "analysis", inventory_analysis, prod_df, demand_df, reduction_df, 
             request.z, request.LT, request.r, request.num_days
         )
         
@@ -211,7 +285,7 @@ async def perform_inventory_simulation(request: Dict[str, Any]):
         demand_df = convert_demand_records_to_df(demand_data)
         prod_df = pd.DataFrame(request["prod_data"])
         
-        simulation_result = inventory_simulation(prod_df, demand_df)
+        simulation_result = await run_cpu_bound("analysis", inventory_simulation, prod_df, demand_df)
         
         # DataFrameをdict形式に変換
         result = {}
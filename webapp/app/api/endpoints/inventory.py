@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Union
 import pandas as pd
 import json
+import logging
 import traceback
 
 from ...models.inventory import (
@@ -18,15 +19,22 @@ from ...models.inventory import (
     PeriodicInventoryRequest, PeriodicInventoryResult
 )
 from ...services.inventory_service import inventory_service
+from ...utils.executor import run_cpu_bound, run_cpu_bound_with_progress
+from ...utils.result_cache import cached_endpoint
 import networkx as nx
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+# ワーカープロセスで呼び出すサービスのインスタンス（run_cpu_bound の対象の接頭辞）
+INVENTORY_SERVICE = "app.services.inventory_service:inventory_service"
+
 # =====================================================
 # EOQ (Economic Order Quantity) エンドポイント
 # =====================================================
 
 @router.post("/eoq", response_model=EOQResult)
+@cached_endpoint("inventory/eoq")
 async def calculate_eoq(request: EOQRequest):
     """
     経済発注量（EOQ）を計算
@@ -71,6 +79,7 @@ async def calculate_eoq(request: EOQRequest):
 # =====================================================
 
 @router.post("/wagner-whitin", response_model=Dict[str, Any])
+@cached_endpoint("inventory/wagner-whitin")
 async def calculate_wagner_whitin(
     demands: List[float],
     fixed_costs: Union[float, List[float]] = 100.0,
@@ -140,7 +149,8 @@ async def calculate_ssa_dp(request: SSARequest):
                 'cost': (product.unit_cost or 1.0) * product.holding_cost_rate
             }
         
-        result = inventory_service.dynamic_programming_for_SSA(
+        result = await run_cpu_bound(
+            "inventory", f"{INVENTORY_SERVICE}.dynamic_programming_for_SSA",
             G=G,
             budget=request.total_budget,
             demand_params=demand_params
@@ -182,7 +192,8 @@ async def calculate_ssa_tabu(request: SSARequest):
                 'cost': (product.unit_cost or 1.0) * product.holding_cost_rate
             }
         
-        result = inventory_service.tabu_search_for_SSA(
+        result = await run_cpu_bound_with_progress(
+            "inventory", f"{INVENTORY_SERVICE}.tabu_search_for_SSA",
             G=G,
             budget=request.total_budget,
             demand_params=demand_params,
@@ -216,7 +227,8 @@ async def simulate_inventory_policy(request: SimulationRequest):
         # 需要データから需要リストを抽出
         demands = [d.demand for d in request.demand_data]
         
-        result = inventory_service.simulate_inventory(
+        result = await run_cpu_bound(
+            "inventory", f"{INVENTORY_SERVICE}.simulate_inventory",
             policy=request.policy,
             demands=demands,
             initial_inventory=request.initial_inventory or 0,
@@ -301,7 +313,8 @@ async def optimize_base_stock_levels(request: BaseStockRequest):
         # 需要データから需要リストを抽出
         demands = [d.demand for d in request.demand_data]
         
-        result = inventory_service.optimize_base_stock(
+        result = await run_cpu_bound_with_progress(
+            "inventory", f"{INVENTORY_SERVICE}.optimize_base_stock",
             demands=demands,
             target_service_level=request.target_service_level,
             holding_cost=request.products[0].holding_cost_rate if request.products else 1.0,
@@ -332,21 +345,21 @@ async def fit_demand_distribution(request: DemandDistributionRequest):
         最適分布とパラメータ
     """
     try:
-        print(f"Received demand distribution request: {request.model_dump()}")
+        logger.debug("需要分布フィッティング: %d件、候補 %s",
+                     len(request.demand_data), request.distribution_candidates)
         
-        result = inventory_service.best_distribution(
+        result = await run_cpu_bound(
+            "inventory", f"{INVENTORY_SERVICE}.best_distribution",
             data=request.demand_data,
             distributions=request.distribution_candidates,
             method=request.fitting_method,
             significance_level=request.significance_level
         )
         
-        print(f"Distribution fitting result: {result}")
         return result
         
     except Exception as e:
-        print(f"Error in fit_demand_distribution: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"需要分布フィッティングエラー: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"需要分布フィッティングエラー: {str(e)}"
@@ -412,7 +425,8 @@ async def comprehensive_inventory_analysis(
             # 需要分布フィッティング
             if analysis_options.get("fit_distributions", False):
                 try:
-                    dist_result = inventory_service.best_distribution(product_demand)
+                    dist_result = await run_cpu_bound(
+                        "inventory", f"{INVENTORY_SERVICE}.best_distribution", product_demand)
                     product_results["demand_distribution"] = {
                         "best_distribution": dist_result.best_distribution,
                         "parameters": dist_result.parameters,
@@ -0,0 +1,165 @@
+"""
+非同期ジョブ用FastAPIエンドポイント（投入・状態の確認・結果の取得・取り消し）
+
+長時間かかる最適化をジョブとして投入するとジョブIDをすぐに返し、HTTP接続を保持しない。
+状態と結果は sqlite に保存するため、ワーカーを再起動しても結果を再計算せずに返せる
+（実行途中だったジョブは再起動後に保存済みのリクエストから再実行する）。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+import logging
+
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from pydantic import BaseModel, ValidationError
+
+from ...models.jobs import JobSubmitRequest, JobStatus, JobKindInfo, JobListResult
+from ...models.logistics import CustomerData, DCData, PlantData, LNDRequest, KMedianRequest, ClusteringRequest
+from ...models.inventory import BaseStockRequest
+from ...models.vrp import VRPRequest
+from ...services.job_service import get_job_manager
+from ...utils.job_store import COMPLETED
+from . import logistics, inventory, vrp
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+
+class ComprehensiveAnalysisRequest(BaseModel):
+    """包括的物流分析のリクエスト（/logistics/comprehensive-analysis の本体と同じ）"""
+    customers: List[CustomerData]
+    dc_candidates: List[DCData]
+    plants: List[PlantData] = []
+    analysis_options: Optional[Dict[str, bool]] = None
+
+
+async def _comprehensive_analysis(request: ComprehensiveAnalysisRequest):
+    return await logistics.comprehensive_logistics_analysis(
+        customers=request.customers,
+        dc_candidates=request.dc_candidates,
+        plants=request.plants,
+        analysis_options=request.analysis_options
+    )
+
+
+@dataclass(frozen=True)
+class JobKind:
+    """ジョブの種類：リクエストのモデルと実行する処理（同期エンドポイントの関数）"""
+    endpoint: str
+    request_model: Type[BaseModel]
+    runner: Callable[[Any], Awaitable[Any]]
+
+
+JOB_KINDS: Dict[str, JobKind] = {
+    "logistics/comprehensive-analysis": JobKind(
+        "/logistics/comprehensive-analysis", ComprehensiveAnalysisRequest, _comprehensive_analysis),
+    "logistics/lnd": JobKind("/logistics/lnd", LNDRequest, logistics.solve_logistics_network_design),
+    "logistics/multi-source-lnd": JobKind(
+        "/logistics/multi-source-lnd", logistics.SimpleLNDRequest, logistics.solve_multi_source_lnd),
+    "logistics/single-source-lnd": JobKind(
+        "/logistics/single-source-lnd", logistics.SimpleLNDRequest, logistics.solve_single_source_lnd),
+    "logistics/single-source-lnd/lagrangian": JobKind(
+        "/logistics/single-source-lnd/lagrangian", logistics.LagrangianLNDRequest,
+        logistics.solve_single_source_lnd_lagrangian),
+    "logistics/exact-lnd": JobKind("/logistics/exact-lnd", logistics.ExactLNDRequest, logistics.solve_exact_lnd),
+    "logistics/k-median": JobKind("/logistics/k-median", KMedianRequest, logistics.solve_k_median_problem),
+    "logistics/clustering": JobKind("/logistics/clustering", ClusteringRequest, logistics.cluster_customers),
+    "inventory/optimize-base-stock": JobKind(
+        "/inventory/optimize-base-stock", BaseStockRequest, inventory.optimize_base_stock_levels),
+    "vrp/optimize": JobKind("/vrp/optimize", VRPRequest, vrp.optimize_vehicle_routing),
+}
+
+
+def _job_status(job_id: str) -> JobStatus:
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"ジョブが見つかりません: {job_id}")
+    return JobStatus(**job)
+
+
+async def resume_interrupted_jobs() -> List[str]:
+    """停止したワーカーが実行途中だったジョブを引き継いで再実行（起動時に呼ぶ）"""
+    manager = get_job_manager()
+    resumed = []
+    for job_id in manager.store.claim_orphans():
+        job = manager.store.get(job_id)
+        kind = JOB_KINDS.get(job["kind"])
+        if kind is None:
+            manager.store.fail(job_id, f"未知のジョブの種類です: {job['kind']}")
+            continue
+        try:
+            request = kind.request_model(**manager.store.request(job_id))
+        except ValidationError as e:
+            manager.store.fail(job_id, f"保存されたリクエストが不正です: {e}")
+            continue
+        manager.resume(job_id, request, kind.runner)
+        resumed.append(job_id)
+    if resumed:
+        logger.info(f"再起動前のジョブを再実行: {len(resumed)}件")
+    return resumed
+
+
+@router.get("/kinds", response_model=List[JobKindInfo])
+async def list_job_kinds():
+    """投入できるジョブの種類"""
+    return [JobKindInfo(kind=name, endpoint=kind.endpoint, request_model=kind.request_model.__name__)
+            for name, kind in JOB_KINDS.items()]
+
+
+@router.post("", response_model=JobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(request: JobSubmitRequest):
+    """
+    ジョブを投入してすぐにジョブIDを返す
+
+    リクエスト本体は投入時に検証し、不正なら 400 を返す（ジョブは登録しない）。
+    """
+    kind = JOB_KINDS.get(request.kind)
+    if kind is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"未知のジョブの種類です: {request.kind}")
+    try:
+        body = kind.request_model(**request.request)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"リクエストが不正です: {e}")
+    job_id = get_job_manager().submit(request.kind, body, kind.runner)
+    return _job_status(job_id)
+
+
+@router.get("", response_model=JobListResult)
+async def list_jobs(status_filter: Optional[str] = Query(None, alias="status"),
+                    kind: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    """ジョブの一覧（新しい順、状態・種類で絞り込み）"""
+    jobs = get_job_manager().store.list(status=status_filter, kind=kind, limit=limit)
+    return JobListResult(jobs=[JobStatus(**job) for job in jobs])
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """ジョブの状態と進捗"""
+    return _job_status(job_id)
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """完了したジョブの結果（保存した JSON をそのまま返す、未完了なら 409）"""
+    job = _job_status(job_id)
+    result = get_job_manager().store.result(job_id) if job.status == COMPLETED else None
+    if result is None:
+        detail = f"ジョブは完了していません: {job.status}"
+        if job.error:
+            detail += f" ({job.error})"
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+    return Response(content=result, media_type="application/json")
+
+
+@router.delete("/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """ジョブを取り消す（終了済みなら 409）"""
+    job = _job_status(job_id)
+    if not get_job_manager().cancel(job_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"ジョブは終了しています: {job.status}")
+    return _job_status(job_id)
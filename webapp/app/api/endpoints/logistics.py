@@ -5,6 +5,7 @@ import logging
 
 from app.models.logistics import (
     CustomerData, DCData, PlantData, ProductData,
+    CustomerAggregationOptions, CustomerAggregationRequest, CustomerAggregationResult,
     WeiszfeldRequest, WeiszfeldResult,
     KMedianRequest, KMedianResult,
     ClusteringRequest, ClusteringResult,
@@ -12,13 +13,31 @@ from app.models.logistics import (
     NetworkVisualizationRequest, NetworkVisualizationResult,
     NetworkAnalysisRequest, NetworkAnalysisResult
 )
-from app.services.logistics_service import LogisticsOptimizationService
+from app.services.job_service import report_progress
+from app.utils.executor import broadcast_cpu_bound, run_cpu_bound, run_cpu_bound_with_progress
+from app.utils.result_cache import cached_endpoint
 
 router = APIRouter()
-logistics_service = LogisticsOptimizationService()
+# ワーカープロセスで呼び出すサービスのインスタンス（run_cpu_bound の対象の接頭辞）
+LOGISTICS_SERVICE = "app.services.logistics_service:logistics_service"
 
 logger = logging.getLogger(__name__)
 
+
+async def aggregate_request_customers(customers: List[CustomerData],
+                                      options: Optional[CustomerAggregationOptions]) -> List[CustomerData]:
+    """集約の設定があれば顧客をセルに集約して返す"""
+    if options is None:
+        return customers
+    aggregated = await run_cpu_bound(
+        "optimization", f"{LOGISTICS_SERVICE}.aggregate_customers_by_cell",
+        customers, method=options.method, cell_km=options.cell_km,
+        geohash_precision=options.geohash_precision
+    )
+    logger.info(f"顧客集約: {aggregated['n_original']} → {aggregated['n_aggregated']}, "
+                f"最大移動誤差={aggregated['max_displacement_km']:.3f}km")
+    return aggregated['customers']
+
 # =====================================================
 # ヘルスチェック
 # =====================================================
@@ -39,11 +58,35 @@ async def health_check():
         ]
     }
 
+def summarize_worker_caches(per_worker: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """ワーカーごとのキャッシュの統計と、距離行列キャッシュの合計"""
+    total = {key: sum(stats["matrix_cache"][key] for stats in per_worker.values())
+             for key in ("entries", "current_bytes", "hits", "misses", "evictions")}
+    requests = total["hits"] + total["misses"]
+    total["hit_rate"] = total["hits"] / requests if requests else 0.0
+    return {
+        "workers": {str(pid): stats for pid, stats in per_worker.items()},
+        "matrix_cache": total
+    }
+
+@router.get("/matrix-cache")
+async def get_matrix_cache_stats():
+    """距離行列などのキャッシュの統計（最適化のワーカーごとと合計）"""
+    per_worker = await broadcast_cpu_bound("optimization", f"{LOGISTICS_SERVICE}.cache_stats")
+    return summarize_worker_caches(per_worker)
+
+@router.delete("/matrix-cache")
+async def clear_matrix_cache():
+    """最適化の各ワーカーの距離行列・MILPモデル・輸送問題のキャッシュをクリア"""
+    per_worker = await broadcast_cpu_bound("optimization", f"{LOGISTICS_SERVICE}.clear_caches")
+    return summarize_worker_caches(per_worker)
+
 # =====================================================
 # Weiszfeld法による施設立地最適化
 # =====================================================
 
 @router.post("/weiszfeld", response_model=WeiszfeldResult)
+@cached_endpoint("logistics/weiszfeld", seed_field="random_seed")
 async def optimize_facility_locations(request: WeiszfeldRequest):
     """
     Weiszfeld法による施設立地最適化
@@ -57,12 +100,15 @@ async def optimize_facility_locations(request: WeiszfeldRequest):
     try:
         logger.info(f"Weiszfeld最適化開始: 顧客数={len(request.customers)}, 施設数={request.num_facilities}")
         
-        result = logistics_service.weiszfeld_multiple(
+        result = await run_cpu_bound_with_progress(
+            "optimization", f"{LOGISTICS_SERVICE}.weiszfeld_multiple",
             customers=request.customers,
             num_facilities=request.num_facilities,
             max_iterations=request.max_iterations,
             tolerance=request.tolerance,
-            use_great_circle=request.use_great_circle
+            use_great_circle=request.use_great_circle,
+            num_restarts=request.num_restarts,
+            random_seed=request.random_seed
         )
         
         logger.info(f"Weiszfeld最適化完了: 総費用={result.total_cost:.2f}")
@@ -80,6 +126,7 @@ async def optimize_facility_locations(request: WeiszfeldRequest):
 # =====================================================
 
 @router.post("/k-median", response_model=KMedianResult)
+@cached_endpoint("logistics/k-median")
 async def solve_k_median_problem(request: KMedianRequest):
     """
     K-Median問題の最適化
@@ -93,8 +140,9 @@ async def solve_k_median_problem(request: KMedianRequest):
     try:
         logger.info(f"K-Median最適化開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}, K={request.k}")
         
-        result = logistics_service.solve_k_median(
-            customers=request.customers,
+        result = await run_cpu_bound_with_progress(
+            "optimization", f"{LOGISTICS_SERVICE}.solve_k_median",
+            customers=await aggregate_request_customers(request.customers, request.aggregation),
             dc_candidates=request.dc_candidates,
             k=request.k,
             max_iterations=request.max_iterations,
@@ -125,7 +173,8 @@ async def find_k_median_learning_rate(
     dc_candidates: List[DCData], 
     k: int,
     lr_range: List[float] = [1e-7, 10.0],
-    num_iterations: int = 100
+    num_iterations: int = 100,
+    batched: bool = True
 ):
     """
     K-Median最適化のための学習率探索
@@ -136,6 +185,7 @@ async def find_k_median_learning_rate(
         k: 選択する施設数
         lr_range: 学習率探索範囲 [min, max]
         num_iterations: 探索イテレーション数
+        batched: 複数の学習率を同時に評価するか
     
     Returns:
         学習率探索結果
@@ -143,12 +193,14 @@ async def find_k_median_learning_rate(
     try:
         logger.info(f"K-Median学習率探索開始: 顧客数={len(customers)}, DC候補数={len(dc_candidates)}, K={k}")
         
-        result = logistics_service.find_learning_rate(
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.find_learning_rate",
             customers=customers,
             dc_candidates=dc_candidates,
             k=k,
             lr_range=tuple(lr_range),
-            num_iterations=num_iterations
+            num_iterations=num_iterations,
+            batched=batched
         )
         
         logger.info(f"K-Median学習率探索完了: 推奨学習率={result['suggested_lr']:.6f}")
@@ -172,6 +224,7 @@ class SimpleLNDRequest(BaseModel):
     products: Optional[List[ProductData]] = None
     max_iterations: int = Field(500, description="最大反復回数")
     tolerance: float = Field(1e-6, description="収束判定閾値")
+    aggregation: Optional[CustomerAggregationOptions] = Field(None, description="求解前の顧客のセル集約")
 
 # =====================================================
 # Advanced Optimization Methods
@@ -185,8 +238,9 @@ async def solve_multi_source_lnd(request: SimpleLNDRequest):
     try:
         logger.info(f"Multi-source LND開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}, 工場数={len(request.plants)}")
         
-        result = logistics_service.solve_multi_source_lnd(
-            customers=request.customers,
+        result = await run_cpu_bound_with_progress(
+            "optimization", f"{LOGISTICS_SERVICE}.solve_multi_source_lnd",
+            customers=await aggregate_request_customers(request.customers, request.aggregation),
             dc_candidates=request.dc_candidates,
             plants=request.plants,
             products=request.products,
@@ -212,8 +266,9 @@ async def solve_single_source_lnd(request: SimpleLNDRequest):
     try:
         logger.info(f"Single-source LND開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}, 工場数={len(request.plants)}")
         
-        result = logistics_service.solve_single_source_lnd(
-            customers=request.customers,
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.solve_single_source_lnd",
+            customers=await aggregate_request_customers(request.customers, request.aggregation),
             dc_candidates=request.dc_candidates,
             plants=request.plants,
             products=request.products,
@@ -231,6 +286,88 @@ async def solve_single_source_lnd(request: SimpleLNDRequest):
             detail=f"Single-source LNDに失敗しました: {str(e)}"
         )
 
+class ExactLNDRequest(BaseModel):
+    customers: List[CustomerData]
+    dc_candidates: List[DCData]
+    plants: List[PlantData]
+    single_source: bool = Field(False, description="単一ソース制約（各顧客を1つのDCに割当）")
+    solver_name: str = Field("PULP_CBC_CMD", description="PuLPのソルバー名")
+    time_limit: Optional[float] = Field(None, gt=0, description="計算時間の上限（秒）")
+    mip_gap: Optional[float] = Field(None, ge=0, description="相対MIPギャップの許容値")
+    threads: Optional[int] = Field(None, ge=1, description="ソルバーのスレッド数")
+    warm_start: bool = Field(True, description="ヒューリスティック解を初期解として使用")
+    aggregation: Optional[CustomerAggregationOptions] = Field(None, description="求解前の顧客のセル集約")
+
+@router.post("/exact-lnd", response_model=LNDResult)
+async def solve_exact_lnd(request: ExactLNDRequest):
+    """
+    Exact MILP logistics network design (multi-source / single-source)
+    """
+    try:
+        logger.info(f"Exact LND開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}, 単一ソース={request.single_source}")
+        
+        method = "lnd_ss_exact" if request.single_source else "lnd_ms_exact"
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.{method}",
+            customers=await aggregate_request_customers(request.customers, request.aggregation),
+            dc_candidates=request.dc_candidates,
+            plants=request.plants,
+            solver_name=request.solver_name,
+            time_limit=request.time_limit,
+            mip_gap=request.mip_gap,
+            threads=request.threads,
+            warm_start=request.warm_start
+        )
+        
+        logger.info(f"Exact LND完了: 総費用={result.total_cost:.2f}, ステータス={result.solution_status}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Exact LNDエラー: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Exact LNDに失敗しました: {str(e)}"
+        )
+
+class LagrangianLNDRequest(BaseModel):
+    customers: List[CustomerData]
+    dc_candidates: List[DCData]
+    plants: List[PlantData]
+    max_iterations: int = Field(300, ge=1, description="劣勾配法の最大反復回数")
+    gap_tolerance: float = Field(1e-3, ge=0, description="終了する相対ギャップ")
+    time_limit: Optional[float] = Field(None, gt=0, description="計算時間の上限（秒）")
+    knapsack: str = Field("auto", description="ナップサック下位問題の解法（auto / greedy）")
+    aggregation: Optional[CustomerAggregationOptions] = Field(None, description="求解前の顧客のセル集約")
+
+@router.post("/single-source-lnd/lagrangian", response_model=LNDResult)
+async def solve_single_source_lnd_lagrangian(request: LagrangianLNDRequest):
+    """
+    Single-source capacitated LND by Lagrangian decomposition (lower bound / gap reported)
+    """
+    try:
+        logger.info(f"Lagrangian single-source LND開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}")
+        
+        result = await run_cpu_bound_with_progress(
+            "optimization", f"{LOGISTICS_SERVICE}.solve_single_source_lnd_lagrangian",
+            customers=await aggregate_request_customers(request.customers, request.aggregation),
+            dc_candidates=request.dc_candidates,
+            plants=request.plants,
+            max_iterations=request.max_iterations,
+            gap_tolerance=request.gap_tolerance,
+            time_limit=request.time_limit,
+            knapsack=request.knapsack
+        )
+        
+        logger.info(f"Lagrangian single-source LND完了: 総費用={result.total_cost:.2f}, ギャップ={result.network_performance['gap']:.4f}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Lagrangian single-source LNDエラー: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Lagrangian single-source LNDに失敗しました: {str(e)}"
+        )
+
 class AbstractLNDPRequest(BaseModel):
     customers: List[CustomerData]
     dc_candidates: List[DCData]
@@ -247,7 +384,8 @@ async def solve_abstract_lndp(request: AbstractLNDPRequest):
     try:
         logger.info(f"Abstract LNDP開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}, 工場数={len(request.plants)}")
         
-        result = logistics_service.solve_abstract_lndp(
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.solve_abstract_lndp",
             customers=request.customers,
             dc_candidates=request.dc_candidates,
             plants=request.plants,
@@ -270,6 +408,35 @@ async def solve_abstract_lndp(request: AbstractLNDPRequest):
 # 顧客クラスタリング
 # =====================================================
 
+@router.post("/aggregate-customers", response_model=CustomerAggregationResult)
+async def aggregate_customers(request: CustomerAggregationRequest):
+    """
+    顧客をグリッド・ジオハッシュのセルに集約（需要重心と移動誤差）
+    
+    Args:
+        request: 顧客集約リクエスト
+    
+    Returns:
+        集約後の顧客と最大・平均移動誤差
+    """
+    try:
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.aggregate_customers_by_cell",
+            customers=request.customers,
+            method=request.method,
+            cell_km=request.cell_km,
+            geohash_precision=request.geohash_precision
+        )
+        result.pop('customer_cells')
+        return CustomerAggregationResult(**result)
+        
+    except Exception as e:
+        logger.error(f"顧客集約エラー: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"顧客集約に失敗しました: {str(e)}"
+        )
+
 @router.post("/clustering", response_model=ClusteringResult)
 async def cluster_customers(request: ClusteringRequest):
     """
@@ -284,11 +451,15 @@ async def cluster_customers(request: ClusteringRequest):
     try:
         logger.info(f"顧客クラスタリング開始: 顧客数={len(request.customers)}, 手法={request.method}, クラスター数={request.n_clusters}")
         
-        result = logistics_service.cluster_customers(
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.cluster_customers",
             customers=request.customers,
             method=request.method,
             n_clusters=request.n_clusters,
-            use_road_distance=request.use_road_distance
+            use_road_distance=request.use_road_distance,
+            clustering_mode=request.clustering_mode,
+            memory_budget_mb=request.memory_budget_mb,
+            silhouette_sample_size=request.silhouette_sample_size
         )
         
         logger.info(f"顧客クラスタリング完了: シルエット係数={result.silhouette_score:.3f}")
@@ -319,7 +490,8 @@ async def solve_logistics_network_design(request: LNDRequest):
     try:
         logger.info(f"LND最適化開始: 顧客数={len(request.customers)}, DC候補数={len(request.dc_candidates)}")
         
-        result = logistics_service.solve_basic_lnd(
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.solve_basic_lnd",
             customers=request.customers,
             dc_candidates=request.dc_candidates,
             plants=request.plants,
@@ -355,33 +527,40 @@ async def create_network_visualization(request: NetworkVisualizationRequest):
     try:
         logger.info("ネットワーク可視化データ生成開始")
         
-        # サンプル顧客データを作成（実際の座標）
-        # TODO: 将来的にはリクエストに顧客データを含めるか、DBから取得する
-        customers = [
-            CustomerData(
-                name="顧客A",
-                latitude=35.6762,
-                longitude=139.6503,
-                demand=50
-            ),
-            CustomerData(
-                name="顧客B",
-                latitude=35.6894,
-                longitude=139.6917,
-                demand=30
-            ),
-            CustomerData(
-                name="顧客C",
-                latitude=35.6586,
-                longitude=139.7454,
-                demand=80
-            )
-        ]
+        customers = request.customers
+        if customers is None:
+            # 顧客データがない場合はサンプル顧客データを使用（実際の座標）
+            customers = [
+                CustomerData(
+                    name="顧客A",
+                    latitude=35.6762,
+                    longitude=139.6503,
+                    demand=50
+                ),
+                CustomerData(
+                    name="顧客B",
+                    latitude=35.6894,
+                    longitude=139.6917,
+                    demand=30
+                ),
+                CustomerData(
+                    name="顧客C",
+                    latitude=35.6586,
+                    longitude=139.7454,
+                    demand=80
+                )
+            ]
         
-        result = logistics_service.create_network_visualization(
+        result = await run_cpu_bound(
+            "optimization", f"{LOGISTICS_SERVICE}.create_network_visualization",
             lnd_result=request.lnd_result,
             customers=customers,
-            show_flows=request.show_flows
+            show_flows=request.show_flows,
+            flow_threshold=request.flow_threshold,
+            max_markers=request.max_markers,
+            zoom_levels=request.zoom_levels,
+            max_payload_bytes=request.max_payload_bytes,
+            typed_arrays=request.typed_arrays
         )
         
         logger.info("ネットワーク可視化データ生成完了")
@@ -428,13 +607,17 @@ async def comprehensive_logistics_analysis(
             }
         
         results = {"analyses": {}}
+        # ジョブとして実行したときの進捗（有効な分析ごとに進める）
+        stages = [name for name in ("weiszfeld", "k_median", "clustering", "lnd")
+                  if analysis_options.get(name, False)]
         
         logger.info("包括的物流分析開始")
         
         # 1. Weiszfeld法による施設立地
         if analysis_options.get("weiszfeld", False):
             try:
-                weiszfeld_result = logistics_service.weiszfeld_multiple(
+                weiszfeld_result = await run_cpu_bound_with_progress(
+                    "optimization", f"{LOGISTICS_SERVICE}.weiszfeld_multiple",
                     customers=customers,
                     num_facilities=min(5, len(dc_candidates)),
                     max_iterations=500,
@@ -446,12 +629,14 @@ async def comprehensive_logistics_analysis(
             except Exception as e:
                 logger.error(f"Weiszfeld分析エラー: {e}")
                 results["analyses"]["weiszfeld_error"] = str(e)
+            report_progress((stages.index("weiszfeld") + 1) / len(stages), "Weiszfeld分析終了")
         
         # 2. K-Median最適化
         if analysis_options.get("k_median", False):
             try:
                 k = min(3, len(dc_candidates))
-                k_median_result = logistics_service.solve_k_median(
+                k_median_result = await run_cpu_bound_with_progress(
+                    "optimization", f"{LOGISTICS_SERVICE}.solve_k_median",
                     customers=customers,
                     dc_candidates=dc_candidates,
                     k=k,
@@ -464,11 +649,13 @@ async def comprehensive_logistics_analysis(
             except Exception as e:
                 logger.error(f"K-Median分析エラー: {e}")
                 results["analyses"]["k_median_error"] = str(e)
+            report_progress((stages.index("k_median") + 1) / len(stages), "K-Median分析終了")
         
         # 3. 顧客クラスタリング
         if analysis_options.get("clustering", False):
             try:
-                clustering_result = logistics_service.cluster_customers(
+                clustering_result = await run_cpu_bound(
+                    "optimization", f"{LOGISTICS_SERVICE}.cluster_customers",
                     customers=customers,
                     method="kmeans",
                     n_clusters=min(5, len(customers) // 2),
@@ -479,11 +666,13 @@ async def comprehensive_logistics_analysis(
             except Exception as e:
                 logger.error(f"クラスタリング分析エラー: {e}")
                 results["analyses"]["clustering_error"] = str(e)
+            report_progress((stages.index("clustering") + 1) / len(stages), "クラスタリング分析終了")
         
         # 4. 物流ネットワーク設計
         if analysis_options.get("lnd", False):
             try:
-                lnd_result = logistics_service.solve_basic_lnd(
+                lnd_result = await run_cpu_bound(
+                    "optimization", f"{LOGISTICS_SERVICE}.solve_basic_lnd",
                     customers=customers,
                     dc_candidates=dc_candidates,
                     plants=plants,
@@ -495,6 +684,7 @@ async def comprehensive_logistics_analysis(
             except Exception as e:
                 logger.error(f"LND分析エラー: {e}")
                 results["analyses"]["lnd_error"] = str(e)
+            report_progress((stages.index("lnd") + 1) / len(stages), "LND分析終了")
         
         results["summary"] = {
             "total_customers": len(customers),
@@ -629,7 +819,8 @@ async def benchmark_optimization_algorithms(
             
             try:
                 if algorithm == "weiszfeld":
-                    result = logistics_service.weiszfeld_multiple(
+                    result = await run_cpu_bound_with_progress(
+                        "optimization", f"{LOGISTICS_SERVICE}.weiszfeld_multiple",
                         customers=customers,
                         num_facilities=3,
                         max_iterations=500
@@ -642,7 +833,8 @@ async def benchmark_optimization_algorithms(
                     }
                     
                 elif algorithm == "k_median":
-                    result = logistics_service.solve_k_median(
+                    result = await run_cpu_bound_with_progress(
+                        "optimization", f"{LOGISTICS_SERVICE}.solve_k_median",
                         customers=customers,
                         dc_candidates=dc_candidates,
                         k=3,
@@ -656,7 +848,8 @@ async def benchmark_optimization_algorithms(
                     }
                     
                 elif algorithm == "basic_lnd":
-                    result = logistics_service.solve_basic_lnd(
+                    result = await run_cpu_bound(
+                        "optimization", f"{LOGISTICS_SERVICE}.solve_basic_lnd",
                         customers=customers,
                         dc_candidates=dc_candidates,
                         plants=[],
@@ -0,0 +1,228 @@
+"""
+ソルバーの進捗ストリーミング用FastAPIエンドポイント（Server-Sent Events / WebSocket）
+
+ジョブと同じ種類（/jobs/kinds）の処理を実行し、反復型ソルバー（K-Median、Multi-source LND、
+Weiszfeld、ラグランジュ分解、タブ探索SSA、ベースストック最適化）の進捗を
+OptimizationProgress として逐次送る。途中停止を要求するとソルバーはその時点の最良解を返し、
+最後に通常のエンドポイントと同じ結果を送る。
+"""
+
+import asyncio
+import json
+import math
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+from ...models.logistics import OptimizationProgress
+from ...utils.progress import DEFAULT_PROGRESS_INTERVAL, ProgressListener, use_progress_listener
+from ...utils.result_cache import decode_result
+from .jobs import JOB_KINDS, JobKind
+
+router = APIRouter()
+
+# イベントがない間に SSE のコメント行を送る間隔（秒、プロキシのアイドル切断対策）
+KEEPALIVE_SECONDS = 15.0
+MIN_PROGRESS_INTERVAL = 0.05
+
+
+def _finite(value: Any) -> Optional[float]:
+    """JSON にできない inf / NaN を None にする"""
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def progress_model(run_id: str, event: Dict[str, Any], status: str = "running") -> OptimizationProgress:
+    """ソルバーの進捗イベントの辞書を OptimizationProgress に変換"""
+    fraction = _finite(event.get("progress")) or 0.0
+    elapsed = _finite(event.get("elapsed"))
+    estimated = None
+    if elapsed is not None and 0 < fraction < 1:
+        estimated = datetime.now() + timedelta(seconds=elapsed * (1 - fraction) / fraction)
+    lower, upper = _finite(event.get("lower_bound")), _finite(event.get("upper_bound"))
+    objective = upper if upper is not None else _finite(event.get("objective"))
+    iteration = event.get("iteration")
+    message = f"{event.get('solver', 'solver')}: 反復 {iteration}"
+    if lower is not None or upper is not None:
+        message += f"（下界 {lower}、上界 {upper}）"
+    elif objective is not None:
+        message += f"（目的関数値 {objective}）"
+    return OptimizationProgress(
+        task_id=run_id,
+        status=status,
+        progress=fraction,
+        current_objective=objective,
+        estimated_completion=estimated,
+        messages=[message],
+        solver=event.get("solver"),
+        iteration=iteration,
+        lower_bound=lower,
+        upper_bound=upper,
+        gap=_finite(event.get("gap")),
+        elapsed_seconds=elapsed
+    )
+
+
+class StreamListener(ProgressListener):
+    """進捗を asyncio.Queue に積み、停止要求を保持する（1回のストリーム実行ごと）"""
+
+    def __init__(self, interval: float):
+        self.run_id = uuid.uuid4().hex
+        self.interval = max(MIN_PROGRESS_INTERVAL, interval)
+        self.events: asyncio.Queue = asyncio.Queue()
+        self._stop = False
+
+    def on_progress(self, event: Dict[str, Any]) -> None:
+        status = "stopping" if self._stop else "running"
+        self.events.put_nowait(progress_model(self.run_id, event, status))
+
+    def stop_requested(self) -> bool:
+        return self._stop
+
+    def request_stop(self) -> None:
+        self._stop = True
+
+
+# 実行中のストリーム（run_id → リスナー、停止要求の受け付け用）
+_runs: Dict[str, StreamListener] = {}
+
+
+def _parse(kind_name: str, body: Dict[str, Any]) -> tuple:
+    kind = JOB_KINDS.get(kind_name)
+    if kind is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"未知の処理の種類です: {kind_name}")
+    try:
+        return kind, kind.request_model(**body)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"リクエストが不正です: {e}")
+
+
+async def _stream_run(kind: JobKind, request: BaseModel, listener: StreamListener):
+    """
+    処理を実行しながら ("progress" | "result" | "error" | "keepalive", 内容) を順に返す
+
+    呼び出し側が途中で終了した（接続が切れた）場合は処理を止める。
+    """
+    with use_progress_listener(listener):
+        task = asyncio.ensure_future(kind.runner(request))
+    _runs[listener.run_id] = listener
+    try:
+        while True:
+            getter = asyncio.ensure_future(listener.events.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield "progress", getter.result()
+                continue
+            getter.cancel()
+            if task in done:
+                break
+            yield "keepalive", None
+        while not listener.events.empty():
+            yield "progress", listener.events.get_nowait()
+        error = task.exception()
+        if error is None:
+            yield "result", jsonable_encoder(decode_result(task.result()))
+        else:
+            detail = error.detail if isinstance(error, HTTPException) else str(error)
+            yield "error", {"detail": detail}
+    finally:
+        _runs.pop(listener.run_id, None)
+        if not task.done():
+            listener.request_stop()
+            task.cancel()
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/runs/{run_id}/stop")
+async def stop_stream_run(run_id: str):
+    """実行中のストリームの途中停止を要求（ソルバーはその時点の最良解を返す）"""
+    listener = _runs.get(run_id)
+    if listener is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"実行中のストリームが見つかりません: {run_id}")
+    listener.request_stop()
+    return {"run_id": run_id, "stop_requested": True}
+
+
+@router.post("/{kind:path}")
+async def stream_progress(kind: str, body: Dict[str, Any],
+                          interval: float = Query(DEFAULT_PROGRESS_INTERVAL, ge=0,
+                                                  description="進捗イベントの最短間隔（秒）")):
+    """
+    処理を実行し、進捗を Server-Sent Events で送る
+
+    イベント:
+        started: {"run_id"}（途中停止は POST /stream/runs/{run_id}/stop）
+        progress: OptimizationProgress
+        result: 対応するエンドポイントの結果
+        error: {"detail"}
+    """
+    job_kind, request = _parse(kind, body)
+    listener = StreamListener(interval)
+
+    async def events():
+        yield _sse("started", {"run_id": listener.run_id, "kind": kind,
+                               "started_at": time.time()})
+        async for event, data in _stream_run(job_kind, request, listener):
+            if event == "keepalive":
+                yield ": keepalive\n\n"
+            elif event == "progress":
+                yield _sse(event, jsonable_encoder(data))
+            else:
+                yield _sse(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/ws")
+async def stream_progress_websocket(websocket: WebSocket):
+    """
+    WebSocket で処理を実行し進捗を送る
+
+    クライアント → サーバー: 最初に {"kind", "request", "interval"}、途中停止は {"action": "stop"}
+    サーバー → クライアント: {"type": "started" | "progress" | "result" | "error", "data": ...}
+    """
+    await websocket.accept()
+    try:
+        message = await websocket.receive_json()
+        try:
+            job_kind, request = _parse(message.get("kind", ""), message.get("request") or {})
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "data": {"detail": e.detail}})
+            await websocket.close()
+            return
+        listener = StreamListener(float(message.get("interval", DEFAULT_PROGRESS_INTERVAL)))
+
+        async def receive_commands():
+            while True:
+                command = await websocket.receive_json()
+                if command.get("action") == "stop":
+                    listener.request_stop()
+
+        commands = asyncio.ensure_future(receive_commands())
+        try:
+            await websocket.send_json({"type": "started", "data": {"run_id": listener.run_id}})
+            async for event, data in _stream_run(job_kind, request, listener):
+                if event != "keepalive":
+                    await websocket.send_text(json.dumps(
+                        {"type": event, "data": jsonable_encoder(data)}, ensure_ascii=False, default=str))
+        finally:
+            commands.cancel()
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,28 @@
+"""
+運用状態の確認用FastAPIエンドポイント
+"""
+
+from fastapi import APIRouter
+from typing import Dict, Any
+
+from ...utils.executor import get_executor
+from ...utils.result_cache import get_result_cache
+
+router = APIRouter()
+
+@router.get("/executor", response_model=Dict[str, Any])
+async def get_executor_stats():
+    """CPU負荷の高い処理のプールの状態（区分ごとのワーカー数・実行中・待ち行列の長さ）"""
+    return get_executor().stats()
+
+@router.get("/result-cache", response_model=Dict[str, Any])
+async def get_result_cache_stats():
+    """結果キャッシュの統計（ヒット率・使用量・エンドポイントごとのヒット数）"""
+    return get_result_cache().stats()
+
+@router.delete("/result-cache", response_model=Dict[str, Any])
+async def clear_result_cache():
+    """結果キャッシュをクリア（メモリ層・ディスク層）"""
+    cache = get_result_cache()
+    cache.clear()
+    return cache.stats()
@@ -13,6 +13,7 @@ from ...services.vrp_service import (
     generate_node, generate_node_normal, build_model_for_vrp, generate_vrp,
     time_convert
 )
+from ...utils.executor import run_cpu_bound
 
 router = APIRouter()
 
@@ -24,7 +25,8 @@ async def optimize_vehicle_routing(request: VRPRequest):
         model = Model(**request.model_data)
         
         # 最適化実行
-        input_dic, output_dic, error = optimize_vrp(
+        input_dic, output_dic, error = await run_cpu_bound(
+            "routing", optimize_vrp,
             model,
             matrix=request.matrix,
             threads=request.threads,
@@ -80,8 +82,10 @@ async def compute_distance_table(request: Dict[str, Any]):
         node_df = pd.DataFrame(request["node_data"])
         toll = request.get("toll", True)
         host = request.get("host", "localhost")
+        port = request.get("port", 5000)
         
-        durations, distances = compute_distance_table_for_vrp(node_df, toll, host)
+        durations, distances = await run_cpu_bound(
+            "routing", compute_distance_table_for_vrp, node_df, toll, host, port)
         
         return {
             "durations": durations,
@@ -101,7 +105,8 @@ async def generate_random_nodes(request: Dict[str, Any]):
         matrix = request.get("matrix", False)
         host = request.get("host", "localhost")
         
-        node_df, time_df = generate_node(n, random_seed, prefecture, matrix, host)
+        node_df, time_df = await run_cpu_bound(
+            "routing", generate_node, n, random_seed, prefecture, matrix, host)
         
         result = {
             "node_data": node_df.to_dict(),
@@ -127,7 +132,8 @@ async def generate_normal_distributed_nodes(request: Dict[str, Any]):
         random_seed = request.get("random_seed", 1)
         matrix = request.get("matrix", False)
         
-        node_df, time_df = generate_node_normal(
+        node_df, time_df = await run_cpu_bound(
+            "routing", generate_node_normal,
             n, lat_center, lon_center, std, country_code, random_seed, matrix
         )
         
@@ -9,6 +9,10 @@ from fastapi.responses import FileResponse
 import os
 
 from .api.api import api_router
+from .api.endpoints.jobs import resume_interrupted_jobs
+from .services.job_service import get_job_manager
+from .utils.executor import shutdown_executor
+from .utils.job_store import job_retention_seconds
 
 app = FastAPI(
     title="Supply Chain Management Optimization API",
@@ -27,6 +31,18 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api/v1")
 
+@app.on_event("startup")
+async def resume_jobs():
+    """前回のワーカーが実行途中だったジョブを再実行し、終了した古いジョブの定期削除を始める"""
+    await resume_interrupted_jobs()
+    get_job_manager().start_purging(job_retention_seconds())
+
+@app.on_event("shutdown")
+async def shutdown_cpu_bound_executor():
+    """実行中のジョブを止め（次の起動時に再実行）、CPU負荷の高い処理のワーカープロセスを停止"""
+    await get_job_manager().shutdown()
+    shutdown_executor()
+
 @app.get("/")
 async def root():
     return {
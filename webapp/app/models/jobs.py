@@ -0,0 +1,39 @@
+"""
+非同期ジョブ用データモデル
+"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+
+class JobSubmitRequest(BaseModel):
+    """ジョブ投入リクエスト"""
+    kind: str = Field(..., description="ジョブの種類（例: logistics/comprehensive-analysis）")
+    request: Dict[str, Any] = Field(..., description="対応するエンドポイントのリクエスト本体")
+
+
+class JobStatus(BaseModel):
+    """ジョブの状態（結果本体は /jobs/{job_id}/result で取得）"""
+    job_id: str = Field(..., description="ジョブID")
+    kind: str = Field(..., description="ジョブの種類")
+    status: str = Field(..., description="queued / running / completed / failed / cancelled")
+    progress: float = Field(0.0, description="進捗率（0〜1）")
+    message: Optional[str] = Field(None, description="進捗メッセージ")
+    error: Optional[str] = Field(None, description="失敗時のエラー")
+    attempts: int = Field(0, description="実行回数（再起動後の再実行を含む）")
+    created_at: datetime = Field(..., description="投入時刻")
+    started_at: Optional[datetime] = Field(None, description="開始時刻")
+    finished_at: Optional[datetime] = Field(None, description="終了時刻")
+
+
+class JobKindInfo(BaseModel):
+    """投入できるジョブの種類"""
+    kind: str = Field(..., description="ジョブの種類")
+    endpoint: str = Field(..., description="同じ処理の同期エンドポイント")
+    request_model: str = Field(..., description="リクエストのモデル名")
+
+
+class JobListResult(BaseModel):
+    """ジョブの一覧"""
+    jobs: List[JobStatus] = Field(..., description="新しい順のジョブ")
@@ -64,6 +64,8 @@ class WeiszfeldRequest(BaseModel):
     max_iterations: int = Field(1000, description="最大反復回数")
     tolerance: float = Field(1e-6, description="収束判定閾値")
     use_great_circle: bool = Field(True, description="大円距離を使用")
+    num_restarts: int = Field(5, description="初期解の数（複数施設の場合）")
+    random_seed: Optional[int] = Field(None, description="乱数シード")
 
 class WeiszfeldResult(BaseModel):
     """Weiszfeld法結果"""
@@ -73,6 +75,24 @@ class WeiszfeldResult(BaseModel):
     convergence_history: List[float] = Field(..., description="収束履歴")
     customer_assignments: Dict[str, int] = Field(..., description="顧客割当")
 
+class CustomerAggregationOptions(BaseModel):
+    """顧客のセル集約の設定"""
+    method: str = Field("grid", description="集約方法（grid / geohash）")
+    cell_km: float = Field(1.0, gt=0, description="グリッドセルの一辺（km）")
+    geohash_precision: int = Field(6, ge=1, le=12, description="ジオハッシュの文字数")
+
+class CustomerAggregationRequest(CustomerAggregationOptions):
+    """顧客集約リクエスト"""
+    customers: List[CustomerData] = Field(..., description="顧客リスト")
+
+class CustomerAggregationResult(BaseModel):
+    """顧客集約結果"""
+    customers: List[CustomerData] = Field(..., description="集約後の顧客")
+    n_original: int = Field(..., description="集約前の顧客数")
+    n_aggregated: int = Field(..., description="集約後の顧客数")
+    max_displacement_km: float = Field(..., description="顧客から集約点までの最大距離（km）")
+    mean_displacement_km: float = Field(..., description="顧客から集約点までの需要加重平均距離（km）")
+
 class KMedianRequest(BaseModel):
     """K-Median最適化リクエスト"""
     customers: List[CustomerData] = Field(..., description="顧客リスト")
@@ -81,6 +101,7 @@ class KMedianRequest(BaseModel):
     max_iterations: int = Field(1000, description="最大反復回数")
     learning_rate: float = Field(0.01, description="学習率")
     momentum: float = Field(0.9, description="モメンタム")
+    aggregation: Optional[CustomerAggregationOptions] = Field(None, description="求解前の顧客のセル集約")
 
 class KMedianResult(BaseModel):
     """K-Median最適化結果"""
@@ -96,6 +117,9 @@ class ClusteringRequest(BaseModel):
     method: str = Field("kmeans", description="クラスタリング手法")
     n_clusters: int = Field(..., description="クラスター数")
     use_road_distance: bool = Field(False, description="道路距離を使用")
+    clustering_mode: str = Field("auto", description="階層クラスタリングの計算方式（auto, exact, birch, knn_ward）")
+    memory_budget_mb: Optional[float] = Field(None, gt=0, description="クラスタリングのメモリ上限（MB）")
+    silhouette_sample_size: Optional[int] = Field(None, ge=2, description="シルエット係数を推定する標本数")
 
 class ClusteringResult(BaseModel):
     """クラスタリング結果"""
@@ -128,7 +152,7 @@ class LNDResult(BaseModel):
     total_cost: float = Field(..., description="総費用")
     cost_breakdown: Dict[str, float] = Field(..., description="費用内訳")
     facility_utilization: Dict[str, float] = Field(..., description="施設稼働率")
-    network_performance: Dict[str, float] = Field(..., description="ネットワーク性能")
+    network_performance: Dict[str, Union[float, str]] = Field(..., description="ネットワーク性能")
     solution_status: str = Field(..., description="解ステータス")
     solve_time: float = Field(..., description="求解時間")
     co2_emissions: Optional[float] = Field(None, description="CO2排出量")
@@ -139,12 +163,18 @@ class NetworkVisualizationRequest(BaseModel):
     show_flows: bool = Field(True, description="フロー表示")
     flow_threshold: float = Field(0.0, description="フロー表示閾値")
     map_style: str = Field("open-street-map", description="地図スタイル")
+    customers: Optional[List[CustomerData]] = Field(None, description="顧客リスト")
+    max_markers: int = Field(5000, ge=1, description="間引かずに表示する顧客マーカー数の上限")
+    zoom_levels: List[float] = Field([4, 6, 8, 10, 12], description="顧客をビン集約するズームレベル")
+    max_payload_bytes: Optional[int] = Field(None, gt=0, description="応答のバイト数の上限")
+    typed_arrays: bool = Field(True, description="数値配列を base64 の float32 型付き配列で返す")
 
 class NetworkVisualizationResult(BaseModel):
     """ネットワーク可視化結果"""
     plotly_figure: Dict[str, Any] = Field(..., description="Plotly図表")
     network_stats: Dict[str, float] = Field(..., description="ネットワーク統計")
     legend_data: Dict[str, Any] = Field(..., description="凡例データ")
+    zoom_layers: Dict[str, Any] = Field({}, description="ズームレベルごとの顧客マーカーのトレース")
 
 # =====================================================
 # 分析・レポートモデル
@@ -205,4 +235,10 @@ class OptimizationProgress(BaseModel):
     current_objective: Optional[float] = Field(None, description="現在の目的関数値")
     best_solution: Optional[LNDResult] = Field(None, description="現在の最良解")
     estimated_completion: Optional[datetime] = Field(None, description="完了予想時刻")
-    messages: List[str] = Field([], description="メッセージログ")
\ No newline at end of file
+    messages: List[str] = Field([], description="メッセージログ")
+    solver: Optional[str] = Field(None, description="進捗を報告したソルバー")
+    iteration: Optional[int] = Field(None, description="反復回数")
+    lower_bound: Optional[float] = Field(None, description="最良の下界")
+    upper_bound: Optional[float] = Field(None, description="最良の上界")
+    gap: Optional[float] = Field(None, description="相対ギャップ (上界 - 下界) / 上界")
+    elapsed_seconds: Optional[float] = Field(None, description="ソルバーの経過時間（秒）")
\ No newline at end of file
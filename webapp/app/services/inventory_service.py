@@ -17,6 +17,7 @@ from scipy.stats import norm
 import warnings
 warnings.filterwarnings('ignore')
 
+from ..utils.progress import DEFAULT_PROGRESS_INTERVAL, ProgressCallback, ProgressReporter
 from ..models.inventory import (
     ProductData, DemandData, SSARequest, SSAResult,
     EOQRequest, EOQResult, SimulationRequest, SimulationResult,
@@ -25,6 +26,10 @@ from ..models.inventory import (
     MultiStageRequest, MultiStageResult
 )
 
+class _EarlyStop(Exception):
+    """進捗コールバックによる途中停止（scipy の最適化ループから抜ける）"""
+
+
 class InventoryOptimizationService:
     """在庫最適化サービスクラス"""
     
@@ -95,10 +100,15 @@ class InventoryOptimizationService:
         return allocation
     
     def tabu_search_for_SSA(self, G: nx.DiGraph, budget: float,
-                           demand_params: Dict, max_iterations: int = 1000) -> Dict[str, float]:
+                           demand_params: Dict, max_iterations: int = 1000,
+                           progress_callback: Optional[ProgressCallback] = None,
+                           progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> Dict[str, float]:
         """
         タブ探索による安全在庫配分最適化
         03inventory.ipynb から完全移植
+        
+        progress_callback には反復ごとの最良の目的関数値を progress_interval 秒間隔で渡し、
+        コールバックが真を返すとその時点の最良解を返す。
         """
         nodes = list(G.nodes())
         n = len(nodes)
@@ -119,6 +129,7 @@ class InventoryOptimizationService:
         best_objective = self._calculate_ssa_objective(best_solution, G, demand_params)
         
         tabu_list = deque(maxlen=min(100, n))  # タブリストサイズ
+        progress = ProgressReporter(progress_callback, "tabu_ssa", max_iterations, progress_interval)
         
         for iteration in range(max_iterations):
             neighbors = self._generate_ssa_neighbors(current_solution, G, budget, demand_params)
@@ -143,6 +154,10 @@ class InventoryOptimizationService:
             if best_neighbor_obj > best_objective:
                 best_solution = current_solution.copy()
                 best_objective = best_neighbor_obj
+            
+            if progress.report(iteration, objective=best_objective):
+                break
+        progress.finish()
         
         return best_solution
     
@@ -633,12 +648,21 @@ class InventoryOptimizationService:
     # =====================================================
     
     def optimize_base_stock(self, demands: List[float], target_service_level: float = 0.95,
-                           holding_cost: float = 1.0, shortage_cost: float = 10.0) -> BaseStockResult:
+                           holding_cost: float = 1.0, shortage_cost: float = 10.0,
+                           progress_callback: Optional[ProgressCallback] = None,
+                           progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> BaseStockResult:
         """
         ベースストックレベルの最適化
         03inventory.ipynb から完全移植（改良版）
+        
+        progress_callback には評価回数（iteration）・最良の費用（objective）・
+        最良のベースストックレベル（base_stock_level）を progress_interval 秒間隔で渡す。
+        コールバックが真を返すと、それまでに評価した最良のレベルで終了する。
         """
-        def objective(base_stock_level):
+        progress = ProgressReporter(progress_callback, "base_stock", None, progress_interval)
+        evaluations = {"count": 0, "best_cost": float('inf'), "best_level": None}
+        
+        def evaluate(base_stock_level):
             # シミュレーションによる評価
             policy = InventoryPolicy(policy_type="sS", s=0, S=base_stock_level[0])
             result = self.simulate_inventory(policy, demands)
@@ -650,6 +674,18 @@ class InventoryOptimizationService:
             
             return result.holding_cost + result.shortage_cost + penalty
         
+        def objective(base_stock_level):
+            cost = evaluate(base_stock_level)
+            evaluations["count"] += 1
+            if cost < evaluations["best_cost"]:
+                evaluations["best_cost"] = cost
+                evaluations["best_level"] = float(base_stock_level[0])
+            if progress.report(evaluations["count"], objective=evaluations["best_cost"],
+                               base_stock_level=evaluations["best_level"],
+                               progress=guess_index / len(initial_guesses)):
+                raise _EarlyStop()
+            return cost
+        
         # 初期値設定（より幅広い範囲を探索）
         mean_demand = np.mean(demands)
         std_demand = np.std(demands)
@@ -666,7 +702,8 @@ class InventoryOptimizationService:
             [sum(demands)]                    # 非常に攻撃的
         ]
         
-        for initial_guess in initial_guesses:
+        stopped = False
+        for guess_index, initial_guess in enumerate(initial_guesses):
             try:
                 result = minimize(objective, initial_guess, method='Nelder-Mead',
                                 options={'xatol': 1e-4, 'fatol': 1e-4, 'maxiter': 1000},
@@ -675,10 +712,17 @@ class InventoryOptimizationService:
                 if result.success and result.fun < best_cost:
                     best_result = result
                     best_cost = result.fun
+            except _EarlyStop:
+                stopped = True
+                break
             except Exception as e:
                 continue  # 次の初期値を試す
+        progress.finish()
         
-        if best_result is None:
+        if stopped and evaluations["best_level"] is not None:
+            # 途中停止：それまでに評価した最良のレベルを使う
+            optimal_base_stock = evaluations["best_level"]
+        elif best_result is None:
             # フォールバック: 単純な安全在庫ベースの計算
             from scipy import stats
             z_score = stats.norm.ppf(target_service_level)
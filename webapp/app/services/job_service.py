@@ -0,0 +1,193 @@
+"""
+非同期ジョブの実行管理（投入・進捗・取り消し・再起動後の再実行）
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from app.utils.job_store import CANCELLED, JobStore, job_db_path
+from app.utils.progress import ProgressListener, use_progress_listener
+from app.utils.result_cache import decode_result
+
+logger = logging.getLogger(__name__)
+
+# runner(request) -> 結果（jsonable_encoder で JSON にできる値）
+JobRunner = Callable[[Any], Awaitable[Any]]
+
+# 終了したジョブを削除する間隔（秒）
+PURGE_INTERVAL = 3600.0
+
+# 実行中のジョブ（report_progress の送り先）
+_current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+
+class JobCancelled(asyncio.CancelledError):
+    """
+    取り消されたジョブの実行を止める
+
+    エンドポイントの except Exception で捕まらないよう CancelledError から派生させる。
+    """
+
+
+class _JobProgressListener(ProgressListener):
+    """
+    ジョブ内のソルバーの進捗をジョブストアに記録する
+
+    エンドポイントが report_progress で段階ごとの進捗を記録し始めたら、
+    ソルバーの進捗はメッセージだけに反映する（段階の進捗を巻き戻さない）。
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.staged = False
+        self._cancelled = False
+
+    def on_progress(self, event: Dict[str, Any]) -> None:
+        message = f"{event.get('solver', 'solver')}: 反復 {event.get('iteration')}"
+        progress = None if self.staged else event.get("progress")
+        status = self.store.update_progress(self.job_id, progress, message)
+        self._cancelled = status == CANCELLED
+
+    def stop_requested(self) -> bool:
+        return self._cancelled
+
+
+class JobManager:
+    """
+    ジョブをこのプロセスのイベントループのタスクとして実行し、状態と結果を JobStore に保存する
+
+    結果は JSON 文字列で保存し、取得時は再計算も再シリアライズもせずにそのまま返す。
+
+    Args:
+        store: ジョブストア
+    """
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._closing = False
+        self._purge_task: Optional[asyncio.Task] = None
+
+    def submit(self, kind: str, request: Any, runner: JobRunner) -> str:
+        """ジョブを登録して実行を開始し、ジョブ ID を返す（実行中のイベントループから呼ぶ）"""
+        job_id = self.store.create(kind, jsonable_encoder(request))
+        self._start(job_id, request, runner)
+        return job_id
+
+    def resume(self, job_id: str, request: Any, runner: JobRunner) -> None:
+        """引き継いだ queued のジョブ（claim_orphans の結果）の実行を開始"""
+        self._start(job_id, request, runner)
+
+    def _start(self, job_id: str, request: Any, runner: JobRunner) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(job_id, request, runner))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str, request: Any, runner: JobRunner) -> None:
+        if not self.store.start(job_id):
+            return
+        listener = _JobProgressListener(self.store, job_id)
+        token = _current_job.set((self.store, job_id, listener))
+        try:
+            with use_progress_listener(listener):
+                # 結果キャッシュのヒットは保存済みの JSON の Response で返る
+                result = decode_result(await runner(request))
+            self.store.complete(job_id, json.dumps(jsonable_encoder(result), ensure_ascii=False))
+        except asyncio.CancelledError:
+            if not self._closing:
+                self.store.cancel(job_id)
+        except HTTPException as e:
+            self.store.fail(job_id, str(e.detail))
+        except Exception as e:
+            logger.exception(f"ジョブ {job_id} の実行エラー")
+            self.store.fail(job_id, str(e))
+        finally:
+            _current_job.reset(token)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        ジョブを取り消す（終了済みなら False）
+
+        ワーカープロセスで実行中の計算は止められないため、その結果は捨てる。
+        プールの待ち行列にある計算は実行前に取り除かれる。
+        別のワーカーで実行中のジョブは、そのジョブが次に進捗を報告したときに止まる。
+        """
+        cancelled = self.store.cancel(job_id)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return cancelled
+
+    def start_purging(self, retention: float, interval: float = PURGE_INTERVAL) -> None:
+        """
+        終了から retention 秒たったジョブを今すぐ、その後は interval 秒ごとに削除する
+        （実行中のイベントループから呼ぶ。retention が 0 以下なら削除しない）
+        """
+        if retention <= 0 or self._purge_task is not None:
+            return
+        self._purge_task = asyncio.get_running_loop().create_task(
+            self._purge_periodically(retention, min(interval, retention)))
+
+    async def _purge_periodically(self, retention: float, interval: float) -> None:
+        while True:
+            try:
+                removed = self.store.purge(retention)
+                if removed:
+                    logger.info(f"終了したジョブを {removed} 件削除しました")
+            except Exception:
+                logger.exception("終了したジョブの削除エラー")
+            await asyncio.sleep(interval)
+
+    def running_jobs(self) -> int:
+        """このプロセスで実行中のジョブ数"""
+        return len(self._tasks)
+
+    async def shutdown(self) -> None:
+        """実行中のタスクを止める（状態は queued / running のまま残し、次の起動時に再実行する）"""
+        self._closing = True
+        tasks = list(self._tasks.values())
+        if self._purge_task is not None:
+            tasks.append(self._purge_task)
+            self._purge_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._closing = False
+
+
+def report_progress(progress: float, message: Optional[str] = None) -> None:
+    """
+    実行中のジョブの進捗（0〜1）を記録（ジョブの外から呼ばれたときは何もしない）
+
+    Raises:
+        JobCancelled: ジョブが取り消されている場合
+    """
+    current = _current_job.get()
+    if current is None:
+        return
+    store, job_id, listener = current
+    listener.staged = True
+    if store.update_progress(job_id, progress, message) == CANCELLED:
+        raise JobCancelled(job_id)
+
+
+_managers: Dict[str, JobManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """ジョブストアのパスごとに共有する JobManager"""
+    path = job_db_path()
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = JobManager(JobStore(path))
+        return manager
@@ -1,16 +1,20 @@
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Callable, Sequence
 from geopy.distance import great_circle
 import math
 import random
-from sklearn.cluster import KMeans, MiniBatchKMeans
+import time
+import hashlib
+import threading
+from sklearn.cluster import AgglomerativeClustering, Birch, KMeans, MiniBatchKMeans
+from sklearn.neighbors import kneighbors_graph
 from sklearn.metrics import silhouette_score
 from scipy.cluster.hierarchy import linkage, fcluster
 from scipy.spatial.distance import pdist, squareform
 import plotly.graph_objects as go
 import plotly.express as px
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import networkx as nx
 try:
     import pulp
@@ -36,12 +40,50 @@ from app.models.logistics import (
     WeiszfeldResult, KMedianResult, ClusteringResult, LNDResult,
     NetworkVisualizationResult, NetworkAnalysisResult
 )
+from app.utils.aggregation import aggregate_by_cell, cell_names
+from app.utils.geo import (
+    coordinate_array, great_circle_pairwise, great_circle_from_trig, distance_pairwise,
+    distance_matrix as compute_distance_matrix
+)
+from app.utils.kmeans_sweep import DEFAULT_SILHOUETTE_SAMPLE_SIZE, MINIBATCH_THRESHOLD, kmeans_sweep
+from app.utils.matrix_cache import MatrixCache
+from app.utils.osrm import OSRMError, get_osrm_client
+from app.utils.plot_payload import (
+    DEFAULT_MAX_MARKERS, DEFAULT_ZOOM_LEVELS, bin_markers, encode_figure_arrays, merged_segments,
+    payload_bytes
+)
+from app.utils.progress import DEFAULT_PROGRESS_INTERVAL, ProgressCallback, ProgressReporter
+from app.utils.road_matrix_store import get_road_matrix_store, location_ids
+from app.utils.spatial_index import NearestFacilityIndex
+from app.utils.transportation import TransportationProblem
+
+# ナップサック下位問題を配列DPで解く表の大きさ（品目数 × (容量 + 1)）の上限
+KNAPSACK_DP_LIMIT = 2_000_000
+# 階層クラスタリングの近似手法（BIRCH の部分クラスター数・k近傍グラフの近傍数）
+BIRCH_MIN_SUBCLUSTERS_PER_CLUSTER = 10
+KNN_WARD_NEIGHBORS = 10
 
 class LogisticsOptimizationService:
     """物流最適化サービス"""
     
     def __init__(self):
         self.random_state = 42
+        # 距離行列計算の設定（float32 にするとメモリ半減・高速化）
+        self.distance_dtype = np.float64
+        self.distance_block_size = 2048
+        # クラスタリングのメモリ上限（MB）とシルエット係数の標本数
+        self.clustering_memory_budget_mb = 512
+        self.silhouette_sample_size = 10000
+        # 拠点集合ごとの距離行列キャッシュ（エンドポイント間で共有）
+        self.matrix_cache = MatrixCache()
+        # 厳密解法のMILPモデル（同じ入力なら再構築せずに解き直す）
+        self.lnd_milp_cache_size = 4
+        self._lnd_milp_models: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lnd_milp_lock = threading.Lock()
+        # 輸送問題（供給・需要・枝が同じなら費用だけ変えて前回の解から解き直す）
+        self.transportation_cache_size = 4
+        self._transportation_problems: "OrderedDict[str, TransportationProblem]" = OrderedDict()
+        self._transportation_lock = threading.Lock()
         np.random.seed(self.random_state)
         random.seed(self.random_state)
     
@@ -66,13 +108,55 @@ class LogisticsOptimizationService:
     
     def calculate_distance_matrix(self, locations1: List[LocationData], 
                                  locations2: List[LocationData],
-                                 use_great_circle: bool = True) -> np.ndarray:
-        """距離行列を計算"""
-        matrix = np.zeros((len(locations1), len(locations2)))
-        for i, loc1 in enumerate(locations1):
-            for j, loc2 in enumerate(locations2):
-                matrix[i, j] = self.calculate_distance(loc1, loc2, use_great_circle)
-        return matrix
+                                 use_great_circle: bool = True,
+                                 dtype=None, block_size: Optional[int] = None) -> np.ndarray:
+        """距離行列を計算（NumPyブロードキャストによる一括計算）"""
+        return compute_distance_matrix(
+            coordinate_array(locations1), coordinate_array(locations2),
+            use_great_circle=use_great_circle,
+            dtype=dtype or self.distance_dtype,
+            block_size=block_size or self.distance_block_size
+        )
+    
+    def cached_distance_matrix(self, locations1: List[LocationData],
+                               locations2: List[LocationData],
+                               use_great_circle: bool = True) -> np.ndarray:
+        """距離行列をキャッシュ経由で取得（読み取り専用の配列を返す）"""
+        coords1 = coordinate_array(locations1)
+        coords2 = coordinate_array(locations2)
+        metric = "great_circle" if use_great_circle else "euclidean"
+        return self.matrix_cache.get_or_compute(
+            coords1, coords2, metric,
+            lambda: compute_distance_matrix(
+                coords1, coords2, use_great_circle=use_great_circle,
+                dtype=self.distance_dtype, block_size=self.distance_block_size),
+            dtype=self.distance_dtype
+        )
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        このプロセスのキャッシュの統計（距離行列・保持しているMILPモデルと輸送問題の数）
+
+        キャッシュはワーカープロセスごとに持つため、API からは各ワーカーで呼び出して集計する。
+        """
+        with self._lnd_milp_lock:
+            lnd_milp_models = len(self._lnd_milp_models)
+        with self._transportation_lock:
+            transportation_problems = len(self._transportation_problems)
+        return {
+            "matrix_cache": self.matrix_cache.stats(),
+            "lnd_milp_models": lnd_milp_models,
+            "transportation_problems": transportation_problems
+        }
+    
+    def clear_caches(self) -> Dict[str, Any]:
+        """このプロセスのキャッシュをすべてクリアして統計を返す"""
+        self.matrix_cache.clear()
+        with self._lnd_milp_lock:
+            self._lnd_milp_models.clear()
+        with self._transportation_lock:
+            self._transportation_problems.clear()
+        return self.cache_stats()
     
     # =====================================================
     # Weiszfeld法による施設立地最適化
@@ -95,29 +179,26 @@ class LogisticsOptimizationService:
             current_location = initial_location
         
         convergence_history = []
+        customer_coords = coordinate_array(customers)
+        demands = np.array([c.demand for c in customers], dtype=float)
         
         for iteration in range(max_iterations):
             # 各顧客までの距離と重みを計算
-            numerator_lat = numerator_lon = denominator = 0.0
-            total_cost = 0.0
-            
-            for customer in customers:
-                distance = self.calculate_distance(current_location, customer, use_great_circle)
-                if distance < 1e-10:  # 同一位置の場合
-                    continue
-                
-                weight = customer.demand / distance
-                numerator_lat += weight * customer.latitude
-                numerator_lon += weight * customer.longitude
-                denominator += weight
-                total_cost += customer.demand * distance
+            distances = compute_distance_matrix(
+                [[current_location.latitude, current_location.longitude]], customer_coords,
+                use_great_circle=use_great_circle
+            )[0]
+            valid = distances >= 1e-10  # 同一位置の顧客は除外
+            weights = np.where(valid, demands / np.where(valid, distances, 1.0), 0.0)
+            denominator = weights.sum()
+            total_cost = float(np.sum(demands[valid] * distances[valid]))
             
             if denominator == 0:
                 break
                 
             # 新しい位置を計算
-            new_lat = numerator_lat / denominator
-            new_lon = numerator_lon / denominator
+            new_lat = float(weights @ customer_coords[:, 0] / denominator)
+            new_lon = float(weights @ customer_coords[:, 1] / denominator)
             new_location = LocationData(name="facility", latitude=new_lat, longitude=new_lon)
             
             # 収束判定
@@ -133,8 +214,12 @@ class LogisticsOptimizationService:
     
     def weiszfeld_multiple(self, customers: List[CustomerData], num_facilities: int,
                           max_iterations: int = 1000, tolerance: float = 1e-6,
-                          use_great_circle: bool = True) -> WeiszfeldResult:
-        """複数施設のWeiszfeld法最適化"""
+                          use_great_circle: bool = True, num_restarts: int = 5,
+                          random_seed: Optional[int] = None,
+                          cost_tolerance: float = 1e-6,
+                          progress_callback: Optional[ProgressCallback] = None,
+                          progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> WeiszfeldResult:
+        """複数施設のWeiszfeld法最適化（進捗の報告は複数施設の場合のみ）"""
         
         if num_facilities == 1:
             facility, cost, iterations = self.weiszfeld_single(
@@ -147,99 +232,206 @@ class LogisticsOptimizationService:
                 customer_assignments={c.name: 0 for c in customers}
             )
         
-        best_facilities = []
-        best_cost = float('inf')
-        best_assignments = {}
-        best_history = []
-        
-        # 複数回実行して最良解を選択
-        for attempt in range(5):
-            # ランダムな初期位置を生成
-            initial_facilities = []
-            for i in range(num_facilities):
-                idx = random.randint(0, len(customers) - 1)
-                customer = customers[idx]
-                initial_facilities.append(LocationData(
-                    name=f"facility_{i}",
-                    latitude=customer.latitude + random.uniform(-0.1, 0.1),
-                    longitude=customer.longitude + random.uniform(-0.1, 0.1)
-                ))
-            
-            facilities, cost, assignments, history = self._optimize_multiple_facilities(
-                customers, initial_facilities, max_iterations, tolerance, use_great_circle)
-            
-            if cost < best_cost:
-                best_cost = cost
-                best_facilities = facilities
-                best_assignments = assignments
-                best_history = history
+        return self.weiszfeld_batched(
+            customers, num_facilities, num_restarts=num_restarts,
+            max_iterations=max_iterations, tolerance=tolerance,
+            use_great_circle=use_great_circle, random_seed=random_seed,
+            cost_tolerance=cost_tolerance, progress_callback=progress_callback,
+            progress_interval=progress_interval)
+    
+    def weiszfeld_batched(self, customers: List[CustomerData], num_facilities: int,
+                          num_restarts: int = 5, max_iterations: int = 1000,
+                          tolerance: float = 1e-6, use_great_circle: bool = True,
+                          random_seed: Optional[int] = None,
+                          cost_tolerance: float = 1e-6,
+                          progress_callback: Optional[ProgressCallback] = None,
+                          progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> WeiszfeldResult:
+        """
+        複数施設・複数初期解のWeiszfeld法を配列演算で一括実行
+        
+        全初期解 (restart) と各初期解内の全施設の位置を (R, F, 2) 配列で保持し、
+        「最近傍施設への割当 → 施設ごとのWeiszfeld反復」を同じループで更新する。
+        収束した施設・初期解はマスクで更新対象から外す。
+        初期解は施設位置の変化が tolerance 未満、または総費用の相対変化が
+        cost_tolerance 未満になった時点で収束とみなす。
+        
+        progress_callback には外側反復ごとに全初期解の最良費用（objective）と
+        未収束の初期解数（active_restarts）を progress_interval 秒間隔で渡す。
+        コールバックが真を返すとその時点の位置で打ち切る。
+        """
+        
+        coords = coordinate_array(customers)
+        demands = np.array([c.demand for c in customers], dtype=float)
+        n_customers = len(customers)
+        n_restarts = max(1, num_restarts)
+        
+        # ランダムな初期位置を生成（顧客位置の近傍、シードがなければ毎回異なる初期解）
+        rng = np.random.default_rng(random_seed)
+        initial_idx = rng.integers(0, n_customers, size=(n_restarts, num_facilities))
+        facilities = coords[initial_idx] + rng.uniform(-0.1, 0.1, size=(n_restarts, num_facilities, 2))
+        
+        inner_iterations = max(1, max_iterations // 10)
+        customer_trig = self._customer_trig(coords) if use_great_circle else None
+        active = np.ones(n_restarts, dtype=bool)
+        previous_costs = np.full(n_restarts, np.inf)
+        histories = [[] for _ in range(n_restarts)]
+        progress = ProgressReporter(progress_callback, "weiszfeld", max_iterations, progress_interval)
+        
+        for iteration in range(max_iterations):
+            active_idx = np.flatnonzero(active)
+            n_active = len(active_idx)
+            positions = facilities[active_idx]
+            start_positions = positions.copy()
+            
+            # 顧客を最近の施設に割当 (n_active, n_customers)
+            assignments = self._nearest_batched_facility(
+                coords, positions, use_great_circle, customer_trig)
+            
+            # 各施設位置を割当顧客でWeiszfeld反復（全施設を同時に更新）
+            moving = np.ones((n_active, num_facilities), dtype=bool)
+            inner_costs = np.full(n_active, np.inf)
+            for _ in range(inner_iterations):
+                new_positions, costs = self._weiszfeld_step(
+                    coords, demands, positions, assignments, use_great_circle, customer_trig)
+                change = distance_pairwise(
+                    positions.reshape(-1, 2), new_positions.reshape(-1, 2), use_great_circle
+                ).reshape(n_active, num_facilities)
+                positions = np.where(moving[:, :, None], new_positions, positions)
+                moving &= change >= tolerance
+                # 費用がほぼ改善しなくなった初期解は内側反復を打ち切る
+                stalled = np.abs(inner_costs - costs) < cost_tolerance * np.maximum(costs, 1e-12)
+                moving[stalled] = False
+                inner_costs = costs
+                if not moving.any():
+                    break
+            
+            facilities[active_idx] = positions
+            for a, r in enumerate(active_idx):
+                histories[r].append(float(costs[a]))
+            
+            # 位置が変化しなかった、または費用が改善しなくなった初期解は収束
+            position_changed = distance_pairwise(
+                start_positions.reshape(-1, 2), positions.reshape(-1, 2), use_great_circle
+            ).reshape(n_active, num_facilities) > tolerance
+            cost_change = np.abs(previous_costs[active_idx] - costs) / np.maximum(costs, 1e-12)
+            previous_costs[active_idx] = costs
+            converged = ~position_changed.any(axis=1) | (cost_change < cost_tolerance)
+            active[active_idx[converged]] = False
+            if not active.any():
+                break
+            if progress.report(iteration, objective=float(previous_costs.min()),
+                               active_restarts=int(active.sum())):
+                break
+        progress.finish()
+        
+        # 最終位置での総費用を比較して最良解を選択
+        final_assignments = self._nearest_batched_facility(
+            coords, facilities, use_great_circle, customer_trig)
+        _, final_costs = self._weiszfeld_step(
+            coords, demands, facilities, final_assignments, use_great_circle, customer_trig)
+        best = int(np.argmin(final_costs))
         
         return WeiszfeldResult(
-            facility_locations=best_facilities,
-            total_cost=best_cost,
-            iterations=len(best_history),
-            convergence_history=best_history,
-            customer_assignments=best_assignments
+            facility_locations=[
+                LocationData(name=f"facility_{i}", latitude=float(lat), longitude=float(lon))
+                for i, (lat, lon) in enumerate(facilities[best])
+            ],
+            total_cost=float(final_costs[best]),
+            iterations=len(histories[best]),
+            convergence_history=histories[best],
+            customer_assignments={
+                c.name: int(f_idx) for c, f_idx in zip(customers, final_assignments[best])
+            }
         )
     
-    def _optimize_multiple_facilities(self, customers: List[CustomerData],
-                                    initial_facilities: List[LocationData],
-                                    max_iterations: int, tolerance: float,
-                                    use_great_circle: bool) -> Tuple[List[LocationData], float, Dict[str, int], List[float]]:
-        """複数施設の反復最適化"""
+    def _nearest_batched_facility(self, coords: np.ndarray, positions: np.ndarray,
+                                  use_great_circle: bool,
+                                  customer_trig: Optional[Tuple[np.ndarray, ...]] = None) -> np.ndarray:
+        """(R, F, 2) の施設位置に対し、初期解ごとの最近傍施設 (R, n) を返す"""
+        n_restarts, n_facilities = positions.shape[:2]
+        if n_facilities > 64:
+            # 施設数が多い場合は空間インデックスで O(n log F)
+            return np.stack([
+                NearestFacilityIndex(positions[r], use_great_circle).nearest(coords)[1]
+                for r in range(n_restarts)
+            ])
+        if not use_great_circle:
+            distances = compute_distance_matrix(coords, positions.reshape(-1, 2),
+                                                use_great_circle=False)
+            return distances.reshape(len(coords), n_restarts, n_facilities).argmin(axis=2).T
+        
+        # 大円距離：顧客側の三角関数を再利用して (n, F) を初期解ごとに計算
+        if customer_trig is None:
+            customer_trig = self._customer_trig(coords)
+        sin_lat, cos_lat, lon = (t[:, None] for t in customer_trig)
+        facility_lat = np.radians(positions[:, :, 0])
+        facility_lon = np.radians(positions[:, :, 1])
+        return np.stack([
+            great_circle_from_trig(sin_lat, cos_lat, lon,
+                                   np.sin(facility_lat[r]), np.cos(facility_lat[r]),
+                                   facility_lon[r]).argmin(axis=1)
+            for r in range(n_restarts)
+        ])
+    
+    def _weiszfeld_step(self, coords: np.ndarray, demands: np.ndarray, positions: np.ndarray,
+                        assignments: np.ndarray, use_great_circle: bool,
+                        customer_trig: Optional[Tuple[np.ndarray, ...]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Weiszfeld更新を全初期解・全施設について1回実行
         
-        facilities = initial_facilities.copy()
-        convergence_history = []
+        Args:
+            coords: (n, 2) の顧客座標
+            demands: (n,) の顧客需要
+            positions: (R, F, 2) の施設位置
+            assignments: (R, n) の割当施設インデックス
+            customer_trig: 顧客の (sin緯度, cos緯度, 経度[rad])（反復間で再利用）
         
-        for iteration in range(max_iterations):
-            # 顧客を最近の施設に割当
-            assignments = {}
-            facility_customers = [[] for _ in range(len(facilities))]
-            
-            for customer in customers:
-                best_facility = 0
-                best_distance = float('inf')
-                
-                for f_idx, facility in enumerate(facilities):
-                    distance = self.calculate_distance(customer, facility, use_great_circle)
-                    if distance < best_distance:
-                        best_distance = distance
-                        best_facility = f_idx
-                
-                assignments[customer.name] = best_facility
-                facility_customers[best_facility].append(customer)
-            
-            # 各施設位置を最適化
-            new_facilities = []
-            total_cost = 0.0
-            position_changed = False
-            
-            for f_idx, assigned_customers in enumerate(facility_customers):
-                if not assigned_customers:
-                    # 顧客が割り当てられていない施設はそのまま
-                    new_facilities.append(facilities[f_idx])
-                    continue
-                
-                # この施設に割り当てられた顧客で最適化
-                new_facility, facility_cost, _ = self.weiszfeld_single(
-                    assigned_customers, facilities[f_idx], 
-                    max_iterations // 10, tolerance, use_great_circle)
-                
-                new_facilities.append(new_facility)
-                total_cost += facility_cost
-                
-                # 位置変更をチェック
-                if self.calculate_distance(facilities[f_idx], new_facility, use_great_circle) > tolerance:
-                    position_changed = True
-            
-            convergence_history.append(total_cost)
-            
-            if not position_changed:
-                break
-                
-            facilities = new_facilities
+        Returns:
+            (新しい施設位置 (R, F, 2), 更新前位置での初期解ごとの総費用 (R,))
+        """
+        n_restarts, n_facilities = positions.shape[:2]
         
-        return facilities, total_cost, assignments, convergence_history
+        # 各顧客の割当施設の座標を (R, n) で取り出して距離を計算
+        if use_great_circle:
+            if customer_trig is None:
+                customer_trig = self._customer_trig(coords)
+            sin_lat, cos_lat, lon = customer_trig
+            facility_lat = np.radians(positions[:, :, 0])
+            facility_lon = np.radians(positions[:, :, 1])
+            distances = great_circle_from_trig(
+                sin_lat, cos_lat, lon,
+                np.take_along_axis(np.sin(facility_lat), assignments, axis=1),
+                np.take_along_axis(np.cos(facility_lat), assignments, axis=1),
+                np.take_along_axis(facility_lon, assignments, axis=1))
+        else:
+            distances = np.hypot(
+                coords[:, 0] - np.take_along_axis(positions[:, :, 0], assignments, axis=1),
+                coords[:, 1] - np.take_along_axis(positions[:, :, 1], assignments, axis=1))
+        
+        valid = distances >= 1e-10  # 同一位置の顧客は除外
+        weights = np.where(valid, demands / np.where(valid, distances, 1.0), 0.0)
+        
+        # 施設ごとの重み付き和（初期解×施設の通し番号で集計）
+        flat = (np.arange(n_restarts)[:, None] * n_facilities + assignments).ravel()
+        size = n_restarts * n_facilities
+        denominator = np.bincount(flat, weights=weights.ravel(), minlength=size)
+        numerator_lat = np.bincount(flat, weights=(weights * coords[:, 0]).ravel(), minlength=size)
+        numerator_lon = np.bincount(flat, weights=(weights * coords[:, 1]).ravel(), minlength=size)
+        
+        # 顧客が割り当てられていない施設はそのまま
+        new_positions = positions.reshape(-1, 2).copy()
+        has_customers = denominator > 0
+        new_positions[has_customers, 0] = numerator_lat[has_customers] / denominator[has_customers]
+        new_positions[has_customers, 1] = numerator_lon[has_customers] / denominator[has_customers]
+        
+        costs = (demands * distances).sum(axis=1)
+        return new_positions.reshape(positions.shape), costs
+    
+    @staticmethod
+    def _customer_trig(coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """顧客座標の (sin緯度, cos緯度, 経度[rad]) を前計算"""
+        lat = np.radians(coords[:, 0])
+        return np.sin(lat), np.cos(lat), np.radians(coords[:, 1])
     
     # =====================================================
     # K-Median最適化（Lagrange緩和）
@@ -248,24 +440,29 @@ class LogisticsOptimizationService:
     def solve_k_median(self, customers: List[CustomerData], dc_candidates: List[DCData],
                       k: int, max_iterations: int = 1000, learning_rate: float = 0.01,
                       momentum: float = 0.9, use_adam: bool = False, 
-                      use_lr_scheduling: bool = False, capacity_constraint: bool = False) -> KMedianResult:
-        """K-Median問題をLagrange緩和法で解く（Adam最適化・学習率スケジューリング対応）"""
+                      use_lr_scheduling: bool = False, capacity_constraint: bool = False,
+                      progress_callback: Optional[ProgressCallback] = None,
+                      progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> KMedianResult:
+        """
+        K-Median問題をLagrange緩和法で解く（Adam最適化・学習率スケジューリング対応）
+        
+        progress_callback には反復ごとの最良の下界・上界を progress_interval 秒間隔で渡し、
+        コールバックが真を返すとその時点の最良解を返す。
+        """
         
         n_customers = len(customers)
         n_facilities = len(dc_candidates)
         
         # 距離行列とコスト行列を計算
-        distance_matrix = np.zeros((n_customers, n_facilities))
-        for i, customer in enumerate(customers):
-            for j, facility in enumerate(dc_candidates):
-                dist = self.calculate_distance(customer, facility)
-                distance_matrix[i, j] = dist
+        distance_matrix = self.cached_distance_matrix(customers, dc_candidates)
         
         # 重み（需要）
         weights = np.array([c.demand for c in customers])
         
         # コスト行列 C[i,j] = 重み[i] * 距離[i,j] * 単価
         transport_unit_cost = 0.5
+        customer_coords = coordinate_array(customers)
+        dc_coords = coordinate_array(dc_candidates)
         C = distance_matrix * weights.reshape((n_customers, 1)) * transport_unit_cost
         
         # Lagrange乗数の初期化
@@ -308,13 +505,22 @@ class LogisticsOptimizationService:
         # 容量制約
         capacities = None
         if capacity_constraint:
-            capacities = np.array([dc.capacity for dc in dc_candidates])
+            capacities = np.array([dc.capacity for dc in dc_candidates], dtype=float)
         
         # 最適化ループ
         objective_history = []
         best_ub = float('inf')
         selected_facilities = []
         customer_assignments = {}
+        fixed_costs = np.array([dc.fixed_cost for dc in dc_candidates], dtype=float)
+        previous_selection = None
+        best_lb = -float('inf')
+        progress = ProgressReporter(progress_callback, "k_median", max_iterations, progress_interval)
+        
+        # 各顧客の費用を昇順に並べておき、縮約費用 C[i,j] - u[i] が負となる
+        # (i, j) の組だけを反復ごとに取り出す（O(n m) の行列演算を避ける）
+        row_order = np.argsort(C, axis=1).astype(np.int32)
+        row_sorted = np.take_along_axis(C, row_order, axis=1)
         
         for t in range(max_iterations):
             current_lr = lr_schedule[t] if use_lr_scheduling else learning_rate
@@ -323,119 +529,63 @@ class LogisticsOptimizationService:
                 current_momentum = momentum_schedule[t]
                 beta_1 = current_momentum
             
-            # コスト行列の更新（Lagrange乗数を考慮）
-            C_reduced = C - u.reshape((n_customers, 1))
+            # 縮約費用（Lagrange乗数を考慮）が負の要素
+            rows, cols, reduced = self._negative_reduced_entries(row_sorted, row_order, u)
             
             # 施設選択（容量制約考慮）
             if capacity_constraint and capacities is not None:
-                # 容量制約付き施設選択
-                facility_values = np.zeros(n_facilities)
-                for j in range(n_facilities):
-                    # 各施設に対して容量制約下での最適割当を計算
-                    costs_j = C_reduced[:, j]
-                    sorted_indices = np.argsort(costs_j)
-                    cumulative_demand = 0
-                    total_value = 0
-                    
-                    for i in sorted_indices:
-                        if cumulative_demand + weights[i] <= capacities[j] and costs_j[i] < 0:
-                            total_value += costs_j[i]
-                            cumulative_demand += weights[i]
-                        else:
-                            break
-                    facility_values[j] = total_value
+                facility_values = self._capacitated_facility_values(
+                    rows, cols, reduced, weights, capacities)
             else:
                 # 容量制約なし
-                facility_values = np.where(C_reduced < 0, C_reduced, 0).sum(axis=0)
+                facility_values = np.bincount(cols, weights=reduced, minlength=n_facilities)
             
             # 上位k個の施設を選択（最も負の値が大きい施設、つまり最も良い施設）
             selected_indices = np.argsort(facility_values)[-k:]
             
-            # デバッグ情報の出力
-            print(f"=== K-Median Debug Info (Iteration {t}) ===")
-            print(f"Facility values: {facility_values}")
-            print(f"Selected indices: {selected_indices}")
-            print(f"Selected facility names: {[dc_candidates[i].name for i in selected_indices]}")
-            print("=" * 50)
-            
-            # 顧客割当の計算
-            assignment_counts = np.zeros(n_customers)
-            for i in range(n_customers):
-                assigned_facilities = []
-                for j in selected_indices:
-                    if C_reduced[i, j] < 0:
-                        assigned_facilities.append(j)
-                
-                assignment_counts[i] = len(assigned_facilities)
+            # 顧客割当の計算（選択施設のうち縮約費用が負の施設数）
+            is_selected = np.zeros(n_facilities, dtype=bool)
+            is_selected[selected_indices] = True
+            assignment_counts = np.bincount(rows[is_selected[cols]], minlength=n_customers)
             
             # 下界の計算
             lower_bound = u.sum() + facility_values[selected_indices].sum()
             
-            # 実行可能解の構築と上界計算
-            temp_assignments = {}
-            total_cost = 0.0
-            
-            # 容量制約がある場合の顧客割当
-            if capacity_constraint and capacities is not None:
-                # 容量制約付き顧客割当
-                facility_loads = {j: 0.0 for j in selected_indices}
-                
-                # コストの昇順でソートされた顧客と施設のペア
-                customer_facility_pairs = []
-                for i, customer in enumerate(customers):
-                    for j in selected_indices:
-                        customer_facility_pairs.append((C[i, j], i, j, customer.name))
-                
-                customer_facility_pairs.sort()
-                assigned_customers = set()
+            # 実行可能解の構築と上界計算（選択施設集合が前回と同じなら同じ解になるため省略）
+            selection_key = tuple(np.sort(selected_indices))
+            if selection_key != previous_selection:
+                previous_selection = selection_key
+                if capacity_constraint and capacities is not None:
+                    # 容量制約付き顧客割当（未割当顧客は -1）
+                    local = self._greedy_capacitated_assignment(
+                        C[:, selected_indices], weights, capacities[selected_indices])
+                    assigned = local >= 0
+                    best_js = np.where(assigned, selected_indices[np.maximum(local, 0)], -1)
+                else:
+                    # 容量制約なしの場合は最近隣割当（C[i,j] は距離に比例するため最近傍施設が最小費用）
+                    if k > 64:
+                        _, local = NearestFacilityIndex(
+                            dc_coords[selected_indices]).nearest(customer_coords)
+                    else:
+                        local = distance_matrix[:, selected_indices].argmin(axis=1)
+                    assigned = np.ones(n_customers, dtype=bool)
+                    best_js = selected_indices[local]
                 
-                for cost, i, j, customer_name in customer_facility_pairs:
-                    if customer_name not in assigned_customers:
-                        customer_demand = customers[i].demand
-                        if facility_loads[j] + customer_demand <= capacities[j]:
-                            temp_assignments[customer_name] = int(j)
-                            facility_loads[j] += customer_demand
-                            total_cost += cost
-                            assigned_customers.add(customer_name)
-            else:
-                # 容量制約なしの場合は最近隣割当
-                for i, customer in enumerate(customers):
-                    best_j = None
-                    best_cost = float('inf')
-                    
-                    for j in selected_indices:
-                        cost = C[i, j]  # 元の距離コストを使用（固定費は別途追加）
-                        if cost < best_cost:
-                            best_cost = cost
-                            best_j = j
-                    
-                    if best_j is not None:
-                        temp_assignments[customer.name] = int(best_j)
-                        total_cost += best_cost
-                        
-                # デバッグ: 顧客割り当て状況を表示
-                assignment_summary = {}
-                for customer_name, facility_idx in temp_assignments.items():
-                    facility_name = dc_candidates[facility_idx].name
-                    if facility_name not in assignment_summary:
-                        assignment_summary[facility_name] = []
-                    assignment_summary[facility_name].append(customer_name)
+                # 元の距離コスト + 固定費
+                rows = np.flatnonzero(assigned)
+                total_cost = float(C[rows, best_js[rows]].sum() + fixed_costs[selected_indices].sum())
                 
-                print(f"Customer assignment summary:")
-                for facility_name, customers_list in assignment_summary.items():
-                    print(f"  {facility_name}: {len(customers_list)} customers")
-                print(f"Total customers assigned: {len(temp_assignments)}")
-            
-            # 固定費の追加
-            for j in selected_indices:
-                total_cost += dc_candidates[j].fixed_cost
-            
-            if total_cost < best_ub:
-                best_ub = total_cost
-                selected_facilities = selected_indices.copy()
-                customer_assignments = temp_assignments.copy()
+                if total_cost < best_ub:
+                    best_ub = total_cost
+                    selected_facilities = selected_indices.copy()
+                    customer_assignments = {
+                        customers[i].name: int(best_js[i]) for i in rows
+                    }
             
             objective_history.append(lower_bound)
+            best_lb = max(best_lb, float(lower_bound))
+            if progress.report(t, lower_bound=best_lb, upper_bound=best_ub):
+                break
             
             # 勾配（制約違反）の計算
             g_t = 1.0 - assignment_counts
@@ -460,6 +610,7 @@ class LogisticsOptimizationService:
             # 収束判定
             if t > 10 and abs(objective_history[-1] - objective_history[-2]) < 1e-6:
                 break
+        progress.finish()
         
         return KMedianResult(
             selected_facilities=[int(idx) for idx in selected_facilities],
@@ -469,20 +620,121 @@ class LogisticsOptimizationService:
             customer_assignments=customer_assignments
         )
     
+    @staticmethod
+    def _negative_reduced_entries(row_sorted: np.ndarray, row_order: np.ndarray,
+                                  u: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        縮約費用 C[i,j] - u[i] が負の要素を (行, 列, 値) の1次元配列で返す
+        
+        row_sorted は各行を昇順に並べた費用行列、row_order はその列インデックス。
+        負になるのは各行の先頭部分なので、その長さを全行同時の二分探索で求める。
+        u が (L, n) の場合は L 組の乗数をまとめて扱い、行は l * n + i で返す。
+        """
+        n, m = row_sorted.shape
+        u = np.asarray(u).ravel()
+        row_idx = np.arange(len(u))
+        customer_idx = row_idx % n
+        lo = np.zeros(len(u), dtype=np.intp)
+        hi = np.full(len(u), m, dtype=np.intp)
+        while True:
+            searching = lo < hi
+            if not searching.any():
+                break
+            mid = (lo + hi) // 2
+            below = searching & (row_sorted[customer_idx, np.minimum(mid, m - 1)] < u)
+            lo = np.where(below, mid + 1, lo)
+            hi = np.where(searching & ~below, mid, hi)
+        
+        rows = np.repeat(row_idx, lo)
+        starts = np.cumsum(lo) - lo
+        positions = np.arange(len(rows)) - np.repeat(starts, lo)
+        customers = customer_idx[rows]
+        return (rows, row_order[customers, positions],
+                row_sorted[customers, positions] - u[rows])
+    
+    @staticmethod
+    def _capacitated_facility_values(rows: np.ndarray, cols: np.ndarray, reduced: np.ndarray,
+                                     weights: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+        """
+        各施設について、縮約費用の小さい顧客から容量内で順に取った場合の値を一括計算
+        
+        負の縮約費用の要素を施設ごとに昇順に並べ、累積需要が容量を最初に超える
+        手前までの和を求める。
+        """
+        n_facilities = len(capacities)
+        if len(rows) == 0:
+            return np.zeros(n_facilities)
+        order = np.lexsort((reduced, cols))
+        cols, reduced, demand = cols[order], reduced[order], weights[rows[order]]
+        group_start = np.searchsorted(cols, cols, side="left")
+        cumulative = np.cumsum(demand)
+        offset = np.where(group_start > 0, cumulative[group_start - 1], 0.0)
+        over = np.cumsum(cumulative - offset > capacities[cols])
+        over_before = np.where(group_start > 0, over[group_start - 1], 0)
+        taken = over - over_before == 0
+        return np.bincount(cols[taken], weights=reduced[taken], minlength=n_facilities)
+    
+    @staticmethod
+    def _greedy_capacitated_assignment(costs: np.ndarray, weights: np.ndarray,
+                                       capacities: np.ndarray, block_size: int = 4096) -> np.ndarray:
+        """
+        容量制約付きの貪欲割当（全ての顧客・施設の組を費用の昇順に見て、残容量に収まれば割り当てる）
+        
+        組の並べ替えは1回の lexsort で行い、block_size 組ずつのブロックごとに
+        割当済みの顧客の組を配列演算で取り除いてから、残った組だけを順に判定する。
+        判定の順序と条件は組ごとのループと同じなので、同じ割当になる。
+        
+        Args:
+            costs: (n, m) の費用行列（選択施設の列のみ）
+            weights: (n,) の需要
+            capacities: (m,) の容量
+            block_size: 1度に絞り込む組の数
+        
+        Returns:
+            (n,) の割当施設の列インデックス（割当不能な顧客は -1）
+        """
+        n, m = costs.shape
+        assignment = np.full(n, -1, dtype=np.intp)
+        if n == 0 or m == 0:
+            return assignment
+        # 費用 → 顧客 → 施設の順に並べる（同じ費用の組は顧客・施設の番号順）
+        order = np.lexsort((np.tile(np.arange(m), n), np.repeat(np.arange(n), m), costs.ravel()))
+        loads = [0.0] * m
+        capacity_list = [float(c) for c in capacities]
+        weight_list = [float(w) for w in weights]
+        unassigned = n
+        
+        for start in range(0, len(order), block_size):
+            block = order[start:start + block_size]
+            block = block[assignment[block // m] < 0]
+            for pair in block.tolist():
+                i, j = divmod(pair, m)
+                if assignment[i] >= 0:
+                    continue
+                if loads[j] + weight_list[i] <= capacity_list[j]:
+                    assignment[i] = j
+                    loads[j] += weight_list[i]
+                    unassigned -= 1
+            if unassigned == 0:
+                break
+        
+        return assignment
+    
     def find_learning_rate(self, customers: List[CustomerData], dc_candidates: List[DCData],
                           k: int, lr_range: Tuple[float, float] = (1e-7, 10.0),
-                          num_iterations: int = 100, divergence_threshold: float = 4.0) -> Dict[str, Any]:
-        """Learning Rate Finder for K-Median optimization"""
+                          num_iterations: int = 100, divergence_threshold: float = 4.0,
+                          batched: bool = True, batch_size: int = 25) -> Dict[str, Any]:
+        """
+        Learning Rate Finder for K-Median optimization
+        
+        batched=True の場合は batch_size 個の学習率の Lagrange 乗数を (L, n) 配列で
+        同時に更新する。batched=False では学習率を1つずつ試す。どちらも同じ結果を返す。
+        """
         
         n_customers = len(customers)
-        n_facilities = len(dc_candidates)
         
         # 距離行列とコスト行列を計算
-        distance_matrix = np.zeros((n_customers, n_facilities))
-        for i, customer in enumerate(customers):
-            for j, facility in enumerate(dc_candidates):
-                dist = self.calculate_distance(customer, facility)
-                distance_matrix[i, j] = dist
+        distance_matrix = self.cached_distance_matrix(customers, dc_candidates)
         
         # 重み（需要）
         weights = np.array([c.demand for c in customers])
@@ -490,61 +742,29 @@ class LogisticsOptimizationService:
         # コスト行列
         transport_unit_cost = 0.5
         C = distance_matrix * weights.reshape((n_customers, 1)) * transport_unit_cost
+        row_order = np.argsort(C, axis=1).astype(np.int32)
+        row_sorted = np.take_along_axis(C, row_order, axis=1)
         
         # 学習率範囲を対数スケールで生成
         min_lr, max_lr = lr_range
         lrs = np.logspace(np.log10(min_lr), np.log10(max_lr), num_iterations)
         losses = []
-        
-        # 各学習率でのテスト
-        for lr in lrs:
-            # Lagrange乗数の初期化
-            u = np.zeros(n_customers)
-            
-            # Adam パラメータ
-            beta_1, beta_2 = 0.9, 0.999
-            epsilon = 1e-8
-            m_t = np.zeros(n_customers)
-            v_t = np.zeros(n_customers)
-            
-            # 短期間の最適化実行
-            for t in range(min(20, num_iterations)):
-                # コスト行列の更新
-                C_reduced = C - u.reshape((n_customers, 1))
-                
-                # 施設選択
-                facility_values = np.where(C_reduced < 0, C_reduced, 0).sum(axis=0)
-                selected_indices = np.argsort(facility_values)[:k]
-                
-                # 顧客割当の計算
-                assignment_counts = np.zeros(n_customers)
-                for i in range(n_customers):
-                    assigned_facilities = []
-                    for j in selected_indices:
-                        if C_reduced[i, j] < 0:
-                            assigned_facilities.append(j)
-                    assignment_counts[i] = len(assigned_facilities)
-                
-                # 勾配計算
-                g_t = 1.0 - assignment_counts
-                
-                # Adam更新
-                m_t = beta_1 * m_t + (1 - beta_1) * g_t
-                v_t = beta_2 * v_t + (1 - beta_2) * (g_t ** 2)
+        steps = min(20, num_iterations)
+        batch_size = max(1, batch_size) if batched else 1
+        
+        # 学習率をバッチごとに評価し、発散を検出したら以降のバッチは評価しない
+        diverged = False
+        for start in range(0, len(lrs), batch_size):
+            batch_losses = self._lr_sweep_losses(
+                row_sorted, row_order, lrs[start:start + batch_size], k, steps)
+            for loss in batch_losses:
+                losses.append(float(loss))
                 
-                # バイアス補正
-                m_cap = m_t / (1 - beta_1 ** (t + 1))
-                v_cap = v_t / (1 - beta_2 ** (t + 1))
-                
-                # 更新
-                u = u + lr * m_cap / (np.sqrt(v_cap) + epsilon)
-            
-            # 損失計算（制約違反の平均）
-            loss = np.mean(np.abs(g_t))
-            losses.append(loss)
-            
-            # 発散チェック
-            if len(losses) > 10 and loss > divergence_threshold * min(losses[-10:]):
+                # 発散チェック
+                if len(losses) > 10 and loss > divergence_threshold * min(losses[-10:]):
+                    diverged = True
+                    break
+            if diverged:
                 break
         
         # 最適学習率を探索
@@ -576,17 +796,86 @@ class LogisticsOptimizationService:
             "iterations_tested": len(losses)
         }
     
+    def _lr_sweep_losses(self, row_sorted: np.ndarray, row_order: np.ndarray,
+                         lrs: np.ndarray, k: int, steps: int) -> np.ndarray:
+        """
+        複数の学習率で Adam による乗数更新を同時に steps 回行い、各学習率の損失を返す
+        
+        乗数・モーメントは (L, n) 配列で保持する。乗数が有限でなくなった学習率は
+        マスクで凍結し、以降の更新から外す。
+        """
+        n, m = row_sorted.shape
+        n_lrs = len(lrs)
+        u = np.zeros((n_lrs, n))
+        m_t = np.zeros((n_lrs, n))
+        v_t = np.zeros((n_lrs, n))
+        g_t = np.zeros((n_lrs, n))
+        active = np.ones(n_lrs, dtype=bool)
+        beta_1, beta_2 = 0.9, 0.999
+        epsilon = 1e-8
+        lr_column = np.asarray(lrs, dtype=float)[:, None]
+        
+        for t in range(steps):
+            idx = np.flatnonzero(active)
+            if len(idx) == 0:
+                break
+            rows, cols, reduced = self._negative_reduced_entries(row_sorted, row_order, u[idx])
+            
+            # 施設選択（学習率ごと）
+            lr_of_row = rows // n
+            facility_values = np.bincount(
+                lr_of_row * m + cols, weights=reduced, minlength=len(idx) * m
+            ).reshape(len(idx), m)
+            selected_indices = np.argsort(facility_values, axis=1)[:, :k]
+            is_selected = np.zeros((len(idx), m), dtype=bool)
+            np.put_along_axis(is_selected, selected_indices, True, axis=1)
+            
+            # 顧客割当の計算と勾配
+            assignment_counts = np.bincount(
+                rows[is_selected[lr_of_row, cols]], minlength=len(idx) * n
+            ).reshape(len(idx), n)
+            g_t[idx] = 1.0 - assignment_counts
+            
+            # Adam更新
+            m_t[idx] = beta_1 * m_t[idx] + (1 - beta_1) * g_t[idx]
+            v_t[idx] = beta_2 * v_t[idx] + (1 - beta_2) * (g_t[idx] ** 2)
+            m_cap = m_t[idx] / (1 - beta_1 ** (t + 1))
+            v_cap = v_t[idx] / (1 - beta_2 ** (t + 1))
+            u[idx] = u[idx] + lr_column[idx] * m_cap / (np.sqrt(v_cap) + epsilon)
+            
+            # 発散した学習率を凍結
+            active[idx[~np.isfinite(u[idx]).all(axis=1)]] = False
+        
+        # 損失計算（制約違反の平均）
+        return np.abs(g_t).mean(axis=1)
+    
     # =====================================================
     # 顧客クラスタリング
     # =====================================================
     
     def cluster_customers(self, customers: List[CustomerData], method: str = "kmeans",
-                         n_clusters: int = 5, use_road_distance: bool = False) -> ClusteringResult:
-        """顧客をクラスタリング"""
+                         n_clusters: int = 5, use_road_distance: bool = False,
+                         clustering_mode: str = "auto", memory_budget_mb: Optional[float] = None,
+                         silhouette_sample_size: Optional[int] = None) -> ClusteringResult:
+        """
+        顧客をクラスタリング
+        
+        階層クラスタリングの clustering_mode:
+            "exact": 全組の距離による Ward 法（メモリ O(n^2)）
+            "birch": BIRCH で部分クラスターに要約してから Ward 法
+            "knn_ward": k近傍グラフを連結制約とする Ward 法（メモリ O(n k)）
+            "auto": 距離行列が memory_budget_mb に収まれば "exact"、収まらなければ "birch"
+        
+        シルエット係数は顧客数が silhouette_sample_size を超える場合は標本から推定する。
+        """
         
         # 特徴量行列を作成
         features = np.array([[c.latitude, c.longitude, c.demand] for c in customers])
-        locations = np.array([[c.latitude, c.longitude] for c in customers])
+        locations = features[:, :2]
+        n = len(customers)
+        if memory_budget_mb is None:
+            memory_budget_mb = self.clustering_memory_budget_mb
+        budget_bytes = memory_budget_mb * 1024 ** 2
         
         if method == "kmeans":
             if len(customers) < 1000:
@@ -598,26 +887,33 @@ class LogisticsOptimizationService:
             cluster_centers_raw = clusterer.cluster_centers_
             
         elif method == "hierarchical":
-            # 階層クラスタリング
-            if use_road_distance:
-                # 距離行列を使用（簡素化でユークリッド距離）
-                distances = pdist(locations)
-                linkage_matrix = linkage(distances, method='ward')
+            # 階層クラスタリング（道路距離指定時は位置のみ、簡素化でユークリッド距離）
+            data = locations if use_road_distance else features
+            if clustering_mode == "auto":
+                # 距離行列（縮約形式）と linkage 内部のコピーで約 8 n (n - 1) バイト
+                clustering_mode = "exact" if 8.0 * n * (n - 1) <= budget_bytes else "birch"
+            
+            if clustering_mode == "exact":
+                linkage_matrix = linkage(pdist(data), method='ward')
+                cluster_labels = fcluster(linkage_matrix, n_clusters, criterion='maxclust') - 1
+            elif clustering_mode == "birch":
+                cluster_labels = self._birch_ward_labels(data, n_clusters, budget_bytes)
+            elif clustering_mode == "knn_ward":
+                connectivity = kneighbors_graph(data, n_neighbors=min(KNN_WARD_NEIGHBORS, n - 1),
+                                                include_self=False)
+                cluster_labels = AgglomerativeClustering(
+                    n_clusters=n_clusters, linkage='ward', connectivity=connectivity
+                ).fit_predict(data)
             else:
-                linkage_matrix = linkage(features, method='ward')
-            
-            cluster_labels = fcluster(linkage_matrix, n_clusters, criterion='maxclust') - 1
+                raise ValueError(f"Unknown clustering_mode: {clustering_mode}")
             
-            # クラスター中心を計算
-            cluster_centers_raw = []
-            for i in range(n_clusters):
-                mask = cluster_labels == i
-                if np.sum(mask) > 0:
-                    center = np.mean(features[mask], axis=0)
-                    cluster_centers_raw.append(center)
-                else:
-                    cluster_centers_raw.append([0, 0, 0])
-            cluster_centers_raw = np.array(cluster_centers_raw)
+            # クラスター中心を計算（顧客のいないクラスターは [0, 0, 0]）
+            counts = np.bincount(cluster_labels, minlength=n_clusters)[:n_clusters]
+            cluster_centers_raw = np.zeros((n_clusters, features.shape[1]))
+            for d in range(features.shape[1]):
+                sums = np.bincount(cluster_labels, weights=features[:, d], minlength=n_clusters)
+                cluster_centers_raw[:, d] = np.divide(sums[:n_clusters], counts,
+                                                      out=np.zeros(n_clusters), where=counts > 0)
         
         # クラスター中心を LocationData に変換
         cluster_centers = []
@@ -629,34 +925,27 @@ class LogisticsOptimizationService:
             ))
         
         # 顧客割当辞書を作成
-        cluster_assignments = {}
-        for i, customer in enumerate(customers):
-            cluster_assignments[customer.name] = int(cluster_labels[i])
-        
-        # 集約顧客を作成
+        cluster_assignments = {customer.name: int(label)
+                               for customer, label in zip(customers, cluster_labels)}
+        
+        # 集約顧客を作成（位置は需要重心）
+        demand = features[:, 2]
+        total_demands = np.bincount(cluster_labels, weights=demand, minlength=n_clusters)
+        lat_sums = np.bincount(cluster_labels, weights=locations[:, 0] * demand, minlength=n_clusters)
+        lon_sums = np.bincount(cluster_labels, weights=locations[:, 1] * demand, minlength=n_clusters)
+        counts = np.bincount(cluster_labels, minlength=n_clusters)
         aggregated_customers = []
         for i in range(n_clusters):
-            mask = cluster_labels == i
-            if np.sum(mask) > 0:
-                cluster_customers = [customers[j] for j in np.where(mask)[0]]
-                total_demand = sum(c.demand for c in cluster_customers)
-                
-                # 需要重心で位置を計算
-                lat = sum(c.latitude * c.demand for c in cluster_customers) / total_demand
-                lon = sum(c.longitude * c.demand for c in cluster_customers) / total_demand
-                
+            if counts[i] > 0:
                 aggregated_customers.append(CustomerData(
                     name=f"aggregated_cluster_{i}",
-                    latitude=lat,
-                    longitude=lon,
-                    demand=total_demand
+                    latitude=lat_sums[i] / total_demands[i],
+                    longitude=lon_sums[i] / total_demands[i],
+                    demand=total_demands[i]
                 ))
         
         # シルエット係数を計算
-        if len(set(cluster_labels)) > 1:
-            silhouette = silhouette_score(features, cluster_labels)
-        else:
-            silhouette = 0.0
+        silhouette = self._sampled_silhouette(features, cluster_labels, silhouette_sample_size)
         
         return ClusteringResult(
             clusters=cluster_assignments,
@@ -665,6 +954,40 @@ class LogisticsOptimizationService:
             silhouette_score=silhouette
         )
     
+    def _birch_ward_labels(self, data: np.ndarray, n_clusters: int, budget_bytes: float) -> np.ndarray:
+        """
+        BIRCH で部分クラスターに要約し、部分クラスター中心を Ward 法で n_clusters に統合
+        
+        部分クラスター数 s の Ward 法は約 8 s^2 バイトを使うため、s が予算に収まるまで
+        しきい値（部分クラスターの半径）を倍にして要約し直す。
+        """
+        max_subclusters = max(int(np.sqrt(budget_bytes / 8.0)),
+                              BIRCH_MIN_SUBCLUSTERS_PER_CLUSTER * n_clusters)
+        threshold = max(float(np.ptp(data, axis=0).max()) / 100.0, 1e-9)
+        while True:
+            birch = Birch(threshold=threshold, n_clusters=None).fit(data)
+            if len(birch.subcluster_centers_) <= max_subclusters:
+                break
+            threshold *= 2.0
+        birch.set_params(n_clusters=AgglomerativeClustering(
+            n_clusters=min(n_clusters, len(birch.subcluster_centers_)), linkage='ward'))
+        # 引数なしの partial_fit は部分クラスターの統合（global clustering）だけを行う
+        birch.partial_fit()
+        return birch.predict(data)
+    
+    def _sampled_silhouette(self, features: np.ndarray, labels: np.ndarray,
+                            sample_size: Optional[int] = None) -> float:
+        """シルエット係数（顧客数が sample_size を超える場合は無作為標本から推定）"""
+        if sample_size is None:
+            sample_size = self.silhouette_sample_size
+        if len(features) > sample_size:
+            rng = np.random.default_rng(self.random_state)
+            sample = rng.choice(len(features), size=sample_size, replace=False)
+            features, labels = features[sample], labels[sample]
+        if len(set(labels)) > 1:
+            return float(silhouette_score(features, labels))
+        return 0.0
+    
     # =====================================================
     # 基本的な物流ネットワーク設計
     # =====================================================
@@ -679,7 +1002,7 @@ class LogisticsOptimizationService:
         n_facilities = len(dc_candidates)
         
         # 各顧客から各DCまでの距離を計算
-        distance_matrix = self.calculate_distance_matrix(customers, dc_candidates)
+        distance_matrix = self.cached_distance_matrix(customers, dc_candidates)
         
         # 容量制約を考慮してDCを選択
         selected_facilities = []
@@ -804,34 +1127,49 @@ class LogisticsOptimizationService:
     
     def solve_multi_source_lnd(self, customers: List[CustomerData], dc_candidates: List[DCData],
                               plants: List[PlantData], products: Optional[List[ProductData]] = None,
-                              max_iterations: int = 1000, tolerance: float = 1e-6) -> LNDResult:
-        """Multi-source logistics network design with multiple plants and DCs"""
+                              max_iterations: int = 1000, tolerance: float = 1e-6,
+                              progress_callback: Optional[ProgressCallback] = None,
+                              progress_interval: float = DEFAULT_PROGRESS_INTERVAL) -> LNDResult:
+        """
+        Multi-source logistics network design with multiple plants and DCs
+        
+        progress_callback には反復ごとの最良の下界・上界を progress_interval 秒間隔で渡し、
+        コールバックが真を返すとその時点の最良解を返す。
+        """
         
+        start_time = time.perf_counter()
         n_customers = len(customers)
         n_facilities = len(dc_candidates)
         n_plants = len(plants)
         
         if not products:
             # デフォルトの単一製品を作成
-            products = [ProductData(name="default_product", unit_cost=1.0, weight=1.0, volume=1.0)]
+            products = [ProductData(prod_id="default", name="default_product", unit_cost=1.0,
+                                    weight=1.0, volume=1.0, value=1.0)]
         
         n_products = len(products)
         
         # 距離行列を計算
         # Plant -> DC
-        plant_dc_distances = self.calculate_distance_matrix(plants, dc_candidates)
+        plant_dc_distances = self.cached_distance_matrix(plants, dc_candidates)
         # DC -> Customer
-        dc_customer_distances = self.calculate_distance_matrix(dc_candidates, customers)
+        dc_customer_distances = self.cached_distance_matrix(dc_candidates, customers)
         
-        # 需要行列 [customers x products]
+        # 需要行列 [customers x products]（単一製品の場合）
         demand_matrix = np.zeros((n_customers, n_products))
-        for i, customer in enumerate(customers):
-            demand_matrix[i, 0] = customer.demand  # 単一製品の場合
+        demand_matrix[:, 0] = [customer.demand for customer in customers]
         
-        # 生産能力行列 [plants x products]
+        # 生産能力行列 [plants x products]（単一製品の場合）
+        plant_capacities = np.array([plant.capacity for plant in plants], dtype=float)
+        dc_capacities = np.array([dc.capacity for dc in dc_candidates], dtype=float)
         production_capacity = np.zeros((n_plants, n_products))
-        for i, plant in enumerate(plants):
-            production_capacity[i, 0] = plant.capacity  # 単一製品の場合
+        production_capacity[:, 0] = plant_capacities
+        
+        # 輸送単価とフロー上限
+        plant_dc_unit_cost = plant_dc_distances * 0.1                     # [plants x DCs]
+        dc_customer_unit_cost = dc_customer_distances * 0.1               # [DCs x customers]
+        plant_dc_max_flow = np.minimum.outer(plant_capacities, dc_capacities)[:, :, None]
+        dc_customer_max_flow = np.minimum(dc_capacities[:, None, None], demand_matrix[None, :, :])
         
         # ラグランジュ緩和法による解法
         # 変数: x[i,j,k] = plant i から DC j への product k のフロー
@@ -850,69 +1188,31 @@ class LogisticsOptimizationService:
         objective_history = []
         best_upper_bound = float('inf')
         best_solution = {}
+        previous_selection = None
+        best_lower_bound = -float('inf')
+        progress = ProgressReporter(progress_callback, "multi_source_lnd", max_iterations,
+                                    progress_interval)
         
         for iteration in range(max_iterations):
-            # 下位問題の解法
-            
-            # 1. Plant-to-DC フロー最適化
-            plant_dc_flows = {}
-            plant_dc_cost = 0.0
-            
-            for i in range(n_plants):
-                for j in range(n_facilities):
-                    for k in range(n_products):
-                        # コスト計算（輸送費 + ラグランジュ項）
-                        transport_cost = plant_dc_distances[i, j] * 0.1  # 単価
-                        lagrange_term = u_capacity[i, k] - u_balance[j, k]
-                        reduced_cost = transport_cost + lagrange_term
-                        
-                        # 最適フロー決定
-                        max_flow = min(plants[i].capacity, dc_candidates[j].capacity)
-                        if reduced_cost < 0:
-                            flow = max_flow
-                        else:
-                            flow = 0
-                        
-                        plant_dc_flows[(i, j, k)] = flow
-                        plant_dc_cost += flow * transport_cost
-            
-            # 2. DC-to-Customer フロー最適化
-            dc_customer_flows = {}
-            dc_customer_cost = 0.0
-            
-            for j in range(n_facilities):
-                for l in range(n_customers):
-                    for k in range(n_products):
-                        # コスト計算
-                        transport_cost = dc_customer_distances[j, l] * 0.1
-                        lagrange_term = u_balance[j, k] - u_demand[l, k]
-                        reduced_cost = transport_cost + lagrange_term
-                        
-                        # 最適フロー決定
-                        max_flow = min(dc_candidates[j].capacity, demand_matrix[l, k])
-                        if reduced_cost < 0:
-                            flow = max_flow
-                        else:
-                            flow = 0
-                        
-                        dc_customer_flows[(j, l, k)] = flow
-                        dc_customer_cost += flow * transport_cost
-            
-            # 3. DC開設決定
-            selected_dcs = []
-            dc_fixed_cost = 0.0
-            
-            for j in range(n_facilities):
-                # DCの開設価値を計算
-                inflow = sum(plant_dc_flows.get((i, j, k), 0) 
-                           for i in range(n_plants) for k in range(n_products))
-                outflow = sum(dc_customer_flows.get((j, l, k), 0)
-                            for l in range(n_customers) for k in range(n_products))
-                
-                # DCを開設するかどうか判定
-                if inflow > 0 or outflow > 0:
-                    selected_dcs.append(j)
-                    dc_fixed_cost += dc_candidates[j].fixed_cost
+            # 下位問題の解法（縮約費用が負の変数はフロー上限まで流す）
+            
+            # 1. Plant-to-DC フロー最適化 [plants x DCs x products]
+            plant_dc_reduced = (plant_dc_unit_cost[:, :, None] + u_capacity[:, None, :]
+                                - u_balance[None, :, :])
+            plant_dc_flows = np.where(plant_dc_reduced < 0, plant_dc_max_flow, 0.0)
+            plant_dc_cost = float(np.einsum('ijk,ij->', plant_dc_flows, plant_dc_unit_cost))
+            
+            # 2. DC-to-Customer フロー最適化 [DCs x customers x products]
+            dc_customer_reduced = (dc_customer_unit_cost[:, :, None] + u_balance[:, None, :]
+                                   - u_demand[None, :, :])
+            dc_customer_flows = np.where(dc_customer_reduced < 0, dc_customer_max_flow, 0.0)
+            dc_customer_cost = float(np.einsum('jlk,jl->', dc_customer_flows, dc_customer_unit_cost))
+            
+            # 3. DC開設決定（入出荷フローのあるDCを開設）
+            dc_inflow = plant_dc_flows.sum(axis=0)      # [DCs x products]
+            dc_outflow = dc_customer_flows.sum(axis=1)  # [DCs x products]
+            selected_dcs = np.flatnonzero((dc_inflow.sum(axis=1) > 0) | (dc_outflow.sum(axis=1) > 0))
+            dc_fixed_cost = float(sum(dc_candidates[j].fixed_cost for j in selected_dcs))
             
             # 下界の計算
             lower_bound = (plant_dc_cost + dc_customer_cost + dc_fixed_cost +
@@ -921,40 +1221,36 @@ class LogisticsOptimizationService:
             
             objective_history.append(lower_bound)
             
-            # 実行可能解の構築（上界）
-            feasible_flows = self._construct_feasible_solution(
-                customers, dc_candidates, plants, products,
-                plant_dc_flows, dc_customer_flows, selected_dcs
-            )
-            
-            upper_bound = feasible_flows['total_cost']
+            # 実行可能解の構築（上界）：開設DCがない場合は実行不能、
+            # 開設DC集合が前回と同じなら上界も同じため省略
+            selection_key = tuple(selected_dcs)
+            if len(selected_dcs) > 0 and selection_key != previous_selection:
+                previous_selection = selection_key
+                feasible_flows = self._construct_feasible_solution(
+                    customers, dc_candidates, plants, products,
+                    plant_dc_flows, dc_customer_flows, selected_dcs.tolist()
+                )
+                
+                upper_bound = feasible_flows['total_cost']
+                
+                if upper_bound < best_upper_bound:
+                    best_upper_bound = upper_bound
+                    # 結果は開設DC集合もこの反復のものを使う
+                    best_solution = dict(feasible_flows, selected_dcs=selected_dcs)
             
-            if upper_bound < best_upper_bound:
-                best_upper_bound = upper_bound
-                best_solution = feasible_flows
+            best_lower_bound = max(best_lower_bound, float(lower_bound))
+            if progress.report(iteration, lower_bound=best_lower_bound, upper_bound=best_upper_bound):
+                break
             
             # ラグランジュ乗数の更新
             # 需要制約の違反
-            demand_violation = np.zeros((n_customers, n_products))
-            for l in range(n_customers):
-                for k in range(n_products):
-                    served = sum(dc_customer_flows.get((j, l, k), 0) for j in range(n_facilities))
-                    demand_violation[l, k] = demand_matrix[l, k] - served
+            demand_violation = demand_matrix - dc_customer_flows.sum(axis=0)
             
             # 生産能力制約の違反
-            capacity_violation = np.zeros((n_plants, n_products))
-            for i in range(n_plants):
-                for k in range(n_products):
-                    produced = sum(plant_dc_flows.get((i, j, k), 0) for j in range(n_facilities))
-                    capacity_violation[i, k] = produced - production_capacity[i, k]
+            capacity_violation = plant_dc_flows.sum(axis=1) - production_capacity
             
             # フロー均衡制約の違反
-            balance_violation = np.zeros((n_facilities, n_products))
-            for j in range(n_facilities):
-                for k in range(n_products):
-                    inflow = sum(plant_dc_flows.get((i, j, k), 0) for i in range(n_plants))
-                    outflow = sum(dc_customer_flows.get((j, l, k), 0) for l in range(n_customers))
-                    balance_violation[j, k] = inflow - outflow
+            balance_violation = dc_inflow - dc_outflow
             
             # 乗数更新
             u_demand += learning_rate * demand_violation
@@ -969,25 +1265,29 @@ class LogisticsOptimizationService:
             # 学習率の調整
             if iteration % 100 == 0 and iteration > 0:
                 learning_rate *= 0.95
+        progress.finish()
         
-        # 結果の構築
+        # 結果の構築（最良解の開設DC集合とフロー配列から、正のフローだけを辞書に変換）
+        selected_dcs = best_solution.get('selected_dcs', np.zeros(0, dtype=np.intp))
         selected_facilities = [dc_candidates[j] for j in selected_dcs]
         
-        flow_assignments = {}
-        for customer in customers:
-            flow_assignments[customer.name] = {}
-            for j in selected_dcs:
-                flow = sum(best_solution.get('dc_customer_flows', {}).get((j, customers.index(customer), k), 0)
-                          for k in range(n_products))
-                if flow > 0:
-                    flow_assignments[customer.name][dc_candidates[j].name] = flow
+        flow_assignments = {customer.name: {} for customer in customers}
+        best_flows = best_solution.get('dc_customer_flows')
+        if best_flows is not None:
+            # [customers x 開設DC] の製品合計フロー
+            customer_dc_flows = best_flows[selected_dcs].sum(axis=2).T
+        else:
+            customer_dc_flows = np.zeros((n_customers, len(selected_dcs)))
+        flow_rows, flow_cols = np.nonzero(customer_dc_flows > 0)
+        for l, s in zip(flow_rows, flow_cols):
+            flow_assignments[customers[l].name][dc_candidates[selected_dcs[s]].name] = \
+                float(customer_dc_flows[l, s])
         
         # 稼働率計算
+        dc_total_flows = customer_dc_flows.sum(axis=0)
         utilization = {}
-        for j in selected_dcs:
-            total_flow = sum(flow_assignments[c.name].get(dc_candidates[j].name, 0) 
-                           for c in customers)
-            utilization[dc_candidates[j].name] = total_flow / dc_candidates[j].capacity
+        for s, j in enumerate(selected_dcs):
+            utilization[dc_candidates[j].name] = float(dc_total_flows[s] / dc_candidates[j].capacity)
         
         return LNDResult(
             selected_facilities=selected_facilities,
@@ -1001,20 +1301,18 @@ class LogisticsOptimizationService:
             },
             facility_utilization=utilization,
             network_performance={
-                "average_distance": np.mean([dc_customer_distances[j, customers.index(c)] 
-                                           for c in customers for j in selected_dcs
-                                           if c.name in flow_assignments and 
-                                           dc_candidates[j].name in flow_assignments[c.name]]),
+                "average_distance": float(np.mean(
+                    dc_customer_distances[selected_dcs[flow_cols], flow_rows])) if len(flow_rows) else 0.0,
                 "facility_count": len(selected_facilities),
                 "total_demand": sum(c.demand for c in customers)
             },
             solution_status="Lagrange_Relaxation",
-            solve_time=iteration * 0.001
+            solve_time=time.perf_counter() - start_time
         )
     
     def _construct_feasible_solution(self, customers: List[CustomerData], dc_candidates: List[DCData],
                                    plants: List[PlantData], products: List[ProductData],
-                                   plant_dc_flows: Dict, dc_customer_flows: Dict, 
+                                   plant_dc_flows: np.ndarray, dc_customer_flows: np.ndarray,
                                    selected_dcs: List[int]) -> Dict[str, Any]:
         """ラグランジュ緩和の解から実行可能解を構築"""
         
@@ -1026,16 +1324,13 @@ class LogisticsOptimizationService:
         for j in selected_dcs:
             total_fixed_cost += dc_candidates[j].fixed_cost
         
-        # 輸送費（概算）
-        for customer in customers:
-            if selected_dcs:
-                # 最も近いDCに割当
-                min_distance = float('inf')
-                for j in selected_dcs:
-                    distance = self.calculate_distance(customer, dc_candidates[j])
-                    if distance < min_distance:
-                        min_distance = distance
-                total_transport_cost += customer.demand * min_distance * 0.1
+        # 輸送費（概算）：各顧客を最も近い開設DCに割当
+        if selected_dcs and customers:
+            min_distances, _ = NearestFacilityIndex(
+                coordinate_array([dc_candidates[j] for j in selected_dcs])
+            ).nearest(coordinate_array(customers))
+            demands = np.array([c.demand for c in customers])
+            total_transport_cost = float(np.sum(demands * min_distances) * 0.1)
         
         return {
             'total_cost': total_transport_cost + total_fixed_cost,
@@ -1059,125 +1354,47 @@ class LogisticsOptimizationService:
         n_products = len(products)
         
         # 距離行列
-        dc_customer_distances = self.calculate_distance_matrix(dc_candidates, customers)
-        plant_dc_distances = self.calculate_distance_matrix(plants, dc_candidates) if plants else np.zeros((1, n_facilities))
+        dc_customer_distances = self.cached_distance_matrix(dc_candidates, customers)
+        plant_dc_distances = self.cached_distance_matrix(plants, dc_candidates) if plants else np.zeros((1, n_facilities))
         
         # 単一ソース制約付きの整数計画法（ヒューリスティック解法）
         # 各顧客は1つのDCからのみサービスを受ける
+        demands = np.array([c.demand for c in customers], dtype=float)
+        capacities = np.array([dc.capacity for dc in dc_candidates], dtype=float)
+        fixed_costs = np.array([dc.fixed_cost for dc in dc_candidates], dtype=float)
+        # 顧客 i を DC j に割り当てたときの輸送費 (n, m)
+        transport_costs = demands[:, None] * dc_customer_distances.T * 0.1
         
         # グリーディヒューリスティック + 局所改善
-        best_cost = float('inf')
-        best_assignments = {}
-        best_selected_dcs = []
-        
-        # 複数の初期解から開始
-        for attempt in range(10):
-            # 初期割当（ランダム）
-            current_assignments = {}
-            used_dcs = set()
-            
-            for customer in customers:
-                # 容量制約を考慮してDCを選択
-                available_dcs = []
-                for j, dc in enumerate(dc_candidates):
-                    current_load = sum(c.demand for c in customers 
-                                     if current_assignments.get(c.name) == j)
-                    if current_load + customer.demand <= dc.capacity:
-                        available_dcs.append(j)
-                
-                if available_dcs:
-                    # 最も近い利用可能なDCを選択
-                    best_dc = min(available_dcs, 
-                                key=lambda j: dc_customer_distances[j, customers.index(customer)])
-                    current_assignments[customer.name] = best_dc
-                    used_dcs.add(best_dc)
-                else:
-                    # 容量制約を無視して最も近いDCに割当
-                    best_dc = np.argmin(dc_customer_distances[:, customers.index(customer)])
-                    current_assignments[customer.name] = best_dc
-                    used_dcs.add(best_dc)
-            
-            # 現在の解のコストを計算
-            current_cost = self._calculate_single_source_cost(
-                customers, dc_candidates, current_assignments, list(used_dcs)
-            )
-            
-            # 局所改善（2-opt style）
-            improved = True
-            local_iterations = 0
-            max_local_iterations = max_iterations // 10  # Limit local search iterations
-            while improved and local_iterations < max_local_iterations:
-                improved = False
-                local_iterations += 1
-                
-                for customer in customers:
-                    current_dc = current_assignments[customer.name]
-                    current_customer_cost = (customer.demand * 
-                                           dc_customer_distances[current_dc, customers.index(customer)] * 0.1)
-                    
-                    # 他のDCに変更してコストが改善するかチェック
-                    for j, dc in enumerate(dc_candidates):
-                        if j == current_dc:
-                            continue
-                        
-                        # 容量制約チェック
-                        current_load = sum(c.demand for c in customers 
-                                         if current_assignments[c.name] == j and c.name != customer.name)
-                        if current_load + customer.demand > dc.capacity:
-                            continue
-                        
-                        # 新しいコストを計算
-                        new_customer_cost = (customer.demand * 
-                                           dc_customer_distances[j, customers.index(customer)] * 0.1)
-                        
-                        # 改善があるかチェック
-                        if new_customer_cost < current_customer_cost:
-                            current_assignments[customer.name] = j
-                            used_dcs.add(j)
-                            
-                            # 古いDCが不要になったかチェック
-                            if not any(current_assignments[c.name] == current_dc for c in customers):
-                                used_dcs.discard(current_dc)
-                            
-                            improved = True
-                            break
-            
-            # 最終コスト計算
-            final_cost = self._calculate_single_source_cost(
-                customers, dc_candidates, current_assignments, list(used_dcs)
-            )
-            
-            if final_cost < best_cost:
-                best_cost = final_cost
-                best_assignments = current_assignments.copy()
-                best_selected_dcs = list(used_dcs)
+        best_assignment, best_cost = self._single_source_heuristic(
+            dc_customer_distances, transport_costs, demands, capacities, fixed_costs,
+            max_iterations)
         
         # 結果の構築
+        loads = np.bincount(best_assignment, weights=demands, minlength=n_facilities)
+        best_selected_dcs = np.flatnonzero(np.bincount(best_assignment, minlength=n_facilities))
         selected_facilities = [dc_candidates[j] for j in best_selected_dcs]
         
         flow_assignments = {}
-        for customer in customers:
-            dc_idx = best_assignments[customer.name]
-            dc_name = dc_candidates[dc_idx].name
+        for i, customer in enumerate(customers):
+            dc_name = dc_candidates[best_assignment[i]].name
             flow_assignments[customer.name] = {dc_name: customer.demand}
         
         # 稼働率計算
-        utilization = {}
-        for j in best_selected_dcs:
-            total_flow = sum(c.demand for c in customers if best_assignments[c.name] == j)
-            utilization[dc_candidates[j].name] = total_flow / dc_candidates[j].capacity
+        utilization = {dc_candidates[j].name: float(loads[j] / capacities[j])
+                       for j in best_selected_dcs}
         
         # 平均距離計算
-        avg_distance = np.mean([dc_customer_distances[best_assignments[c.name], customers.index(c)] 
-                               for c in customers])
+        avg_distance = float(np.mean(dc_customer_distances[best_assignment, np.arange(n_customers)]))
+        fixed_total = float(fixed_costs[best_selected_dcs].sum())
         
         return LNDResult(
             selected_facilities=selected_facilities,
             flow_assignments=flow_assignments,
             total_cost=best_cost,
             cost_breakdown={
-                "transportation": best_cost - sum(dc_candidates[j].fixed_cost for j in best_selected_dcs),
-                "fixed": sum(dc_candidates[j].fixed_cost for j in best_selected_dcs),
+                "transportation": best_cost - fixed_total,
+                "fixed": fixed_total,
                 "variable": 0.0,
                 "inventory": 0.0
             },
@@ -1185,33 +1402,449 @@ class LogisticsOptimizationService:
             network_performance={
                 "average_distance": avg_distance,
                 "facility_count": len(selected_facilities),
-                "total_demand": sum(c.demand for c in customers),
+                "total_demand": float(demands.sum()),
                 "single_source_constraint": True
             },
             solution_status="Heuristic_Optimal",
             solve_time=0.1 * max_iterations / 100
         )
     
-    def _calculate_single_source_cost(self, customers: List[CustomerData], 
-                                    dc_candidates: List[DCData],
-                                    assignments: Dict[str, int], 
-                                    selected_dcs: List[int]) -> float:
-        """単一ソース制約下でのコスト計算"""
+    def _single_source_heuristic(self, dc_customer_distances: np.ndarray,
+                                 transport_costs: np.ndarray, demands: np.ndarray,
+                                 capacities: np.ndarray, fixed_costs: np.ndarray,
+                                 max_iterations: int = 500) -> Tuple[np.ndarray, float]:
+        """
+        単一ソース割当のグリーディ + 局所改善（複数の顧客処理順から最良の割当を返す）
         
-        transport_cost = 0.0
-        fixed_cost = 0.0
+        Returns:
+            (assignment, cost): 顧客ごとの割当DCインデックスと総費用
+        """
+        n_customers, n_facilities = transport_costs.shape
+        best_cost = float('inf')
+        best_assignment = None
+        max_local_iterations = max_iterations // 10  # Limit local search iterations
+        rng = np.random.default_rng(self.random_state)
         
-        # 輸送費
-        for customer in customers:
-            dc_idx = assignments[customer.name]
-            distance = self.calculate_distance(customer, dc_candidates[dc_idx])
-            transport_cost += customer.demand * distance * 0.1  # 単価
+        # 複数の初期解から開始（初回は入力順、以降は顧客の処理順をランダムに変更）
+        for attempt in range(10):
+            order = np.arange(n_customers) if attempt == 0 else rng.permutation(n_customers)
+            
+            assignment = self._single_source_greedy(
+                dc_customer_distances, demands, capacities, order)
+            assignment = self._single_source_local_search(
+                transport_costs, demands, capacities, fixed_costs, assignment, order,
+                max_local_iterations)
+            
+            # 最終コスト計算
+            used = np.bincount(assignment, minlength=n_facilities) > 0
+            final_cost = float(transport_costs[np.arange(n_customers), assignment].sum()
+                               + fixed_costs[used].sum())
+            
+            if final_cost < best_cost:
+                best_cost = final_cost
+                best_assignment = assignment
         
-        # 固定費
-        for j in selected_dcs:
-            fixed_cost += dc_candidates[j].fixed_cost
+        return best_assignment, best_cost
+    
+    @staticmethod
+    def _single_source_greedy(dc_customer_distances: np.ndarray, demands: np.ndarray,
+                              capacities: np.ndarray, order: np.ndarray) -> np.ndarray:
+        """
+        顧客を order の順に、容量に余裕のある最も近いDCへ割り当てる
+        
+        余裕のあるDCがない場合は容量制約を無視して最も近いDCに割り当てる。
+        DCごとの負荷は配列で逐次更新する。
+        """
+        n_facilities = len(capacities)
+        assignment = np.empty(len(demands), dtype=np.intp)
+        loads = np.zeros(n_facilities)
+        for i in order:
+            distances = dc_customer_distances[:, i]
+            feasible = loads + demands[i] <= capacities
+            if feasible.any():
+                best_dc = int(np.argmin(np.where(feasible, distances, np.inf)))
+            else:
+                best_dc = int(np.argmin(distances))
+            assignment[i] = best_dc
+            loads[best_dc] += demands[i]
+        return assignment
+    
+    @staticmethod
+    def _single_source_local_search(transport_costs: np.ndarray, demands: np.ndarray,
+                                    capacities: np.ndarray, fixed_costs: np.ndarray,
+                                    assignment: np.ndarray, order: np.ndarray,
+                                    max_passes: int) -> np.ndarray:
+        """
+        単一ソース割当の移動近傍による局所改善
+        
+        DCごとの負荷と割当顧客数を配列で保持し、顧客 i を DC j に移す費用変化を
+        輸送費の差と、移動によって開設・閉鎖されるDCの固定費から O(1) で評価する。
+        各顧客について容量を満たす移動のうち最も改善の大きいものを適用する。
+        """
+        n_facilities = len(capacities)
+        assignment = assignment.copy()
+        loads = np.bincount(assignment, weights=demands, minlength=n_facilities)
+        counts = np.bincount(assignment, minlength=n_facilities)
+        rows = np.arange(len(demands))
+        min_transport = transport_costs.min(axis=1)
+        
+        for _ in range(max_passes):
+            # 輸送費が下がる余地があるか、現在のDCを閉鎖できる顧客だけを調べる
+            current_transport = transport_costs[rows, assignment]
+            candidates = (min_transport < current_transport) | (counts[assignment] == 1)
+            improved = False
+            for i in order[candidates[order]]:
+                current_dc = assignment[i]
+                delta = transport_costs[i] - transport_costs[i, current_dc]
+                delta = delta + np.where(counts == 0, fixed_costs, 0.0)
+                if counts[current_dc] == 1:
+                    delta -= fixed_costs[current_dc]
+                delta[current_dc] = 0.0
+                delta[loads + demands[i] > capacities] = np.inf
+                j = int(np.argmin(delta))
+                if delta[j] >= -1e-9:
+                    continue
+                
+                assignment[i] = j
+                loads[current_dc] -= demands[i]
+                loads[j] += demands[i]
+                counts[current_dc] -= 1
+                counts[j] += 1
+                improved = True
+            if not improved:
+                break
         
-        return transport_cost + fixed_cost
+        return assignment
+    
+    def solve_single_source_lnd_lagrangian(self, customers: List[CustomerData],
+                                           dc_candidates: List[DCData],
+                                           plants: List[PlantData],
+                                           max_iterations: int = 300,
+                                           gap_tolerance: float = 1e-3,
+                                           time_limit: Optional[float] = None,
+                                           knapsack: str = "auto",
+                                           heuristic_interval: int = 10,
+                                           progress_callback: Optional[ProgressCallback] = None,
+                                           progress_interval: float = DEFAULT_PROGRESS_INTERVAL
+                                           ) -> LNDResult:
+        """
+        単一ソース容量制約付き施設配置のラグランジュ分解
+        
+        割当制約 Σ_j z[i,j] = 1 を乗数 u で緩和すると、問題は DC ごとの
+        0-1 ナップサック（縮約費用 c[i,j] - u[i] が負の顧客を容量内で選ぶ）に分解される。
+        ナップサックは需要・容量が整数で小さければ配列DPで厳密に、それ以外は
+        貪欲法（LP緩和）で解き、いずれも有効な下界を与える。
+        緩和解で開設されたDCから容量付き貪欲割当と局所改善で実行可能解（上界）を作り、
+        乗数は Polyak ステップの劣勾配法で更新する。
+        
+        Args:
+            max_iterations: 劣勾配法の最大反復回数
+            gap_tolerance: 相対ギャップ (上界 - 下界) / 上界 がこれ以下で終了
+            time_limit: 計算時間の上限（秒）
+            knapsack: "auto"（DPが可能なDCはDP）/ "greedy"（全DCを貪欲法）
+            heuristic_interval: 上界を計算する反復間隔
+            progress_callback: iteration, lower_bound, upper_bound, gap の辞書を受け取る関数
+                               （真を返すとその時点の最良解で終了）
+            progress_interval: progress_callback を呼ぶ最短間隔（秒、0 なら毎反復）
+        """
+        if knapsack not in ("auto", "greedy"):
+            raise ValueError("knapsack must be 'auto' or 'greedy'")
+        start_time = time.perf_counter()
+        n_customers, n_facilities = len(customers), len(dc_candidates)
+        
+        demands = np.array([c.demand for c in customers], dtype=float)
+        capacities = np.array([dc.capacity for dc in dc_candidates], dtype=float)
+        fixed_costs = np.array([dc.fixed_cost for dc in dc_candidates], dtype=float)
+        if capacities.sum() < demands.sum():
+            raise ValueError("total DC capacity is smaller than total demand")
+        
+        # 顧客 i を DC j に割り当てたときの輸送費 (n, m)。大規模では float32 で保持
+        dtype = np.float32 if n_customers * n_facilities > 5_000_000 else np.float64
+        dc_customer_distances = self.cached_distance_matrix(dc_candidates, customers)
+        transport_costs = (demands[:, None] * dc_customer_distances.T * 0.1).astype(dtype)
+        row_order = np.argsort(transport_costs, axis=1).astype(np.int32)
+        row_sorted = np.take_along_axis(transport_costs, row_order, axis=1)
+        
+        # 需要・容量が整数ならDPを使う（表の大きさが上限以内のDCのみ）
+        integral = (np.all(demands == np.round(demands))
+                    and np.all(capacities == np.round(capacities)))
+        use_dp = knapsack != "greedy" and integral
+        
+        # 乗数の初期値：固定費を容量比で按分した費用 c[i,j] + f[j] d[i] / s[j] の最小値
+        u = np.min(transport_costs + demands[:, None] * (fixed_costs / capacities)[None, :],
+                   axis=1).astype(float)
+        best_lower = -np.inf
+        best_upper = np.inf
+        best_assignment = None
+        step_scale = 2.0
+        stall = 0
+        evaluated = set()
+        iteration = 0
+        progress = ProgressReporter(progress_callback, "lagrangian_ss_lnd", max_iterations,
+                                    progress_interval)
+        
+        for iteration in range(max_iterations):
+            # DCごとのナップサック下位問題
+            rows, cols, reduced = self._negative_reduced_entries(row_sorted, row_order, u)
+            values, z_rows, z_cols, z_fraction = self._knapsack_relaxation(
+                rows, cols, reduced.astype(float), demands, capacities, use_dp)
+            open_mask = fixed_costs + values < 0
+            lower = float(u.sum() + np.minimum(fixed_costs + values, 0.0).sum())
+            if lower > best_lower + 1e-9 * max(1.0, abs(lower)):
+                best_lower = lower
+                stall = 0
+            else:
+                stall += 1
+                if stall >= 20:
+                    step_scale /= 2
+                    stall = 0
+            
+            # ラグランジュヒューリスティック（開設DC集合が新しいときだけ）
+            if iteration % heuristic_interval == 0 or iteration == max_iterations - 1:
+                key = open_mask.tobytes()
+                if key not in evaluated:
+                    evaluated.add(key)
+                    assignment = self._ss_lagrangian_heuristic(
+                        transport_costs, demands, capacities, fixed_costs,
+                        open_mask, fixed_costs + values, polish=False)
+                    if assignment is not None:
+                        used = np.bincount(assignment, minlength=n_facilities) > 0
+                        cost = float(transport_costs[np.arange(n_customers), assignment]
+                                     .astype(float).sum() + fixed_costs[used].sum())
+                        if cost < best_upper:
+                            best_upper, best_assignment = cost, assignment
+            
+            gap = (best_upper - best_lower) / best_upper if np.isfinite(best_upper) else np.inf
+            if progress.report(iteration, lower_bound=best_lower, upper_bound=best_upper, gap=gap):
+                break
+            if gap <= gap_tolerance or step_scale < 1e-4:
+                break
+            if time_limit is not None and time.perf_counter() - start_time > time_limit:
+                break
+            
+            # 劣勾配：割当制約の違反量 1 - Σ_j z[i,j]（開設DCのみ）
+            taken = open_mask[z_cols]
+            subgradient = 1.0 - np.bincount(z_rows[taken], weights=z_fraction[taken],
+                                            minlength=n_customers)
+            norm = float(subgradient @ subgradient)
+            if norm == 0:
+                break
+            # Polyak ステップの目標値（序盤の粗い上界で歩幅が過大にならないよう下界 + 2% で抑える）
+            target = min(best_upper, best_lower + 0.02 * abs(best_lower) + 1.0)
+            u = u + step_scale * (target - lower) / norm * subgradient
+        progress.finish()
+        
+        if best_assignment is None:
+            # 上界が得られなかった場合は単一ソースヒューリスティックを使用
+            best_assignment, best_upper = self._single_source_heuristic(
+                dc_customer_distances, transport_costs.astype(float), demands, capacities,
+                fixed_costs)
+        else:
+            # 最良解を移動・交換近傍で仕上げる
+            best_assignment = self._ss_improve_assignment(
+                transport_costs, demands, capacities, fixed_costs, best_assignment)
+            used = np.bincount(best_assignment, minlength=n_facilities) > 0
+            best_upper = min(best_upper, float(
+                transport_costs[np.arange(n_customers), best_assignment].astype(float).sum()
+                + fixed_costs[used].sum()))
+        gap = (best_upper - best_lower) / best_upper if best_upper > 0 else 0.0
+        
+        # 結果の構築
+        loads = np.bincount(best_assignment, weights=demands, minlength=n_facilities)
+        selected = np.flatnonzero(np.bincount(best_assignment, minlength=n_facilities))
+        fixed_total = float(fixed_costs[selected].sum())
+        flow_assignments = {
+            customer.name: {dc_candidates[best_assignment[i]].name: customer.demand}
+            for i, customer in enumerate(customers)
+        }
+        return LNDResult(
+            selected_facilities=[dc_candidates[j] for j in selected],
+            flow_assignments=flow_assignments,
+            total_cost=best_upper,
+            cost_breakdown={
+                "transportation": best_upper - fixed_total,
+                "fixed": fixed_total,
+                "variable": 0.0,
+                "inventory": 0.0
+            },
+            facility_utilization={dc_candidates[j].name: float(loads[j] / capacities[j])
+                                  for j in selected},
+            network_performance={
+                "average_distance": float(np.mean(
+                    dc_customer_distances[best_assignment, np.arange(n_customers)])),
+                "facility_count": len(selected),
+                "total_demand": float(demands.sum()),
+                "lower_bound": best_lower,
+                "upper_bound": best_upper,
+                "gap": gap,
+                "iterations": iteration + 1,
+                "knapsack_method": "dp" if use_dp else "greedy",
+                "optimization_method": "Lagrangian_Decomposition"
+            },
+            solution_status="Optimal" if gap <= gap_tolerance else "Feasible",
+            solve_time=time.perf_counter() - start_time
+        )
+    
+    def _knapsack_relaxation(self, rows: np.ndarray, cols: np.ndarray, reduced: np.ndarray,
+                             weights: np.ndarray, capacities: np.ndarray,
+                             use_dp: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        DCごとのナップサック（縮約費用の和を容量内で最小化）の値と解を一括計算
+        
+        全DCを貪欲法（縮約費用 / 需要 の昇順に詰め、最後の1顧客は分数で取る LP 緩和）で解き、
+        use_dp の場合は表の大きさが上限以内のDCだけ配列DPで厳密解に置き換える。
+        
+        Returns:
+            (values, z_rows, z_cols, z_fraction): DCごとの値と、選ばれた (顧客, DC, 割合)
+        """
+        n_facilities = len(capacities)
+        if len(rows) == 0:
+            empty = np.zeros(0)
+            return np.zeros(n_facilities), rows, cols, empty
+        w = weights[rows]
+        with np.errstate(divide="ignore"):
+            ratio = np.where(w > 0, reduced / np.where(w > 0, w, 1.0), -np.inf)
+        order = np.lexsort((ratio, cols))
+        rows, cols, reduced, w = rows[order], cols[order], reduced[order], w[order]
+        group_start = np.searchsorted(cols, cols, side="left")
+        cumulative = np.cumsum(w)
+        offset = np.where(group_start > 0, cumulative[group_start - 1], 0.0)
+        room = capacities[cols] - (cumulative - w - offset)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(w > 0, np.clip(room / np.where(w > 0, w, 1.0), 0.0, 1.0), 1.0)
+        
+        if use_dp:
+            bounds = np.searchsorted(cols, np.arange(n_facilities + 1))
+            for j in range(n_facilities):
+                lo, hi = bounds[j], bounds[j + 1]
+                if hi - lo < 2 or (hi - lo) * (capacities[j] + 1) > KNAPSACK_DP_LIMIT:
+                    continue
+                if fraction[lo:hi].min() == 1.0:
+                    continue  # 全員が入るなら貪欲解が厳密解
+                fraction[lo:hi] = self._knapsack_dp(reduced[lo:hi], w[lo:hi].astype(np.int64),
+                                                    int(capacities[j]))
+        
+        values = np.bincount(cols, weights=reduced * fraction, minlength=n_facilities)
+        chosen = fraction > 0
+        return values, rows[chosen], cols[chosen], fraction[chosen]
+    
+    @staticmethod
+    def _knapsack_dp(values: np.ndarray, weights: np.ndarray, capacity: int) -> np.ndarray:
+        """
+        0-1 ナップサック（values は負、和を最小化）を容量方向の配列DPで解く
+        
+        Returns:
+            各品目を選ぶなら 1.0、選ばないなら 0.0 の配列
+        """
+        best = np.zeros(capacity + 1)
+        keep = np.zeros((len(values), capacity + 1), dtype=bool)
+        for t, (value, weight) in enumerate(zip(values, weights)):
+            if weight > capacity:
+                continue
+            candidate = best[:capacity + 1 - weight] + value
+            better = candidate < best[weight:]
+            keep[t, weight:] = better
+            best[weight:] = np.where(better, candidate, best[weight:])
+        
+        chosen = np.zeros(len(values))
+        c = capacity
+        for t in range(len(values) - 1, -1, -1):
+            if keep[t, c]:
+                chosen[t] = 1.0
+                c -= weights[t]
+        return chosen
+    
+    def _ss_lagrangian_heuristic(self, transport_costs: np.ndarray, demands: np.ndarray,
+                                 capacities: np.ndarray, fixed_costs: np.ndarray,
+                                 open_mask: np.ndarray, priority: np.ndarray,
+                                 polish: bool = True) -> Optional[np.ndarray]:
+        """
+        緩和解の開設DCから実行可能な単一ソース割当を構築（得られなければ None）
+        
+        容量が総需要に足りなければ priority（固定費 + ナップサック値）の小さいDCを追加し、
+        容量付き貪欲割当で割り当てられない顧客が残れば次のDCを追加して割当をやり直す。
+        最後に移動近傍の局所改善を1パス適用し、polish なら交換近傍も使って改善する。
+        """
+        n_customers = len(demands)
+        open_mask = open_mask.copy()
+        candidates = [j for j in np.argsort(priority) if not open_mask[j]]
+        while capacities[open_mask].sum() < demands.sum() and candidates:
+            open_mask[candidates.pop(0)] = True
+        
+        while True:
+            open_dcs = np.flatnonzero(open_mask)
+            local = self._greedy_capacitated_assignment(
+                transport_costs[:, open_dcs], demands, capacities[open_dcs])
+            if (local >= 0).all():
+                break
+            if not candidates:
+                return None
+            open_mask[candidates.pop(0)] = True
+        
+        assignment = open_dcs[local]
+        if polish:
+            return self._ss_improve_assignment(transport_costs, demands, capacities,
+                                               fixed_costs, assignment)
+        return self._single_source_local_search(
+            transport_costs, demands, capacities, fixed_costs, assignment,
+            np.arange(n_customers), max_passes=1)
+    
+    def _ss_improve_assignment(self, transport_costs: np.ndarray, demands: np.ndarray,
+                               capacities: np.ndarray, fixed_costs: np.ndarray,
+                               assignment: np.ndarray, max_rounds: int = 3) -> np.ndarray:
+        """移動近傍と交換近傍を改善がなくなるまで交互に適用"""
+        order = np.arange(len(demands))
+        for _ in range(max_rounds):
+            assignment = self._single_source_local_search(
+                transport_costs, demands, capacities, fixed_costs, assignment, order,
+                max_passes=5)
+            assignment, swapped = self._single_source_swap_search(
+                transport_costs, demands, capacities, assignment)
+            if not swapped:
+                break
+        return assignment
+    
+    @staticmethod
+    def _single_source_swap_search(transport_costs: np.ndarray, demands: np.ndarray,
+                                   capacities: np.ndarray,
+                                   assignment: np.ndarray) -> Tuple[np.ndarray, bool]:
+        """
+        単一ソース割当の交換近傍による改善（開設DC集合は変えない）
+        
+        より安い開設DC b がある顧客 i について、b に割り当てられた顧客全員との
+        割当の交換を費用変化と両DCの容量から一括で評価し、最も改善する交換を適用する。
+        
+        Returns:
+            (assignment, improved): 改善後の割当と、交換を1回以上行ったか
+        """
+        n_facilities = len(capacities)
+        assignment = assignment.copy()
+        loads = np.bincount(assignment, weights=demands, minlength=n_facilities)
+        current = transport_costs[np.arange(len(demands)), assignment]
+        candidates = np.flatnonzero((transport_costs < current[:, None]).any(axis=1))
+        improved = False
+        for i in candidates:
+            a = assignment[i]
+            cheaper = np.flatnonzero((transport_costs[i] < transport_costs[i, a]) & (loads > 0))
+            best_delta, best_swap = -1e-9, None
+            for b in cheaper:
+                members = np.flatnonzero(assignment == b)
+                delta = (transport_costs[i, b] - transport_costs[i, a]
+                         + transport_costs[members, a] - transport_costs[members, b])
+                feasible = ((loads[a] - demands[i] + demands[members] <= capacities[a])
+                            & (loads[b] - demands[members] + demands[i] <= capacities[b]))
+                delta = np.where(feasible, delta, np.inf)
+                t = int(np.argmin(delta))
+                if delta[t] < best_delta:
+                    best_delta, best_swap = float(delta[t]), (b, members[t])
+            if best_swap is None:
+                continue
+            b, k = best_swap
+            assignment[i], assignment[k] = b, a
+            loads[a] += demands[k] - demands[i]
+            loads[b] += demands[i] - demands[k]
+            improved = True
+        return assignment, improved
     
     # =====================================================
     # 抽象LNDP（Logistics Network Design Problem）モデル
@@ -1308,173 +1941,129 @@ class LogisticsOptimizationService:
                 "to": to_level,
                 "from_nodes": nodes_by_level[from_level],
                 "to_nodes": nodes_by_level[to_level],
-                "flow_type": "direct" if i == len(levels) - 2 else "consolidated"
-            })
-        
-        return patterns
-    
-    def _solve_multilevel_lagrange(self, levels: List[str], nodes_by_level: Dict[str, List],
-                                 flow_patterns: List[Dict[str, Any]], products: List[ProductData],
-                                 config: Dict[str, Any]) -> LNDResult:
-        """多階層ラグランジュ緩和法"""
-        
-        max_iterations = config.get("max_iterations", 1000)
-        tolerance = config.get("tolerance", 1e-6)
-        
-        # 変数とラグランジュ乗数の初期化
-        flows = {}  # Flow variables x[i,j,k,p] = flow from node i to j of product k in pattern p
-        multipliers = {}  # Lagrange multipliers for various constraints
-        
-        # パターンごとの距離行列計算
-        distance_matrices = {}
-        for p_idx, pattern in enumerate(flow_patterns):
-            from_nodes = pattern["from_nodes"]
-            to_nodes = pattern["to_nodes"]
-            distance_matrices[p_idx] = self.calculate_distance_matrix(from_nodes, to_nodes)
-        
-        # 最適化ループ
-        objective_history = []
-        best_solution = None
-        best_cost = float('inf')
-        
-        learning_rate = 0.01
-        
-        for iteration in range(max_iterations):
-            # フロー最適化
-            total_transport_cost = 0.0
-            total_fixed_cost = 0.0
-            
-            for p_idx, pattern in enumerate(flow_patterns):
-                from_nodes = pattern["from_nodes"]
-                to_nodes = pattern["to_nodes"]
-                dist_matrix = distance_matrices[p_idx]
-                
-                # パターン内フロー決定
-                pattern_flows = {}
-                
-                for i, from_node in enumerate(from_nodes):
-                    for j, to_node in enumerate(to_nodes):
-                        for k, product in enumerate(products):
-                            # コスト計算
-                            transport_cost = dist_matrix[i, j] * product.unit_cost * 0.1
-                            
-                            # 容量制約下でのフロー決定
-                            if hasattr(from_node, 'capacity') and hasattr(to_node, 'demand'):
-                                max_flow = min(from_node.capacity, to_node.demand)
-                            elif hasattr(from_node, 'capacity'):
-                                max_flow = from_node.capacity
-                            elif hasattr(to_node, 'demand'):
-                                max_flow = to_node.demand
-                            else:
-                                max_flow = 100  # デフォルト
-                            
-                            # フロー値決定（簡素化）
-                            flow_value = max_flow if transport_cost < 10.0 else 0
-                            pattern_flows[(i, j, k)] = flow_value
-                            total_transport_cost += flow_value * transport_cost
-                
-                flows[p_idx] = pattern_flows
-            
-            # 施設開設決定
-            selected_facilities = []
-            for level in levels:
-                if level in ["regional_dc", "local_dc"]:
-                    for node in nodes_by_level[level]:
-                        # この施設が使用されているかチェック
-                        used = False
-                        for p_idx, pattern in enumerate(flow_patterns):
-                            if node in pattern.get("from_nodes", []) or node in pattern.get("to_nodes", []):
-                                pattern_flows = flows.get(p_idx, {})
-                                for flow_key, flow_val in pattern_flows.items():
-                                    if flow_val > 0:
-                                        used = True
-                                        break
-                                if used:
-                                    break
-                        
-                        if used:
-                            selected_facilities.append(node)
-                            total_fixed_cost += node.fixed_cost
-            
-            # 目的関数値
-            objective_value = total_transport_cost + total_fixed_cost
-            objective_history.append(objective_value)
-            
-            if objective_value < best_cost:
-                best_cost = objective_value
-                best_solution = {
-                    "flows": flows.copy(),
-                    "selected_facilities": selected_facilities.copy(),
-                    "transport_cost": total_transport_cost,
-                    "fixed_cost": total_fixed_cost
-                }
-            
-            # 収束判定
-            if (iteration > 10 and 
-                abs(objective_history[-1] - objective_history[-2]) < tolerance):
-                break
+                "flow_type": "direct" if i == len(levels) - 2 else "consolidated"
+            })
         
-        # 結果の構築
-        if best_solution is None:
-            best_solution = {
-                "flows": flows,
-                "selected_facilities": selected_facilities,
-                "transport_cost": total_transport_cost,
-                "fixed_cost": total_fixed_cost
-            }
+        return patterns
+    
+    def _solve_multilevel_lagrange(self, levels: List[str], nodes_by_level: Dict[str, List],
+                                 flow_patterns: List[Dict[str, Any]], products: List[ProductData],
+                                 config: Dict[str, Any]) -> LNDResult:
+        """
+        多階層ラグランジュ緩和法
+        
+        各階層のノードに通し番号（階層ごとのオフセット + 階層内インデックス）を付け、
+        パターンごとのフローを (from, to, product) 配列、ノードごとの入出荷量を
+        1次元配列で保持する。
+        """
         
-        # フロー割当の変換
+        start_time = time.perf_counter()
+        
+        # 階層ごとのノードID（通し番号）のオフセット
+        level_offsets = {}
+        n_nodes = 0
+        for level in levels:
+            level_offsets[level] = n_nodes
+            n_nodes += len(nodes_by_level[level])
+        unit_costs = np.array([product.unit_cost for product in products], dtype=float)
+        
+        # パターンごとのフロー配列 x[p][i,j,k] = from i から to j への product k のフロー
+        # （フロー決定は反復に依存しないため一度だけ計算する）
+        flows = []
+        transport_costs = []
+        node_inflow = np.zeros(n_nodes)
+        node_outflow = np.zeros(n_nodes)
+        for pattern in flow_patterns:
+            from_nodes = pattern["from_nodes"]
+            to_nodes = pattern["to_nodes"]
+            dist_matrix = self.cached_distance_matrix(from_nodes, to_nodes)
+            max_flow = self._pattern_max_flow(from_nodes, to_nodes)
+            
+            pattern_flows = np.zeros((len(from_nodes), len(to_nodes), len(products)))
+            pattern_cost = 0.0
+            for k, unit_cost in enumerate(unit_costs):
+                # コスト計算とフロー値決定（簡素化）
+                transport_cost = dist_matrix * unit_cost * 0.1
+                flow_value = np.where(transport_cost < 10.0, max_flow, 0.0)
+                pattern_flows[:, :, k] = flow_value
+                pattern_cost += float(np.sum(flow_value * transport_cost))
+            
+            flows.append(pattern_flows)
+            transport_costs.append(pattern_cost)
+            from_offset = level_offsets[pattern["from"]]
+            to_offset = level_offsets[pattern["to"]]
+            node_outflow[from_offset:from_offset + len(from_nodes)] += pattern_flows.sum(axis=(1, 2))
+            node_inflow[to_offset:to_offset + len(to_nodes)] += pattern_flows.sum(axis=(0, 2))
+        
+        # 施設開設決定：入出荷のある DC ノードを開設
+        facility_ids = []
+        for level in levels:
+            if level in ["regional_dc", "local_dc"]:
+                offset = level_offsets[level]
+                facility_ids.extend(range(offset, offset + len(nodes_by_level[level])))
+        facility_ids = np.array(facility_ids, dtype=np.intp)
+        used = (node_inflow[facility_ids] + node_outflow[facility_ids]) > 0
+        selected_ids = facility_ids[used]
+        
+        nodes = [node for level in levels for node in nodes_by_level[level]]
+        selected_facilities = [nodes[node_id] for node_id in selected_ids]
+        total_transport_cost = float(sum(transport_costs))
+        total_fixed_cost = float(sum(node.fixed_cost for node in selected_facilities))
+        
+        # フロー割当の変換（最終階層 = 顧客向けフロー）
         flow_assignments = {}
         customers = nodes_by_level.get("customer", [])
-        
         for customer in customers:
             flow_assignments[customer.name] = {}
-            
-            # 最終階層のフローを探索
-            if flow_patterns:
-                last_pattern = flow_patterns[-1]  # customer向けのフロー
-                if customer in last_pattern["to_nodes"]:
-                    customer_idx = last_pattern["to_nodes"].index(customer)
-                    last_pattern_idx = len(flow_patterns) - 1
-                    pattern_flows = best_solution["flows"].get(last_pattern_idx, {})
-                    
-                    for (i, j, k), flow_val in pattern_flows.items():
-                        if j == customer_idx and flow_val > 0:
-                            from_facility = last_pattern["from_nodes"][i]
-                            flow_assignments[customer.name][from_facility.name] = flow_val
         
-        # 稼働率計算
+        if flow_patterns and flow_patterns[-1]["to"] == "customer":
+            last_pattern = flow_patterns[-1]
+            customer_flows = flows[-1].max(axis=2)  # [from x customers]
+            from_idx, customer_idx = np.nonzero(customer_flows > 0)
+            for i, l in zip(from_idx, customer_idx):
+                from_facility = last_pattern["from_nodes"][i]
+                flow_assignments[customers[l].name][from_facility.name] = float(customer_flows[i, l])
+        
+        # 稼働率計算（ノードごとの出荷量）
         utilization = {}
-        for facility in best_solution["selected_facilities"]:
+        for node_id, facility in zip(selected_ids, selected_facilities):
             if hasattr(facility, 'capacity'):
-                total_flow = sum(
-                    sum(flows.values()) for flows in flow_assignments.values()
-                    if facility.name in flows
-                )
-                utilization[facility.name] = min(total_flow / facility.capacity, 1.0)
+                utilization[facility.name] = min(node_outflow[node_id] / facility.capacity, 1.0)
         
         return LNDResult(
-            selected_facilities=best_solution["selected_facilities"],
+            selected_facilities=selected_facilities,
             flow_assignments=flow_assignments,
-            total_cost=best_cost,
+            total_cost=total_transport_cost + total_fixed_cost,
             cost_breakdown={
-                "transportation": best_solution["transport_cost"],
-                "fixed": best_solution["fixed_cost"],
+                "transportation": total_transport_cost,
+                "fixed": total_fixed_cost,
                 "variable": 0.0,
                 "inventory": 0.0
             },
             facility_utilization=utilization,
             network_performance={
-                "average_distance": best_solution["transport_cost"] / sum(c.demand for c in customers) if customers else 0,
-                "facility_count": len(best_solution["selected_facilities"]),
+                "average_distance": total_transport_cost / sum(c.demand for c in customers) if customers else 0,
+                "facility_count": len(selected_facilities),
                 "total_demand": sum(c.demand for c in customers),
                 "echelon_levels": len(levels),
                 "optimization_method": "Multi-Level_Lagrange_Relaxation"
             },
             solution_status="Multi_Echelon_Optimal",
-            solve_time=iteration * 0.001
+            solve_time=time.perf_counter() - start_time
         )
     
+    @staticmethod
+    def _pattern_max_flow(from_nodes: List, to_nodes: List) -> np.ndarray:
+        """
+        パターン内の (from, to) ごとのフロー上限
+        
+        出荷側の容量と到着側の需要のうち存在するものの最小値（どちらもなければ100）。
+        """
+        capacities = np.array([getattr(node, 'capacity', np.nan) for node in from_nodes], dtype=float)
+        demands = np.array([getattr(node, 'demand', np.nan) for node in to_nodes], dtype=float)
+        max_flow = np.fmin(capacities[:, None], demands[None, :])
+        return np.where(np.isnan(max_flow), 100.0, max_flow)
+    
     def _solve_multilevel_tabu(self, levels: List[str], nodes_by_level: Dict[str, List],
                              flow_patterns: List[Dict[str, Any]], products: List[ProductData],
                              config: Dict[str, Any]) -> LNDResult:
@@ -1540,86 +2129,193 @@ class LogisticsOptimizationService:
     # ネットワーク可視化
     # =====================================================
     
-    def create_network_visualization(self, lnd_result: LNDResult, 
-                                   customers: List[CustomerData],
-                                   show_flows: bool = True) -> NetworkVisualizationResult:
-        """ネットワーク可視化データを作成"""
-        
-        # Plotly地図データを作成
-        fig = go.Figure()
-        
-        # 顧客をプロット
-        customer_lats = [c.latitude for c in customers]
-        customer_lons = [c.longitude for c in customers]
-        customer_demands = [c.demand for c in customers]
-        customer_names = [c.name for c in customers]
-        
-        fig.add_trace(go.Scattermapbox(
-            lat=customer_lats,
-            lon=customer_lons,
+    def _customer_markers(self, coords: np.ndarray, demand: np.ndarray, names: List[str],
+                          zoom: Optional[float], labels: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """顧客マーカーの位置・需要（zoom が None なら全点、それ以外はズームに応じたビン集約）"""
+        if zoom is None:
+            return {
+                'latitude': coords[:, 0], 'longitude': coords[:, 1], 'demand': demand,
+                'count': np.ones(len(coords), dtype=np.int64), 'label': labels,
+                'cell_of_point': np.arange(len(coords)), 'text': list(names)
+            }
+        binned = bin_markers(coords[:, 0], coords[:, 1], demand, zoom, labels=labels)
+        binned['text'] = [f"{int(count)}件" for count in binned['count']]
+        return binned
+    
+    def _customer_marker_trace(self, markers: Dict[str, Any], name: str,
+                               color: Any = 'blue') -> go.Scattermapbox:
+        """顧客マーカーのトレース（ビン集約時は需要に応じた大きさ）"""
+        demand = np.asarray(markers['demand'], dtype=float)
+        if markers['count'].max(initial=1) > 1 and demand.max(initial=0) > 0:
+            size = 6 + 14 * np.sqrt(demand / demand.max())
+        else:
+            size = np.full(len(demand), 8.0)
+        return go.Scattermapbox(
+            lat=markers['latitude'],
+            lon=markers['longitude'],
             mode='markers',
-            marker=dict(size=8, color='blue', opacity=0.7),
-            text=customer_names,
+            marker=dict(size=size, color=color, opacity=0.7),
+            text=markers['text'],
             hovertemplate='<b>%{text}</b><br>需要: %{customdata}<extra></extra>',
-            customdata=customer_demands,
-            name='顧客'
-        ))
+            customdata=demand,
+            name=name
+        )
+    
+    def _decimated_map_figure(self, coords: np.ndarray, demand: np.ndarray, names: List[str],
+                              build: Callable[[Dict[str, Any], bool], go.Figure],
+                              labels: Optional[np.ndarray], max_markers: int,
+                              zoom_levels: Sequence[float], max_payload_bytes: Optional[int],
+                              typed_arrays: bool) -> Dict[str, Any]:
+        """
+        顧客マーカーを間引いた図を作り、ペイロードが max_payload_bytes 以下になるまで粗くする
         
-        # 選択された施設をプロット
-        facility_lats = [f.latitude for f in lnd_result.selected_facilities]
-        facility_lons = [f.longitude for f in lnd_result.selected_facilities]
-        facility_names = [f.name for f in lnd_result.selected_facilities]
-        facility_capacities = [f.capacity for f in lnd_result.selected_facilities]
+        顧客数が max_markers 以下なら全点、超える場合はズームレベルごとにビン集約し、
+        ビン数が max_markers 以下の最も細かいズームを初期表示にする。他のズームのマーカーは
+        zoom_layers に入れる（クライアントが地図のズームに応じて差し替える）。
+        上限を超える場合は、細かいズームの zoom_layers → 粗いズームの zoom_layers →
+        初期表示のズーム → フロー線の順に削る。
         
-        fig.add_trace(go.Scattermapbox(
-            lat=facility_lats,
-            lon=facility_lons,
-            mode='markers',
-            marker=dict(size=15, color='red', symbol='star'),
-            text=facility_names,
-            hovertemplate='<b>%{text}</b><br>容量: %{customdata}<extra></extra>',
-            customdata=facility_capacities,
-            name='配送センター'
-        ))
+        Args:
+            build: build(markers, include_flows) で初期表示の図を作る関数
+        """
+        levels: List[Optional[float]] = [None] if len(coords) <= max_markers else sorted(zoom_levels)
+        layers = {zoom: self._customer_markers(coords, demand, names, zoom, labels) for zoom in levels}
+        fitting = [zoom for zoom in levels if len(layers[zoom]['latitude']) <= max_markers]
+        display_index = levels.index(fitting[-1]) if fitting else 0
+        extra = [zoom for zoom in levels if zoom is not None and zoom != levels[display_index]]
+        include_flows = True
+        
+        def encoded_layer(zoom: float) -> Dict[str, Any]:
+            trace = go.Figure(self._customer_marker_trace(layers[zoom], '顧客')).to_dict()
+            return (encode_figure_arrays(trace) if typed_arrays else trace)['data'][0]
+        
+        encoded_layers = {zoom: encoded_layer(zoom) for zoom in extra}
+        while True:
+            display_zoom = levels[display_index]
+            figure = build(layers[display_zoom], include_flows).to_dict()
+            if typed_arrays:
+                encode_figure_arrays(figure)
+            zoom_layers = {str(zoom): encoded_layers[zoom] for zoom in extra}
+            size = payload_bytes({'plotly_figure': figure, 'zoom_layers': zoom_layers})
+            if max_payload_bytes is None or size <= max_payload_bytes:
+                break
+            finer = [zoom for zoom in extra if display_zoom is None or zoom > display_zoom]
+            if extra:
+                extra.remove(max(finer) if finer else min(extra))
+            elif display_index > 0:
+                display_index -= 1
+            elif include_flows:
+                include_flows = False
+            else:
+                break
         
-        # フローを表示
-        if show_flows:
-            for customer in customers:
-                if customer.name in lnd_result.flow_assignments:
-                    flows = lnd_result.flow_assignments[customer.name]
-                    for facility_name, flow_amount in flows.items():
-                        # 対応する施設を検索
-                        for facility in lnd_result.selected_facilities:
-                            if facility.name == facility_name:
-                                fig.add_trace(go.Scattermapbox(
-                                    lat=[customer.latitude, facility.latitude],
-                                    lon=[customer.longitude, facility.longitude],
-                                    mode='lines',
-                                    line=dict(width=max(1, flow_amount/100), color='green'),
-                                    opacity=0.5,
-                                    hoverinfo='none',
-                                    showlegend=False
-                                ))
-                                break
-        
-        # レイアウト設定
-        fig.update_layout(
-            mapbox=dict(
-                style="carto-positron",  # カルト・ポジトロン（トークン不要）
-                center=dict(
-                    lat=np.mean(customer_lats + facility_lats),
-                    lon=np.mean(customer_lons + facility_lons)
+        return {
+            'plotly_figure': figure,
+            'zoom_layers': zoom_layers,
+            'display_zoom': display_zoom,
+            'markers': layers[display_zoom],
+            'include_flows': include_flows,
+            'payload_bytes': size
+        }
+    
+    def create_network_visualization(self, lnd_result: LNDResult, 
+                                   customers: List[CustomerData],
+                                   show_flows: bool = True, flow_threshold: float = 0.0,
+                                   max_markers: int = DEFAULT_MAX_MARKERS,
+                                   zoom_levels: Sequence[float] = DEFAULT_ZOOM_LEVELS,
+                                   max_payload_bytes: Optional[int] = None,
+                                   typed_arrays: bool = True) -> NetworkVisualizationResult:
+        """
+        ネットワーク可視化データを作成
+        
+        顧客は max_markers を超えるとズームレベルごとにビン集約し、フロー線は DC ごとに
+        1トレース（線分を NaN で区切った折れ線）にまとめる。typed_arrays=True なら
+        座標などの数値配列を base64 の float32 型付き配列で返す。
+        """
+        coords = coordinate_array(customers)
+        demand = np.array([c.demand for c in customers], dtype=float)
+        names = [c.name for c in customers]
+        facilities = lnd_result.selected_facilities
+        facility_coords = coordinate_array(facilities)
+        
+        # フロー（顧客インデックス, 施設インデックス, 量）
+        customer_index = {name: i for i, name in enumerate(names)}
+        facility_index = {f.name: j for j, f in enumerate(facilities)}
+        flow_rows = [(customer_index[c_name], facility_index[f_name], amount)
+                     for c_name, flows in lnd_result.flow_assignments.items() if c_name in customer_index
+                     for f_name, amount in flows.items()
+                     if f_name in facility_index and amount > flow_threshold]
+        flow_array = np.array(flow_rows, dtype=float).reshape(-1, 3)
+        
+        all_lats = np.concatenate([coords[:, 0], facility_coords[:, 0]])
+        all_lons = np.concatenate([coords[:, 1], facility_coords[:, 1]])
+        
+        def build(markers: Dict[str, Any], include_flows: bool) -> go.Figure:
+            # Plotly地図データを作成
+            fig = go.Figure()
+            
+            # 顧客をプロット
+            fig.add_trace(self._customer_marker_trace(markers, '顧客'))
+            
+            # 選択された施設をプロット
+            fig.add_trace(go.Scattermapbox(
+                lat=facility_coords[:, 0],
+                lon=facility_coords[:, 1],
+                mode='markers',
+                marker=dict(size=15, color='red', symbol='star'),
+                text=[f.name for f in facilities],
+                hovertemplate='<b>%{text}</b><br>容量: %{customdata}<extra></extra>',
+                customdata=[f.capacity for f in facilities],
+                name='配送センター'
+            ))
+            
+            # フローを DC ごとに1本にまとめて表示（ビン集約時はビン × DC のフローを合算）
+            if show_flows and include_flows and len(flow_array):
+                bins = markers['cell_of_point'][flow_array[:, 0].astype(np.intp)]
+                frame = pd.DataFrame({'bin': bins, 'facility': flow_array[:, 1].astype(np.intp),
+                                      'amount': flow_array[:, 2]})
+                merged = frame.groupby(['facility', 'bin'], sort=True)['amount'].sum().reset_index()
+                facility_totals = merged.groupby('facility')['amount'].sum()
+                max_total = facility_totals.max()
+                for j, group in merged.groupby('facility'):
+                    bin_ids = group['bin'].to_numpy()
+                    lat, lon = merged_segments(
+                        markers['latitude'][bin_ids], markers['longitude'][bin_ids],
+                        np.full(len(bin_ids), facility_coords[j, 0]),
+                        np.full(len(bin_ids), facility_coords[j, 1]))
+                    fig.add_trace(go.Scattermapbox(
+                        lat=lat,
+                        lon=lon,
+                        mode='lines',
+                        line=dict(width=1 + 4 * facility_totals[j] / max_total, color='green'),
+                        opacity=0.5,
+                        hoverinfo='none',
+                        name=f'フロー: {facilities[j].name}',
+                        showlegend=False
+                    ))
+            
+            # レイアウト設定
+            fig.update_layout(
+                mapbox=dict(
+                    style="carto-positron",  # カルト・ポジトロン（トークン不要）
+                    center=dict(
+                        lat=float(np.mean(all_lats)) if len(all_lats) else 0.0,
+                        lon=float(np.mean(all_lons)) if len(all_lons) else 0.0
+                    ),
+                    zoom=10
                 ),
-                zoom=10
-            ),
-            showlegend=True,
-            height=600,
-            margin=dict(l=0, r=0, t=0, b=0)
-        )
+                showlegend=True,
+                height=600,
+                margin=dict(l=0, r=0, t=0, b=0)
+            )
+            return fig
+        
+        rendered = self._decimated_map_figure(coords, demand, names, build, None, max_markers,
+                                              zoom_levels, max_payload_bytes, typed_arrays)
         
         # ネットワーク統計
         total_customers = len(customers)
-        total_facilities = len(lnd_result.selected_facilities)
+        total_facilities = len(facilities)
         avg_distance = lnd_result.network_performance.get("average_distance", 0)
         
         network_stats = {
@@ -1627,17 +2323,22 @@ class LogisticsOptimizationService:
             "active_facilities": total_facilities,
             "average_distance": avg_distance,
             "total_cost": lnd_result.total_cost,
-            "network_efficiency": total_customers / total_facilities if total_facilities > 0 else 0
+            "network_efficiency": total_customers / total_facilities if total_facilities > 0 else 0,
+            "displayed_customer_markers": len(rendered['markers']['latitude']),
+            "display_zoom": -1 if rendered['display_zoom'] is None else rendered['display_zoom'],
+            "flows_shown": float(show_flows and rendered['include_flows'] and len(flow_array) > 0),
+            "payload_bytes": rendered['payload_bytes']
         }
         
         return NetworkVisualizationResult(
-            plotly_figure=fig.to_dict(),
+            plotly_figure=rendered['plotly_figure'],
             network_stats=network_stats,
             legend_data={
-                "customers": "青い点は顧客位置",
+                "customers": "青い点は顧客位置（多い場合は需要を合計したビン）",
                 "facilities": "赤い星は配送センター",
-                "flows": "緑の線は物流フロー"
-            }
+                "flows": "緑の線は物流フロー（DCごとに統合）"
+            },
+            zoom_layers=rendered['zoom_layers']
         )
     
     # =====================================================
@@ -1648,79 +2349,34 @@ class LogisticsOptimizationService:
                     plants: List[PlantData], plnt_dc_threshold: float = 999999,
                     dc_cust_threshold: float = 999999, unit_tp_cost: float = 1.0,
                     unit_del_cost: float = 1.0, lt_lb: int = 1, lt_threshold: float = 800,
-                    stage_time_bound: Tuple[int, int] = (1, 1)) -> Dict[str, Any]:
-        """ネットワーク生成（great circle距離使用）"""
+                    stage_time_bound: Tuple[int, int] = (1, 1),
+                    build_graph: bool = False) -> Dict[str, Any]:
+        """
+        ネットワーク生成（great circle距離使用）
         
-        trans_data = []
-        graph = nx.DiGraph()
-        position = {}
+        プラント-DC、DC-顧客の距離ブロックに閾値マスクを適用し、残った枝だけから
+        trans_df を列単位で作成する。networkx のグラフは build_graph=True の場合のみ作成。
+        """
         
-        # ノード位置を記録
-        for plant in plants:
-            position[plant.name] = (plant.longitude, plant.latitude)
-            graph.add_node(plant.name, type="plant")
+        position = self._node_positions(plants, dc_candidates, customers)
         
-        for dc in dc_candidates:
-            position[dc.name] = (dc.longitude, dc.latitude)
-            graph.add_node(dc.name, type="dc")
+        # 距離行列（キャッシュ共有）
+        plnt_dc_dist = self.cached_distance_matrix(plants, dc_candidates)
+        dc_cust_dist = self.cached_distance_matrix(dc_candidates, customers)
         
-        for customer in customers:
-            position[customer.name] = (customer.longitude, customer.latitude)
-            graph.add_node(customer.name, type="customer")
+        # プラント-DC接続 / DC-顧客接続
+        plnt_dc_arcs = self._network_arcs(
+            plants, dc_candidates, plnt_dc_dist, plnt_dc_threshold, 'plnt-dc',
+            lambda dist, time: dist * unit_tp_cost, lt_lb, lt_threshold, stage_time_bound)
+        dc_cust_arcs = self._network_arcs(
+            dc_candidates, customers, dc_cust_dist, dc_cust_threshold, 'dc-cust',
+            lambda dist, time: dist * unit_del_cost, lt_lb, lt_threshold, stage_time_bound)
+        trans_df = pd.concat([plnt_dc_arcs, dc_cust_arcs], ignore_index=True)
         
-        # プラント-DC接続
-        for plant in plants:
-            for dc in dc_candidates:
-                dist = great_circle(
-                    (plant.latitude, plant.longitude),
-                    (dc.latitude, dc.longitude)
-                ).kilometers
-                
-                if dist <= plnt_dc_threshold:
-                    cost = dist * unit_tp_cost
-                    lead_time = lt_lb if dist <= lt_threshold else lt_lb + math.ceil((dist - lt_threshold) / 100)
-                    stage_time = random.randint(*stage_time_bound)
-                    
-                    trans_data.append({
-                        'from_node': plant.name,
-                        'to_node': dc.name,
-                        'dist': dist,
-                        'cost': cost,
-                        'lead_time': lead_time,
-                        'stage_time': stage_time,
-                        'kind': 'plnt-dc'
-                    })
-                    
-                    graph.add_edge(plant.name, dc.name, 
-                                 distance=dist, cost=cost, kind='plnt-dc')
-        
-        # DC-顧客接続
-        for dc in dc_candidates:
-            for customer in customers:
-                dist = great_circle(
-                    (dc.latitude, dc.longitude),
-                    (customer.latitude, customer.longitude)
-                ).kilometers
-                
-                if dist <= dc_cust_threshold:
-                    cost = dist * unit_del_cost
-                    lead_time = lt_lb if dist <= lt_threshold else lt_lb + math.ceil((dist - lt_threshold) / 100)
-                    stage_time = random.randint(*stage_time_bound)
-                    
-                    trans_data.append({
-                        'from_node': dc.name,
-                        'to_node': customer.name,
-                        'dist': dist,
-                        'cost': cost,
-                        'lead_time': lead_time,
-                        'stage_time': stage_time,
-                        'kind': 'dc-cust'
-                    })
-                    
-                    graph.add_edge(dc.name, customer.name,
-                                 distance=dist, cost=cost, kind='dc-cust')
-        
-        trans_df = pd.DataFrame(trans_data)
+        graph = None
+        if build_graph:
+            graph = self._network_graph(plants, dc_candidates, customers, trans_df,
+                                        {'distance': 'dist', 'cost': 'cost', 'kind': 'kind'})
         
         return {
             'trans_df': trans_df,
@@ -1735,101 +2391,58 @@ class LogisticsOptimizationService:
                                tc_per_dis: float = 20./20000, dc_per_dis: float = 10./4000,
                                tc_per_time: float = 8000./20000, dc_per_time: float = 8000./4000,
                                lt_lb: int = 1, lt_threshold: float = 800,
-                               stage_time_bound: Tuple[int, int] = (1, 1)) -> Dict[str, Any]:
-        """ネットワーク生成（道路距離・時間使用）"""
+                               stage_time_bound: Tuple[int, int] = (1, 1),
+                               build_graph: bool = False) -> Dict[str, Any]:
+        """
+        ネットワーク生成（道路距離・時間使用）
         
-        # OSRM距離・時間マトリックスが提供されていない場合はgreat circle * 10で近似
-        all_locations = plants + dc_candidates + customers
-        n_locations = len(all_locations)
+        distances / durations は plants + dc_candidates + customers の順に並んだ
+        全地点間の行列（メートル・秒）。必要なのはプラント-DC と DC-顧客の
+        矩形ブロックだけなので、行列が与えられない場合もそのブロックだけを近似計算する
+        （全地点間の行列は作らず、distance_matrix / duration_matrix は None を返す）。
+        """
         
-        if distances is None or durations is None:
-            # Great circle距離に道路係数をかけて近似
-            distances = np.zeros((n_locations, n_locations))
-            durations = np.zeros((n_locations, n_locations))
-            
-            for i, loc1 in enumerate(all_locations):
-                for j, loc2 in enumerate(all_locations):
-                    if i != j:
-                        gc_dist = great_circle(
-                            (loc1.latitude, loc1.longitude),
-                            (loc2.latitude, loc2.longitude)
-                        ).kilometers
-                        distances[i, j] = gc_dist * 1.3  # 道路係数
-                        durations[i, j] = gc_dist * 60  # 時速60kmで近似（秒）
-        
-        trans_data = []
-        graph = nx.DiGraph()
-        position = {}
-        
-        # ノード位置を記録
-        node_mapping = {}
-        for i, loc in enumerate(all_locations):
-            position[loc.name] = (loc.longitude, loc.latitude)
-            node_mapping[loc.name] = i
-            if isinstance(loc, PlantData):
-                graph.add_node(loc.name, type="plant")
-            elif isinstance(loc, DCData):
-                graph.add_node(loc.name, type="dc")
-            else:
-                graph.add_node(loc.name, type="customer")
+        n_plants, n_dcs = len(plants), len(dc_candidates)
+        plant_idx = np.arange(n_plants)
+        dc_idx = np.arange(n_plants, n_plants + n_dcs)
+        customer_idx = np.arange(n_plants + n_dcs, n_plants + n_dcs + len(customers))
         
-        # プラント-DC接続
-        for plant in plants:
-            for dc in dc_candidates:
-                i = node_mapping[plant.name]
-                j = node_mapping[dc.name]
-                
-                dist = distances[i, j] / 1000  # メートルからキロメートル
-                time = durations[i, j] / 3600  # 秒から時間
-                
-                if dist <= plnt_dc_threshold:
-                    cost = dist * tc_per_dis + time * tc_per_time
-                    lead_time = lt_lb if dist <= lt_threshold else lt_lb + math.ceil((dist - lt_threshold) / 100)
-                    stage_time = random.randint(*stage_time_bound)
-                    
-                    trans_data.append({
-                        'from_node': plant.name,
-                        'to_node': dc.name,
-                        'dist': dist,
-                        'time': time,
-                        'cost': cost,
-                        'lead_time': lead_time,
-                        'stage_time': stage_time,
-                        'kind': 'plnt-dc'
-                    })
-                    
-                    graph.add_edge(plant.name, dc.name,
-                                 distance=dist, time=time, cost=cost, kind='plnt-dc')
-        
-        # DC-顧客接続
-        for dc in dc_candidates:
-            for customer in customers:
-                i = node_mapping[dc.name]
-                j = node_mapping[customer.name]
-                
-                dist = distances[i, j] / 1000
-                time = durations[i, j] / 3600
-                
-                if dist <= dc_cust_threshold:
-                    cost = dist * dc_per_dis + time * dc_per_time
-                    lead_time = lt_lb if dist <= lt_threshold else lt_lb + math.ceil((dist - lt_threshold) / 100)
-                    stage_time = random.randint(*stage_time_bound)
-                    
-                    trans_data.append({
-                        'from_node': dc.name,
-                        'to_node': customer.name,
-                        'dist': dist,
-                        'time': time,
-                        'cost': cost,
-                        'lead_time': lead_time,
-                        'stage_time': stage_time,
-                        'kind': 'dc-cust'
-                    })
-                    
-                    graph.add_edge(dc.name, customer.name,
-                                 distance=dist, time=time, cost=cost, kind='dc-cust')
-        
-        trans_df = pd.DataFrame(trans_data)
+        if distances is None or durations is None:
+            # OSRM距離・時間マトリックスが提供されていない場合は
+            # Great circle距離に道路係数をかけて近似（キロメートル・時間）
+            distances = durations = None
+            plnt_dc_gc = self.cached_distance_matrix(plants, dc_candidates)
+            dc_cust_gc = self.cached_distance_matrix(dc_candidates, customers)
+            plnt_dc_dist = plnt_dc_gc * 1.3  # 道路係数
+            dc_cust_dist = dc_cust_gc * 1.3
+            plnt_dc_time = plnt_dc_gc / 60  # 時速60kmで近似
+            dc_cust_time = dc_cust_gc / 60
+        else:
+            distances = np.asarray(distances)
+            durations = np.asarray(durations)
+            plnt_dc_dist = distances[np.ix_(plant_idx, dc_idx)] / 1000  # メートルからキロメートル
+            dc_cust_dist = distances[np.ix_(dc_idx, customer_idx)] / 1000
+            plnt_dc_time = durations[np.ix_(plant_idx, dc_idx)] / 3600  # 秒から時間
+            dc_cust_time = durations[np.ix_(dc_idx, customer_idx)] / 3600
+        
+        position = self._node_positions(plants, dc_candidates, customers)
+        
+        # プラント-DC接続 / DC-顧客接続
+        plnt_dc_arcs = self._network_arcs(
+            plants, dc_candidates, plnt_dc_dist, plnt_dc_threshold, 'plnt-dc',
+            lambda dist, time: dist * tc_per_dis + time * tc_per_time,
+            lt_lb, lt_threshold, stage_time_bound, time_matrix=plnt_dc_time)
+        dc_cust_arcs = self._network_arcs(
+            dc_candidates, customers, dc_cust_dist, dc_cust_threshold, 'dc-cust',
+            lambda dist, time: dist * dc_per_dis + time * dc_per_time,
+            lt_lb, lt_threshold, stage_time_bound, time_matrix=dc_cust_time)
+        trans_df = pd.concat([plnt_dc_arcs, dc_cust_arcs], ignore_index=True)
+        
+        graph = None
+        if build_graph:
+            graph = self._network_graph(plants, dc_candidates, customers, trans_df,
+                                        {'distance': 'dist', 'time': 'time',
+                                         'cost': 'cost', 'kind': 'kind'})
         
         return {
             'trans_df': trans_df,
@@ -1839,6 +2452,63 @@ class LogisticsOptimizationService:
             'duration_matrix': durations
         }
     
+    @staticmethod
+    def _node_positions(plants: List[PlantData], dc_candidates: List[DCData],
+                        customers: List[CustomerData]) -> Dict[str, Tuple[float, float]]:
+        """ノード名から (経度, 緯度) への辞書"""
+        return {loc.name: (loc.longitude, loc.latitude)
+                for loc in list(plants) + list(dc_candidates) + list(customers)}
+    
+    @staticmethod
+    def _network_arcs(from_nodes: List, to_nodes: List, dist_matrix: np.ndarray,
+                      threshold: float, kind: str, cost_fn, lt_lb: int, lt_threshold: float,
+                      stage_time_bound: Tuple[int, int],
+                      time_matrix: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        距離ブロックのうち閾値以下の枝だけを取り出し、trans_df の列を配列で作成
+        
+        cost_fn(dist, time) は枝ごとの距離・時間の配列から費用の配列を返す関数。
+        枝の並びは (from, to) の行優先順。
+        """
+        dist_matrix = np.asarray(dist_matrix, dtype=float).reshape(len(from_nodes), len(to_nodes))
+        rows, cols = np.nonzero(dist_matrix <= threshold)
+        dist = dist_matrix[rows, cols]
+        travel_time = time_matrix[rows, cols] if time_matrix is not None else None
+        
+        columns = {
+            'from_node': np.array([node.name for node in from_nodes], dtype=object)[rows],
+            'to_node': np.array([node.name for node in to_nodes], dtype=object)[cols],
+            'dist': dist
+        }
+        if travel_time is not None:
+            columns['time'] = travel_time
+        columns['cost'] = cost_fn(dist, travel_time)
+        columns['lead_time'] = np.where(
+            dist <= lt_threshold, lt_lb,
+            lt_lb + np.ceil((dist - lt_threshold) / 100)).astype(int)
+        columns['stage_time'] = np.random.randint(
+            stage_time_bound[0], stage_time_bound[1] + 1, size=len(dist))
+        columns['kind'] = kind
+        return pd.DataFrame(columns)
+    
+    @staticmethod
+    def _network_graph(plants: List[PlantData], dc_candidates: List[DCData],
+                       customers: List[CustomerData], trans_df: pd.DataFrame,
+                       edge_attrs: Dict[str, str]) -> nx.DiGraph:
+        """trans_df から networkx の有向グラフを作成（edge_attrs は属性名 -> 列名）"""
+        graph = nx.DiGraph()
+        graph.add_nodes_from((plant.name for plant in plants), type="plant")
+        graph.add_nodes_from((dc.name for dc in dc_candidates), type="dc")
+        graph.add_nodes_from((customer.name for customer in customers), type="customer")
+        attr_names = list(edge_attrs)
+        attr_columns = [trans_df[column].tolist() for column in edge_attrs.values()]
+        graph.add_edges_from(
+            (from_node, to_node, dict(zip(attr_names, values)))
+            for from_node, to_node, *values in zip(
+                trans_df['from_node'].tolist(), trans_df['to_node'].tolist(), *attr_columns)
+        )
+        return graph
+    
     def distance_histogram(self, customers: List[CustomerData], dc_candidates: List[DCData],
                           plants: List[PlantData], distances: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """距離分布のヒストグラムを作成"""
@@ -1847,22 +2517,9 @@ class LogisticsOptimizationService:
         dc_cust_distances = []
         
         if distances is None:
-            # Great circle距離を使用
-            for plant in plants:
-                for dc in dc_candidates:
-                    dist = great_circle(
-                        (plant.latitude, plant.longitude),
-                        (dc.latitude, dc.longitude)
-                    ).kilometers
-                    plnt_dc_distances.append(dist)
-            
-            for dc in dc_candidates:
-                for customer in customers:
-                    dist = great_circle(
-                        (dc.latitude, dc.longitude),
-                        (customer.latitude, customer.longitude)
-                    ).kilometers
-                    dc_cust_distances.append(dist)
+            # Great circle距離を使用（キャッシュ共有）
+            plnt_dc_distances = self.cached_distance_matrix(plants, dc_candidates).ravel().tolist()
+            dc_cust_distances = self.cached_distance_matrix(dc_candidates, customers).ravel().tolist()
         else:
             # 提供された距離マトリックスを使用
             all_locations = plants + dc_candidates + customers
@@ -1991,17 +2648,11 @@ class LogisticsOptimizationService:
     def make_total_demand(self, customers: List[CustomerData]) -> Dict[str, Any]:
         """総需要を計算"""
         total_demand = sum(c.demand for c in customers)
-        demand_by_location = {}
-        
-        for customer in customers:
-            key = f"{customer.latitude},{customer.longitude}"
-            if key not in demand_by_location:
-                demand_by_location[key] = []
-            demand_by_location[key].append(customer.demand)
-        
-        location_totals = {
-            key: sum(demands) for key, demands in demand_by_location.items()
-        }
+        frame = pd.DataFrame([(c.latitude, c.longitude, c.demand) for c in customers],
+                             columns=['latitude', 'longitude', 'demand'])
+        # 位置キーの文字列は集約後の地点ごとにだけ作る（出現順）
+        totals = frame.groupby(['latitude', 'longitude'], sort=False)['demand'].sum()
+        location_totals = {f"{lat},{lon}": demand for (lat, lon), demand in totals.items()}
         
         return {
             'total_demand': total_demand,
@@ -2011,26 +2662,28 @@ class LogisticsOptimizationService:
         }
     
     def make_aggregated_cust_df(self, customers: List[CustomerData]) -> List[CustomerData]:
-        """顧客データを位置別に集約"""
-        location_groups = defaultdict(list)
-        
-        # 位置別にグループ化
-        for customer in customers:
-            key = f"{customer.latitude:.6f},{customer.longitude:.6f}"
-            location_groups[key].append(customer)
+        """顧客データを位置別に集約（小数点以下6桁で同じ位置）"""
+        if not customers:
+            return []
+        coords = coordinate_array(customers)
+        keys = np.rint(coords * 1e6).astype(np.int64)
+        index, _ = pd.factorize(pd.MultiIndex.from_arrays([keys[:, 0], keys[:, 1]]), sort=False)
+        order = np.argsort(index, kind='stable')
+        bounds = np.flatnonzero(np.diff(index[order])) + 1
         
         aggregated_customers = []
-        for location_key, customer_group in location_groups.items():
+        for members in np.split(order, bounds):
+            customer_group = [customers[i] for i in members]
             if len(customer_group) == 1:
                 # 単一顧客の場合はそのまま
                 aggregated_customers.append(customer_group[0])
             else:
                 # 複数顧客の場合は集約
                 total_demand = sum(c.demand for c in customer_group)
-                customer_names = [c.name for c in customer_group]
+                customer_names = [c.name for c in customer_group[:4]]
                 
                 aggregated_customers.append(CustomerData(
-                    name=f"AGG_{'+'.join(customer_names[:3])}{'...' if len(customer_names) > 3 else ''}",
+                    name=f"AGG_{'+'.join(customer_names[:3])}{'...' if len(customer_group) > 3 else ''}",
                     latitude=customer_group[0].latitude,
                     longitude=customer_group[0].longitude,
                     demand=total_demand
@@ -2038,48 +2691,99 @@ class LogisticsOptimizationService:
         
         return aggregated_customers
     
+    def aggregate_customers_by_cell(self, customers: List[CustomerData], method: str = "grid",
+                                    cell_km: float = 1.0, geohash_precision: int = 6) -> Dict[str, Any]:
+        """
+        顧客をグリッド（一辺 cell_km）またはジオハッシュのセルに集約
+        
+        セルごとの需要重心に総需要を持つ顧客を作る（顧客が1人のセルは元の顧客のまま）。
+        集約後の顧客はそのまま LND・K-Median の customers に渡せる。
+        
+        Returns:
+            customers（集約後の顧客）, customer_cells（元の顧客ごとの集約後インデックス）,
+            n_original, n_aggregated, max_displacement_km（顧客から集約点までの最大距離）,
+            mean_displacement_km（需要加重平均の距離）の辞書
+        """
+        if not customers:
+            return {'customers': [], 'customer_cells': np.zeros(0, dtype=np.intp), 'n_original': 0,
+                    'n_aggregated': 0, 'max_displacement_km': 0.0, 'mean_displacement_km': 0.0}
+        coords = coordinate_array(customers)
+        demand = np.array([c.demand for c in customers], dtype=np.float64)
+        cells = aggregate_by_cell(coords[:, 0], coords[:, 1], demand, method=method,
+                                  cell_km=cell_km, geohash_precision=geohash_precision)
+        names = cell_names(cells['cell_ids'], method, geohash_precision)
+        # 顧客が1人のセルの元の顧客（初出の顧客のインデックス）
+        first_member = np.full(len(names), -1, dtype=np.intp)
+        first_member[cells['cell_of_point'][::-1]] = np.arange(len(customers))[::-1]
+        
+        aggregated_customers = []
+        for i, name in enumerate(names):
+            if cells['count'][i] == 1:
+                aggregated_customers.append(customers[first_member[i]])
+            else:
+                aggregated_customers.append(CustomerData(
+                    name=name,
+                    latitude=float(cells['latitude'][i]),
+                    longitude=float(cells['longitude'][i]),
+                    demand=float(cells['demand'][i])
+                ))
+        
+        total_demand = demand.sum()
+        displacement = cells['displacement_km']
+        return {
+            'customers': aggregated_customers,
+            'customer_cells': cells['cell_of_point'],
+            'n_original': len(customers),
+            'n_aggregated': len(aggregated_customers),
+            'max_displacement_km': float(displacement.max()),
+            'mean_displacement_km': float(displacement @ demand / total_demand) if total_demand > 0
+                                    else float(displacement.mean())
+        }
+    
     def make_aggregated_df(self, customers: List[CustomerData], 
-                          aggregation_threshold: float = 0.1) -> List[CustomerData]:
-        """需要に基づいて顧客を集約"""
+                          aggregation_threshold: float = 0.1, tail_method: str = "grid",
+                          cell_km: float = 10.0) -> List[CustomerData]:
+        """
+        需要に基づいて顧客を集約
+        
+        需要が総需要 × aggregation_threshold 未満の顧客を、tail_method="grid" なら
+        一辺 cell_km のグリッドセルごとに、"kmeans" なら k-means で集約する。
+        """
         total_demand = sum(c.demand for c in customers)
         min_demand = total_demand * aggregation_threshold
         
-        high_demand_customers = []
-        low_demand_customers = []
-        
-        for customer in customers:
-            if customer.demand >= min_demand:
-                high_demand_customers.append(customer)
-            else:
-                low_demand_customers.append(customer)
+        high_demand_customers = [c for c in customers if c.demand >= min_demand]
+        low_demand_customers = [c for c in customers if c.demand < min_demand]
         
         # 低需要顧客を地理的に集約
-        if low_demand_customers:
-            # 簡単なk-meansクラスタリング
-            n_clusters = max(1, len(low_demand_customers) // 5)
-            if n_clusters > 1:
-                cluster_result = self.cluster_customers(
-                    low_demand_customers, 
-                    n_clusters=n_clusters,
-                    method='kmeans'
-                )
-                aggregated_customers = high_demand_customers + cluster_result.aggregated_customers
-            else:
-                # 全ての低需要顧客を1つに集約
-                total_low_demand = sum(c.demand for c in low_demand_customers)
-                center_lat = sum(c.latitude * c.demand for c in low_demand_customers) / total_low_demand
-                center_lon = sum(c.longitude * c.demand for c in low_demand_customers) / total_low_demand
-                
-                aggregated_customers = high_demand_customers + [CustomerData(
-                    name="AGG_LOW_DEMAND",
-                    latitude=center_lat,
-                    longitude=center_lon,
-                    demand=total_low_demand
-                )]
-        else:
-            aggregated_customers = high_demand_customers
-        
-        return aggregated_customers
+        if not low_demand_customers:
+            return high_demand_customers
+        if tail_method == "grid":
+            aggregated = self.aggregate_customers_by_cell(low_demand_customers, method="grid",
+                                                          cell_km=cell_km)
+            return high_demand_customers + aggregated['customers']
+        
+        # 簡単なk-meansクラスタリング
+        n_clusters = max(1, len(low_demand_customers) // 5)
+        if n_clusters > 1:
+            cluster_result = self.cluster_customers(
+                low_demand_customers, 
+                n_clusters=n_clusters,
+                method='kmeans'
+            )
+            return high_demand_customers + cluster_result.aggregated_customers
+        
+        # 全ての低需要顧客を1つに集約
+        total_low_demand = sum(c.demand for c in low_demand_customers)
+        center_lat = sum(c.latitude * c.demand for c in low_demand_customers) / total_low_demand
+        center_lon = sum(c.longitude * c.demand for c in low_demand_customers) / total_low_demand
+        
+        return high_demand_customers + [CustomerData(
+            name="AGG_LOW_DEMAND",
+            latitude=center_lat,
+            longitude=center_lon,
+            demand=total_low_demand
+        )]
     
     def remove_zero_cust(self, customers: List[CustomerData], 
                         threshold: float = 0.001) -> List[CustomerData]:
@@ -2111,203 +2815,255 @@ class LogisticsOptimizationService:
     # =====================================================
     
     def lnd_ms_exact(self, customers: List[CustomerData], dc_candidates: List[DCData],
-                    plants: List[PlantData], solver_name: str = "PULP_CBC_CMD") -> LNDResult:
-        """多拠点LND問題の厳密解法（PuLP使用）"""
+                    plants: List[PlantData], solver_name: str = "PULP_CBC_CMD",
+                    time_limit: Optional[float] = None, mip_gap: Optional[float] = None,
+                    threads: Optional[int] = None, warm_start: bool = True) -> LNDResult:
+        """
+        多拠点LND問題の厳密解法（PuLP使用）
+        
+        Args:
+            solver_name: PuLPのソルバー名
+            time_limit: 計算時間の上限（秒）
+            mip_gap: 相対MIPギャップの許容値
+            threads: ソルバーのスレッド数
+            warm_start: 単一ソースヒューリスティックの解を初期解として渡すか
+        """
         
         if not PULP_AVAILABLE:
             # PuLPがない場合はヒューリスティック解法にフォールバック
             return self.solve_multi_source_lnd(customers, dc_candidates, plants)
         
-        # 問題を定義
-        prob = pulp.LpProblem("Multi_Source_LND", pulp.LpMinimize)
-        
-        # 決定変数
-        # x[i,j] = 1 if DC j is selected, 0 otherwise
-        x = {}
-        for j, dc in enumerate(dc_candidates):
-            x[j] = pulp.LpVariable(f"x_{j}", cat='Binary')
-        
-        # y[i,j] = flow from customer i to DC j
-        y = {}
-        for i, customer in enumerate(customers):
-            for j, dc in enumerate(dc_candidates):
-                y[i,j] = pulp.LpVariable(f"y_{i}_{j}", lowBound=0)
-        
-        # 目的関数：固定費用 + 輸送費用
-        fixed_costs = pulp.lpSum([dc.fixed_cost * x[j] for j, dc in enumerate(dc_candidates)])
-        
-        transport_costs = pulp.lpSum([
-            customer.demand * self.calculate_distance(customer, dc) * 0.1 * y[i,j]
-            for i, customer in enumerate(customers)
-            for j, dc in enumerate(dc_candidates)
-        ])
-        
-        prob += fixed_costs + transport_costs
-        
-        # 制約条件
-        # 1. 需要充足制約
-        for i, customer in enumerate(customers):
-            prob += pulp.lpSum([y[i,j] for j in range(len(dc_candidates))]) == customer.demand
-        
-        # 2. 容量制約
-        for j, dc in enumerate(dc_candidates):
-            prob += pulp.lpSum([y[i,j] for i in range(len(customers))]) <= dc.capacity * x[j]
-        
-        # 3. フロー制約（DCが選択されていない場合はフロー禁止）
-        for i, customer in enumerate(customers):
-            for j, dc in enumerate(dc_candidates):
-                prob += y[i,j] <= customer.demand * x[j]
-        
-        # 求解
-        solver = pulp.getSolver(solver_name) if solver_name else pulp.PULP_CBC_CMD()
-        prob.solve(solver)
-        
-        # 結果の解析
-        status = pulp.LpStatus[prob.status]
-        
-        if prob.status == pulp.LpStatusOptimal:
-            # 選択されたDC
-            selected_facilities = []
-            for j, dc in enumerate(dc_candidates):
-                if x[j].varValue > 0.5:  # バイナリ変数の閾値
-                    selected_facilities.append(dc)
-            
-            # フロー割当
-            flow_assignments = {}
-            for i, customer in enumerate(customers):
-                flows = {}
-                for j, dc in enumerate(dc_candidates):
-                    if y[i,j].varValue > 0.001:  # 小さな値は無視
-                        flows[dc.name] = y[i,j].varValue
-                if flows:
-                    flow_assignments[customer.name] = flows
-            
-            # コスト計算
-            total_cost = pulp.value(prob.objective)
-            fixed_cost = sum(dc.fixed_cost for j, dc in enumerate(dc_candidates) if x[j].varValue > 0.5)
-            transport_cost = total_cost - fixed_cost
-            
-            # 性能指標
-            total_demand = sum(c.demand for c in customers)
-            avg_distance = transport_cost / (total_demand * 0.1) if total_demand > 0 else 0
-            
-            return LNDResult(
-                selected_facilities=selected_facilities,
-                flow_assignments=flow_assignments,
-                total_cost=total_cost,
-                fixed_costs=fixed_cost,
-                transport_costs=transport_cost,
-                solution_status=status,
-                solver_time=0.0,  # PuLPからは取得困難
-                network_performance={
-                    "total_demand_served": total_demand,
-                    "average_distance": avg_distance,
-                    "facility_utilization": {},
-                    "optimization_method": "Exact_MILP_PuLP"
-                }
-            )
-        else:
-            # 最適解が見つからない場合はヒューリスティック解法にフォールバック
+        solution = self._solve_lnd_milp(customers, dc_candidates, False, solver_name,
+                                        time_limit, mip_gap, threads, warm_start)
+        if solution is None:
+            # 解が見つからない場合はヒューリスティック解法にフォールバック
             return self.solve_multi_source_lnd(customers, dc_candidates, plants)
+        return self._lnd_milp_result(customers, dc_candidates, solution, "Exact_MILP_PuLP")
     
     def lnd_ss_exact(self, customers: List[CustomerData], dc_candidates: List[DCData],
-                    plants: List[PlantData], solver_name: str = "PULP_CBC_CMD") -> LNDResult:
-        """単一拠点LND問題の厳密解法（PuLP使用）"""
+                    plants: List[PlantData], solver_name: str = "PULP_CBC_CMD",
+                    time_limit: Optional[float] = None, mip_gap: Optional[float] = None,
+                    threads: Optional[int] = None, warm_start: bool = True) -> LNDResult:
+        """単一拠点LND問題の厳密解法（PuLP使用、引数は lnd_ms_exact と同じ）"""
         
         if not PULP_AVAILABLE:
             return self.solve_single_source_lnd(customers, dc_candidates, plants)
         
-        # 問題を定義
-        prob = pulp.LpProblem("Single_Source_LND", pulp.LpMinimize)
+        solution = self._solve_lnd_milp(customers, dc_candidates, True, solver_name,
+                                        time_limit, mip_gap, threads, warm_start)
+        if solution is None:
+            return self.solve_single_source_lnd(customers, dc_candidates, plants)
+        return self._lnd_milp_result(customers, dc_candidates, solution,
+                                     "Exact_MILP_PuLP_SingleSource")
+    
+    def _lnd_milp_model(self, costs: np.ndarray, demands: np.ndarray, capacities: np.ndarray,
+                        fixed_costs: np.ndarray, single_source: bool) -> Tuple[Dict[str, Any], bool]:
+        """
+        LND問題のMILPモデルを費用配列から一括生成（同じ入力のモデルは再利用）
         
-        # 決定変数
-        # x[j] = 1 if DC j is selected, 0 otherwise
-        x = {}
-        for j, dc in enumerate(dc_candidates):
-            x[j] = pulp.LpVariable(f"x_{j}", cat='Binary')
+        多拠点では y[i,j] を顧客 i への DC j からの供給量（単位費用 costs[i,j]）、
+        単一拠点では z[i,j] を割当の0-1変数（割当費用 costs[i,j]）とする。
+        変数・制約は係数リストから直接生成し、式の演算は使わない。
         
-        # z[i,j] = 1 if customer i is assigned to DC j, 0 otherwise
-        z = {}
-        for i, customer in enumerate(customers):
-            for j, dc in enumerate(dc_candidates):
-                z[i,j] = pulp.LpVariable(f"z_{i}_{j}", cat='Binary')
+        Returns:
+            (model, reused): prob・変数・排他ロックの辞書と、キャッシュから再利用したか
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(b"single" if single_source else b"multi")
+        for array in (costs, demands, capacities, fixed_costs):
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        key = digest.hexdigest()
+        with self._lnd_milp_lock:
+            model = self._lnd_milp_models.get(key)
+            if model is not None:
+                self._lnd_milp_models.move_to_end(key)
+                return model, True
+        
+        n, m = costs.shape
+        prob = pulp.LpProblem("Single_Source_LND" if single_source else "Multi_Source_LND",
+                              pulp.LpMinimize)
+        x = [pulp.LpVariable(f"x_{j}", cat='Binary') for j in range(m)]
+        if single_source:
+            # z[i,j] = 1 if customer i is assigned to DC j
+            assign = [[pulp.LpVariable(f"z_{i}_{j}", cat='Binary') for j in range(m)]
+                      for i in range(n)]
+            rhs, weights, bounds = np.ones(n), demands, np.ones(n)
+        else:
+            # y[i,j] = flow from DC j to customer i
+            assign = [[pulp.LpVariable(f"y_{i}_{j}", lowBound=0) for j in range(m)]
+                      for i in range(n)]
+            rhs, weights, bounds = demands, np.ones(n), demands
         
-        # 目的関数
-        fixed_costs = pulp.lpSum([dc.fixed_cost * x[j] for j, dc in enumerate(dc_candidates)])
+        # 目的関数：固定費用 + 輸送費用
+        cost_rows = costs.tolist()
+        objective = list(zip(x, fixed_costs.tolist()))
+        for row, coefficients in zip(assign, cost_rows):
+            objective.extend(zip(row, coefficients))
+        prob.setObjective(pulp.LpAffineExpression(objective))
         
-        transport_costs = pulp.lpSum([
-            customer.demand * self.calculate_distance(customer, dc) * 0.1 * z[i,j]
-            for i, customer in enumerate(customers)
-            for j, dc in enumerate(dc_candidates)
-        ])
+        # 1. 需要充足（単一拠点では割当）制約
+        for i, row in enumerate(assign):
+            prob.addConstraint(pulp.LpConstraint([(v, 1) for v in row], pulp.LpConstraintEQ,
+                                                 rhs=float(rhs[i])), f"demand_{i}")
+        
+        # 2. 容量制約
+        weight_list = weights.tolist()
+        for j in range(m):
+            terms = [(assign[i][j], weight_list[i]) for i in range(n)]
+            terms.append((x[j], -float(capacities[j])))
+            prob.addConstraint(pulp.LpConstraint(terms, pulp.LpConstraintLE, rhs=0),
+                               f"capacity_{j}")
+        
+        # 3. DCが選択されていない場合はフロー・割当を禁止
+        bound_list = bounds.tolist()
+        for i, row in enumerate(assign):
+            for j, v in enumerate(row):
+                prob.addConstraint(pulp.LpConstraint([(v, 1), (x[j], -bound_list[i])],
+                                                     pulp.LpConstraintLE, rhs=0), f"link_{i}_{j}")
+        
+        model = {"prob": prob, "x": x, "assign": assign, "lock": threading.Lock()}
+        with self._lnd_milp_lock:
+            self._lnd_milp_models[key] = model
+            while len(self._lnd_milp_models) > self.lnd_milp_cache_size:
+                self._lnd_milp_models.popitem(last=False)
+        return model, False
+    
+    def _solve_lnd_milp(self, customers: List[CustomerData], dc_candidates: List[DCData],
+                        single_source: bool, solver_name: str, time_limit: Optional[float],
+                        mip_gap: Optional[float], threads: Optional[int],
+                        warm_start: bool) -> Optional[Dict[str, Any]]:
+        """LND問題のMILPを構築（または再利用）して解く（解がなければ None）"""
+        
+        demands = np.array([c.demand for c in customers], dtype=float)
+        capacities = np.array([dc.capacity for dc in dc_candidates], dtype=float)
+        fixed_costs = np.array([dc.fixed_cost for dc in dc_candidates], dtype=float)
+        # 顧客-DC間距離を一括計算 (n, m)
+        distance_matrix = self.cached_distance_matrix(customers, dc_candidates)
+        unit_costs = distance_matrix * 0.1
+        transport_costs = demands[:, None] * unit_costs  # 顧客の全需要を割り当てたときの輸送費
+        
+        build_start = time.perf_counter()
+        model, reused = self._lnd_milp_model(
+            transport_costs if single_source else unit_costs,
+            demands, capacities, fixed_costs, single_source)
+        build_time = time.perf_counter() - build_start
+        
+        prob, x, assign = model["prob"], model["x"], model["assign"]
+        with model["lock"]:
+            if warm_start:
+                # 単一ソースヒューリスティックの解（多拠点でも実行可能解）を初期解にする
+                assignment, _ = self._single_source_heuristic(
+                    distance_matrix.T, transport_costs, demands, capacities, fixed_costs)
+                used = np.bincount(assignment, minlength=len(x)) > 0
+                for j, v in enumerate(x):
+                    v.setInitialValue(int(used[j]))
+                for i, row in enumerate(assign):
+                    value = 1 if single_source else demands[i]
+                    for j, v in enumerate(row):
+                        v.setInitialValue(value if j == assignment[i] else 0)
+            
+            options = {"msg": False, "warmStart": warm_start}
+            if time_limit is not None:
+                options["timeLimit"] = time_limit
+            if mip_gap is not None:
+                options["gapRel"] = mip_gap
+            if threads is not None:
+                options["threads"] = threads
+            solver = pulp.getSolver(solver_name or "PULP_CBC_CMD", **options)
+            solve_start = time.perf_counter()
+            prob.solve(solver)
+            solve_time = time.perf_counter() - solve_start
+            
+            if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+                return None
+            selected = np.array([(v.varValue or 0) > 0.5 for v in x])
+            flows = np.array([[v.varValue or 0 for v in row] for row in assign])
+            objective = pulp.value(prob.objective)
+        
+        if single_source:
+            flows = flows * demands[:, None]
+        return {
+            "selected": selected,
+            "flows": flows,
+            "total_cost": float(objective),
+            "fixed_cost": float(fixed_costs[selected].sum()),
+            "status": "Optimal" if prob.sol_status == pulp.LpSolutionOptimal else "Feasible",
+            "build_time": build_time,
+            "solve_time": solve_time,
+            "model_reused": reused,
+            "warm_start": warm_start
+        }
+    
+    def _lnd_milp_result(self, customers: List[CustomerData], dc_candidates: List[DCData],
+                         solution: Dict[str, Any], method: str) -> LNDResult:
+        """MILPの解から LNDResult を構築"""
         
-        prob += fixed_costs + transport_costs
+        selected = solution["selected"]
+        flows = solution["flows"]
+        capacities = np.array([dc.capacity for dc in dc_candidates], dtype=float)
+        selected_facilities = [dc for dc, used in zip(dc_candidates, selected) if used]
         
-        # 制約条件
-        # 1. 各顧客は1つのDCにのみ割当
+        # フロー割当（小さな値は無視）
+        flow_assignments = {}
         for i, customer in enumerate(customers):
-            prob += pulp.lpSum([z[i,j] for j in range(len(dc_candidates))]) == 1
+            served = np.flatnonzero(flows[i] > 0.001)
+            if len(served):
+                flow_assignments[customer.name] = {
+                    dc_candidates[j].name: float(flows[i, j]) for j in served}
         
-        # 2. 容量制約
-        for j, dc in enumerate(dc_candidates):
-            prob += pulp.lpSum([customer.demand * z[i,j] for i, customer in enumerate(customers)]) <= dc.capacity * x[j]
+        loads = flows.sum(axis=0)
+        utilization = {dc_candidates[j].name: float(loads[j] / capacities[j])
+                       for j in np.flatnonzero(selected)}
         
-        # 3. 割当制約（DCが選択されていない場合は割当禁止）
-        for i, customer in enumerate(customers):
-            for j, dc in enumerate(dc_candidates):
-                prob += z[i,j] <= x[j]
-        
-        # 求解
-        solver = pulp.getSolver(solver_name) if solver_name else pulp.PULP_CBC_CMD()
-        prob.solve(solver)
-        
-        # 結果の解析
-        status = pulp.LpStatus[prob.status]
-        
-        if prob.status == pulp.LpStatusOptimal:
-            # 選択されたDC
-            selected_facilities = []
-            for j, dc in enumerate(dc_candidates):
-                if x[j].varValue > 0.5:
-                    selected_facilities.append(dc)
-            
-            # 顧客割当
-            customer_assignments = {}
-            flow_assignments = {}
-            for i, customer in enumerate(customers):
-                for j, dc in enumerate(dc_candidates):
-                    if z[i,j].varValue > 0.5:
-                        customer_assignments[customer.name] = j
-                        flow_assignments[customer.name] = {dc.name: customer.demand}
-                        break
-            
-            total_cost = pulp.value(prob.objective)
-            fixed_cost = sum(dc.fixed_cost for j, dc in enumerate(dc_candidates) if x[j].varValue > 0.5)
-            
-            return LNDResult(
-                selected_facilities=selected_facilities,
-                flow_assignments=flow_assignments,
-                total_cost=total_cost,
-                fixed_costs=fixed_cost,
-                transport_costs=total_cost - fixed_cost,
-                solution_status=status,
-                solver_time=0.0,
-                network_performance={
-                    "total_demand_served": sum(c.demand for c in customers),
-                    "average_distance": (total_cost - fixed_cost) / (sum(c.demand for c in customers) * 0.1),
-                    "facility_utilization": {},
-                    "optimization_method": "Exact_MILP_PuLP_SingleSource"
-                }
-            )
-        else:
-            return self.solve_single_source_lnd(customers, dc_candidates, plants)
+        total_cost = solution["total_cost"]
+        fixed_cost = solution["fixed_cost"]
+        transport_cost = total_cost - fixed_cost
+        total_demand = float(sum(c.demand for c in customers))
+        
+        return LNDResult(
+            selected_facilities=selected_facilities,
+            flow_assignments=flow_assignments,
+            total_cost=total_cost,
+            cost_breakdown={
+                "transportation": transport_cost,
+                "fixed": fixed_cost,
+                "variable": 0.0,
+                "inventory": 0.0
+            },
+            facility_utilization=utilization,
+            network_performance={
+                "total_demand_served": total_demand,
+                "average_distance": transport_cost / (total_demand * 0.1) if total_demand > 0 else 0.0,
+                "facility_count": len(selected_facilities),
+                "optimization_method": method,
+                "model_build_time": solution["build_time"],
+                "solver_time": solution["solve_time"],
+                "model_reused": float(solution["model_reused"]),
+                "warm_start": float(solution["warm_start"])
+            },
+            solution_status=solution["status"],
+            solve_time=solution["build_time"] + solution["solve_time"]
+        )
     
     # =====================================================
     # ユーティリティ機能（05lnd.ipynbより移植）
     # =====================================================
     
-    def elbow_method(self, customers: List[CustomerData], max_k: int = 10) -> Dict[str, Any]:
-        """エルボー法で最適クラスター数を決定"""
+    def elbow_method(self, customers: List[CustomerData], max_k: int = 10,
+                     max_workers: Optional[int] = None, minibatch_threshold: int = MINIBATCH_THRESHOLD,
+                     silhouette_sample_size: Optional[int] = None,
+                     partial_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        エルボー法で最適クラスター数を決定
+        
+        k の値はブロックごとにプロセスプールで並列に解き、ブロック内では直前の k の中心から
+        開始する。顧客数が minibatch_threshold を超えたら MiniBatchKMeans を使い、
+        シルエット係数は silhouette_sample_size 点の標本から推定する。
+        partial_callback を指定すると、k ごとの結果（k, inertia, silhouette, fit_time）を
+        解き終わった順に渡す。
+        """
         
         if len(customers) < 2:
             return {'optimal_k': 1, 'scores': [0], 'plotly_figure': None}
@@ -2317,18 +3073,16 @@ class LogisticsOptimizationService:
         
         # 異なるk値でクラスタリングを実行
         k_range = range(1, min(max_k + 1, len(customers)))
-        inertias = []
-        silhouette_scores = []
-        
-        for k in k_range:
-            if k == 1:
-                inertias.append(np.sum(np.var(features, axis=0)))
-                silhouette_scores.append(0)
-            else:
-                kmeans = KMeans(n_clusters=k, random_state=self.random_state, n_init=10)
-                cluster_labels = kmeans.fit_predict(features)
-                inertias.append(kmeans.inertia_)
-                silhouette_scores.append(silhouette_score(features, cluster_labels))
+        results = {}
+        for result in kmeans_sweep(
+                features, k_range, max_workers=max_workers, random_state=self.random_state,
+                minibatch_threshold=minibatch_threshold,
+                silhouette_sample_size=silhouette_sample_size or DEFAULT_SILHOUETTE_SAMPLE_SIZE):
+            results[result['k']] = result
+            if partial_callback is not None:
+                partial_callback(result)
+        inertias = [results[k]['inertia'] for k in k_range]
+        silhouette_scores = [results[k]['silhouette'] for k in k_range]
         
         # エルボーポイントを検出
         # 二階微分の最大値を探す
@@ -2380,6 +3134,7 @@ class LogisticsOptimizationService:
             'k_range': list(k_range),
             'inertias': inertias,
             'silhouette_scores': silhouette_scores,
+            'fit_times': [results[k]['fit_time'] for k in k_range],
             'plotly_figure': fig.to_dict()
         }
     
@@ -2436,68 +3191,84 @@ class LogisticsOptimizationService:
         )
     
     def plot_k_median(self, customers: List[CustomerData], dc_candidates: List[DCData],
-                     k: int = 3) -> Dict[str, Any]:
-        """K-median最適化の可視化"""
+                     k: int = 3, max_markers: int = DEFAULT_MAX_MARKERS,
+                     zoom_levels: Sequence[float] = DEFAULT_ZOOM_LEVELS,
+                     max_payload_bytes: Optional[int] = None,
+                     typed_arrays: bool = True) -> Dict[str, Any]:
+        """
+        K-median最適化の可視化
+        
+        顧客は割当先 DC ごとに色分けし、max_markers を超える場合は割当先の同じ顧客だけを
+        ズームレベルごとのビンに集約する（create_network_visualization と同じ間引き）。
+        """
         
         # K-median最適化を実行
         result = self.solve_k_median(customers, dc_candidates, k)
         
-        # 可視化
-        fig = go.Figure()
-        
-        # 顧客をプロット
-        customer_colors = []
-        for customer in customers:
-            assigned_facility = result.facility_assignments.get(customer.name, 0)
-            customer_colors.append(assigned_facility)
-        
-        fig.add_trace(go.Scattermapbox(
-            lat=[c.latitude for c in customers],
-            lon=[c.longitude for c in customers],
-            mode='markers',
-            marker=dict(
-                size=[c.demand/10 + 5 for c in customers],
-                color=customer_colors,
-                colorscale='Viridis',
-                opacity=0.7
-            ),
-            text=[c.name for c in customers],
-            name='顧客'
-        ))
-        
-        # 選択された施設をプロット
-        selected_facilities = result.selected_facilities
-        fig.add_trace(go.Scattermapbox(
-            lat=[f.latitude for f in selected_facilities],
-            lon=[f.longitude for f in selected_facilities],
-            mode='markers',
-            marker=dict(size=15, color='red', symbol='star'),
-            text=[f.name for f in selected_facilities],
-            name='選択されたDC'
-        ))
+        coords = coordinate_array(customers)
+        demand = np.array([c.demand for c in customers], dtype=float)
+        names = [c.name for c in customers]
+        # 割当先の DC 候補インデックス（未割当は -1 → 0 番目の色）
+        customer_colors = np.array([result.customer_assignments.get(name, -1) for name in names],
+                                   dtype=np.int64)
+        labels = np.maximum(customer_colors, 0)
+        selected_facilities = result.facility_locations
+        
+        def build(markers: Dict[str, Any], include_flows: bool) -> go.Figure:
+            # 可視化
+            fig = go.Figure()
+            
+            # 顧客をプロット
+            trace = self._customer_marker_trace(markers, '顧客', color=markers['label'])
+            trace.marker.colorscale = 'Viridis'
+            if markers['count'].max(initial=1) == 1:
+                trace.marker.size = 5 + markers['demand'] / 10
+            fig.add_trace(trace)
+            
+            # 選択された施設をプロット
+            fig.add_trace(go.Scattermapbox(
+                lat=[f.latitude for f in selected_facilities],
+                lon=[f.longitude for f in selected_facilities],
+                mode='markers',
+                marker=dict(size=15, color='red', symbol='star'),
+                text=[f.name for f in selected_facilities],
+                name='選択されたDC'
+            ))
+            
+            # レイアウト設定
+            fig.update_layout(
+                mapbox=dict(
+                    style="carto-positron",
+                    center=dict(lat=float(coords[:, 0].mean()), lon=float(coords[:, 1].mean())),
+                    zoom=10
+                ),
+                showlegend=True,
+                title=f'K-Median最適化結果 (k={k})',
+                height=600
+            )
+            return fig
         
-        # レイアウト設定
-        center_lat = np.mean([c.latitude for c in customers])
-        center_lon = np.mean([c.longitude for c in customers])
+        rendered = self._decimated_map_figure(coords, demand, names, build, labels, max_markers,
+                                              zoom_levels, max_payload_bytes, typed_arrays)
         
-        fig.update_layout(
-            mapbox=dict(
-                style="carto-positron",
-                center=dict(lat=center_lat, lon=center_lon),
-                zoom=10
-            ),
-            showlegend=True,
-            title=f'K-Median最適化結果 (k={k})',
-            height=600
-        )
+        # 割当先 DC までの需要加重平均距離
+        distance_matrix = self.cached_distance_matrix(customers, dc_candidates)
+        assigned = customer_colors >= 0
+        distances = distance_matrix[np.flatnonzero(assigned), customer_colors[assigned]]
+        avg_distance = (float(np.average(distances, weights=demand[assigned]))
+                        if assigned.any() and demand[assigned].sum() > 0 else 0.0)
         
         return {
-            'plotly_figure': fig.to_dict(),
-            'k_median_result': result.__dict__,
+            'plotly_figure': rendered['plotly_figure'],
+            'zoom_layers': rendered['zoom_layers'],
+            'k_median_result': result.model_dump(),
             'optimization_stats': {
                 'selected_facilities': len(selected_facilities),
                 'total_cost': result.total_cost,
-                'avg_distance': result.avg_distance
+                'avg_distance': avg_distance,
+                'displayed_customer_markers': len(rendered['markers']['latitude']),
+                'display_zoom': rendered['display_zoom'],
+                'payload_bytes': rendered['payload_bytes']
             }
         }
     
@@ -2517,52 +3288,40 @@ class LogisticsOptimizationService:
                 'error': 'requests library not available'
             }
         
-        # 座標リストを作成
-        coordinates = []
-        for loc in locations:
-            coordinates.append(f"{loc.longitude},{loc.latitude}")
-        
-        coords_str = ";".join(coordinates)
+        # 同じ地点集合の道路行列がキャッシュにあれば再利用
+        coords = coordinate_array(locations)
+        distance_key = MatrixCache.make_key(coords, coords, f"road_distance:{osrm_host}:{osrm_port}")
+        duration_key = MatrixCache.make_key(coords, coords, f"road_duration:{osrm_host}:{osrm_port}")
+        cached_distances = self.matrix_cache.get(distance_key)
+        cached_durations = self.matrix_cache.get(duration_key)
+        cache_hit = cached_distances is not None and cached_durations is not None
+        self.matrix_cache.record(cache_hit)
+        if cache_hit:
+            return {
+                'distances': cached_distances,
+                'durations': cached_durations,
+                'code': 'Ok',
+                'locations': len(locations),
+                'cached': True
+            }
         
         try:
-            # OSRM table APIを呼び出し
-            url = f"http://{osrm_host}:{osrm_port}/table/v1/driving/{coords_str}"
-            params = {
-                'annotations': 'distance,duration'
-            }
-            
-            response = requests.get(url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                distances = np.array(data['distances'])  # メートル単位
-                durations = np.array(data['durations'])  # 秒単位
-                
-                return {
-                    'distances': distances,
-                    'durations': durations,
-                    'code': data.get('code', 'Ok'),
-                    'locations': len(locations)
-                }
+            # OSRM table APIを呼び出し（タイル分割・並列取得）
+            client = get_osrm_client(osrm_host, osrm_port)
+            store = get_road_matrix_store(osrm_host, osrm_port)
+            if store is None or len(coords) > store.max_locations:
+                matrices = client.table(coords, annotations=("distance", "duration"))
             else:
-                return {
-                    'distances': None,
-                    'durations': None,
-                    'error': f'OSRM API error: {response.status_code}'
-                }
-                
-        except requests.exceptions.Timeout:
+                # 永続ストアに未登録の地点の行・列だけを取得
+                indices = store.ensure(location_ids([loc.name for loc in locations], coords),
+                                       coords, client.table)
+                matrices = {name: store.submatrix(name, indices)
+                            for name in ("distances", "durations")}
+        except OSRMError as e:
             return {
                 'distances': None,
                 'durations': None,
-                'error': 'OSRM API timeout'
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                'distances': None,
-                'durations': None,
-                'error': f'OSRM API request failed: {str(e)}'
+                'error': str(e)
             }
         except Exception as e:
             return {
@@ -2570,6 +3329,16 @@ class LogisticsOptimizationService:
                 'durations': None,
                 'error': f'OSRM processing error: {str(e)}'
             }
+        
+        distances = self.matrix_cache.put(distance_key, matrices['distances'])  # メートル単位
+        durations = self.matrix_cache.put(duration_key, matrices['durations'])  # 秒単位
+        
+        return {
+            'distances': distances,
+            'durations': durations,
+            'code': 'Ok',
+            'locations': len(locations)
+        }
     
     def make_network_with_osrm(self, customers: List[CustomerData], dc_candidates: List[DCData],
                               plants: List[PlantData], osrm_host: str = "test-osrm-intel.aq-cloud.com",
@@ -2599,66 +3368,50 @@ class LogisticsOptimizationService:
             return network_result
     
     def transportation_simplex(self, supply: List[float], demand: List[float],
-                             cost_matrix: np.ndarray) -> Dict[str, Any]:
-        """輸送問題をネットワークシンプレックス法で解く（簡易版）"""
-        
-        if not PULP_AVAILABLE:
-            return {
-                'error': 'PuLP not available for transportation problem',
-                'flows': None
-            }
+                             cost_matrix: np.ndarray, warm_start: bool = True) -> Dict[str, Any]:
+        """
+        輸送問題を疎な枝リストの LP として HiGHS で解く
         
-        # 供給と需要のバランスチェック
-        total_supply = sum(supply)
-        total_demand = sum(demand)
+        費用が有限の (供給点, 需要点) の組だけを枝にする（np.inf の組は輸送不可）。
+        供給と需要が釣り合わない場合は多い側を「以下」制約にする（入力のリストは変更しない）。
+        供給・需要・枝が前回と同じで費用だけが変わった場合は、前回の解から解き直す。
         
-        if abs(total_supply - total_demand) > 1e-6:
-            # 不平衡問題：ダミーノードを追加
-            if total_supply > total_demand:
-                demand.append(total_supply - total_demand)
-                cost_matrix = np.vstack([cost_matrix, np.zeros(len(supply))])
+        Returns:
+            flows（(供給点数, 需要点数) のフロー行列）, total_cost, status, supply, demand と
+            求解情報（rounds, restricted_arcs, n_arcs）の辞書
+        """
+        supply = np.array(supply, dtype=float)
+        demand = np.array(demand, dtype=float)
+        cost_matrix = np.asarray(cost_matrix, dtype=float)
+        if cost_matrix.shape != (len(supply), len(demand)):
+            raise ValueError("cost_matrix must have shape (len(supply), len(demand))")
+        
+        digest = hashlib.blake2b(digest_size=20)
+        for array in (supply, demand, np.isfinite(cost_matrix)):
+            digest.update(str(array.shape).encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        key = digest.hexdigest()
+        with self._transportation_lock:
+            problem = self._transportation_problems.get(key)
+            if problem is None:
+                problem = TransportationProblem.from_dense(supply, demand, cost_matrix)
+                self._transportation_problems[key] = problem
+                while len(self._transportation_problems) > self.transportation_cache_size:
+                    self._transportation_problems.popitem(last=False)
             else:
-                supply.append(total_demand - total_supply)
-                cost_matrix = np.hstack([cost_matrix, np.zeros((len(demand), 1))])
-        
-        # PuLPで輸送問題を定義
-        prob = pulp.LpProblem("Transportation", pulp.LpMinimize)
-        
-        # 決定変数
-        x = {}
-        for i in range(len(supply)):
-            for j in range(len(demand)):
-                x[i,j] = pulp.LpVariable(f"x_{i}_{j}", lowBound=0)
-        
-        # 目的関数
-        prob += pulp.lpSum([cost_matrix[i,j] * x[i,j] 
-                           for i in range(len(supply)) 
-                           for j in range(len(demand))])
-        
-        # 供給制約
-        for i in range(len(supply)):
-            prob += pulp.lpSum([x[i,j] for j in range(len(demand))]) == supply[i]
-        
-        # 需要制約
-        for j in range(len(demand)):
-            prob += pulp.lpSum([x[i,j] for i in range(len(supply))]) == demand[j]
-        
-        # 求解
-        prob.solve(pulp.PULP_CBC_CMD(msg=0))
-        
-        # 結果の抽出
-        flows = np.zeros((len(supply), len(demand)))
-        if prob.status == pulp.LpStatusOptimal:
-            for i in range(len(supply)):
-                for j in range(len(demand)):
-                    flows[i,j] = x[i,j].varValue if x[i,j].varValue is not None else 0
+                self._transportation_problems.move_to_end(key)
+            
+            result = problem.solve(problem.dense_costs(cost_matrix), warm_start=warm_start)
         
         return {
-            'flows': flows,
-            'total_cost': pulp.value(prob.objective) if prob.status == pulp.LpStatusOptimal else None,
-            'status': pulp.LpStatus[prob.status],
-            'supply': supply,
-            'demand': demand
+            'flows': problem.dense_flows(result['flows']),
+            'total_cost': result['total_cost'],
+            'status': result['status'],
+            'supply': supply.tolist(),
+            'demand': demand.tolist(),
+            'rounds': result['rounds'],
+            'restricted_arcs': result['restricted_arcs'],
+            'n_arcs': problem.n_arcs
         }
     
     # =====================================================
@@ -3002,4 +3755,6 @@ class LogisticsOptimizationService:
             return {
                 'error': f'Excel template creation failed: {str(e)}',
                 'excel_data': None
-            }
\ No newline at end of file
+            }
+# サービスインスタンス
+logistics_service = LogisticsOptimizationService()
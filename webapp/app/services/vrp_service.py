@@ -21,6 +21,11 @@ from collections import defaultdict, OrderedDict
 from faker import Faker
 
 from typing import List, Optional, Union, Tuple, Dict, Set, Any, DefaultDict, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.osrm import OSRMError, get_osrm_client, matrix_to_lists
+from app.utils.road_matrix_store import get_road_matrix_store, location_ids
+from app.utils.time_matrix import matrices_from_time_df, time_df_from_matrices
 
 # 02metroVI.ipynb cell-34 から完全移植
 def optimize_vrp(model, matrix=False, threads=4, explore=5, cloud=False, osrm=False, host="localhost"):
@@ -192,30 +197,35 @@ def make_solution(output_dic: dict) -> tuple:
     return summary_df, route_summary_df, unassigned_df, route_df_dic
 
 # 02metroVI.ipynb cell-43 から完全移植
-def compute_distance_table_for_vrp(node_df, toll=True, host="localhost"):
+def compute_distance_table_for_vrp(node_df, toll=True, host="localhost", port=5000):
     """
     移動時間行列の計算関数 - 02metroVI.ipynb cell-43から完全移植
-    """
-    ROUTE = []
-    for row in node_df.itertuples():
-        ROUTE.append(ast.literal_eval(row.location))
-    route_str = ""
-    for (i, j) in ROUTE[:]:
-        route_str += str(i) + "," + str(j) + ";"
-        
-    if toll:
-        response = requests.get(f'http://{host}:5000/table/v1/driving/' + route_str[:-1] + "?annotations=distance,duration")
-    else:
-        response = requests.get(f'http://{host}:5000/table/v1/driving/' + route_str[:-1] + "?annotations=distance,duration&exclude=toll")
     
-    result = response.json()
-    # print(result)
+    OSRM の行列はタイルに分割して並列に取得する。経路がない組は None。
+    """
+    durations, distances = _osrm_tables_for_vrp(node_df, toll=toll, host=host, port=port)
+    return matrix_to_lists(durations), matrix_to_lists(distances)
+
+def _osrm_tables_for_vrp(node_df, toll=True, host="localhost", port=5000):
+    """node_df の location（[経度,緯度]）間の移動時間・距離行列を配列で取得（経路なしは NaN）"""
+    coords = [ast.literal_eval(row.location) for row in node_df.itertuples()]
+    latlon = np.array([[lat, lon] for lon, lat in coords], dtype=float).reshape(-1, 2)
+    client = get_osrm_client(host, port)
+    exclude = None if toll else "toll"
+    store = get_road_matrix_store(host, port, toll=toll)
     try:
-        durations = result["durations"]
-        distances = result["distances"]
-    except:
-        raise ValueError 
-    return durations, distances
+        if store is None or len(latlon) > store.max_locations:
+            result = client.table(latlon, exclude=exclude)
+        else:
+            # 永続ストアに未登録の地点の行・列だけを取得
+            names = node_df["name"] if "name" in node_df.columns else node_df.location
+            indices = store.ensure(location_ids(list(names), latlon), latlon,
+                                   lambda sources, destinations: client.table(
+                                       sources, destinations, exclude=exclude))
+            result = {name: store.submatrix(name, indices) for name in ("durations", "distances")}
+    except OSRMError as e:
+        raise ValueError(str(e)) from e
+    return result["durations"], result["distances"]
 
 # 02metroVI.ipynb cell-51 から完全移植
 def generate_node(n, random_seed=1, prefecture=None, matrix=False, host="localhost"):
@@ -271,7 +281,7 @@ def generate_node(n, random_seed=1, prefecture=None, matrix=False, host="localho
         
     return node_df, time_df
 
-def make_time_df_for_vrp(node_df, host="localhost"):
+def make_time_df_for_vrp(node_df, host="localhost", port=5000):
     """
     地点間の距離と移動時間のデータフレームを生成する関数 - 02metroVI.ipynb cell-48から完全移植
     """
@@ -280,37 +290,17 @@ def make_time_df_for_vrp(node_df, host="localhost"):
         node_df.reset_index(inplace=True)
     except:
         pass
-    durations, distances = compute_distance_table_for_vrp(node_df, toll=True, host=host)  # 高速利用
-    durations2, distances2 = compute_distance_table_for_vrp(node_df, toll=False, host=host)  # 高速利用なし
-    n = len(durations)
-    name_dic = node_df.name.to_dict()  # 番号を顧客名に写像
-    from_id, to_id, duration, distance, duration2, distance2 = [], [], [], [], [], []
-    from_name, to_name = [], [] 
-    for i in range(n):
-        for j in range(n):
-            if durations[i][j] is not None and durations2[i][j] is not None:
-                from_id.append(i)
-                to_id.append(j)
-                from_name.append(name_dic[i])
-                to_name.append(name_dic[j])
-                duration.append(int(durations[i][j]))
-                distance.append(int(distances[i][j]))
-                duration2.append(int(durations2[i][j]))
-                distance2.append(int(distances2[i][j]))
-            else:
-                # 距離・時間がない場合
-                from_id.append(i)
-                to_id.append(j)
-                from_name.append(name_dic[i])
-                to_name.append(name_dic[j])
-                duration.append(MAX_)
-                distance.append(MAX_)
-                duration2.append(MAX_)
-                distance2.append(MAX_)
-                
-    time_df = pd.DataFrame({"from_node": from_id, "from_name": from_name, "to_node": to_id,
-                            "to_name": to_name, "time": duration, "distance": distance, 
-                            "time(no toll)": duration2, "distance(no toll)": distance2})
+    # 高速利用あり・なしの行列を並行して取得
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        toll_future = executor.submit(_osrm_tables_for_vrp, node_df, True, host, port)  # 高速利用
+        no_toll_future = executor.submit(_osrm_tables_for_vrp, node_df, False, host, port)  # 高速利用なし
+        durations, distances = toll_future.result()
+        durations2, distances2 = no_toll_future.result()
+    # 全組を一括に展開（どちらかの経路がない組は全列 MAX_）
+    time_df = time_df_from_matrices(node_df.name, {
+        "time": durations, "distance": distances,
+        "time(no toll)": durations2, "distance(no toll)": distances2
+    }, fill_value=MAX_)
     return time_df
 
 # 02metroVI.ipynb cell-56 から完全移植
@@ -334,8 +324,9 @@ def generate_node_normal(n, lat_center, lon_center, std=0.1, country_code="ja_JP
     node_df["location"] = "[" + node_df.longitude.astype(str) + "," + node_df.latitude.astype(str) + "]"
 
     if matrix:
-        durations, distances, _ = compute_durations(node_df)
-        time_df = make_time_df(node_df, durations, distances)
+        durations, distances = _osrm_tables_for_vrp(node_df)
+        time_df = time_df_from_matrices(node_df.name, {"time": durations, "distance": distances},
+                                        fill_value=100000)
     else:
         time_df = ""
         
@@ -425,9 +416,9 @@ def build_model_for_vrp(job_df, shipment_df, vehicle_df, break_df, time_df=None,
 
     if time_df is not None:  # 移動時間行列を準備
         n = len(job_df) + (len(shipment_df) * 2 if shipment_df is not None else 0) + len(vehicle_df)
-        duration = np.full((n, n), 100000)  # 移動時間の上限を10万秒に設定
-        for (i, j, t) in zip(time_df["from_node"], time_df["to_node"], time_df["time"]):
-            duration[i, j] = t
+        # 移動時間の上限を10万秒に設定
+        duration = matrices_from_time_df(time_df, columns=("time",), n=n, fill_value=100000,
+                                         dtype=np.int64)["time"]
         L = duration.tolist()
     else:
         L = None
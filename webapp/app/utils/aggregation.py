@@ -0,0 +1,138 @@
+"""
+グリッド・ジオハッシュのセルによる地点の一括集約（需要重心・最大移動誤差）
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.utils.geo import EARTH_RADIUS_KM, great_circle_pairwise
+
+# 緯度1度あたりの距離 (km)
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_GEOHASH_PRECISION = 12
+
+
+def grid_cells(lat: np.ndarray, lon: np.ndarray, cell_km: float) -> np.ndarray:
+    """
+    一辺 cell_km のほぼ正方形のグリッドセルの番号（int64）
+
+    緯度方向は等間隔に切り、経度方向の幅は行の中心緯度の cos で広げる。
+    番号は行 × 2^32 + 列（行・列は負にならないようにずらす）。
+    """
+    if cell_km <= 0:
+        raise ValueError("cell_km must be positive")
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    cell_lat = cell_km / KM_PER_DEGREE
+    row = np.floor((lat + 90.0) / cell_lat)
+    center_lat = np.clip(row * cell_lat - 90.0 + cell_lat / 2, -89.9, 89.9)
+    cell_lon = cell_lat / np.cos(np.radians(center_lat))
+    col = np.floor((lon + 180.0) / cell_lon)
+    return (row.astype(np.int64) << 32) | col.astype(np.int64)
+
+
+def geohash_cells(lat: np.ndarray, lon: np.ndarray, precision: int) -> np.ndarray:
+    """
+    ジオハッシュ（precision 文字）を 5 × precision ビットの整数（int64）で計算
+
+    経度・緯度をそれぞれ量子化してからビットを交互に並べる（経度が先頭ビット）。
+    """
+    if not 1 <= precision <= MAX_GEOHASH_PRECISION:
+        raise ValueError(f"precision must be between 1 and {MAX_GEOHASH_PRECISION}")
+    n_bits = 5 * precision
+    lon_bits, lat_bits = (n_bits + 1) // 2, n_bits // 2
+    lon_q = np.clip(((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * (1 << lon_bits)),
+                    0, (1 << lon_bits) - 1).astype(np.int64)
+    lat_q = np.clip(((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0 * (1 << lat_bits)),
+                    0, (1 << lat_bits) - 1).astype(np.int64)
+    codes = np.zeros(lon_q.shape, dtype=np.int64)
+    for i in range(n_bits):
+        # 上位ビットから：偶数番目は経度、奇数番目は緯度
+        if i % 2 == 0:
+            bit = (lon_q >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_q >> (lat_bits - 1 - i // 2)) & 1
+        codes = (codes << 1) | bit
+    return codes
+
+
+def geohash_strings(codes: np.ndarray, precision: int) -> np.ndarray:
+    """geohash_cells の整数をジオハッシュ文字列に変換"""
+    codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+    shifts = 5 * np.arange(precision - 1, -1, -1)
+    chars = np.array(list(GEOHASH_BASE32))[(codes[:, None] >> shifts) & 31]
+    return np.array(["".join(row) for row in chars], dtype=object)
+
+
+def aggregate_points(lat: np.ndarray, lon: np.ndarray, demand: np.ndarray,
+                     cells: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    セル番号ごとに需要重心・総需要・地点数・最大移動誤差を集計
+
+    需要の合計が 0 のセルは単純平均の位置を重心にする。
+
+    Args:
+        lat, lon, demand: (n,) 地点の緯度・経度・需要
+        cells: (n,) 地点のセル番号（整数）
+
+    Returns:
+        cell_of_point（地点ごとの集約後インデックス、初出順）, cell_ids, latitude, longitude,
+        demand, count, max_displacement_km（セル内の地点から重心までの最大距離）,
+        displacement_km（地点ごとの移動距離）の辞書
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    demand = np.asarray(demand, dtype=np.float64)
+    index, cell_ids = pd.factorize(np.asarray(cells), sort=False)
+    k = len(cell_ids)
+
+    count = np.bincount(index, minlength=k).astype(np.float64)
+    total = np.bincount(index, weights=demand, minlength=k)
+    weighted = total > 0
+    weights = np.where(weighted[index], demand, 1.0)
+    weight_sums = np.where(weighted, total, count)
+    center_lat = np.bincount(index, weights=lat * weights, minlength=k) / weight_sums
+    center_lon = np.bincount(index, weights=lon * weights, minlength=k) / weight_sums
+
+    displacement = great_circle_pairwise(np.column_stack([lat, lon]),
+                                         np.column_stack([center_lat[index], center_lon[index]]))
+    max_displacement = np.zeros(k)
+    np.maximum.at(max_displacement, index, displacement)
+    return {
+        "cell_of_point": index,
+        "cell_ids": np.asarray(cell_ids),
+        "latitude": center_lat,
+        "longitude": center_lon,
+        "demand": total,
+        "count": count.astype(np.int64),
+        "max_displacement_km": max_displacement,
+        "displacement_km": displacement
+    }
+
+
+def aggregate_by_cell(lat: np.ndarray, lon: np.ndarray, demand: np.ndarray, method: str = "grid",
+                      cell_km: float = 1.0, geohash_precision: int = 6) -> Dict[str, np.ndarray]:
+    """
+    地点をグリッド（method="grid"、一辺 cell_km）またはジオハッシュ（method="geohash"、
+    geohash_precision 文字）のセルに集約（戻り値は aggregate_points と同じ）
+    """
+    if method == "grid":
+        cells = grid_cells(lat, lon, cell_km)
+    elif method == "geohash":
+        cells = geohash_cells(lat, lon, geohash_precision)
+    else:
+        raise ValueError(f"Unknown aggregation method: {method}")
+    return aggregate_points(lat, lon, demand, cells)
+
+
+def cell_names(cell_ids: np.ndarray, method: str, geohash_precision: Optional[int] = None) -> np.ndarray:
+    """集約後の地点名（グリッドは CELL_行_列、ジオハッシュは GH_ジオハッシュ）"""
+    cell_ids = np.asarray(cell_ids, dtype=np.int64)
+    if method == "geohash":
+        return np.array([f"GH_{code}" for code in geohash_strings(cell_ids, geohash_precision)],
+                        dtype=object)
+    rows, cols = cell_ids >> 32, cell_ids & 0xFFFFFFFF
+    return np.array([f"CELL_{row}_{col}" for row, col in zip(rows, cols)], dtype=object)
@@ -0,0 +1,165 @@
+"""
+需要データファイル（CSV / Parquet）の読み込みと列ごとのスキーマ検査
+
+JSON の DemandRecord のリストを1行ずつ検証する代わりに、ファイルを列単位で読み込み、
+列ごとに型と欠損を検査して DemandRecord と同じ列を持つ DataFrame にする。
+pyarrow があれば CSV も pyarrow で読み（マルチスレッド）、なければ CSV は pandas で読む
+（Parquet には pyarrow が必要）。
+"""
+
+import io
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# DemandRecord の列（文字列・数値の列と必須の列）
+STRING_COLUMNS = ("date", "cust", "prod")
+NUMERIC_COLUMNS = ("demand", "promo_0", "promo_1", "sales")
+REQUIRED_COLUMNS = ("date", "cust", "prod", "demand")
+DEMAND_COLUMNS = STRING_COLUMNS + NUMERIC_COLUMNS
+
+FILE_FORMATS = ("csv", "parquet")
+_EXTENSIONS = {".csv": "csv", ".txt": "csv", ".parquet": "parquet", ".pq": "parquet"}
+
+
+class DemandSchemaError(ValueError):
+    """需要データの列が不足している・型が合わない・必須の値が欠けている"""
+
+
+def detect_format(filename: Optional[str], file_format: Optional[str] = None) -> str:
+    """明示された形式、なければファイル名の拡張子から "csv" / "parquet" を決める"""
+    if file_format:
+        file_format = file_format.lower()
+        if file_format not in FILE_FORMATS:
+            raise DemandSchemaError(f"未対応のファイル形式です: {file_format}（csv / parquet）")
+        return file_format
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in _EXTENSIONS:
+        raise DemandSchemaError(f"ファイル形式を判定できません: {filename}（file_format を指定してください）")
+    return _EXTENSIONS[extension]
+
+
+def read_demand_file(content: bytes, file_format: str) -> pd.DataFrame:
+    """
+    CSV / Parquet の需要データを読み込み、列ごとに検査した DataFrame を返す
+
+    DemandRecord にない列（CSV の無名のインデックス列など）は使わない。
+    date・cust・prod は文字列（Parquet の日付型はそのまま）、数値の列は float64 にする。
+
+    Raises:
+        DemandSchemaError: 列の不足・型の不一致・必須の列の欠損がある場合（問題のある列をすべて示す）
+    """
+    if not content:
+        raise DemandSchemaError("ファイルが空です")
+    if file_format == "parquet":
+        if not PYARROW_AVAILABLE:
+            raise DemandSchemaError("Parquet ファイルの読み込みには pyarrow が必要です")
+        return _read_arrow(_read_parquet_table(content))
+    if PYARROW_AVAILABLE:
+        return _read_arrow(_read_csv_table(content))
+    return _read_pandas_csv(content)
+
+
+def _read_csv_table(content: bytes) -> "pa.Table":
+    try:
+        return pa_csv.read_csv(
+            io.BytesIO(content),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in STRING_COLUMNS},
+                # pandas と同じく空欄の文字列は欠損値にする
+                strings_can_be_null=True
+            )
+        )
+    except pa.ArrowInvalid as e:
+        raise DemandSchemaError(f"CSV を読み込めません: {e}")
+
+
+def _read_parquet_table(content: bytes) -> "pa.Table":
+    try:
+        schema = pq.read_schema(io.BytesIO(content))
+        columns = [name for name in DEMAND_COLUMNS if name in schema.names]
+        return pq.read_table(io.BytesIO(content), columns=columns)
+    except pa.ArrowInvalid as e:
+        raise DemandSchemaError(f"Parquet を読み込めません: {e}")
+
+
+def _read_arrow(table: "pa.Table") -> pd.DataFrame:
+    """pyarrow のテーブルを列ごとに検査・変換して DataFrame にする"""
+    problems: List[str] = []
+    columns: Dict[str, "pa.ChunkedArray"] = {}
+    for name in DEMAND_COLUMNS:
+        if name not in table.column_names:
+            if name in REQUIRED_COLUMNS:
+                problems.append(f"{name}: 列がありません")
+            continue
+        column = table.column(name)
+        dtype = column.type
+        if name in NUMERIC_COLUMNS:
+            if not (pa.types.is_integer(dtype) or pa.types.is_floating(dtype)
+                    or pa.types.is_null(dtype)):
+                problems.append(f"{name}: 数値ではありません（{dtype}）")
+                continue
+            column = column.cast(pa.float64())
+        elif pa.types.is_dictionary(dtype):
+            column = column.cast(dtype.value_type)
+        elif not (pa.types.is_string(dtype) or pa.types.is_large_string(dtype)
+                  or (name == "date" and (pa.types.is_timestamp(dtype) or pa.types.is_date(dtype)))):
+            column = column.cast(pa.string())
+        if name in REQUIRED_COLUMNS:
+            missing = column.null_count
+            if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                # Parquet の空文字列も欠損として数える
+                missing += pc.sum(pc.equal(column, "")).as_py() or 0
+            if missing:
+                problems.append(f"{name}: 欠損値が {missing} 件あります")
+        columns[name] = column
+    if problems:
+        raise DemandSchemaError("需要データの列が不正です: " + "; ".join(problems))
+    if table.num_rows == 0:
+        raise DemandSchemaError("需要データに行がありません")
+    return pa.table(columns).to_pandas()
+
+
+def _read_pandas_csv(content: bytes) -> pd.DataFrame:
+    """pyarrow がない環境の CSV の読み込み（pandas の C パーサー）"""
+    try:
+        df = pd.read_csv(io.BytesIO(content), usecols=lambda name: name in DEMAND_COLUMNS,
+                         dtype={name: str for name in STRING_COLUMNS})
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise DemandSchemaError(f"CSV を読み込めません: {e}")
+    problems: List[str] = []
+    for name in DEMAND_COLUMNS:
+        if name not in df.columns:
+            if name in REQUIRED_COLUMNS:
+                problems.append(f"{name}: 列がありません")
+            continue
+        if name in NUMERIC_COLUMNS:
+            if not (pd.api.types.is_numeric_dtype(df[name]) or df[name].isna().all()):
+                problems.append(f"{name}: 数値ではありません（{df[name].dtype}）")
+                continue
+            df[name] = df[name].astype(np.float64)
+        if name in REQUIRED_COLUMNS:
+            missing = int(df[name].isna().sum())
+            if missing:
+                problems.append(f"{name}: 欠損値が {missing} 件あります")
+    if problems:
+        raise DemandSchemaError("需要データの列が不正です: " + "; ".join(problems))
+    if df.empty:
+        raise DemandSchemaError("需要データに行がありません")
+    return df[[name for name in DEMAND_COLUMNS if name in df.columns]]
+
+
+def analyze_demand_file(content: bytes, file_format: str, analysis: Callable[..., Any], *args: Any) -> Any:
+    """ワーカーで実行：需要データファイルを読み込み analysis(demand_df, *args) を返す"""
+    return analysis(read_demand_file(content, file_format), *args)
@@ -0,0 +1,406 @@
+"""
+CPU 負荷の高いサービス呼び出しをエンドポイント区分ごとのプロセスプールで実行する層
+
+async エンドポイントから重い同期処理を直接呼ぶとイベントループが止まり、同じ uvicorn
+ワーカーの他のリクエスト（/health など）も待たされる。ここでは区分（optimization,
+inventory, routing, analysis）ごとに上限付きのプロセスプールを用意し、
+`await run_cpu_bound(区分, 対象, ...)` で処理をワーカープロセスに送る。
+
+大きな入力は次のように渡す:
+    - 一定サイズ以上の NumPy 配列は共有メモリに置き、ワーカーではコピーせずに参照する
+    - 同じ型の pydantic モデルの長いリスト（顧客リストなど）は列ごとの配列にして送り、
+      ワーカーで model_construct により復元する（検証済みの値なので再検証しない）
+"""
+
+import asyncio
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.utils.progress import ProgressChannel, current_progress_listener, thread_channel
+
+# 区分ごとの既定のワーカー数
+DEFAULT_WORKERS = {
+    "optimization": 2,
+    "inventory": 2,
+    "routing": 2,
+    "analysis": 1,
+}
+# "process"（既定）または "thread"（プロセスを起動できない環境向け）
+MODE_ENV = "SCM_EXECUTOR_MODE"
+# 例: "optimization=4,analysis=2"
+WORKERS_ENV = "SCM_EXECUTOR_WORKERS"
+# この大きさ以上の NumPy 配列は共有メモリで渡す
+SHARED_MEMORY_MIN_BYTES = 1 << 20
+# この件数以上の pydantic モデルのリストは列ごとの配列で渡す
+MODEL_COLUMNS_MIN_ITEMS = 1000
+# broadcast で全ワーカーがそろうまで待つ秒数
+BROADCAST_TIMEOUT = 30.0
+
+Target = Union[str, Callable[..., Any]]
+
+
+class SharedArray:
+    """共有メモリに置いた NumPy 配列の参照（ワーカーに渡す）"""
+
+    def __init__(self, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        self.shape, self.dtype = array.shape, array.dtype.str
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.name = self._shm.name
+        np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)[...] = array
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._shm = None
+
+    def open(self) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+        """ワーカー側で配列を開く（返す SharedMemory は使用後に close する）"""
+        shm = shared_memory.SharedMemory(name=self.name)
+        return np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf), shm
+
+    def release(self) -> None:
+        """呼び出し側で共有メモリを解放"""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class ModelColumns:
+    """同じ型の pydantic モデルのリストを列ごとの配列にしたもの"""
+
+    def __init__(self, models: List[BaseModel]):
+        self.model_cls = type(models[0])
+        self.columns: Dict[str, Any] = {}
+        for field in self.model_cls.model_fields:
+            values = [getattr(model, field) for model in models]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                array = np.asarray(values)
+                self.columns[field] = (SharedArray(array) if array.nbytes >= SHARED_MEMORY_MIN_BYTES
+                                       else array)
+            else:
+                self.columns[field] = values
+        self.length = len(models)
+
+    @staticmethod
+    def accepts(value: Any) -> bool:
+        """列ごとの配列にできるリスト（同じ型の平坦な pydantic モデル）か"""
+        if not isinstance(value, list) or len(value) < MODEL_COLUMNS_MIN_ITEMS:
+            return False
+        model_cls = type(value[0])
+        if not issubclass(model_cls, BaseModel) or any(type(v) is not model_cls for v in value):
+            return False
+        return not any(isinstance(getattr(value[0], field), (BaseModel, list, dict))
+                       for field in model_cls.model_fields)
+
+    def restore(self, handles: List[shared_memory.SharedMemory]) -> List[BaseModel]:
+        columns = {}
+        for field, column in self.columns.items():
+            if isinstance(column, SharedArray):
+                column, shm = column.open()
+                handles.append(shm)
+            columns[field] = column.tolist() if isinstance(column, np.ndarray) else column
+        fields = list(columns)
+        return [self.model_cls.model_construct(**dict(zip(fields, row)))
+                for row in zip(*(columns[field] for field in fields))]
+
+    def release(self) -> None:
+        for column in self.columns.values():
+            if isinstance(column, SharedArray):
+                column.release()
+
+
+def _pack(value: Any) -> Any:
+    """大きな入力を共有メモリ・列ごとの配列に置き換える"""
+    if isinstance(value, np.ndarray) and value.nbytes >= SHARED_MEMORY_MIN_BYTES:
+        return SharedArray(value)
+    if ModelColumns.accepts(value):
+        return ModelColumns(value)
+    return value
+
+
+def _unpack(value: Any, handles: List[shared_memory.SharedMemory]) -> Any:
+    if isinstance(value, SharedArray):
+        array, shm = value.open()
+        handles.append(shm)
+        return array
+    if isinstance(value, ModelColumns):
+        return value.restore(handles)
+    return value
+
+
+def _release(value: Any) -> None:
+    if isinstance(value, (SharedArray, ModelColumns)):
+        value.release()
+
+
+def resolve_target(target: Target) -> Callable[..., Any]:
+    """
+    "パッケージ.モジュール:属性.属性" の文字列を呼び出し可能オブジェクトに解決
+
+    例: "app.services.inventory_service:inventory_service.best_distribution"
+    （ワーカープロセスでは同じモジュールの同じ名前のインスタンスのメソッドになる）
+    """
+    if callable(target):
+        return target
+    module_name, _, attribute_path = target.partition(":")
+    obj: Any = importlib.import_module(module_name)
+    for attribute in attribute_path.split("."):
+        obj = getattr(obj, attribute)
+    return obj
+
+
+def _invoke(target: Target, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+    """ワーカーで実行：入力を復元して呼び出す（共有メモリは結果を返す前に閉じる）"""
+    handles: List[shared_memory.SharedMemory] = []
+    try:
+        args = tuple(_unpack(value, handles) for value in args)
+        kwargs = {key: _unpack(value, handles) for key, value in kwargs.items()}
+        return resolve_target(target)(*args, **kwargs)
+    finally:
+        del args, kwargs
+        for shm in handles:
+            try:
+                shm.close()
+            except BufferError:
+                # 結果が共有メモリの配列を参照している場合はプロセスの終了時に閉じる
+                pass
+
+
+def _broadcast_invoke(barrier: Any, target: Target, args: Tuple[Any, ...],
+                      kwargs: Dict[str, Any]) -> Tuple[int, Any]:
+    """ワーカーで実行：broadcast の全タスクが別々のワーカーに入るまで待ってから呼び出す"""
+    if barrier is not None:
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            # 他のワーカーが空かなかった：このワーカーの分だけ実行する
+            pass
+    return os.getpid(), resolve_target(target)(*args, **kwargs)
+
+
+class _PoolStats:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+
+
+class CPUBoundExecutor:
+    """
+    エンドポイント区分ごとのプロセスプール（プールは最初の呼び出しで起動）
+
+    Args:
+        workers: 区分 → ワーカー数（省略した区分は DEFAULT_WORKERS、環境変数で上書き可）
+        mode: "process" または "thread"（省略時は環境変数 SCM_EXECUTOR_MODE、既定 "process"）
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None, mode: Optional[str] = None):
+        self.workers = dict(DEFAULT_WORKERS)
+        for item in filter(None, os.environ.get(WORKERS_ENV, "").split(",")):
+            name, _, count = item.partition("=")
+            self.workers[name.strip()] = int(count)
+        self.workers.update(workers or {})
+        self.mode = mode or os.environ.get(MODE_ENV, "process")
+        if self.mode not in ("process", "thread"):
+            raise ValueError(f"Unknown executor mode: {self.mode}")
+        self._pools: Dict[str, Executor] = {}
+        self._stats: Dict[str, _PoolStats] = {}
+        self._lock = threading.Lock()
+        # 進捗イベントのキューを持つマネージャープロセス（プロセスモードで最初に必要になったとき起動）
+        self._manager = None
+
+    def _get_manager(self) -> Any:
+        """進捗のキューや broadcast のバリアを持つマネージャープロセス（最初に必要になったとき起動）"""
+        with self._lock:
+            if self._manager is None:
+                self._manager = get_context("spawn").Manager()
+            return self._manager
+
+    def _pool(self, endpoint_class: str) -> Executor:
+        with self._lock:
+            pool = self._pools.get(endpoint_class)
+            if pool is None:
+                if endpoint_class not in self.workers:
+                    raise ValueError(f"Unknown endpoint class: {endpoint_class}")
+                workers = max(1, self.workers[endpoint_class])
+                if self.mode == "process":
+                    # fork はスレッドを持つサーバープロセスでは安全でないため spawn で起動する
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+                else:
+                    pool = ThreadPoolExecutor(max_workers=workers,
+                                              thread_name_prefix=f"cpu-{endpoint_class}")
+                self._pools[endpoint_class] = pool
+                self._stats[endpoint_class] = _PoolStats(workers)
+            return pool
+
+    async def run(self, endpoint_class: str, target: Target, *args: Any, **kwargs: Any) -> Any:
+        """
+        target(*args, **kwargs) を区分 endpoint_class のプールで実行して結果を待つ
+
+        Args:
+            endpoint_class: "optimization" / "inventory" / "routing" / "analysis" など
+            target: モジュールレベルの関数、または "モジュール:属性.属性" 形式の文字列
+                    （サービスのインスタンスのメソッドは文字列で指定する）
+        """
+        pool = self._pool(endpoint_class)
+        stats = self._stats[endpoint_class]
+        if self.mode == "process":
+            args = tuple(_pack(value) for value in args)
+            kwargs = {key: _pack(value) for key, value in kwargs.items()}
+        with self._lock:
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        start = time.perf_counter()
+        failed = False
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, _invoke, target, args, kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+                stats.completed += not failed
+                stats.failed += failed
+                stats.total_seconds += time.perf_counter() - start
+            for value in (*args, *kwargs.values()):
+                _release(value)
+
+    async def broadcast(self, endpoint_class: str, target: Target, *args: Any,
+                        timeout: float = BROADCAST_TIMEOUT, **kwargs: Any) -> Dict[int, Any]:
+        """
+        target(*args, **kwargs) を区分 endpoint_class の各ワーカーで1回ずつ実行し、
+        プロセスID → 結果 の辞書を返す（ワーカーごとのキャッシュの集計・クリアに使う）
+
+        プロセスモードではワーカー数と同じ数のタスクをバリアで待ち合わせるため、各タスクは
+        別々のワーカーで実行される。実行中の処理で timeout 秒以内にワーカーがそろわない場合は
+        待ち合わせをやめ、実行できたワーカーの結果だけを返す。
+        スレッドモードではワーカーが同じプロセスなので1回だけ実行する。
+        """
+        if self.mode == "thread":
+            pid, result = await self.run(endpoint_class, _broadcast_invoke, None, target, args, kwargs)
+            return {pid: result}
+        self._pool(endpoint_class)
+        workers = self._stats[endpoint_class].workers
+        barrier = self._get_manager().Barrier(workers, timeout=timeout)
+        results = await asyncio.gather(*(
+            self.run(endpoint_class, _broadcast_invoke, barrier, target, args, kwargs)
+            for _ in range(workers)
+        ))
+        return dict(results)
+
+    def progress_channel(self) -> ProgressChannel:
+        """ワーカーから進捗イベントを受け取る通り道（プロセスモードではマネージャーのキューを使う）"""
+        if self.mode == "thread":
+            return thread_channel()
+        manager = self._get_manager()
+        return ProgressChannel(manager.Queue(), manager.Event())
+
+    async def run_with_progress(self, endpoint_class: str, target: Target, *args: Any, **kwargs: Any) -> Any:
+        """
+        run() と同じだが、進捗のリスナー（use_progress_listener）が設定されていれば
+        target に progress_callback / progress_interval を渡し、進捗をリスナーに転送する
+
+        リスナーが停止を要求すると、ソルバーはその時点の最良解を返して終了する。
+        """
+        listener = current_progress_listener()
+        if listener is None:
+            return await self.run(endpoint_class, target, *args, **kwargs)
+        channel = self.progress_channel()
+        kwargs.update(progress_callback=channel.sink, progress_interval=listener.interval)
+        task = asyncio.ensure_future(self.run(endpoint_class, target, *args, **kwargs))
+        try:
+            await channel.forward(listener, task)
+        except asyncio.CancelledError:
+            channel.request_stop()
+            task.cancel()
+            raise
+        return task.result()
+
+    def stats(self) -> Dict[str, Any]:
+        """区分ごとのワーカー数・実行中・待ち行列の長さ（queued）・完了数"""
+        with self._lock:
+            classes = {}
+            for name, workers in self.workers.items():
+                stats = self._stats.get(name)
+                if stats is None:
+                    classes[name] = {"workers": workers, "started": False, "in_flight": 0,
+                                     "running": 0, "queued": 0, "max_in_flight": 0,
+                                     "completed": 0, "failed": 0, "average_seconds": 0.0}
+                    continue
+                finished = stats.completed + stats.failed
+                classes[name] = {
+                    "workers": stats.workers,
+                    "started": True,
+                    "in_flight": stats.in_flight,
+                    "running": min(stats.in_flight, stats.workers),
+                    "queued": max(0, stats.in_flight - stats.workers),
+                    "max_in_flight": stats.max_in_flight,
+                    "completed": stats.completed,
+                    "failed": stats.failed,
+                    "average_seconds": stats.total_seconds / finished if finished else 0.0
+                }
+            return {"mode": self.mode, "classes": classes}
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pools, self._pools = self._pools, {}
+            self._stats = {}
+            manager, self._manager = self._manager, None
+        for pool in pools.values():
+            pool.shutdown(wait=wait, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+
+_executor: Optional[CPUBoundExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> CPUBoundExecutor:
+    """アプリ全体で共有する CPUBoundExecutor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = CPUBoundExecutor()
+        return _executor
+
+
+async def run_cpu_bound(endpoint_class: str, target: Target, *args: Any, **kwargs: Any) -> Any:
+    """共有の CPUBoundExecutor で target を実行（エンドポイントから呼ぶ）"""
+    return await get_executor().run(endpoint_class, target, *args, **kwargs)
+
+
+async def run_cpu_bound_with_progress(endpoint_class: str, target: Target, *args: Any, **kwargs: Any) -> Any:
+    """進捗を報告できるソルバーを共有の CPUBoundExecutor で実行（CPUBoundExecutor.run_with_progress）"""
+    return await get_executor().run_with_progress(endpoint_class, target, *args, **kwargs)
+
+
+async def broadcast_cpu_bound(endpoint_class: str, target: Target, *args: Any, **kwargs: Any) -> Dict[int, Any]:
+    """共有の CPUBoundExecutor の区分 endpoint_class の各ワーカーで target を実行（CPUBoundExecutor.broadcast）"""
+    return await get_executor().broadcast(endpoint_class, target, *args, **kwargs)
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """アプリ終了時にプールを停止"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
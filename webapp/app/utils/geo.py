@@ -0,0 +1,131 @@
+"""
+距離計算カーネル（NumPyブロードキャストによる一括計算）
+"""
+
+import numpy as np
+from typing import Optional, Sequence
+
+# geopy.distance.great_circle と同じ地球半径 (km)
+EARTH_RADIUS_KM = 6371.009
+
+DEFAULT_BLOCK_SIZE = 2048
+
+
+def coordinate_array(locations: Sequence, dtype=np.float64) -> np.ndarray:
+    """緯度・経度属性を持つオブジェクトのリストを (n, 2) 配列に変換"""
+    if len(locations) == 0:
+        return np.zeros((0, 2), dtype=dtype)
+    return np.array([[loc.latitude, loc.longitude] for loc in locations], dtype=dtype)
+
+
+def great_circle_from_trig(sin_lat1: np.ndarray, cos_lat1: np.ndarray, lon1: np.ndarray,
+                           sin_lat2: np.ndarray, cos_lat2: np.ndarray, lon2: np.ndarray,
+                           radius: float = EARTH_RADIUS_KM) -> np.ndarray:
+    """
+    緯度の sin/cos と経度（ラジアン）から大円距離 (km) を計算
+
+    反復計算で同じ点の三角関数を再利用するための低水準関数。
+    引数はブロードキャスト可能な形状であればよい。
+    """
+    delta_lon = lon2 - lon1
+    cos_delta_lon = np.cos(delta_lon)
+    y = np.hypot(cos_lat2 * np.sin(delta_lon),
+                 cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_delta_lon)
+    x = sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_delta_lon
+    return radius * np.arctan2(y, x)
+
+
+def great_circle_matrix(coords1: np.ndarray, coords2: np.ndarray,
+                        dtype=np.float64, block_size: Optional[int] = None,
+                        radius: float = EARTH_RADIUS_KM) -> np.ndarray:
+    """
+    大円距離行列 (km) を行ブロック単位で計算
+
+    geopy の great_circle と同じ式（atan2 形式）を用いるため、
+    float64 では geopy と丸め誤差の範囲で一致する。
+
+    Args:
+        coords1: (n, 2) の [緯度, 経度] 配列（度）
+        coords2: (m, 2) の [緯度, 経度] 配列（度）
+        dtype: 計算・出力の浮動小数点型（np.float32 / np.float64）
+        block_size: 一度に処理する行数（メモリ使用量は block_size × m）
+        radius: 球の半径 (km)
+
+    Returns:
+        (n, m) の距離行列
+    """
+    dtype = np.dtype(dtype)
+    coords1 = np.asarray(coords1, dtype=dtype).reshape(-1, 2)
+    coords2 = np.asarray(coords2, dtype=dtype).reshape(-1, 2)
+    n, m = len(coords1), len(coords2)
+    block_size = block_size or DEFAULT_BLOCK_SIZE
+
+    result = np.empty((n, m), dtype=dtype)
+    if n == 0 or m == 0:
+        return result
+
+    lat2 = np.radians(coords2[:, 0])
+    lon2 = np.radians(coords2[:, 1])
+    sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        lat1 = np.radians(coords1[start:stop, 0])[:, None]
+        lon1 = np.radians(coords1[start:stop, 1])[:, None]
+        result[start:stop] = great_circle_from_trig(
+            np.sin(lat1), np.cos(lat1), lon1, sin_lat2, cos_lat2, lon2, radius)
+
+    return result
+
+
+def great_circle_pairwise(coords1: np.ndarray, coords2: np.ndarray,
+                          dtype=np.float64, radius: float = EARTH_RADIUS_KM) -> np.ndarray:
+    """対応する点の組 (coords1[i], coords2[i]) ごとの大円距離 (km) を計算"""
+    dtype = np.dtype(dtype)
+    coords1 = np.radians(np.asarray(coords1, dtype=dtype).reshape(-1, 2))
+    coords2 = np.radians(np.asarray(coords2, dtype=dtype).reshape(-1, 2))
+    lat1, lon1 = coords1[:, 0], coords1[:, 1]
+    lat2, lon2 = coords2[:, 0], coords2[:, 1]
+    return great_circle_from_trig(np.sin(lat1), np.cos(lat1), lon1,
+                                  np.sin(lat2), np.cos(lat2), lon2, radius)
+
+
+def euclidean_matrix(coords1: np.ndarray, coords2: np.ndarray,
+                     dtype=np.float64, block_size: Optional[int] = None) -> np.ndarray:
+    """緯度経度空間でのユークリッド距離行列を行ブロック単位で計算"""
+    dtype = np.dtype(dtype)
+    coords1 = np.asarray(coords1, dtype=dtype).reshape(-1, 2)
+    coords2 = np.asarray(coords2, dtype=dtype).reshape(-1, 2)
+    n, m = len(coords1), len(coords2)
+    block_size = block_size or DEFAULT_BLOCK_SIZE
+
+    result = np.empty((n, m), dtype=dtype)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        diff = coords1[start:stop, None, :] - coords2[None, :, :]
+        result[start:stop] = np.sqrt(np.sum(diff * diff, axis=2))
+    return result
+
+
+def euclidean_pairwise(coords1: np.ndarray, coords2: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """対応する点の組ごとの緯度経度空間でのユークリッド距離を計算"""
+    diff = (np.asarray(coords1, dtype=dtype).reshape(-1, 2)
+            - np.asarray(coords2, dtype=dtype).reshape(-1, 2))
+    return np.hypot(diff[:, 0], diff[:, 1])
+
+
+def distance_pairwise(coords1: np.ndarray, coords2: np.ndarray,
+                      use_great_circle: bool = True, dtype=np.float64) -> np.ndarray:
+    """対応する点の組ごとの大円距離またはユークリッド距離を計算"""
+    if use_great_circle:
+        return great_circle_pairwise(coords1, coords2, dtype=dtype)
+    return euclidean_pairwise(coords1, coords2, dtype=dtype)
+
+
+def distance_matrix(coords1: np.ndarray, coords2: np.ndarray,
+                    use_great_circle: bool = True, dtype=np.float64,
+                    block_size: Optional[int] = None) -> np.ndarray:
+    """大円距離またはユークリッド距離の行列を計算"""
+    if use_great_circle:
+        return great_circle_matrix(coords1, coords2, dtype=dtype, block_size=block_size)
+    return euclidean_matrix(coords1, coords2, dtype=dtype, block_size=block_size)
@@ -0,0 +1,250 @@
+"""
+非同期ジョブの状態・結果の永続ストア（sqlite）
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# 保存先ファイルの環境変数
+JOB_DB_ENV = "SCM_JOB_DB"
+DEFAULT_JOB_DB = "./data/jobs.sqlite3"
+# 終了したジョブを残す秒数の環境変数（0 以下なら削除しない）
+JOB_RETENTION_ENV = "SCM_JOB_RETENTION"
+DEFAULT_JOB_RETENTION = 7 * 24 * 3600.0
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    request TEXT NOT NULL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+# 状態の問い合わせで返す列（結果本体は含めない）
+_STATUS_COLUMNS = ("job_id, kind, status, progress, message, error, owner, attempts, "
+                   "created_at, started_at, finished_at")
+
+
+# 同じ PID で再起動したプロセス（コンテナの PID 1 など）を区別するための起動ごとの値
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def process_owner() -> str:
+    """このプロセスを表す所有者名（ホスト名:PID:起動ごとの値）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_TOKEN}"
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    """所有者のプロセスが動いているか（別ホストの所有者は動いているとみなす）"""
+    if not owner:
+        return False
+    if owner == process_owner():
+        return True
+    host, _, rest = owner.partition(":")
+    pid, _, _ = rest.partition(":")
+    if host != socket.gethostname():
+        return True
+    if pid == str(os.getpid()):
+        # 同じ PID で起動値が違う = 以前のこのプロセス
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    ジョブの状態・進捗・リクエスト・結果（JSON文字列）を保持する sqlite ストア
+
+    複数の uvicorn ワーカーが同じファイルを共有できるよう WAL モードで開き、
+    状態の遷移は「遷移前の状態」を条件にした UPDATE で行う（終了したジョブは上書きしない）。
+
+    Args:
+        path: sqlite ファイルのパス
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _fetchone(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, kind: str, request: Dict[str, Any]) -> str:
+        """ジョブを登録して ID を返す（状態は queued、所有者はこのプロセス）"""
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (job_id, kind, status, owner, created_at, request) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, process_owner(), time.time(), json.dumps(request, ensure_ascii=False))
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態（結果本体を除く）"""
+        row = self._fetchone(f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,))
+        return dict(row) if row is not None else None
+
+    def request(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """登録時のリクエスト"""
+        row = self._fetchone("SELECT request FROM jobs WHERE job_id = ?", (job_id,))
+        return json.loads(row["request"]) if row is not None else None
+
+    def result(self, job_id: str) -> Optional[str]:
+        """完了したジョブの結果（保存した JSON 文字列のまま返す）"""
+        row = self._fetchone("SELECT result FROM jobs WHERE job_id = ? AND status = ?",
+                             (job_id, COMPLETED))
+        return row["result"] if row is not None else None
+
+    def list(self, status: Optional[str] = None, kind: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        """新しい順のジョブの状態一覧"""
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._fetchall(f"SELECT {_STATUS_COLUMNS} FROM jobs {where} ORDER BY created_at DESC LIMIT ?",
+                              (*params, limit))
+        return [dict(row) for row in rows]
+
+    def start(self, job_id: str) -> bool:
+        """queued → running（取り消し済みなら False）"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, owner = ? "
+            "WHERE job_id = ? AND status = ?",
+            (RUNNING, time.time(), process_owner(), job_id, QUEUED)
+        )
+        return cursor.rowcount == 1
+
+    def update_progress(self, job_id: str, progress: Optional[float], message: Optional[str] = None) -> str:
+        """実行中のジョブの進捗（0〜1、None ならメッセージだけ）を更新し、現在の状態を返す"""
+        if progress is not None:
+            progress = min(max(float(progress), 0.0), 1.0)
+        self._execute("UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message) "
+                      "WHERE job_id = ? AND status = ?",
+                      (progress, message, job_id, RUNNING))
+        row = self._fetchone("SELECT status FROM jobs WHERE job_id = ?", (job_id,))
+        return row["status"] if row is not None else CANCELLED
+
+    def complete(self, job_id: str, result: str) -> bool:
+        """running → completed（結果は JSON 文字列）"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, progress = 1, result = ?, finished_at = ? "
+            "WHERE job_id = ? AND status = ?",
+            (COMPLETED, result, time.time(), job_id, RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, error: str) -> bool:
+        """queued / running → failed"""
+        cursor = self._execute(
+            f"UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+            f"WHERE job_id = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+            (FAILED, error, time.time(), job_id, *ACTIVE_STATUSES)
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        """queued / running → cancelled（終了済みなら False）"""
+        cursor = self._execute(
+            f"UPDATE jobs SET status = ?, finished_at = ? "
+            f"WHERE job_id = ? AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+            (CANCELLED, time.time(), job_id, *ACTIVE_STATUSES)
+        )
+        return cursor.rowcount == 1
+
+    def claim_orphans(self) -> List[str]:
+        """
+        所有者のプロセスが止まった queued / running のジョブをこのプロセスに移して queued に戻す
+
+        所有者名を条件にした UPDATE で引き継ぐため、複数のワーカーが同時に起動しても
+        1つのジョブを引き継ぐのは1つのワーカーだけ。
+        """
+        rows = self._fetchall(
+            f"SELECT job_id, owner FROM jobs WHERE status IN ({', '.join('?' * len(ACTIVE_STATUSES))}) "
+            f"ORDER BY created_at", ACTIVE_STATUSES
+        )
+        claimed = []
+        owner = process_owner()
+        for row in rows:
+            if owner_alive(row["owner"]):
+                continue
+            cursor = self._execute(
+                "UPDATE jobs SET status = ?, owner = ?, progress = 0, message = ? "
+                "WHERE job_id = ? AND owner IS ? AND status IN (?, ?)",
+                (QUEUED, owner, "ワーカーの再起動により再実行", row["job_id"], row["owner"], *ACTIVE_STATUSES)
+            )
+            if cursor.rowcount == 1:
+                claimed.append(row["job_id"])
+        return claimed
+
+    def purge(self, max_age_seconds: float) -> int:
+        """終了から max_age_seconds 以上たったジョブを削除し、削除件数を返す"""
+        cursor = self._execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) "
+            f"AND finished_at < ?",
+            (*FINISHED_STATUSES, time.time() - max_age_seconds)
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def job_db_path() -> str:
+    """ジョブストアのパス（環境変数 SCM_JOB_DB）"""
+    return os.environ.get(JOB_DB_ENV, DEFAULT_JOB_DB)
+
+
+def job_retention_seconds() -> float:
+    """終了したジョブを残す秒数（環境変数 SCM_JOB_RETENTION、既定 7 日）"""
+    return float(os.environ.get(JOB_RETENTION_ENV, DEFAULT_JOB_RETENTION))
@@ -0,0 +1,122 @@
+"""
+クラスター数 k を変えた k-means の一括実行（エルボー法用・プロセス並列・前の k の中心から開始）
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+# この件数を超えたら MiniBatchKMeans を使う
+MINIBATCH_THRESHOLD = 10000
+DEFAULT_SILHOUETTE_SAMPLE_SIZE = 5000
+# 1ワーカーが続けて解く k の数の上限（小さいほど途中結果が早く返る）
+DEFAULT_BLOCK_SIZE = 4
+# 点数 × k の数がこれ未満ならプロセスを起動せずに解く
+PARALLEL_MIN_WORK = 200000
+
+
+def _added_center(features: np.ndarray, centers: np.ndarray, rng: np.random.Generator,
+                  sample_size: int = 20000) -> np.ndarray:
+    """既存の中心からの距離の2乗に比例する確率で新しい中心を1つ選ぶ（k-means++ の1ステップ）"""
+    candidates = features
+    if len(features) > sample_size:
+        candidates = features[rng.choice(len(features), size=sample_size, replace=False)]
+    d2 = ((candidates[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    total = d2.sum()
+    index = rng.choice(len(candidates), p=d2 / total) if total > 0 else rng.integers(len(candidates))
+    return candidates[index]
+
+
+def iter_sweep_block(features: np.ndarray, k_values: Sequence[int], random_state: int = 42,
+                     minibatch_threshold: int = MINIBATCH_THRESHOLD,
+                     silhouette_sample_size: int = DEFAULT_SILHOUETTE_SAMPLE_SIZE,
+                     n_init: int = 10) -> Iterator[Dict[str, Any]]:
+    """
+    連続する k の値を順に解く（2番目以降の k は直前の k の中心に1点を加えて開始）
+
+    最初の k だけ k-means++ で n_init 回試し、以降は初期値1通りで解く。
+    シルエット係数は silhouette_sample_size 点の無作為標本から推定する。
+
+    Yields:
+        k ごとの {"k", "inertia", "silhouette", "fit_time", "warm_start"}
+    """
+    rng = np.random.default_rng(random_state + int(k_values[0]))
+    n = len(features)
+    use_minibatch = n > minibatch_threshold
+    sample = None
+    if n > silhouette_sample_size:
+        sample = rng.choice(n, size=silhouette_sample_size, replace=False)
+
+    centers = None
+    for k in k_values:
+        start = time.perf_counter()
+        if k == 1:
+            centers = features.mean(axis=0, keepdims=True)
+            yield {"k": 1, "inertia": float(((features - centers) ** 2).sum()),
+                   "silhouette": 0.0, "fit_time": time.perf_counter() - start, "warm_start": False}
+            continue
+
+        warm_start = centers is not None and len(centers) == k - 1
+        if warm_start:
+            init, init_runs = np.vstack([centers, _added_center(features, centers, rng)]), 1
+        else:
+            init, init_runs = "k-means++", n_init
+        if use_minibatch:
+            model = MiniBatchKMeans(n_clusters=k, init=init, n_init=init_runs,
+                                    random_state=random_state, batch_size=2048)
+        else:
+            model = KMeans(n_clusters=k, init=init, n_init=init_runs, random_state=random_state)
+        labels = model.fit_predict(features)
+        centers = model.cluster_centers_
+
+        if sample is not None:
+            sample_labels = labels[sample]
+            silhouette = (silhouette_score(features[sample], sample_labels)
+                          if len(np.unique(sample_labels)) > 1 else 0.0)
+        else:
+            silhouette = silhouette_score(features, labels) if len(np.unique(labels)) > 1 else 0.0
+        yield {"k": int(k), "inertia": float(model.inertia_), "silhouette": float(silhouette),
+               "fit_time": time.perf_counter() - start, "warm_start": warm_start}
+
+
+def sweep_block(features: np.ndarray, k_values: Sequence[int], **kwargs) -> List[Dict[str, Any]]:
+    """iter_sweep_block の結果をリストで返す（プロセスプールのワーカーで実行）"""
+    return list(iter_sweep_block(features, k_values, **kwargs))
+
+
+def kmeans_sweep(features: np.ndarray, k_values: Sequence[int], max_workers: Optional[int] = None,
+                 block_size: int = DEFAULT_BLOCK_SIZE, **kwargs) -> Iterator[Dict[str, Any]]:
+    """
+    k の値を block_size 個ずつのブロックに分けてプロセスプールで並列に解き、
+    終わったブロックから k ごとの結果を返すジェネレータ（返る順は k の順とは限らない）
+
+    Args:
+        features: (n, d) 特徴量
+        k_values: 解く k の値（昇順）
+        max_workers: プロセス数（省略時は CPU 数、1 ならこのプロセスで順に解く）
+        block_size: 1ブロックの k の数
+        **kwargs: iter_sweep_block に渡す引数
+    """
+    features = np.ascontiguousarray(features, dtype=np.float64)
+    k_values = list(k_values)
+    blocks = [k_values[i:i + block_size] for i in range(0, len(k_values), max(1, block_size))]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(blocks))
+
+    if max_workers <= 1 or len(features) * len(k_values) < PARALLEL_MIN_WORK:
+        for block in blocks:
+            yield from iter_sweep_block(features, block, **kwargs)
+        return
+
+    # fork はスレッドを持つサーバープロセスでは安全でないため spawn で起動する
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn")) as executor:
+        futures = [executor.submit(sweep_block, features, block, **kwargs) for block in blocks]
+        for future in as_completed(futures):
+            yield from future.result()
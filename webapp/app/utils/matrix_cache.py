@@ -0,0 +1,116 @@
+"""
+距離・コスト行列のキャッシュ（座標配列のハッシュをキーとするLRUキャッシュ）
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class MatrixCache:
+    """
+    座標配列と距離尺度（great_circle / euclidean / road など）の内容ハッシュを
+    キーに行列を保持するLRUキャッシュ
+
+    同じ拠点集合に対する行列を複数のソルバー・リクエスト間で共有する。
+    保持する行列は読み取り専用にして返すため、呼び出し側で書き換えないこと。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(coords1: np.ndarray, coords2: np.ndarray, metric: str,
+                 dtype=np.float64) -> str:
+        """座標配列・尺度・型から内容ハッシュのキーを生成"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{metric}|{np.dtype(dtype).str}|".encode())
+        for coords in (coords1, coords2):
+            array = np.ascontiguousarray(coords, dtype=np.float64)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """キーに対応する行列を返す（存在しなければ None）"""
+        with self._lock:
+            matrix = self._entries.get(key)
+            if matrix is not None:
+                self._entries.move_to_end(key)
+            return matrix
+
+    def put(self, key: str, matrix: np.ndarray) -> np.ndarray:
+        """行列を登録し、予算を超えた分を古い順に破棄する"""
+        matrix = np.asarray(matrix)
+        matrix.setflags(write=False)
+        if matrix.nbytes > self.max_bytes:
+            # 予算を超える行列はキャッシュしない
+            return matrix
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = matrix
+            self.current_bytes += matrix.nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+        return matrix
+
+    def get_or_compute(self, coords1: np.ndarray, coords2: np.ndarray, metric: str,
+                       compute: Callable[[], np.ndarray], dtype=np.float64) -> np.ndarray:
+        """
+        キャッシュから行列を取得し、なければ compute() で計算して登録
+
+        (coords2, coords1) の行列が既にあれば転置ビューを返す。
+        """
+        key = self.make_key(coords1, coords2, metric, dtype)
+        matrix = self.get(key)
+        if matrix is None:
+            transposed = self.get(self.make_key(coords2, coords1, metric, dtype))
+            if transposed is not None:
+                matrix = transposed.T
+        self.record(matrix is not None)
+        if matrix is not None:
+            return matrix
+        return self.put(key, compute())
+
+    def record(self, hit: bool) -> None:
+        """ヒット・ミスを集計（get() を直接使う呼び出し側向け）"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self) -> None:
+        """キャッシュを空にする（統計値は保持）"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計値"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0.0
+            }
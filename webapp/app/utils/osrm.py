@@ -0,0 +1,172 @@
+"""
+OSRM table API クライアント（タイル分割・並列取得・コネクションプール）
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+DEFAULT_TILE_SIZE = 100
+DEFAULT_MAX_WORKERS = 8
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class OSRMError(RuntimeError):
+    """OSRM table API の呼び出しに失敗した"""
+
+
+class OSRMTableClient:
+    """
+    OSRM table API の行列を出発地・到着地のタイルに分割して取得するクライアント
+
+    1リクエストの座標数を tile_size × 2 以下に抑えて URL 長の上限やタイムアウトを避け、
+    タイルはスレッドプールで並列に取得して事前確保した配列に書き込む。
+    HTTP セッションはクライアント単位で共有し（コネクションプール）、
+    接続エラーと 429/5xx は指数バックオフで再試行する。
+
+    Args:
+        host: OSRM サーバーのホスト名
+        port: ポート番号
+        profile: ルーティングプロファイル（driving など）
+        tile_size: 1タイルあたりの出発地・到着地の最大数
+        max_workers: 同時に送るリクエスト数の上限
+        timeout: 1リクエストのタイムアウト（秒）
+        retries: 再試行回数
+        backoff_factor: 再試行間隔の係数（backoff_factor × 2^(試行回数-1) 秒）
+    """
+
+    def __init__(self, host: str, port: int = 5000, profile: str = "driving",
+                 tile_size: int = DEFAULT_TILE_SIZE, max_workers: int = DEFAULT_MAX_WORKERS,
+                 timeout: float = 30.0, retries: int = 3, backoff_factor: float = 0.5,
+                 scheme: str = "http"):
+        if not REQUESTS_AVAILABLE:
+            raise OSRMError("requests library not available")
+        self.host = host
+        self.port = port
+        self.profile = profile
+        self.tile_size = max(1, tile_size)
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.base_url = f"{scheme}://{host}:{port}/table/v1/{profile}/"
+        self._session = self._make_session()
+
+    def _make_session(self) -> "requests.Session":
+        retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=frozenset(["GET"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> "OSRMTableClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def table(self, coords: np.ndarray, destinations: Optional[np.ndarray] = None,
+              annotations: Sequence[str] = ("duration", "distance"),
+              exclude: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """
+        出発地 × 到着地の行列を取得
+
+        Args:
+            coords: 出発地の (n, 2) [緯度, 経度] 配列
+            destinations: 到着地の (m, 2) [緯度, 経度] 配列（省略時は coords と同じ）
+            annotations: 取得する値（"duration" 秒 / "distance" メートル）
+            exclude: 除外する道路種別（"toll" など）
+
+        Returns:
+            {"durations": (n, m), "distances": (n, m)} の辞書。経路がない組は NaN
+        """
+        sources = np.asarray(coords, dtype=float).reshape(-1, 2)
+        targets = sources if destinations is None else np.asarray(destinations, dtype=float).reshape(-1, 2)
+        square = destinations is None
+        n, m = len(sources), len(targets)
+        keys = [f"{name}s" for name in annotations]
+        results = {key: np.full((n, m), np.nan) for key in keys}
+
+        tiles = [(s0, min(s0 + self.tile_size, n), d0, min(d0 + self.tile_size, m))
+                 for s0 in range(0, n, self.tile_size)
+                 for d0 in range(0, m, self.tile_size)]
+
+        def fetch(tile: Tuple[int, int, int, int]) -> None:
+            s0, s1, d0, d1 = tile
+            same_block = square and (s0, s1) == (d0, d1)
+            block = self._fetch_tile(sources[s0:s1], None if same_block else targets[d0:d1],
+                                     annotations, exclude)
+            for key in keys:
+                results[key][s0:s1, d0:d1] = block[key]
+
+        if len(tiles) <= 1 or self.max_workers == 1:
+            for tile in tiles:
+                fetch(tile)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tiles))) as executor:
+                # 例外は list() の中で再送出される
+                list(executor.map(fetch, tiles))
+        return results
+
+    def _fetch_tile(self, sources: np.ndarray, targets: Optional[np.ndarray],
+                    annotations: Sequence[str], exclude: Optional[str]) -> Dict[str, np.ndarray]:
+        """1タイル分のリクエスト（targets が None なら sources 同士の正方行列）"""
+        points = sources if targets is None else np.vstack([sources, targets])
+        url = self.base_url + ";".join(f"{lon},{lat}" for lat, lon in points)
+        params = {"annotations": ",".join(annotations)}
+        if targets is not None:
+            params["sources"] = ";".join(map(str, range(len(sources))))
+            params["destinations"] = ";".join(
+                map(str, range(len(sources), len(sources) + len(targets))))
+        if exclude:
+            params["exclude"] = exclude
+
+        try:
+            response = self._session.get(url, params=params, timeout=self.timeout)
+        except requests.exceptions.Timeout as e:
+            raise OSRMError("OSRM API timeout") from e
+        except requests.exceptions.RequestException as e:
+            raise OSRMError(f"OSRM request error: {str(e)}") from e
+
+        if response.status_code != 200:
+            raise OSRMError(f"OSRM API error: {response.status_code}")
+        data = response.json()
+        if data.get("code", "Ok") != "Ok":
+            raise OSRMError(f"OSRM API error: {data.get('code')}")
+        # null（経路なし）は NaN になる
+        return {f"{name}s": np.array(data[f"{name}s"], dtype=float) for name in annotations}
+
+
+_clients: Dict[Tuple[str, int], OSRMTableClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_osrm_client(host: str, port: int = 5000) -> OSRMTableClient:
+    """ホスト・ポートごとに共有する OSRMTableClient を返す"""
+    with _clients_lock:
+        client = _clients.get((host, port))
+        if client is None:
+            client = _clients[(host, port)] = OSRMTableClient(host, port)
+        return client
+
+
+def matrix_to_lists(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    """NaN を None にした入れ子リスト（OSRM の JSON と同じ形式）に変換"""
+    return np.where(np.isnan(matrix), None, matrix).tolist()
@@ -0,0 +1,114 @@
+"""
+地図可視化の間引き（ズームレベルごとのビン集約・フロー線の統合）と Plotly の型付き配列エンコード
+"""
+
+import base64
+import json
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.utils.aggregation import aggregate_points
+
+try:
+    from plotly.utils import PlotlyJSONEncoder
+    PLOTLY_AVAILABLE = True
+except ImportError:
+    PLOTLY_AVAILABLE = False
+
+# Web メルカトルのタイルの大きさ（ピクセル）
+TILE_PIXELS = 256
+# 1ビンの大きさ（画面上のピクセル）
+DEFAULT_BIN_PIXELS = 8
+# これ以下の顧客数なら間引かずに全点を表示
+DEFAULT_MAX_MARKERS = 5000
+DEFAULT_ZOOM_LEVELS = (4, 6, 8, 10, 12)
+# 型付き配列にするトレースの数値配列（ドット区切りで入れ子のキー）
+TYPED_ARRAY_KEYS = ("lat", "lon", "customdata", "marker.size", "marker.color")
+
+
+def bin_size_degrees(zoom: float, bin_pixels: float = DEFAULT_BIN_PIXELS) -> float:
+    """ズームレベル zoom で bin_pixels ピクセルに相当する経度幅（度）"""
+    return 360.0 / (TILE_PIXELS * 2.0 ** zoom) * bin_pixels
+
+
+def bin_markers(lat: np.ndarray, lon: np.ndarray, demand: np.ndarray, zoom: float,
+                bin_pixels: float = DEFAULT_BIN_PIXELS,
+                labels: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    ズームレベルに応じた格子で地点をビンに集約（需要重心・総需要・地点数）
+
+    labels（割当先 DC など）を指定すると、ラベルの異なる地点は同じビンにしない。
+
+    Returns:
+        aggregate_points の結果に label（ビンのラベル、labels 指定時）を加えた辞書
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    size = bin_size_degrees(zoom, bin_pixels)
+    cells = ((np.floor((lat + 90.0) / size).astype(np.int64) << 32)
+             | np.floor((lon + 180.0) / size).astype(np.int64))
+    if labels is not None:
+        labels = np.asarray(labels, dtype=np.int64)
+        cells = pd.factorize(cells)[0].astype(np.int64) * (int(labels.max()) + 1) + labels
+    binned = aggregate_points(lat, lon, demand, cells)
+    if labels is not None:
+        binned["label"] = np.zeros(len(binned["cell_ids"]), dtype=np.int64)
+        binned["label"][binned["cell_of_point"]] = labels
+    return binned
+
+
+def merged_segments(from_lat: np.ndarray, from_lon: np.ndarray, to_lat: np.ndarray,
+                    to_lon: np.ndarray):
+    """
+    線分の集合を1本の折れ線にまとめた緯度・経度配列（線分の間は NaN で区切る）
+
+    Returns:
+        (lat, lon): 長さ 3 × 線分数の配列
+    """
+    gap = np.full(len(from_lat), np.nan)
+    lat = np.column_stack([from_lat, to_lat, gap]).ravel()
+    lon = np.column_stack([from_lon, to_lon, gap]).ravel()
+    return lat, lon
+
+
+def encode_typed_array(values: Any, dtype: str = "f4") -> Dict[str, str]:
+    """数値配列を Plotly の型付き配列 {"dtype", "bdata"}（リトルエンディアン・base64）に変換"""
+    array = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "bdata": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def encode_figure_arrays(figure: Dict[str, Any], keys: Sequence[str] = TYPED_ARRAY_KEYS) -> Dict[str, Any]:
+    """
+    図の辞書の各トレースの数値配列を float32 の型付き配列に置き換える（figure を直接変更）
+
+    数値に変換できない配列（文字列の customdata など）はそのまま残す。
+    """
+    for trace in figure.get("data", []):
+        for key in keys:
+            *parents, leaf = key.split(".")
+            container = trace
+            for parent in parents:
+                container = container.get(parent)
+                if not isinstance(container, dict):
+                    break
+            else:
+                values = container.get(leaf)
+                if isinstance(values, (list, tuple, np.ndarray)) and len(values) > 0:
+                    try:
+                        array = np.asarray(values, dtype=np.float32)
+                    except (TypeError, ValueError):
+                        continue
+                    if array.ndim == 1:
+                        container[leaf] = encode_typed_array(array)
+    return figure
+
+
+def payload_bytes(payload: Any) -> int:
+    """JSON にしたときのバイト数"""
+    if PLOTLY_AVAILABLE:
+        text = json.dumps(payload, cls=PlotlyJSONEncoder, separators=(",", ":"))
+    else:
+        text = json.dumps(payload, separators=(",", ":"), default=str)
+    return len(text.encode("utf-8"))
@@ -0,0 +1,171 @@
+"""
+反復型ソルバーの進捗イベント（間引き・途中停止）と、ワーカーから API プロセスへの受け渡し
+
+ソルバー側は ProgressReporter を反復ごとに呼ぶだけでよく、コールバックを呼ぶのは
+前回から min_interval 秒以上たったときだけなので、反復の多いループでも負荷はほぼない。
+コールバックが真を返すか停止が要求されると report() が True を返し、ソルバーは
+その時点の最良解を返して終了する。
+
+API プロセス側では ProgressListener（SSE/WebSocket のストリーム、ジョブの進捗記録）を
+コンテキストに設定しておくと、run_cpu_bound_with_progress がワーカーに ProgressSink を
+渡し、届いたイベントをリスナーに転送する。
+"""
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 進捗コールバックを呼ぶ最短間隔（秒）の既定値
+DEFAULT_PROGRESS_INTERVAL = 0.5
+# API プロセスがワーカーからのイベントを取り出す間隔（秒）
+POLL_INTERVAL = 0.05
+
+# callback(event) -> 真なら途中停止を要求
+ProgressCallback = Callable[[Dict[str, Any]], Optional[bool]]
+
+
+class ProgressReporter:
+    """
+    ソルバーの反復ごとに呼ぶ進捗報告（min_interval 秒ごとにだけコールバックを呼ぶ）
+
+    Args:
+        callback: 進捗イベントの辞書を受け取る関数（None なら何もしない）
+        solver: イベントに付けるソルバー名
+        max_iterations: 最大反復回数（progress = 反復 / 最大反復回数）
+        min_interval: コールバックを呼ぶ最短間隔（秒、0 なら毎回）
+    """
+
+    def __init__(self, callback: Optional[ProgressCallback], solver: str,
+                 max_iterations: Optional[int] = None,
+                 min_interval: float = DEFAULT_PROGRESS_INTERVAL):
+        self.callback = callback
+        self.solver = solver
+        self.max_iterations = max_iterations
+        self.min_interval = min_interval
+        self.start = time.perf_counter()
+        self._last_time = -float("inf")
+        self._pending: Optional[Dict[str, Any]] = None
+        self.stopped = False
+
+    def report(self, iteration: int, force: bool = False, **values: Any) -> bool:
+        """
+        反復 iteration の値（lower_bound, upper_bound, objective など）を報告
+
+        Returns:
+            途中停止が要求されていれば True
+        """
+        if self.callback is None:
+            return False
+        now = time.perf_counter()
+        if not force and now - self._last_time < self.min_interval:
+            # 間引いた反復は最後の1つだけ覚えておき、finish() で送る
+            self._pending = {"iteration": iteration, **values}
+            return self.stopped
+        self._pending = None
+        self._last_time = now
+        event = {"solver": self.solver, "iteration": iteration,
+                 "max_iterations": self.max_iterations, "elapsed": now - self.start}
+        if self.max_iterations:
+            event["progress"] = min(1.0, (iteration + 1) / self.max_iterations)
+        lower, upper = values.get("lower_bound"), values.get("upper_bound")
+        if "gap" not in values and lower is not None and upper is not None and upper not in (0, float("inf")):
+            values["gap"] = (upper - lower) / abs(upper)
+        event.update(values)
+        if self.callback(event):
+            self.stopped = True
+        return self.stopped
+
+    def finish(self) -> None:
+        """間引かれたまま残っている最後の反復を送る（ソルバーの終了時に呼ぶ）"""
+        if self.callback is not None and self._pending is not None:
+            pending, self._pending = self._pending, None
+            self.report(force=True, **pending)
+
+
+class ProgressSink:
+    """
+    ワーカーに渡す進捗コールバック（イベントをキューに入れ、停止要求を返す）
+
+    スレッドモードでは queue.Queue / threading.Event、プロセスモードでは
+    multiprocessing.Manager のキュー・イベント（プロキシは pickle できる）を使う。
+    """
+
+    def __init__(self, events: Any, stop_event: Any):
+        self.events = events
+        self.stop_event = stop_event
+
+    def __call__(self, event: Dict[str, Any]) -> bool:
+        self.events.put(event)
+        return self.stop_event.is_set()
+
+
+class ProgressListener:
+    """進捗イベントの受け取り先（API プロセスのイベントループで呼ばれる）"""
+
+    # ソルバーに渡す進捗コールバックの最短間隔（秒）
+    interval: float = DEFAULT_PROGRESS_INTERVAL
+
+    def on_progress(self, event: Dict[str, Any]) -> None:
+        pass
+
+    def stop_requested(self) -> bool:
+        return False
+
+
+_listener: contextvars.ContextVar = contextvars.ContextVar("progress_listener", default=None)
+
+
+@contextmanager
+def use_progress_listener(listener: ProgressListener) -> Iterator[ProgressListener]:
+    """このコンテキスト（と、そこから作ったタスク）のソルバー呼び出しの進捗を listener に送る"""
+    token = _listener.set(listener)
+    try:
+        yield listener
+    finally:
+        _listener.reset(token)
+
+
+def current_progress_listener() -> Optional[ProgressListener]:
+    return _listener.get()
+
+
+class ProgressChannel:
+    """1回のソルバー呼び出しのワーカー → API プロセスの進捗の通り道"""
+
+    def __init__(self, events: Any, stop_event: Any):
+        self.sink = ProgressSink(events, stop_event)
+        self._events = events
+        self._stop_event = stop_event
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """届いているイベントをすべて取り出す"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def request_stop(self) -> None:
+        self._stop_event.set()
+
+    async def forward(self, listener: ProgressListener, done: asyncio.Future) -> None:
+        """done が終わるまでイベントを listener に転送し、停止要求をワーカーに伝える"""
+        while True:
+            finished = done.done()
+            for event in self.drain():
+                listener.on_progress(event)
+            if listener.stop_requested() and not self._stop_event.is_set():
+                self.request_stop()
+            if finished:
+                return
+            await asyncio.wait({done}, timeout=POLL_INTERVAL)
+
+
+def thread_channel() -> ProgressChannel:
+    """同じプロセス内（スレッドプール）で使う通り道"""
+    return ProgressChannel(queue.Queue(), threading.Event())
@@ -0,0 +1,396 @@
+"""
+最適化エンドポイントの結果キャッシュ（検証済みリクエストの内容ハッシュをキーとする）
+
+キーは「エンドポイント名・コードのバージョン・検証済みリクエストの正規化 JSON」のハッシュで、
+同じシナリオを複数の利用者が開いたときの同一リクエストを再計算せずに返す。
+結果はエンドポイントが返す JSON のバイト列で保持し、ヒット時はそのまま応答にする
+（再検証・再シリアライズしない）。
+
+メモリ層（LRU、容量・有効期限つき）と、任意のディスク層（環境変数 SCM_RESULT_CACHE_DIR、
+複数ワーカーで共有）の2段構成。
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.utils.progress import current_progress_listener
+
+# 設定の環境変数
+CACHE_TTL_ENV = "SCM_RESULT_CACHE_TTL"
+CACHE_MAX_BYTES_ENV = "SCM_RESULT_CACHE_MAX_BYTES"
+CACHE_DIR_ENV = "SCM_RESULT_CACHE_DIR"
+CACHE_DISK_MAX_BYTES_ENV = "SCM_RESULT_CACHE_DISK_MAX_BYTES"
+CODE_VERSION_ENV = "SCM_CODE_VERSION"
+
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+# ヒットした応答に付けるヘッダー（値は HIT-MEMORY / HIT-DISK）
+CACHE_HEADER = "X-Result-Cache"
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@functools.lru_cache(maxsize=1)
+def code_version() -> str:
+    """
+    キャッシュキーに含めるコードのバージョン
+
+    環境変数 SCM_CODE_VERSION（デプロイ時のコミットなど）があればそれを、
+    なければ app パッケージの .py ファイルの内容ハッシュを使う（コードを変えると別のキーになる）。
+    """
+    version = os.environ.get(CODE_VERSION_ENV)
+    if version:
+        return version
+    digest = hashlib.blake2b(digest_size=8)
+    for root, dirs, files in os.walk(_APP_DIR):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for filename in sorted(files):
+            if filename.endswith(".py"):
+                path = os.path.join(root, filename)
+                digest.update(os.path.relpath(path, _APP_DIR).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def canonical_json(value: Any) -> str:
+    """モデル・辞書を正規化した JSON（キー順・区切り文字を固定）"""
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json")
+    return json.dumps(jsonable_encoder(value), sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False, allow_nan=True)
+
+
+def fingerprint(endpoint: str, request: Any, version: Optional[str] = None) -> str:
+    """エンドポイント・コードのバージョン・リクエストからキャッシュキーを作る"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{endpoint}|{version or code_version()}|".encode())
+    digest.update(canonical_json(request).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    結果の JSON バイト列を保持する2段のキャッシュ
+
+    メモリ層は max_bytes を超えると古い順に破棄する LRU。ディスク層は directory の下に
+    キーごとのファイルで保存し、disk_max_bytes を超えると更新時刻の古い順に削除する。
+    どちらの層も ttl 秒を過ぎたエントリは返さない。
+
+    Args:
+        ttl: 有効期限（秒）
+        max_bytes: メモリ層の容量（バイト）
+        directory: ディスク層の保存先（None ならディスク層を使わない）
+        disk_max_bytes: ディスク層の容量（バイト）
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES,
+                 directory: Optional[str] = None, disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.disk_bytes = self._scan_disk_bytes()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _scan_disk_bytes(self) -> int:
+        if not self.directory:
+            return 0
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    pass
+        return total
+
+    def _count(self, endpoint: Optional[str], outcome: str) -> None:
+        if endpoint is not None:
+            counts = self._endpoints.setdefault(endpoint, {"hits": 0, "misses": 0, "bypassed": 0})
+            counts[outcome] += 1
+
+    def get(self, key: str, endpoint: Optional[str] = None) -> Tuple[Optional[bytes], str]:
+        """
+        キーに対応する結果を返す
+
+        Returns:
+            (結果のバイト列または None, "memory" / "disk" / "miss")
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                content, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    self._count(endpoint, "hits")
+                    return content, "memory"
+                del self._entries[key]
+                self.current_bytes -= len(content)
+                self.expired += 1
+        content, written_at = self._read_disk(key, now)
+        with self._lock:
+            if content is None:
+                self.misses += 1
+                self._count(endpoint, "misses")
+                return None, "miss"
+            self.disk_hits += 1
+            self._count(endpoint, "hits")
+        # 他のワーカーが保存した結果もメモリ層に載せる
+        self._put_memory(key, content, written_at + self.ttl)
+        return content, "disk"
+
+    def _read_disk(self, key: str, now: float) -> Tuple[Optional[bytes], float]:
+        """ディスク層の結果と保存時刻"""
+        if not self.directory:
+            return None, now
+        path = self._path(key)
+        try:
+            written_at = os.path.getmtime(path)
+            if written_at + self.ttl <= now:
+                size = os.path.getsize(path)
+                os.remove(path)
+                with self._lock:
+                    self.disk_bytes -= size
+                    self.expired += 1
+                return None, now
+            with open(path, "rb") as f:
+                return f.read(), written_at
+        except OSError:
+            return None, now
+
+    def put(self, key: str, content: bytes) -> None:
+        """結果を両方の層に保存する"""
+        with self._lock:
+            self.stores += 1
+        self._put_memory(key, content, time.time() + self.ttl)
+        self._write_disk(key, content)
+
+    def _put_memory(self, key: str, content: bytes, expires_at: float) -> None:
+        if len(content) > self.max_bytes:
+            # 容量を超える結果はメモリ層に置かない
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[0])
+            self._entries[key] = (content, expires_at)
+            self.current_bytes += len(content)
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def _write_disk(self, key: str, content: bytes) -> None:
+        if not self.directory or len(content) > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 同じキーを別のワーカーが読んでいても壊れないよう、一時ファイルから置き換える
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(temporary, "wb") as f:
+                f.write(content)
+            os.replace(temporary, path)
+        except OSError:
+            return
+        with self._lock:
+            self.disk_bytes += len(content) - previous
+            over_budget = self.disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """ディスク層を容量以下になるまで更新時刻の古い順に削除"""
+        files = []
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    files.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    pass
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self.disk_bytes = total
+
+    def record_bypass(self, endpoint: Optional[str] = None) -> None:
+        """キャッシュできないリクエスト（シードのない乱数つき計算など）を集計"""
+        with self._lock:
+            self.bypassed += 1
+            self._count(endpoint, "bypassed")
+
+    def clear(self) -> None:
+        """両方の層を空にする（統計値は保持）"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+        if self.directory:
+            for root, _, filenames in os.walk(self.directory):
+                for filename in filenames:
+                    try:
+                        os.remove(os.path.join(root, filename))
+                    except OSError:
+                        pass
+            with self._lock:
+                self.disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率・使用量などの統計値"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "code_version": code_version(),
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.directory),
+                "disk_bytes": self.disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "endpoints": {name: dict(counts) for name, counts in self._endpoints.items()}
+            }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """環境変数の設定で作る共有の ResultCache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                ttl=float(os.environ.get(CACHE_TTL_ENV, DEFAULT_TTL)),
+                max_bytes=int(os.environ.get(CACHE_MAX_BYTES_ENV, DEFAULT_MAX_BYTES)),
+                directory=os.environ.get(CACHE_DIR_ENV) or None,
+                disk_max_bytes=int(os.environ.get(CACHE_DISK_MAX_BYTES_ENV, DEFAULT_DISK_MAX_BYTES))
+            )
+        return _cache
+
+
+def reset_result_cache() -> None:
+    """共有の ResultCache を破棄する（次の get_result_cache() で環境変数から作り直す）"""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def cached_endpoint(endpoint: str, seed_field: Optional[str] = None):
+    """
+    エンドポイント関数の結果をキャッシュするデコレーター（@router.post の下に付ける）
+
+    検証済みの引数（リクエストのモデル・本体の値）からキーを作り、ヒットすれば保存した JSON を
+    そのまま Response で返す。乱数を使うエンドポイントは seed_field のシードが指定された
+    リクエストだけをキャッシュする。例外になった計算と、進捗ストリームで途中停止した計算の
+    結果は保存しない。
+
+    Args:
+        endpoint: キーに含めるエンドポイント名
+        seed_field: 乱数シードの項目名（リクエストのモデルの属性、または引数名）
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        signature = inspect.signature(func)
+
+        def seed_given(arguments: Dict[str, Any]) -> bool:
+            if seed_field is None:
+                return True
+            if seed_field in arguments:
+                return arguments[seed_field] is not None
+            return any(getattr(value, seed_field, None) is not None
+                       for value in arguments.values() if isinstance(value, BaseModel))
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cache = get_result_cache()
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            arguments = dict(arguments.arguments)
+            if not seed_given(arguments):
+                cache.record_bypass(endpoint)
+                return await func(*args, **kwargs)
+            key = fingerprint(endpoint, arguments)
+            content, tier = cache.get(key, endpoint)
+            if content is not None:
+                return Response(content=content, media_type="application/json",
+                                headers={CACHE_HEADER: f"HIT-{tier.upper()}"})
+            result = await func(*args, **kwargs)
+            listener = current_progress_listener()
+            if listener is None or not listener.stop_requested():
+                try:
+                    cache.put(key, encode_result(result))
+                except (TypeError, ValueError):
+                    # JSON にできない結果（NaN を含むなど）はキャッシュしない
+                    pass
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def encode_result(result: Any) -> bytes:
+    """エンドポイントの結果を応答と同じ JSON のバイト列にする"""
+    if isinstance(result, Response):
+        return bytes(result.body)
+    return json.dumps(jsonable_encoder(result), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def decode_result(result: Any) -> Any:
+    """キャッシュから返った Response を JSON の値に戻す（ジョブ・ストリームで結果を扱う側向け）"""
+    if isinstance(result, Response):
+        return json.loads(result.body)
+    return result
@@ -0,0 +1,352 @@
+"""
+道路距離・移動時間行列の永続ストア（メモリマップした .npy ファイル・差分取得）
+
+環境変数 ROAD_MATRIX_STORE_DIR を指定したときだけ使う。ファイルは容量 × 容量の密な配列
+（値ごとに 8 バイト、取得済みマスクに 1 バイト）で、既定の値（移動時間・距離）なら
+容量 4096 で約 290MB、容量 N では約 17 × N² バイトのディスクを使う。
+登録地点数が ROAD_MATRIX_STORE_MAX_LOCATIONS を超える場合はストアを空にして作り直す。
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# 保存先ディレクトリの環境変数（未設定・空文字列ならストアを使わない）
+STORE_DIR_ENV = "ROAD_MATRIX_STORE_DIR"
+# 登録地点数（= 容量）の上限の環境変数
+MAX_LOCATIONS_ENV = "ROAD_MATRIX_STORE_MAX_LOCATIONS"
+DEFAULT_MAX_LOCATIONS = 4096
+DEFAULT_ANNOTATIONS = ("duration", "distance")
+MIN_CAPACITY = 64
+# 取得済みの組のマスクのファイル名（拡張子なし）
+FETCHED_NAME = "fetched"
+COPY_BLOCK_ROWS = 1024
+
+# fetch(sources, destinations) -> {"durations": (k, m), "distances": (k, m)}
+FetchFunction = Callable[[np.ndarray, np.ndarray], Dict[str, np.ndarray]]
+
+
+class RoadMatrixStore:
+    """
+    地点IDをキーとする道路行列の永続ストア（1ディレクトリ = 1ルーティングプロファイル）
+
+    行列は容量 × 容量の .npy ファイルをメモリマップして保持し、取得済みの組を同じ形の
+    マスク（fetched.npy）で記録する（到達できない組の NaN と未取得を区別するため）。
+    ensure() は要求された地点どうしの未取得の組だけを取得する（容量が足りなければ倍に拡張）。
+    要求に含まれない登録済みの地点との組は取得せず、後で一緒に要求されたときに取得する。
+    座標が変わった地点は行と列を未取得に戻して取り直す。取得に失敗した組は未取得のまま
+    残るため、次回の ensure() で取り直される。
+    新しい地点を登録すると max_locations を超える場合は、全地点を破棄して空のストアから
+    登録し直す（ファイルの大きさは容量の2乗なので、上限でディスク使用量を抑える）。
+
+    Args:
+        directory: 保存先ディレクトリ
+        annotations: 保持する値（"duration" 秒 / "distance" メートル）
+        max_locations: 登録地点数の上限（省略時は環境変数 ROAD_MATRIX_STORE_MAX_LOCATIONS、既定 4096）
+    """
+
+    def __init__(self, directory: str, annotations: Sequence[str] = DEFAULT_ANNOTATIONS,
+                 max_locations: Optional[int] = None):
+        self.directory = directory
+        self.max_locations = max_locations or int(
+            os.environ.get(MAX_LOCATIONS_ENV, DEFAULT_MAX_LOCATIONS))
+        self.annotations = tuple(annotations)
+        self.names = tuple(f"{name}s" for name in self.annotations)
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._version = None
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._coords = np.zeros((0, 2))
+        self._capacity = 0
+        self._matrices: Dict[str, np.memmap] = {}
+        self._fetched: Optional[np.memmap] = None
+        # このプロセスで取得した地点数・行列要素数の累計
+        self.fetched_locations = 0
+        self.fetched_entries = 0
+        self.resets = 0
+        with self._locked():
+            self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, location_id: str) -> bool:
+        return location_id in self._positions
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """スレッド間・プロセス間の排他（fcntl がない環境ではスレッド間のみ）"""
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            with open(self._path(".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """メタデータを読み直し、他プロセスが更新していればメモリマップを開き直す"""
+        meta_path = self._path("meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["version"] == self._version:
+            return
+        self._version = meta["version"]
+        self._ids = meta["ids"]
+        self._positions = {location_id: i for i, location_id in enumerate(self._ids)}
+        self._coords = np.array(meta["coords"], dtype=float).reshape(-1, 2)
+        self._capacity = meta["capacity"]
+        if self._capacity == 0:
+            # 作り直した直後の空のストア
+            self._matrices = {}
+            self._fetched = None
+            return
+        self._matrices = {name: np.load(self._path(f"{name}.npy"), mmap_mode="r+")
+                          for name in self.names}
+        if not os.path.exists(self._path(f"{FETCHED_NAME}.npy")):
+            # マスクのない古いストア：座標のある地点どうしはすべて取得済み
+            fetched = np.lib.format.open_memmap(self._path(f"{FETCHED_NAME}.npy"), mode="w+",
+                                                dtype=np.uint8, shape=(self._capacity, self._capacity))
+            valid = np.flatnonzero(~np.isnan(self._coords[:, 0]))
+            fetched[np.ix_(valid, valid)] = 1
+            fetched.flush()
+            del fetched
+        self._fetched = np.load(self._path(f"{FETCHED_NAME}.npy"), mmap_mode="r+")
+
+    def _write_meta(self) -> None:
+        self._version = (self._version or 0) + 1
+        meta = {
+            "version": self._version,
+            "capacity": self._capacity,
+            "ids": self._ids,
+            # NaN（取得中）は JSON の null として保存
+            "coords": [[None if np.isnan(v) else float(v) for v in row] for row in self._coords]
+        }
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def _reserve(self, size: int) -> None:
+        """容量を size 以上に拡張（既存の値はブロック単位でコピー）"""
+        if size <= self._capacity:
+            return
+        capacity = max(size, min(max(2 * self._capacity, MIN_CAPACITY), self.max_locations))
+        n = len(self._coords)
+        arrays = {}
+        for name in self.names + (FETCHED_NAME,):
+            is_mask = name == FETCHED_NAME
+            tmp_path = self._path(f"{name}.npy.tmp")
+            matrix = np.lib.format.open_memmap(tmp_path, mode="w+",
+                                               dtype=np.uint8 if is_mask else np.float64,
+                                               shape=(capacity, capacity))
+            matrix[:] = 0 if is_mask else np.nan
+            old = self._fetched if is_mask else self._matrices.get(name)
+            for start in range(0, n, COPY_BLOCK_ROWS):
+                stop = min(start + COPY_BLOCK_ROWS, n)
+                matrix[start:stop, :n] = old[start:stop, :n]
+            matrix.flush()
+            del matrix
+            os.replace(tmp_path, self._path(f"{name}.npy"))
+            arrays[name] = np.load(self._path(f"{name}.npy"), mmap_mode="r+")
+        self._fetched = arrays.pop(FETCHED_NAME)
+        self._matrices = arrays
+        self._capacity = capacity
+
+    def _reset(self) -> None:
+        """全地点を破棄してファイルを削除（次の _reserve で作り直す）"""
+        self._ids = []
+        self._positions = {}
+        self._coords = np.zeros((0, 2))
+        self._capacity = 0
+        self._matrices = {}
+        self._fetched = None
+        self._write_meta()
+        for name in self.names + (FETCHED_NAME,):
+            path = self._path(f"{name}.npy")
+            if os.path.exists(path):
+                os.remove(path)
+        self.resets += 1
+
+    def ensure(self, location_ids: Sequence[str], coords: np.ndarray,
+               fetch: FetchFunction) -> np.ndarray:
+        """
+        地点をストアに登録し、要求された地点どうしの未取得の組だけを fetch で取得
+
+        Args:
+            location_ids: 地点IDのリスト（同じIDは同じ座標であること）
+            coords: (n, 2) の [緯度, 経度] 配列
+            fetch: fetch(sources, destinations) で部分行列を返す関数
+
+        Returns:
+            各地点のストア内インデックス（submatrix() に渡す）
+
+        Raises:
+            ValueError: 異なる地点が max_locations を超える場合（呼び出し側でストアを使わない）
+        """
+        location_ids = [str(location_id) for location_id in location_ids]
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        if len(location_ids) != len(coords):
+            raise ValueError("location_ids and coords must have the same length")
+        requested: Dict[str, np.ndarray] = {}
+        for location_id, point in zip(location_ids, coords):
+            if not np.array_equal(requested.setdefault(location_id, point), point):
+                raise ValueError(f"location_id '{location_id}' has conflicting coordinates")
+        if len(requested) > self.max_locations:
+            raise ValueError(f"{len(requested)} locations exceed max_locations ({self.max_locations})")
+
+        with self._locked():
+            self._refresh()
+            new = sum(location_id not in self._positions for location_id in requested)
+            if len(self._ids) + new > self.max_locations:
+                self._reset()
+            moved = []
+            n_stored = len(self._ids)
+            for location_id, point in requested.items():
+                position = self._positions.get(location_id)
+                if position is None:
+                    self._positions[location_id] = len(self._ids)
+                    self._ids.append(location_id)
+                elif not np.array_equal(self._coords[position], point):
+                    moved.append(position)
+            indices = np.array([self._positions[location_id] for location_id in location_ids],
+                               dtype=np.intp)
+            n = len(self._ids)
+            if n > n_stored or moved:
+                self._reserve(n)
+                all_coords = np.full((n, 2), np.nan)
+                all_coords[:n_stored] = self._coords
+                all_coords[indices] = coords
+                self._coords = all_coords
+                # 座標が変わった地点の行と列は未取得に戻す
+                for position in moved:
+                    self._fetched[position, :n] = 0
+                    self._fetched[:n, position] = 0
+                self._write_meta()
+
+            positions = np.unique(indices)
+            fetched = self._fetched[np.ix_(positions, positions)].astype(bool)
+            # 自身との組が未取得の地点（新規・移動・取得失敗）は要求された全地点との行と列を取得
+            missing = positions[~np.diagonal(fetched)]
+            known = positions[np.diagonal(fetched)]
+            if len(missing):
+                self._fetch_block(missing, positions, fetch)
+                if len(known):
+                    self._fetch_block(known, missing, fetch)
+                self.fetched_locations += len(missing)
+            # 登録済みの地点どうしで、まだ一緒に取得していない組
+            if len(known):
+                incomplete = known[~self._fetched[np.ix_(known, known)].astype(bool).all(axis=1)]
+                if len(incomplete):
+                    self._fetch_block(incomplete, known, fetch)
+            return indices
+
+    def _fetch_block(self, rows: np.ndarray, cols: np.ndarray, fetch: FetchFunction) -> None:
+        """rows × cols の部分行列を取得して書き込み、取得済みとして記録"""
+        block = fetch(self._coords[rows], self._coords[cols])
+        for name in self.names:
+            matrix = self._matrices[name]
+            matrix[rows[:, None], cols[None, :]] = block[name]
+            matrix.flush()
+        self._fetched[rows[:, None], cols[None, :]] = 1
+        self._fetched.flush()
+        self.fetched_entries += len(rows) * len(cols)
+
+    def submatrix(self, name: str, rows: np.ndarray, cols: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        インデックスで指定した部分行列を取得（必要な要素だけをファイルから読む）
+
+        Args:
+            name: "durations" / "distances"
+            rows: 行のストア内インデックス
+            cols: 列のストア内インデックス（省略時は rows と同じ）
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = rows if cols is None else np.asarray(cols, dtype=np.intp)
+        with self._lock:
+            return np.asarray(self._matrices[name][np.ix_(rows, cols)])
+
+    def matrix(self, name: str) -> np.ndarray:
+        """登録済み全地点の行列（メモリマップの読み取り専用ビュー、コピーしない。未取得の組は NaN）"""
+        with self._lock:
+            n = len(self._ids)
+            view = self._matrices[name][:n, :n]
+            view.flags.writeable = False
+            return view
+
+    def stats(self) -> Dict[str, int]:
+        """登録地点数・容量・差分取得の累計"""
+        return {
+            "locations": len(self._ids),
+            "capacity": self._capacity,
+            "fetched_locations": self.fetched_locations,
+            "fetched_entries": self.fetched_entries,
+            "max_locations": self.max_locations,
+            "resets": self.resets,
+            "file_bytes": sum(os.path.getsize(self._path(f"{name}.npy"))
+                              for name in self.names + (FETCHED_NAME,)
+                              if os.path.exists(self._path(f"{name}.npy")))
+        }
+
+
+def store_directory() -> Optional[str]:
+    """ストアの保存先（環境変数 ROAD_MATRIX_STORE_DIR が未設定・空文字列なら None）"""
+    return os.environ.get(STORE_DIR_ENV) or None
+
+
+_stores: Dict[str, RoadMatrixStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_road_matrix_store(host: str, port: int = 5000, toll: bool = True,
+                          profile: str = "driving") -> Optional[RoadMatrixStore]:
+    """OSRM サーバー・プロファイル（有料道路利用あり/なし）ごとに共有するストアを返す"""
+    root = store_directory()
+    if root is None:
+        return None
+    key = f"{host}_{port}_{profile}_{'toll' if toll else 'no_toll'}"
+    directory = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", key))
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = _stores[directory] = RoadMatrixStore(directory)
+        return store
+
+
+def location_ids(names: Sequence[str], coords: np.ndarray) -> List[str]:
+    """
+    地点ID「地点名@緯度,経度」（座標は小数点以下7桁）
+
+    シナリオが違えば同じ地点名（"c1", "DC1" など）でも座標が違うため、地点名だけを
+    キーにすると互いの行と列を取り直し合ってしまう。座標を含めて別の地点として扱う。
+    """
+    return [f"{name}@{lat:.7f},{lon:.7f}"
+            for name, (lat, lon) in zip(names, np.asarray(coords, dtype=float).reshape(-1, 2))]
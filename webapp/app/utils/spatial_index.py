@@ -0,0 +1,66 @@
+"""
+最近傍施設探索のための空間インデックス（haversine BallTree / KDTree）
+"""
+
+import numpy as np
+from typing import Tuple
+from sklearn.neighbors import BallTree, KDTree
+
+from app.utils.geo import EARTH_RADIUS_KM
+
+
+class NearestFacilityIndex:
+    """
+    施設座標に対する最近傍探索インデックス
+
+    大円距離の場合は haversine 距離の BallTree、ユークリッド距離の場合は
+    KDTree を構築し、顧客ごとの最近傍施設（および k 近傍の候補リスト）を
+    O(n log m) で求める。
+
+    Args:
+        facility_coords: (m, 2) の [緯度, 経度] 配列（度）
+        use_great_circle: 大円距離を使用するか
+        leaf_size: 木の葉サイズ
+    """
+
+    def __init__(self, facility_coords: np.ndarray, use_great_circle: bool = True,
+                 leaf_size: int = 40):
+        self.facility_coords = np.asarray(facility_coords, dtype=float).reshape(-1, 2)
+        if len(self.facility_coords) == 0:
+            raise ValueError("facility_coords must contain at least one facility")
+        self.use_great_circle = use_great_circle
+        if use_great_circle:
+            self._tree = BallTree(np.radians(self.facility_coords),
+                                  leaf_size=leaf_size, metric="haversine")
+        else:
+            self._tree = KDTree(self.facility_coords, leaf_size=leaf_size)
+
+    def __len__(self) -> int:
+        return len(self.facility_coords)
+
+    def query(self, coords: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        各点の k 近傍施設を距離の昇順で返す
+
+        Returns:
+            (distances, indices): いずれも (n, k) 配列。大円距離は km 単位
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        k = min(k, len(self))
+        if len(coords) == 0:
+            return np.zeros((0, k)), np.zeros((0, k), dtype=np.intp)
+        if self.use_great_circle:
+            distances, indices = self._tree.query(np.radians(coords), k=k)
+            distances = distances * EARTH_RADIUS_KM
+        else:
+            distances, indices = self._tree.query(coords, k=k)
+        return distances, indices
+
+    def nearest(self, coords: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """各点の最近傍施設の (距離, インデックス) を1次元配列で返す"""
+        distances, indices = self.query(coords, k=1)
+        return distances[:, 0], indices[:, 0]
+
+    def candidate_lists(self, coords: np.ndarray, k: int) -> np.ndarray:
+        """各点の k 近傍施設インデックスのリスト（局所探索の候補絞り込み用）"""
+        return self.query(coords, k=k)[1]
@@ -0,0 +1,100 @@
+"""
+地点間の移動時間・距離の縦持ちデータフレーム（time_df）と行列の相互変換
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+NAME_COLUMNS = ("from_name", "to_name")
+
+
+def time_df_from_matrices(names: Sequence[str], matrices: Dict[str, np.ndarray],
+                          fill_value: Optional[int] = None, dtype=np.int32) -> pd.DataFrame:
+    """
+    行列から from_node × to_node の全組を持つ time_df を生成
+
+    行は from_node の昇順・同じ from_node 内では to_node の昇順（行列の ravel 順）。
+    値は小数点以下を切り捨てて dtype に変換する。
+
+    Args:
+        names: 地点名（行列の番号順）
+        matrices: 列名 → (n, n) 行列（"time", "distance" など）
+        fill_value: いずれかの行列が NaN の組に入れる値（その組は全列を fill_value にする）
+        dtype: 番号・値の列の整数型
+
+    Returns:
+        from_node, from_name, to_node, to_name と matrices の各列を持つデータフレーム
+    """
+    names = np.asarray(names, dtype=object)
+    n = len(names)
+    arrays = {column: np.asarray(matrix, dtype=float).reshape(n * n)
+              for column, matrix in matrices.items()}
+    nodes = np.arange(n, dtype=dtype)
+    from_node, to_node = np.repeat(nodes, n), np.tile(nodes, n)
+    columns = {"from_node": from_node, "from_name": names[from_node],
+               "to_node": to_node, "to_name": names[to_node]}
+
+    missing = np.zeros(n * n, dtype=bool)
+    for values in arrays.values():
+        missing |= np.isnan(values)
+    if missing.any() and fill_value is None:
+        raise ValueError("matrices contain NaN and no fill_value was given")
+    for column, values in arrays.items():
+        values = np.trunc(values)
+        values[missing] = fill_value if fill_value is not None else 0
+        columns[column] = values.astype(dtype)
+    return pd.DataFrame(columns)
+
+
+def matrices_from_time_df(time_df: pd.DataFrame, columns: Sequence[str] = ("time", "distance"),
+                          n: Optional[int] = None, fill_value: float = 0,
+                          dtype=np.float64) -> Dict[str, np.ndarray]:
+    """
+    time_df から (n, n) 行列を復元（time_df にない組は fill_value）
+
+    Args:
+        time_df: from_node, to_node と columns の列を持つデータフレーム
+        columns: 行列にする列
+        n: 行列の大きさ（省略時は from_node / to_node の最大値 + 1）
+        fill_value: time_df にない組の値
+        dtype: 行列の型
+    """
+    from_node = time_df["from_node"].to_numpy(dtype=np.intp)
+    to_node = time_df["to_node"].to_numpy(dtype=np.intp)
+    if n is None:
+        n = int(max(from_node.max(), to_node.max())) + 1 if len(time_df) else 0
+    matrices = {}
+    for column in columns:
+        matrix = np.full((n, n), fill_value, dtype=dtype)
+        matrix[from_node, to_node] = time_df[column].to_numpy()
+        matrices[column] = matrix
+    return matrices
+
+
+def write_time_df(time_df: pd.DataFrame, path: str) -> None:
+    """time_df を Parquet で保存（地点名以外の列は int32、地点名は辞書符号化）"""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to write Parquet files")
+    compact = time_df.astype({column: np.int32 for column in time_df.columns
+                              if column not in NAME_COLUMNS})
+    compact.to_parquet(path, engine="pyarrow", index=False)
+
+
+def read_time_df(path: str, categorical_names: bool = True) -> pd.DataFrame:
+    """
+    write_time_df で保存した time_df を読み込む
+
+    categorical_names=True なら地点名を category 型で読む（文字列を生成しないため高速）。
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to read Parquet files")
+    read_dictionary = list(NAME_COLUMNS) if categorical_names else None
+    return pq.read_table(path, read_dictionary=read_dictionary).to_pandas()
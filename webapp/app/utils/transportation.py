@@ -0,0 +1,158 @@
+"""
+疎な枝リストの輸送問題ソルバー（HiGHS・費用変更時の再求解）
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+LINPROG_STATUS = {0: "Optimal", 1: "Not Solved", 2: "Infeasible", 3: "Unbounded", 4: "Not Solved"}
+REDUCED_COST_TOLERANCE = 1e-9
+
+
+class TransportationProblem:
+    """
+    供給点 × 需要点の枝リストで与える輸送問題（容量付き枝にも対応）
+
+    制約行列は枝の (from, to) から疎行列で作り、変数ごとの Python オブジェクトは作らない。
+    LP は scipy の HiGHS で解く。供給と需要が釣り合わない場合は多い側の制約を
+    不等式にする（入力の配列は変更しない）。
+
+    費用だけを変えて解き直すときは、前回の最適解の枝（新しい費用でも実行可能）に
+    前回の双対変数で縮約費用が負になる枝を加えた部分問題から始め、全枝の縮約費用が
+    非負になるまで枝を追加して解き直す（列生成）。
+
+    Args:
+        supply: (n_supply,) 供給量
+        demand: (n_demand,) 需要量
+        arc_from: (n_arcs,) 枝の供給点インデックス
+        arc_to: (n_arcs,) 枝の需要点インデックス
+        arc_capacity: (n_arcs,) 枝の容量（省略時は上限なし）
+    """
+
+    def __init__(self, supply: np.ndarray, demand: np.ndarray, arc_from: np.ndarray,
+                 arc_to: np.ndarray, arc_capacity: Optional[np.ndarray] = None):
+        self.supply = np.array(supply, dtype=float)
+        self.demand = np.array(demand, dtype=float)
+        self.arc_from = np.asarray(arc_from, dtype=np.intp)
+        self.arc_to = np.asarray(arc_to, dtype=np.intp)
+        if len(self.arc_from) != len(self.arc_to):
+            raise ValueError("arc_from and arc_to must have the same length")
+        self.n_supply, self.n_demand = len(self.supply), len(self.demand)
+        self.n_arcs = len(self.arc_from)
+        self.arc_capacity = (np.full(self.n_arcs, np.inf) if arc_capacity is None
+                             else np.asarray(arc_capacity, dtype=float))
+
+        # 多い側は「以下」制約（total_supply > total_demand なら供給側）
+        total_supply, total_demand = self.supply.sum(), self.demand.sum()
+        self.supply_is_upper = total_supply > total_demand + 1e-9
+        self.demand_is_upper = total_demand > total_supply + 1e-9
+        # 制約行：供給点 0..n_supply-1、需要点 n_supply..
+        self._rows_from = self.arc_from
+        self._rows_to = self.n_supply + self.arc_to
+        self._rhs = np.concatenate([self.supply, self.demand])
+        self._upper_rows = np.concatenate([np.full(self.n_supply, self.supply_is_upper),
+                                           np.full(self.n_demand, self.demand_is_upper)])
+
+        self._last_flows: Optional[np.ndarray] = None
+        self._last_duals: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_dense(cls, supply: np.ndarray, demand: np.ndarray,
+                   cost_matrix: np.ndarray) -> "TransportationProblem":
+        """費用行列の有限な要素を枝とする問題を作成（枝の費用は dense_costs() で取得）"""
+        arc_from, arc_to = np.nonzero(np.isfinite(np.asarray(cost_matrix, dtype=float)))
+        return cls(supply, demand, arc_from, arc_to)
+
+    def dense_costs(self, cost_matrix: np.ndarray) -> np.ndarray:
+        """from_dense で作った問題の費用行列を枝の費用配列に変換"""
+        return np.asarray(cost_matrix, dtype=float)[self.arc_from, self.arc_to]
+
+    def dense_flows(self, flows: np.ndarray) -> np.ndarray:
+        """枝のフロー配列を (n_supply, n_demand) 行列に変換"""
+        matrix = np.zeros((self.n_supply, self.n_demand))
+        np.add.at(matrix, (self.arc_from, self.arc_to), flows)
+        return matrix
+
+    def reduced_costs(self, costs: np.ndarray, duals: np.ndarray) -> np.ndarray:
+        """枝ごとの縮約費用 c[a] - y[from] - y[to]"""
+        return costs - duals[self._rows_from] - duals[self._rows_to]
+
+    def _solve_restricted(self, costs: np.ndarray, arcs: np.ndarray):
+        """枝集合 arcs に限定した LP を HiGHS で解く"""
+        n_rows = self.n_supply + self.n_demand
+        n = len(arcs)
+        columns = np.repeat(np.arange(n), 2)
+        rows = np.column_stack([self._rows_from[arcs], self._rows_to[arcs]]).ravel()
+        matrix = sp.csr_matrix((np.ones(2 * n), (rows, columns)), shape=(n_rows, n))
+        upper = self._upper_rows
+        bounds = np.column_stack([np.zeros(n), self.arc_capacity[arcs]])
+        result = linprog(
+            costs[arcs],
+            A_ub=matrix[upper] if upper.any() else None,
+            b_ub=self._rhs[upper] if upper.any() else None,
+            A_eq=matrix[~upper] if (~upper).any() else None,
+            b_eq=self._rhs[~upper] if (~upper).any() else None,
+            bounds=bounds, method="highs")
+        duals = np.zeros(n_rows)
+        if result.status == 0:
+            if upper.any():
+                duals[upper] = result.ineqlin.marginals
+            if (~upper).any():
+                duals[~upper] = result.eqlin.marginals
+        return result, duals
+
+    def solve(self, costs: np.ndarray, warm_start: bool = True,
+              max_rounds: int = 50) -> Dict[str, Any]:
+        """
+        枝の費用配列で輸送問題を解く
+
+        Args:
+            costs: (n_arcs,) 枝の単位費用
+            warm_start: 前回の解があれば部分問題から始める（費用だけが変わる場合）
+            max_rounds: 列生成の最大反復回数（超えたら全枝で解く）
+
+        Returns:
+            flows（枝ごとのフロー）, total_cost, status, duals（供給点・需要点の双対変数）,
+            rounds（LP を解いた回数）, restricted_arcs（最後に解いた部分問題の枝数）の辞書
+        """
+        costs = np.asarray(costs, dtype=float)
+        if len(costs) != self.n_arcs:
+            raise ValueError("costs must have one entry per arc")
+
+        all_arcs = np.arange(self.n_arcs)
+        if warm_start and self._last_flows is not None:
+            # 前回の最適解の枝 + 前回の双対変数で縮約費用が負の枝
+            reduced = self.reduced_costs(costs, self._last_duals)
+            arcs = np.flatnonzero((self._last_flows > 0) | (reduced < -REDUCED_COST_TOLERANCE))
+        else:
+            arcs = all_arcs
+
+        rounds = 0
+        while True:
+            rounds += 1
+            result, duals = self._solve_restricted(costs, arcs)
+            if result.status != 0 or len(arcs) == self.n_arcs:
+                break
+            # 全枝の価格付け：縮約費用が負の枝があれば追加して解き直す
+            reduced = self.reduced_costs(costs, duals)
+            entering = np.flatnonzero(reduced < -REDUCED_COST_TOLERANCE)
+            entering = np.setdiff1d(entering, arcs, assume_unique=True)
+            if len(entering) == 0:
+                break
+            arcs = all_arcs if rounds >= max_rounds else np.union1d(arcs, entering)
+
+        flows = np.zeros(self.n_arcs)
+        if result.status == 0:
+            flows[arcs] = result.x
+            self._last_flows, self._last_duals = flows, duals
+        return {
+            "flows": flows,
+            "total_cost": float(result.fun) if result.status == 0 else None,
+            "status": LINPROG_STATUS.get(result.status, "Not Solved"),
+            "duals": duals,
+            "rounds": rounds,
+            "restricted_arcs": len(arcs)
+        }
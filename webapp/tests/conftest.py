@@ -2,10 +2,24 @@
 pytestの設定とフィクスチャ
 """
 
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
 import pytest
 import pandas as pd
 import numpy as np
 
+from app.utils.geo import great_circle_matrix
+from app.utils.result_cache import reset_result_cache
+
+# API のテストではワーカープロセスを起動せずスレッドで実行する
+# （プロセスプールは tests/test_executor.py で個別に確認する）
+os.environ.setdefault("SCM_EXECUTOR_MODE", "thread")
+
 
 @pytest.fixture
 def sample_demand_data():
@@ -35,4 +49,99 @@ def sample_node_data():
     return pd.DataFrame({
         'name': ['地点A', '地点B', '地点C'],
         'location': ['[139.7, 35.7]', '[139.8, 35.8]', '[139.6, 35.6]']
-    })
\ No newline at end of file
+    })
+
+
+@pytest.fixture(autouse=True)
+def job_db_path(tmp_path, monkeypatch):
+    """非同期ジョブのストアをテストごとの一時ファイルにする"""
+    path = tmp_path / "jobs.sqlite3"
+    monkeypatch.setenv("SCM_JOB_DB", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def result_cache(monkeypatch):
+    """結果キャッシュをテストごとに作り直す（ディスク層は使わない）"""
+    monkeypatch.delenv("SCM_RESULT_CACHE_DIR", raising=False)
+    reset_result_cache()
+    yield
+    reset_result_cache()
+
+
+@pytest.fixture(autouse=True)
+def road_matrix_store_dir(tmp_path, monkeypatch):
+    """道路行列ストアの保存先をテストごとの一時ディレクトリにする"""
+    directory = tmp_path / "road_matrix"
+    monkeypatch.setenv("ROAD_MATRIX_STORE_DIR", str(directory))
+    return directory
+
+
+class _FakeOSRMHandler(BaseHTTPRequestHandler):
+    """OSRM table API の代替（大円距離 × 1000 m、時速60km・有料道路除外時は時速40km）"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.paths.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            fail = server.fail_next > 0
+            if fail:
+                server.fail_next -= 1
+        try:
+            time.sleep(server.delay)
+            if fail:
+                self._send(503, {"code": "ServiceUnavailable"})
+                return
+            parsed = urlsplit(self.path)
+            points = [tuple(map(float, p.split(","))) for p in parsed.path.rsplit("/", 1)[1].split(";")]
+            query = parse_qs(parsed.query)
+            sources = [int(i) for i in query["sources"][0].split(";")] if "sources" in query else range(len(points))
+            destinations = ([int(i) for i in query["destinations"][0].split(";")]
+                            if "destinations" in query else range(len(points)))
+            latlon = np.array([[lat, lon] for lon, lat in points])
+            distances = great_circle_matrix(latlon[list(sources)], latlon[list(destinations)]) * 1000
+            speed = 40 / 3.6 if query.get("exclude") == ["toll"] else 60 / 3.6
+            durations = distances / speed
+            # 到達不能な地点（経度が unreachable_lon）との組は null
+            blocked = ((latlon[list(sources), 1] == server.unreachable_lon)[:, None]
+                       | (latlon[list(destinations), 1] == server.unreachable_lon)[None, :])
+            body = {"code": "Ok"}
+            for key, matrix in (("distances", distances), ("durations", durations)):
+                body[key] = np.where(blocked, None, matrix).tolist()
+            self._send(200, body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_osrm_server():
+    """ローカルで動く OSRM table API の代替サーバー（リクエスト履歴・同時接続数を記録）"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOSRMHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.paths = []
+    server.active = 0
+    server.max_active = 0
+    server.fail_next = 0
+    server.delay = 0.0
+    server.unreachable_lon = None
+    server.host, server.port = server.server_address
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,103 @@
+"""
+グリッド・ジオハッシュによる顧客集約のテスト
+"""
+
+import pytest
+import numpy as np
+
+from app.models.logistics import CustomerData
+from app.services.logistics_service import LogisticsOptimizationService
+from app.utils.aggregation import aggregate_by_cell, geohash_cells, geohash_strings, grid_cells
+from app.utils.geo import great_circle_pairwise
+
+
+def make_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(34.0, 36.0, n), rng.uniform(138.0, 141.0, n), rng.uniform(0, 10, n)
+
+
+class TestCellAggregation:
+    """セル番号と需要重心の集計"""
+
+    def test_geohash_matches_reference(self):
+        codes = geohash_cells(np.array([57.64911, 35.681236]), np.array([10.40744, 139.767125]), 11)
+        assert list(geohash_strings(codes, 11)) == ["u4pruydqqvj", "xn76urx6606"]
+
+    def test_grid_cells_are_about_cell_km(self):
+        lat, lon, _ = make_points(20000)
+        cells = grid_cells(lat, lon, cell_km=5.0)
+        result = aggregate_by_cell(lat, lon, np.ones_like(lat), cell_km=5.0)
+        assert len(result["cell_ids"]) == len(np.unique(cells))
+        # セルの対角線の長さ（5√2 km）より離れた点は同じセルにない
+        assert result["max_displacement_km"].max() <= 5.0 * np.sqrt(2) + 1e-6
+
+    def test_demand_weighted_centroids_match_loop(self):
+        lat, lon, demand = make_points(3000, seed=1)
+        demand[:10] = 0
+        result = aggregate_by_cell(lat, lon, demand, method="geohash", geohash_precision=4)
+        index = result["cell_of_point"]
+        for cell in range(len(result["cell_ids"])):
+            members = index == cell
+            weights = demand[members] if demand[members].sum() > 0 else np.ones(members.sum())
+            assert result["latitude"][cell] == pytest.approx(np.average(lat[members], weights=weights))
+            assert result["longitude"][cell] == pytest.approx(np.average(lon[members], weights=weights))
+            assert result["demand"][cell] == pytest.approx(demand[members].sum())
+            distances = great_circle_pairwise(
+                np.column_stack([lat[members], lon[members]]),
+                np.tile([result["latitude"][cell], result["longitude"][cell]], (members.sum(), 1)))
+            assert result["max_displacement_km"][cell] == pytest.approx(distances.max())
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            aggregate_by_cell(np.zeros(1), np.zeros(1), np.ones(1), method="hexagon")
+
+
+class TestCustomerAggregationService:
+    """サービスの集約機能"""
+
+    def make_customers(self, n, seed=0):
+        lat, lon, demand = make_points(n, seed)
+        return [CustomerData(name=f"c{i}", latitude=lat[i], longitude=lon[i], demand=demand[i])
+                for i in range(n)]
+
+    def test_aggregate_customers_by_cell(self):
+        service = LogisticsOptimizationService()
+        customers = self.make_customers(5000)
+        result = service.aggregate_customers_by_cell(customers, cell_km=20.0)
+        assert result["n_aggregated"] == len(result["customers"]) < 5000
+        assert sum(c.demand for c in result["customers"]) == pytest.approx(sum(c.demand for c in customers))
+        assert 0 < result["mean_displacement_km"] <= result["max_displacement_km"] <= 20.0 * np.sqrt(2)
+        assert len(result["customer_cells"]) == 5000
+
+    def test_singleton_cells_keep_original_customer(self):
+        service = LogisticsOptimizationService()
+        customers = [CustomerData(name="a", latitude=35.0, longitude=139.0, demand=1.0),
+                     CustomerData(name="b", latitude=35.0001, longitude=139.0001, demand=3.0),
+                     CustomerData(name="far", latitude=43.0, longitude=141.0, demand=2.0)]
+        result = service.aggregate_customers_by_cell(customers, cell_km=1.0)
+        names = [c.name for c in result["customers"]]
+        assert "far" in names and len(names) == 2
+        merged = result["customers"][0]
+        assert merged.demand == 4.0
+        assert merged.latitude == pytest.approx((35.0 + 3 * 35.0001) / 4)
+
+    def test_make_total_demand_and_aggregated_cust_df(self):
+        service = LogisticsOptimizationService()
+        customers = [CustomerData(name="a", latitude=35.0, longitude=139.0, demand=1.0),
+                     CustomerData(name="b", latitude=36.0, longitude=140.0, demand=2.0),
+                     CustomerData(name="c", latitude=35.0, longitude=139.0, demand=3.0)]
+        totals = service.make_total_demand(customers)
+        assert totals["location_totals"] == {"35.0,139.0": 4.0, "36.0,140.0": 2.0}
+        assert totals["average_demand_per_location"] == 3.0
+        aggregated = service.make_aggregated_cust_df(customers)
+        assert [c.name for c in aggregated] == ["AGG_a+c", "b"]
+        assert aggregated[0].demand == 4.0
+
+    def test_make_aggregated_df_grid_tail(self):
+        service = LogisticsOptimizationService()
+        customers = self.make_customers(500, seed=2)
+        customers.append(CustomerData(name="big", latitude=35.0, longitude=139.0, demand=5000.0))
+        aggregated = service.make_aggregated_df(customers, aggregation_threshold=0.1, cell_km=50.0)
+        assert aggregated[0].name == "big"
+        assert len(aggregated) < len(customers)
+        assert sum(c.demand for c in aggregated) == pytest.approx(sum(c.demand for c in customers))
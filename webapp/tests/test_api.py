@@ -104,4 +104,30 @@ class TestAPIEndpoints:
         response = client.get("/api/v1/vrp/health")
         assert response.status_code == 200
         data = response.json()
-        assert data["status"] == "healthy"
\ No newline at end of file
+        assert data["status"] == "healthy"
+
+    def test_aggregate_customers_endpoint(self):
+        """顧客集約エンドポイントのテスト"""
+        customers = [{"name": f"c{i}", "latitude": 35.0 + 0.001 * i, "longitude": 139.0, "demand": 1.0}
+                     for i in range(10)]
+        response = client.post("/api/v1/logistics/aggregate-customers",
+                               json={"customers": customers, "method": "grid", "cell_km": 50.0})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["n_original"] == 10
+        # 点がセル境界をまたぐ場合があるため 2 セル以下
+        assert data["n_aggregated"] <= 2
+        assert sum(c["demand"] for c in data["customers"]) == 10.0
+        assert data["max_displacement_km"] < 1.0
+
+    def test_k_median_with_aggregation(self):
+        """集約した顧客で K-Median を解くテスト"""
+        customers = [{"name": f"c{i}", "latitude": 35.0 + 0.0001 * i, "longitude": 139.0 + 0.5 * (i % 2),
+                      "demand": 1.0} for i in range(20)]
+        dcs = [{"name": "d0", "latitude": 35.0, "longitude": 139.0, "capacity": 100.0, "fixed_cost": 0.0},
+               {"name": "d1", "latitude": 35.0, "longitude": 139.5, "capacity": 100.0, "fixed_cost": 0.0}]
+        response = client.post("/api/v1/logistics/k-median", json={
+            "customers": customers, "dc_candidates": dcs, "k": 2, "max_iterations": 50,
+            "aggregation": {"method": "geohash", "geohash_precision": 5}})
+        assert response.status_code == 200
+        assert len(response.json()["customer_assignments"]) == 2
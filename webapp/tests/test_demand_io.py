@@ -0,0 +1,148 @@
+"""
+需要データファイル（CSV / Parquet）の読み込みとアップロード用エンドポイントのテスト
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.endpoints.abc import convert_demand_records_to_df
+from app.main import app
+from app.models.abc import DemandRecord
+from app.services.abc_service import abc_analysis
+from app.utils.demand_io import (
+    PYARROW_AVAILABLE, DemandSchemaError, detect_format, read_demand_file
+)
+
+
+def make_demand_df(days=30):
+    """notebook の demand_with_promo.csv と同じ形（無名のインデックス列つき）の需要データ"""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2023-01-01", periods=days, freq="D").strftime("%Y-%m-%d")
+    rows = [{"date": date, "cust": cust, "prod": prod, "promo_0": 0, "promo_1": int(rng.integers(0, 2)),
+             "demand": int(rng.integers(0, 100))}
+            for date in dates for cust in ("札幌市", "東京都", "大阪市") for prod in ("A", "B", "C", "D")]
+    return pd.DataFrame(rows)
+
+
+def to_csv(df):
+    return df.to_csv().encode("utf-8")
+
+
+class TestReadDemandFile:
+
+    def test_csv_matches_json_records(self):
+        """CSV から読んだ DataFrame は DemandRecord のリストから作ったものと同じ分析結果になる"""
+        df = make_demand_df()
+        demand_df = read_demand_file(to_csv(df), "csv")
+        assert list(demand_df.columns) == ["date", "cust", "prod", "demand", "promo_0", "promo_1"]
+        assert demand_df["demand"].dtype == np.float64
+        assert demand_df["date"].iloc[0] == "2023-01-01"
+
+        records = [DemandRecord(**row) for row in df.to_dict("records")]
+        expected = convert_demand_records_to_df(records)
+        agg_file, _, category_file = abc_analysis(demand_df, [0.7, 0.2, 0.1])
+        agg_json, _, category_json = abc_analysis(expected, [0.7, 0.2, 0.1])
+        assert category_file == category_json
+        assert agg_file.to_dict() == agg_json.to_dict()
+
+    def test_schema_errors_by_column(self):
+        """不足・型の不一致・欠損は列ごとにまとめて示す"""
+        df = make_demand_df(2).drop(columns=["cust"])
+        df["demand"] = "many"
+        df.loc[0, "prod"] = None
+        with pytest.raises(DemandSchemaError) as error:
+            read_demand_file(to_csv(df), "csv")
+        message = str(error.value)
+        assert "cust: 列がありません" in message
+        assert "demand: 数値ではありません" in message
+        assert "prod: 欠損値が 1 件あります" in message
+
+    def test_blank_strings_are_missing(self):
+        """空欄の cust・prod は欠損値として拒否する（pandas / pyarrow のどちらで読んでも同じ）"""
+        df = make_demand_df(2)
+        df.loc[0, "cust"] = ""
+        df.loc[1, "prod"] = ""
+        with pytest.raises(DemandSchemaError) as error:
+            read_demand_file(to_csv(df), "csv")
+        assert "cust: 欠損値が 1 件あります" in str(error.value)
+        assert "prod: 欠損値が 1 件あります" in str(error.value)
+
+    def test_parquet_blank_strings_are_missing(self):
+        pytest.importorskip("pyarrow")
+        df = make_demand_df(2)
+        df.loc[0, "cust"] = ""
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        with pytest.raises(DemandSchemaError, match="cust: 欠損値が 1 件あります"):
+            read_demand_file(buffer.getvalue(), "parquet")
+
+    def test_empty(self):
+        with pytest.raises(DemandSchemaError):
+            read_demand_file(b"", "csv")
+        with pytest.raises(DemandSchemaError):
+            read_demand_file(b"date,cust,prod,demand\n", "csv")
+
+    def test_detect_format(self):
+        assert detect_format("demand.CSV") == "csv"
+        assert detect_format("demand.parquet") == "parquet"
+        assert detect_format("upload.bin", "Parquet") == "parquet"
+        with pytest.raises(DemandSchemaError):
+            detect_format("demand.xlsx")
+
+    def test_parquet(self):
+        """Parquet は列の型をそのまま使う（整数の需要は float64 にする）"""
+        pytest.importorskip("pyarrow")
+        df = make_demand_df(3)
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        demand_df = read_demand_file(buffer.getvalue(), "parquet")
+        assert len(demand_df) == len(df)
+        assert demand_df["demand"].dtype == np.float64
+
+    @pytest.mark.skipif(PYARROW_AVAILABLE, reason="pyarrow がない環境の動作")
+    def test_parquet_requires_pyarrow(self):
+        with pytest.raises(DemandSchemaError, match="pyarrow"):
+            read_demand_file(b"PAR1", "parquet")
+
+
+class TestUploadEndpoints:
+
+    def test_abc_analysis_upload(self):
+        """ファイルのABC分析は JSON のエンドポイントと同じ結果"""
+        df = make_demand_df()
+        records = df.drop(columns=["promo_0", "promo_1"]).to_dict("records")
+        with TestClient(app) as client:
+            uploaded = client.post("/api/v1/abc/analysis/upload",
+                                   files={"file": ("demand.csv", to_csv(df), "text/csv")},
+                                   data={"threshold": "0.6, 0.3, 0.1"})
+            assert uploaded.status_code == 200
+            json_result = client.post("/api/v1/abc/analysis",
+                                      json={"demand_data": records, "threshold": [0.6, 0.3, 0.1]})
+            assert uploaded.json()["categories"] == json_result.json()["categories"]
+            assert uploaded.json()["aggregated_data"] == json_result.json()["aggregated_data"]
+
+    def test_rank_and_risk_pooling_upload(self):
+        files = {"file": ("demand.csv", to_csv(make_demand_df()), "text/csv")}
+        with TestClient(app) as client:
+            rank = client.post("/api/v1/abc/rank-analysis/upload", files=files, data={"top_rank": "2"})
+            assert rank.status_code == 200
+            assert "figure" in rank.json()
+            pooling = client.post("/api/v1/abc/risk-pooling/upload", files=files)
+            assert pooling.status_code == 200
+            assert set(pooling.json()["reduction_data"]) >= {"prod", "agg_std", "sum_std", "reduction"}
+
+    def test_schema_error_is_400(self):
+        """スキーマが合わないファイル・判定できない形式は 400"""
+        df = make_demand_df(2).drop(columns=["demand"])
+        with TestClient(app) as client:
+            response = client.post("/api/v1/abc/analysis/upload",
+                                   files={"file": ("demand.csv", to_csv(df), "text/csv")})
+            assert response.status_code == 400
+            assert "demand: 列がありません" in response.json()["detail"]
+            response = client.post("/api/v1/abc/risk-pooling/upload",
+                                   files={"file": ("demand.bin", b"x", "application/octet-stream")})
+            assert response.status_code == 400
@@ -0,0 +1,196 @@
+"""
+CPU負荷の高い処理の実行層（プロセスプール・共有メモリ・列ごとの受け渡し）のテスト
+"""
+
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.logistics import CustomerData
+from app.utils import executor as executor_module
+from app.utils.executor import (
+    CPUBoundExecutor, ModelColumns, SharedArray, resolve_target,
+    SHARED_MEMORY_MIN_BYTES, MODEL_COLUMNS_MIN_ITEMS
+)
+
+
+def array_summary(array):
+    """ワーカーで実行：受け取った配列の型・大きさ・合計"""
+    return type(array).__name__, array.shape, float(array.sum())
+
+
+def customer_summary(customers):
+    """ワーカーで実行：受け取った顧客リストの型・件数・需要合計・最初の顧客名"""
+    return type(customers[0]).__name__, len(customers), sum(c.demand for c in customers), customers[0].name
+
+
+def make_customers(n):
+    return [CustomerData(name=f"C{i}", latitude=35.0 + i * 1e-4, longitude=139.0, demand=float(i % 7))
+            for i in range(n)]
+
+
+class TestCPUBoundExecutor:
+
+    def test_thread_mode_string_target(self):
+        """スレッドモードで文字列の対象（モジュールの関数）を実行し統計を数える"""
+        executor = CPUBoundExecutor(mode="thread")
+        try:
+            result = asyncio.run(executor.run("analysis", "app.utils.geo:great_circle_matrix",
+                                              np.array([[35.0, 139.0]]), np.array([[35.0, 139.0]])))
+            assert result.shape == (1, 1)
+            assert result[0, 0] == pytest.approx(0.0, abs=1e-6)
+            stats = executor.stats()
+            assert stats["mode"] == "thread"
+            assert stats["classes"]["analysis"]["completed"] == 1
+            assert stats["classes"]["optimization"]["started"] is False
+        finally:
+            executor.shutdown()
+
+    def test_resolve_target(self):
+        """"モジュール:属性.属性" の解決"""
+        method = resolve_target("app.services.logistics_service:logistics_service.weiszfeld_multiple")
+        assert callable(method)
+        with pytest.raises(ValueError):
+            CPUBoundExecutor(mode="fork")
+
+    def test_unknown_class_and_failure_count(self):
+        """未知の区分はエラー、対象の例外は呼び出し側に伝わり失敗数に数える"""
+        executor = CPUBoundExecutor(mode="thread")
+        try:
+            with pytest.raises(ValueError):
+                asyncio.run(executor.run("unknown", array_summary, np.zeros(3)))
+            with pytest.raises(AttributeError):
+                asyncio.run(executor.run("analysis", array_summary, None))
+            assert executor.stats()["classes"]["analysis"]["failed"] == 1
+        finally:
+            executor.shutdown()
+
+    def test_worker_counts_from_environment(self, monkeypatch):
+        """環境変数で区分ごとのワーカー数を上書き"""
+        monkeypatch.setenv("SCM_EXECUTOR_WORKERS", "optimization=4, analysis=3")
+        executor = CPUBoundExecutor(mode="thread", workers={"analysis": 5})
+        assert executor.workers["optimization"] == 4
+        assert executor.workers["analysis"] == 5
+        assert executor.workers["routing"] == 2
+
+    def test_queue_depth_and_event_loop(self):
+        """ワーカー数を超えた呼び出しは待ち行列に入り、その間もイベントループは止まらない"""
+        executor = CPUBoundExecutor(mode="thread", workers={"analysis": 1})
+
+        async def scenario():
+            calls = [asyncio.create_task(executor.run("analysis", time.sleep, 0.3)) for _ in range(3)]
+            ticks = 0
+            while ticks < 5:
+                await asyncio.sleep(0.02)
+                ticks += 1
+            stats = executor.stats()["classes"]["analysis"]
+            await asyncio.gather(*calls)
+            return ticks, stats
+
+        try:
+            ticks, stats = asyncio.run(scenario())
+            assert ticks == 5
+            assert stats["running"] == 1
+            assert stats["queued"] == 2
+            after = executor.stats()["classes"]["analysis"]
+            assert after["queued"] == 0
+            assert after["completed"] == 3
+            assert after["max_in_flight"] == 3
+        finally:
+            executor.shutdown()
+
+    def test_model_columns_roundtrip(self):
+        """顧客リストを列ごとの配列にして復元すると同じ値になる"""
+        customers = make_customers(MODEL_COLUMNS_MIN_ITEMS)
+        assert ModelColumns.accepts(customers)
+        assert not ModelColumns.accepts(customers[:10])
+        columns = ModelColumns(customers)
+        handles = []
+        try:
+            restored = columns.restore(handles)
+            assert [c.model_dump() for c in restored] == [c.model_dump() for c in customers]
+        finally:
+            for shm in handles:
+                shm.close()
+            columns.release()
+
+    def test_process_mode_shared_inputs(self):
+        """プロセスモードで大きな配列（共有メモリ）と顧客リスト（列ごと）を渡す"""
+        executor = CPUBoundExecutor(mode="process", workers={"analysis": 1})
+        array = np.arange(SHARED_MEMORY_MIN_BYTES // 8 + 10, dtype=np.float64)
+        customers = make_customers(MODEL_COLUMNS_MIN_ITEMS + 5)
+        try:
+            name, shape, total = asyncio.run(executor.run("analysis", array_summary, array))
+            assert name == "ndarray"
+            assert shape == array.shape
+            assert total == pytest.approx(array.sum())
+
+            result = asyncio.run(executor.run("analysis", customer_summary, customers))
+            assert result == ("CustomerData", len(customers), sum(c.demand for c in customers), "C0")
+            assert executor.stats()["classes"]["analysis"]["completed"] == 2
+        finally:
+            executor.shutdown()
+
+    def test_broadcast_runs_on_every_worker(self):
+        """broadcast は各ワーカーで1回ずつ実行する（スレッドモードでは1回）"""
+        executor = CPUBoundExecutor(mode="process", workers={"analysis": 2})
+        try:
+            results = asyncio.run(executor.broadcast("analysis", "os:getpid"))
+            assert len(results) == 2
+            assert all(pid == result for pid, result in results.items())
+            assert executor.stats()["classes"]["analysis"]["completed"] == 2
+        finally:
+            executor.shutdown()
+        executor = CPUBoundExecutor(mode="thread", workers={"analysis": 2})
+        try:
+            assert list(asyncio.run(executor.broadcast("analysis", "os:getpid")).values()) == [os.getpid()]
+        finally:
+            executor.shutdown()
+
+    def test_shared_array_released(self):
+        """SharedArray は release 後に名前で開けない"""
+        shared = SharedArray(np.ones(10))
+        array, shm = shared.open()
+        assert array.sum() == 10
+        del array
+        shm.close()
+        shared.release()
+        with pytest.raises(FileNotFoundError):
+            shared.open()
+
+
+class TestExecutorEndpoint:
+
+    def test_executor_stats_endpoint(self):
+        """/system/executor で区分ごとの状態を返す"""
+        executor_module.shutdown_executor()
+        client = TestClient(app)
+        response = client.get("/api/v1/system/executor")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["mode"] == "thread"
+        assert set(data["classes"]) >= {"optimization", "inventory", "routing", "analysis"}
+        assert "queued" in data["classes"]["optimization"]
+
+    def test_matrix_cache_endpoint_covers_workers(self):
+        """/logistics/matrix-cache はワーカーのキャッシュを集計し、クリアする"""
+        customers = [c.model_dump() for c in make_customers(12)]
+        dcs = [{"name": f"D{j}", "latitude": 35.0 + 0.01 * j, "longitude": 139.0, "capacity": 100.0,
+                "fixed_cost": 10.0} for j in range(3)]
+        with TestClient(app) as client:
+            client.delete("/api/v1/logistics/matrix-cache")
+            response = client.post("/api/v1/logistics/k-median",
+                                   json={"customers": customers, "dc_candidates": dcs, "k": 2,
+                                         "max_iterations": 5})
+            assert response.status_code == 200
+            stats = client.get("/api/v1/logistics/matrix-cache").json()
+            assert stats["matrix_cache"]["entries"] >= 1
+            assert len(stats["workers"]) == 1
+            cleared = client.delete("/api/v1/logistics/matrix-cache").json()
+            assert cleared["matrix_cache"]["entries"] == 0
+            assert all(worker["transportation_problems"] == 0 for worker in cleared["workers"].values())
@@ -0,0 +1,302 @@
+"""
+非同期ジョブ（sqlite ストア・実行管理・API）のテスト
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.endpoints.jobs import resume_interrupted_jobs
+from app.main import app
+from app.services.job_service import JobManager, get_job_manager, report_progress
+from app.utils.job_store import JobStore, owner_alive, process_owner
+
+
+async def wait_for(store, job_id, statuses=("completed", "failed", "cancelled"), timeout=30.0):
+    """ジョブが指定の状態になるまで待つ"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+def dead_owner():
+    """同じホスト・同じ PID で起動値だけ違う所有者（再起動前のこのプロセス）"""
+    return f"{socket.gethostname()}:{os.getpid()}:previous"
+
+
+class TestJobStore:
+
+    def test_lifecycle(self, job_db_path):
+        """queued → running → completed、結果は保存した文字列のまま返す"""
+        store = JobStore(str(job_db_path))
+        job_id = store.create("test", {"x": 1})
+        assert store.get(job_id)["status"] == "queued"
+        assert store.request(job_id) == {"x": 1}
+        assert store.result(job_id) is None
+
+        assert store.start(job_id)
+        assert store.update_progress(job_id, 0.5, "半分") == "running"
+        job = store.get(job_id)
+        assert job["progress"] == 0.5 and job["message"] == "半分" and job["attempts"] == 1
+
+        assert store.complete(job_id, '{"value": 42}')
+        assert store.result(job_id) == '{"value": 42}'
+        assert store.get(job_id)["progress"] == 1.0
+        # 終了したジョブは取り消し・失敗で上書きしない
+        assert not store.cancel(job_id)
+        assert not store.fail(job_id, "error")
+        assert store.get(job_id)["status"] == "completed"
+
+    def test_list_and_purge(self, job_db_path):
+        """状態・種類での絞り込みと、終了したジョブの削除"""
+        store = JobStore(str(job_db_path))
+        first = store.create("a", {})
+        store.create("b", {})
+        store.cancel(first)
+        assert [job["job_id"] for job in store.list(status="cancelled")] == [first]
+        assert len(store.list(kind="b")) == 1
+        assert len(store.list(limit=1)) == 1
+        assert store.purge(max_age_seconds=-1) == 1
+        assert store.get(first) is None
+
+    def test_claim_orphans(self, job_db_path):
+        """止まったプロセスのジョブだけを queued に戻して引き継ぐ"""
+        store = JobStore(str(job_db_path))
+        orphan = store.create("test", {})
+        store.start(orphan)
+        live = store.create("test", {})
+        store._execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (dead_owner(), orphan))
+        assert not owner_alive(dead_owner())
+        assert owner_alive(process_owner())
+
+        assert store.claim_orphans() == [orphan]
+        job = store.get(orphan)
+        assert job["status"] == "queued"
+        assert job["owner"] == process_owner()
+        assert store.get(live)["status"] == "queued"
+        assert store.claim_orphans() == []
+
+
+class TestJobManager:
+
+    def test_submit_and_result(self, job_db_path):
+        """投入したジョブの結果を JSON で保存"""
+        manager = JobManager(JobStore(str(job_db_path)))
+
+        async def runner(request):
+            report_progress(0.5, "計算中")
+            return {"total": sum(request["values"])}
+
+        async def scenario():
+            job_id = manager.submit("test", {"values": [1, 2, 3]}, runner)
+            return await wait_for(manager.store, job_id)
+
+        job = asyncio.run(scenario())
+        assert job["status"] == "completed"
+        assert job["message"] == "計算中"
+        assert json.loads(manager.store.result(job["job_id"])) == {"total": 6}
+        # 再起動（新しい接続）でも再計算せずに結果を返す
+        assert json.loads(JobStore(str(job_db_path)).result(job["job_id"])) == {"total": 6}
+
+    def test_failure(self, job_db_path):
+        """エンドポイントの HTTPException は detail をエラーとして記録"""
+        manager = JobManager(JobStore(str(job_db_path)))
+
+        async def runner(request):
+            raise HTTPException(status_code=400, detail="不正な入力")
+
+        async def scenario():
+            return await wait_for(manager.store, manager.submit("test", {}, runner))
+
+        job = asyncio.run(scenario())
+        assert job["status"] == "failed"
+        assert job["error"] == "不正な入力"
+
+    def test_cancel_running(self, job_db_path):
+        """実行中のジョブを取り消すとタスクも止まる"""
+        manager = JobManager(JobStore(str(job_db_path)))
+        finished = []
+
+        async def runner(request):
+            await asyncio.sleep(10)
+            finished.append(True)
+
+        async def scenario():
+            job_id = manager.submit("test", {}, runner)
+            await wait_for(manager.store, job_id, statuses=("running",))
+            assert manager.cancel(job_id)
+            job = await wait_for(manager.store, job_id)
+            await asyncio.sleep(0.05)
+            return job
+
+        job = asyncio.run(scenario())
+        assert job["status"] == "cancelled"
+        assert finished == []
+        assert manager.running_jobs() == 0
+
+    def test_cancel_from_other_worker(self, job_db_path):
+        """別のワーカーが取り消したジョブは次の進捗報告で止まる"""
+        manager = JobManager(JobStore(str(job_db_path)))
+        other_worker = JobStore(str(job_db_path))
+        steps = []
+
+        async def runner(request):
+            for step in range(100):
+                report_progress(step / 100)
+                steps.append(step)
+                await asyncio.sleep(0.01)
+            return {}
+
+        async def scenario():
+            job_id = manager.submit("test", {}, runner)
+            await wait_for(manager.store, job_id, statuses=("running",))
+            await asyncio.sleep(0.05)
+            assert other_worker.cancel(job_id)
+            return await wait_for(manager.store, job_id, statuses=("cancelled",))
+
+        asyncio.run(scenario())
+        assert 0 < len(steps) < 100
+
+    def test_shutdown_keeps_jobs_resumable(self, job_db_path):
+        """停止時に実行中だったジョブは取り消し扱いにしない"""
+        manager = JobManager(JobStore(str(job_db_path)))
+
+        async def runner(request):
+            await asyncio.sleep(10)
+
+        async def scenario():
+            job_id = manager.submit("test", {}, runner)
+            await wait_for(manager.store, job_id, statuses=("running",))
+            await manager.shutdown()
+            return manager.store.get(job_id)
+
+        assert asyncio.run(scenario())["status"] == "running"
+
+    def test_periodic_purge(self, job_db_path):
+        """保存期間を過ぎた終了済みのジョブを定期的に削除し、shutdown で止める"""
+        manager = JobManager(JobStore(str(job_db_path)))
+        finished = manager.store.create("test", {})
+        manager.store.cancel(finished)
+        queued = manager.store.create("test", {})
+
+        async def scenario():
+            manager.start_purging(retention=0.05, interval=0.01)
+            await asyncio.sleep(0.2)
+            await manager.shutdown()
+
+        asyncio.run(scenario())
+        assert manager.store.get(finished) is None
+        assert manager.store.get(queued)["status"] == "queued"
+
+
+class TestJobsAPI:
+
+    customers = [{"name": f"c{i}", "latitude": 35.0 + 0.01 * i, "longitude": 139.0 + 0.01 * (i % 3),
+                  "demand": 1.0 + i} for i in range(12)]
+    dcs = [{"name": f"d{i}", "latitude": 35.0 + 0.05 * i, "longitude": 139.0, "capacity": 100.0,
+            "fixed_cost": 10.0} for i in range(3)]
+
+    def poll(self, client, job_id, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = client.get(f"/api/v1/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed", "cancelled"):
+                return job
+            time.sleep(0.02)
+        raise TimeoutError(job_id)
+
+    def test_submit_poll_result(self):
+        """包括的物流分析をジョブとして投入し、ポーリングして結果を取得"""
+        with TestClient(app) as client:
+            response = client.post("/api/v1/jobs", json={
+                "kind": "logistics/comprehensive-analysis",
+                "request": {"customers": self.customers, "dc_candidates": self.dcs,
+                            "analysis_options": {"weiszfeld": True, "clustering": True}}})
+            assert response.status_code == 202
+            submitted = response.json()
+            assert submitted["status"] in ("queued", "running", "completed")
+
+            job = self.poll(client, submitted["job_id"])
+            assert job["status"] == "completed"
+            assert job["progress"] == 1.0
+            result = client.get(f"/api/v1/jobs/{job['job_id']}/result")
+            assert result.status_code == 200
+            assert set(result.json()["analyses"]) >= {"weiszfeld", "clustering"}
+
+            listed = client.get("/api/v1/jobs", params={"status": "completed"}).json()["jobs"]
+            assert [item["job_id"] for item in listed] == [job["job_id"]]
+            # 終了したジョブは取り消せない
+            assert client.delete(f"/api/v1/jobs/{job['job_id']}").status_code == 409
+
+    def test_invalid_requests(self):
+        """未知の種類・不正なリクエストは 400、未知のジョブは 404"""
+        with TestClient(app) as client:
+            assert client.post("/api/v1/jobs", json={"kind": "unknown", "request": {}}).status_code == 400
+            response = client.post("/api/v1/jobs", json={"kind": "logistics/k-median",
+                                                         "request": {"customers": self.customers}})
+            assert response.status_code == 400
+            assert client.get("/api/v1/jobs").json()["jobs"] == []
+            assert client.get("/api/v1/jobs/missing").status_code == 404
+            assert client.get("/api/v1/jobs/missing/result").status_code == 404
+            kinds = {item["kind"] for item in client.get("/api/v1/jobs/kinds").json()}
+            assert {"logistics/comprehensive-analysis", "inventory/optimize-base-stock",
+                    "vrp/optimize"} <= kinds
+
+    def test_failed_job_result_conflict(self):
+        """失敗したジョブの結果は 409 とエラー内容を返す"""
+        with TestClient(app) as client:
+            job_id = client.post("/api/v1/jobs", json={
+                "kind": "logistics/exact-lnd",
+                "request": {"customers": self.customers, "dc_candidates": self.dcs, "plants": [],
+                            "solver_name": "NO_SUCH_SOLVER"}}).json()["job_id"]
+            job = self.poll(client, job_id)
+            assert job["status"] == "failed"
+            response = client.get(f"/api/v1/jobs/{job_id}/result")
+            assert response.status_code == 409
+            assert "failed" in response.json()["detail"]
+
+    def test_resume_after_restart(self):
+        """再起動前に実行途中だったジョブを保存済みのリクエストから再実行"""
+        store = get_job_manager().store
+        job_id = store.create("logistics/k-median", {
+            "customers": self.customers, "dc_candidates": self.dcs, "k": 2, "max_iterations": 50})
+        store.start(job_id)
+        store._execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (dead_owner(), job_id))
+
+        with TestClient(app) as client:
+            job = self.poll(client, job_id)
+            assert job["status"] == "completed"
+            assert job["attempts"] == 2
+            assert len(client.get(f"/api/v1/jobs/{job_id}/result").json()["selected_facilities"]) == 2
+
+    def test_startup_purges_old_jobs(self, monkeypatch):
+        """起動時に SCM_JOB_RETENTION より前に終了したジョブを削除"""
+        monkeypatch.setenv("SCM_JOB_RETENTION", "60")
+        store = get_job_manager().store
+        old = store.create("test", {})
+        store.cancel(old)
+        store._execute("UPDATE jobs SET finished_at = ? WHERE job_id = ?", (time.time() - 120, old))
+        recent = store.create("test", {})
+        store.cancel(recent)
+
+        with TestClient(app):
+            assert store.get(old) is None
+            assert store.get(recent)["status"] == "cancelled"
+
+    def test_resume_interrupted_jobs_unknown_kind(self):
+        """未知の種類のジョブは再実行せずに失敗にする"""
+        store = get_job_manager().store
+        job_id = store.create("removed/kind", {})
+        store._execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (dead_owner(), job_id))
+        assert asyncio.run(resume_interrupted_jobs()) == []
+        assert store.get(job_id)["status"] == "failed"
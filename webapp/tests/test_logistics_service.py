@@ -0,0 +1,686 @@
+"""
+物流最適化サービスのテスト
+"""
+
+import random
+
+import pytest
+import numpy as np
+from geopy.distance import great_circle
+
+from app.models.logistics import CustomerData, DCData, PlantData
+from app.services.logistics_service import LogisticsOptimizationService
+from app.utils.geo import great_circle_matrix, great_circle_pairwise, euclidean_matrix
+from app.utils.matrix_cache import MatrixCache
+from app.utils.spatial_index import NearestFacilityIndex
+
+
+def make_customers(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        CustomerData(name=f"cust_{i}",
+                     latitude=float(rng.uniform(33.0, 36.5)),
+                     longitude=float(rng.uniform(133.0, 140.5)),
+                     demand=float(rng.uniform(10, 100)))
+        for i in range(n)
+    ]
+
+
+def make_dcs(n, seed=1, capacity=5000.0):
+    rng = np.random.default_rng(seed)
+    return [
+        DCData(name=f"dc_{j}",
+               latitude=float(rng.uniform(33.0, 36.5)),
+               longitude=float(rng.uniform(133.0, 140.5)),
+               capacity=capacity,
+               fixed_cost=float(rng.uniform(1000, 5000)))
+        for j in range(n)
+    ]
+
+
+class TestDistanceKernel:
+    """距離計算カーネルのテスト"""
+
+    def setup_method(self):
+        self.customers = make_customers(40)
+        self.dcs = make_dcs(7)
+        self.c_coords = np.array([[c.latitude, c.longitude] for c in self.customers])
+        self.d_coords = np.array([[d.latitude, d.longitude] for d in self.dcs])
+        self.expected = np.array([
+            [great_circle((c.latitude, c.longitude), (d.latitude, d.longitude)).kilometers
+             for d in self.dcs]
+            for c in self.customers
+        ])
+
+    def test_matches_geopy(self):
+        result = great_circle_matrix(self.c_coords, self.d_coords)
+        assert result.shape == (40, 7)
+        np.testing.assert_allclose(result, self.expected, rtol=1e-9, atol=1e-9)
+
+    def test_float32(self):
+        result = great_circle_matrix(self.c_coords, self.d_coords, dtype=np.float32)
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result, self.expected, rtol=1e-4, atol=1e-2)
+
+    def test_block_size_does_not_change_result(self):
+        full = great_circle_matrix(self.c_coords, self.d_coords)
+        blocked = great_circle_matrix(self.c_coords, self.d_coords, block_size=3)
+        np.testing.assert_array_equal(full, blocked)
+
+    def test_pairwise(self):
+        result = great_circle_pairwise(self.c_coords[:7], self.d_coords)
+        np.testing.assert_allclose(result, np.diag(self.expected[:7]), rtol=1e-9)
+
+    def test_euclidean(self):
+        result = euclidean_matrix(self.c_coords, self.d_coords)
+        expected = np.linalg.norm(self.c_coords[:, None, :] - self.d_coords[None, :, :], axis=2)
+        np.testing.assert_allclose(result, expected)
+
+    def test_service_distance_matrix(self):
+        service = LogisticsOptimizationService()
+        result = service.calculate_distance_matrix(self.customers, self.dcs)
+        np.testing.assert_allclose(result, self.expected, rtol=1e-9)
+        single = service.calculate_distance(self.customers[0], self.dcs[0])
+        assert abs(result[0, 0] - single) < 1e-9
+
+
+class TestLogisticsSolvers:
+    """物流最適化ソルバーのテスト"""
+
+    def setup_method(self):
+        self.service = LogisticsOptimizationService()
+        self.customers = make_customers(30)
+        self.dcs = make_dcs(6)
+        self.plants = [PlantData(name="plant_0", latitude=35.0, longitude=137.0,
+                                 capacity=100000.0, production_cost=1.0)]
+
+    def test_k_median(self):
+        result = self.service.solve_k_median(self.customers, self.dcs, k=2, max_iterations=50)
+        assert len(result.selected_facilities) == 2
+        assert len(result.customer_assignments) == len(self.customers)
+        assert set(result.customer_assignments.values()) <= set(result.selected_facilities)
+
+    def test_k_median_optimizer_options(self):
+        for options in ({"use_adam": True}, {"use_lr_scheduling": True},
+                        {"use_adam": True, "use_lr_scheduling": True}):
+            result = self.service.solve_k_median(
+                self.customers, self.dcs, k=2, max_iterations=30, **options)
+            assert len(result.selected_facilities) == 2
+            assert len(result.customer_assignments) == len(self.customers)
+
+    def test_k_median_capacitated_respects_capacity(self):
+        dcs = make_dcs(6, capacity=900.0)
+        result = self.service.solve_k_median(
+            self.customers, dcs, k=3, max_iterations=30, capacity_constraint=True)
+        demand = {c.name: c.demand for c in self.customers}
+        loads = {}
+        for name, j in result.customer_assignments.items():
+            loads[j] = loads.get(j, 0.0) + demand[name]
+        assert all(loads[j] <= dcs[j].capacity + 1e-9 for j in loads)
+
+    def test_greedy_capacitated_assignment_matches_pair_loop(self):
+        """容量のきつい例でも、組を費用順に1つずつ見る元のループと同じ割当になる"""
+        def pair_loop(costs, weights, capacities):
+            pairs = sorted((costs[i, j], i, j) for i in range(costs.shape[0]) for j in range(costs.shape[1]))
+            loads = np.zeros(costs.shape[1])
+            assignment = np.full(costs.shape[0], -1)
+            for _, i, j in pairs:
+                if assignment[i] < 0 and loads[j] + weights[i] <= capacities[j]:
+                    assignment[i] = j
+                    loads[j] += weights[i]
+            return assignment
+
+        for seed in range(5):
+            rng = np.random.default_rng(seed)
+            costs = rng.uniform(0, 100, size=(120, 5))
+            weights = rng.integers(1, 40, size=120).astype(float)
+            capacities = np.full(5, weights.sum() / 5.5)
+            expected = pair_loop(costs, weights, capacities)
+            result = LogisticsOptimizationService._greedy_capacitated_assignment(
+                costs, weights, capacities, block_size=64)
+            assert (expected < 0).any()
+            np.testing.assert_array_equal(result, expected)
+
+    def test_find_learning_rate_batched_matches_sequential(self):
+        batched = self.service.find_learning_rate(self.customers, self.dcs, k=2, num_iterations=40)
+        sequential = self.service.find_learning_rate(
+            self.customers, self.dcs, k=2, num_iterations=40, batched=False)
+        assert batched == sequential
+        assert len(batched["learning_rates"]) == 40
+        assert batched["iterations_tested"] == len(batched["losses"])
+
+    def test_reduced_cost_helpers_match_dense(self):
+        rng = np.random.default_rng(4)
+        C = rng.uniform(0, 5, size=(50, 6))
+        u = rng.uniform(0, 4, 50)
+        weights = rng.uniform(1, 10, 50)
+        capacities = rng.uniform(0, 60, 6)
+        C_reduced = C - u[:, None]
+        row_order = np.argsort(C, axis=1).astype(np.int32)
+        row_sorted = np.take_along_axis(C, row_order, axis=1)
+        rows, cols, reduced = LogisticsOptimizationService._negative_reduced_entries(
+            row_sorted, row_order, u)
+        np.testing.assert_allclose(np.bincount(cols, weights=reduced, minlength=6),
+                                   np.minimum(C_reduced, 0).sum(axis=0))
+        # 容量制約付きの値：縮約費用の昇順に容量内で取れるだけ取る
+        expected = np.zeros(6)
+        for j in range(6):
+            load = 0.0
+            for i in np.argsort(C_reduced[:, j]):
+                if C_reduced[i, j] >= 0 or load + weights[i] > capacities[j]:
+                    break
+                expected[j] += C_reduced[i, j]
+                load += weights[i]
+        np.testing.assert_allclose(
+            LogisticsOptimizationService._capacitated_facility_values(
+                rows, cols, reduced, weights, capacities), expected)
+
+    def test_weiszfeld_single_facility(self):
+        result = self.service.weiszfeld_multiple(self.customers, num_facilities=1)
+        location = result.facility_locations[0]
+        # 最適位置の費用は需要重心の費用以下
+        coords = np.array([[c.latitude, c.longitude] for c in self.customers])
+        demands = np.array([c.demand for c in self.customers])
+        centroid = demands @ coords / demands.sum()
+        centroid_cost = float(demands @ great_circle_matrix(centroid, coords)[0])
+        optimal_cost = float(demands @ great_circle_matrix(
+            [location.latitude, location.longitude], coords)[0])
+        assert optimal_cost <= centroid_cost + 1e-6
+
+    def test_weiszfeld_batched_multiple_facilities(self):
+        result = self.service.weiszfeld_multiple(
+            self.customers, num_facilities=3, num_restarts=4, random_seed=7)
+        assert len(result.facility_locations) == 3
+        assert set(result.customer_assignments.values()) <= {0, 1, 2}
+        assert result.iterations == len(result.convergence_history)
+        # 各顧客は最終位置の最近傍施設に割り当てられている
+        coords = np.array([[c.latitude, c.longitude] for c in self.customers])
+        locations = np.array([[f.latitude, f.longitude] for f in result.facility_locations])
+        nearest = great_circle_matrix(coords, locations).argmin(axis=1)
+        assert [result.customer_assignments[c.name] for c in self.customers] == nearest.tolist()
+
+    def test_weiszfeld_batched_seed_reproducible(self):
+        first = self.service.weiszfeld_multiple(self.customers, num_facilities=2, random_seed=3)
+        second = self.service.weiszfeld_multiple(self.customers, num_facilities=2, random_seed=3)
+        assert first.total_cost == second.total_cost
+        assert first.facility_locations == second.facility_locations
+
+    def test_weiszfeld_batched_keeps_global_random_state(self):
+        """シードなしでもモジュールの random の状態を変えない（他のスレッドの乱数列に干渉しない）"""
+        random.seed(11)
+        expected = random.random()
+        random.seed(11)
+        self.service.weiszfeld_batched(self.customers, num_facilities=2, max_iterations=5)
+        assert random.random() == expected
+
+    def test_weiszfeld_batched_euclidean(self):
+        result = self.service.weiszfeld_multiple(
+            self.customers, num_facilities=2, use_great_circle=False, random_seed=5)
+        assert len(result.facility_locations) == 2
+        assert np.isfinite(result.total_cost)
+
+    def test_single_source_lnd(self):
+        result = self.service.solve_single_source_lnd(
+            self.customers, self.dcs, self.plants, max_iterations=50)
+        assert set(result.flow_assignments) == {c.name for c in self.customers}
+        for customer in self.customers:
+            flows = result.flow_assignments[customer.name]
+            assert len(flows) == 1
+            assert abs(sum(flows.values()) - customer.demand) < 1e-9
+
+    def test_multi_source_lnd(self):
+        plants = self.plants + [PlantData(name="plant_1", latitude=34.0, longitude=135.0,
+                                          capacity=50000.0, production_cost=1.0)]
+        result = self.service.solve_multi_source_lnd(
+            self.customers, self.dcs, plants, max_iterations=200)
+        assert set(result.flow_assignments) == {c.name for c in self.customers}
+        selected = {dc.name for dc in result.selected_facilities}
+        for flows in result.flow_assignments.values():
+            assert set(flows) <= selected
+            assert all(flow > 0 for flow in flows.values())
+        # 開設DCのない空の解を上界として採用しない
+        assert result.total_cost > 0
+        assert abs(result.total_cost - sum(result.cost_breakdown.values())) < 1e-6
+        # 開設DC集合・固定費・稼働率は同じ反復の最良解から作る
+        fixed = sum(dc.fixed_cost for dc in result.selected_facilities)
+        assert abs(result.cost_breakdown["fixed"] - fixed) < 1e-6
+        assert set(result.facility_utilization) == selected
+        assert np.isfinite(result.network_performance["average_distance"])
+
+    def test_abstract_lndp_four_echelons(self):
+        # 容量1000超が regional_dc、1000以下が local_dc になる
+        dcs = make_dcs(4, seed=5, capacity=5000.0) + make_dcs(4, seed=6, capacity=800.0)
+        dcs = [dc.model_copy(update={"name": f"dc_{j}"}) for j, dc in enumerate(dcs)]
+        customers = [c.model_copy(update={"latitude": 35.0 + (c.latitude - 35.0) * 0.05,
+                                          "longitude": 137.0 + (c.longitude - 137.0) * 0.05})
+                     for c in self.customers]
+        result = self.service.solve_abstract_lndp(customers, dcs, self.plants)
+        assert result.network_performance["echelon_levels"] == 4
+        assert result.network_performance["optimization_method"] == "Multi-Level_Lagrange_Relaxation"
+        local_names = {dc.name for dc in dcs if dc.capacity <= 1000}
+        for flows in result.flow_assignments.values():
+            assert set(flows) <= local_names
+        fixed = sum(dc.fixed_cost for dc in result.selected_facilities)
+        assert abs(result.cost_breakdown["fixed"] - fixed) < 1e-6
+        assert abs(result.total_cost - sum(result.cost_breakdown.values())) < 1e-6
+        assert result.solve_time > 0
+
+    def test_single_source_lnd_respects_capacity(self):
+        dcs = make_dcs(6, capacity=700.0)
+        result = self.service.solve_single_source_lnd(
+            self.customers, dcs, self.plants, max_iterations=50)
+        assert all(u <= 1.0 + 1e-9 for u in result.facility_utilization.values())
+        fixed = sum(dc.fixed_cost for dc in result.selected_facilities)
+        assert abs(result.cost_breakdown["fixed"] - fixed) < 1e-6
+
+    def test_single_source_local_search_improves_greedy(self):
+        rng = np.random.default_rng(2)
+        n, m = 60, 5
+        costs = rng.uniform(1, 100, size=(n, m))
+        demands = rng.uniform(1, 10, n)
+        capacities = np.full(m, demands.sum() / 3)
+        fixed_costs = rng.uniform(50, 200, m)
+        order = np.arange(n)
+        initial = LogisticsOptimizationService._single_source_greedy(
+            costs.T, demands, capacities, order)
+        improved = LogisticsOptimizationService._single_source_local_search(
+            costs, demands, capacities, fixed_costs, initial, order, max_passes=20)
+
+        def total(assignment):
+            used = np.unique(assignment)
+            return costs[np.arange(n), assignment].sum() + fixed_costs[used].sum()
+
+        assert total(improved) <= total(initial) + 1e-9
+        loads = np.bincount(improved, weights=demands, minlength=m)
+        initial_loads = np.bincount(initial, weights=demands, minlength=m)
+        # 容量を満たしていたDCは移動後も容量を満たす
+        assert np.all((loads <= capacities + 1e-9) | (initial_loads > capacities))
+
+
+class TestMatrixCache:
+    """距離行列キャッシュのテスト"""
+
+    def test_hit_and_transpose(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(20)
+        dcs = make_dcs(4)
+        first = service.cached_distance_matrix(customers, dcs)
+        second = service.cached_distance_matrix(customers, dcs)
+        transposed = service.cached_distance_matrix(dcs, customers)
+        assert second is first
+        np.testing.assert_array_equal(transposed, first.T)
+        stats = service.matrix_cache.stats()
+        assert stats["misses"] == 1 and stats["hits"] == 2
+        assert not first.flags.writeable
+
+    def test_metric_is_part_of_key(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(5)
+        dcs = make_dcs(3)
+        gc = service.cached_distance_matrix(customers, dcs, use_great_circle=True)
+        eu = service.cached_distance_matrix(customers, dcs, use_great_circle=False)
+        assert not np.allclose(gc, eu)
+        assert service.matrix_cache.stats()["misses"] == 2
+
+    def test_lru_eviction(self):
+        cache = MatrixCache(max_bytes=3 * 8 * 100)
+        matrices = {}
+        for n in range(4):
+            coords = np.full((10, 2), float(n))
+            matrices[n] = cache.get_or_compute(coords, coords, "euclidean",
+                                               lambda: np.zeros((10, 10)))
+        stats = cache.stats()
+        assert stats["entries"] == 3
+        assert stats["evictions"] == 1
+        assert stats["current_bytes"] <= cache.max_bytes
+        # 最も古いエントリが破棄されている
+        oldest = np.full((10, 2), 0.0)
+        assert cache.get(MatrixCache.make_key(oldest, oldest, "euclidean")) is None
+
+    def test_solvers_share_matrix(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(15)
+        dcs = make_dcs(4)
+        service.solve_k_median(customers, dcs, k=2, max_iterations=5)
+        service.make_network(customers, dcs, [])
+        service.distance_histogram(customers, dcs, [])
+        assert service.matrix_cache.stats()["hits"] >= 2
+
+
+class TestNearestFacilityIndex:
+    """空間インデックスのテスト"""
+
+    def setup_method(self):
+        rng = np.random.default_rng(3)
+        self.points = np.column_stack([rng.uniform(30, 40, 200), rng.uniform(130, 142, 200)])
+        self.facilities = np.column_stack([rng.uniform(30, 40, 25), rng.uniform(130, 142, 25)])
+
+    def test_nearest_matches_brute_force(self):
+        distances, indices = NearestFacilityIndex(self.facilities).nearest(self.points)
+        matrix = great_circle_matrix(self.points, self.facilities)
+        np.testing.assert_array_equal(indices, matrix.argmin(axis=1))
+        np.testing.assert_allclose(distances, matrix.min(axis=1), rtol=1e-8)
+
+    def test_k_nearest_candidates(self):
+        candidates = NearestFacilityIndex(self.facilities).candidate_lists(self.points, k=5)
+        matrix = great_circle_matrix(self.points, self.facilities)
+        expected = np.argsort(matrix, axis=1)[:, :5]
+        np.testing.assert_array_equal(candidates, expected)
+
+    def test_euclidean(self):
+        _, indices = NearestFacilityIndex(self.facilities, use_great_circle=False).nearest(self.points)
+        np.testing.assert_array_equal(
+            indices, euclidean_matrix(self.points, self.facilities).argmin(axis=1))
+
+    def test_k_median_assigns_to_nearest_selected(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(40)
+        dcs = make_dcs(8)
+        result = service.solve_k_median(customers, dcs, k=3, max_iterations=20)
+        matrix = service.calculate_distance_matrix(customers, dcs)
+        selected = np.array(result.selected_facilities)
+        for i, customer in enumerate(customers):
+            expected = selected[np.argmin(matrix[i, selected])]
+            assert result.customer_assignments[customer.name] == expected
+
+
+class TestNetworkBuilder:
+    """ネットワーク生成のテスト"""
+
+    def setup_method(self):
+        self.service = LogisticsOptimizationService()
+        self.customers = make_customers(25)
+        self.dcs = make_dcs(5)
+        self.plants = [PlantData(name="plant_0", latitude=35.0, longitude=137.0,
+                                 capacity=100000.0, production_cost=1.0)]
+
+    def test_threshold_mask(self):
+        result = self.service.make_network(self.customers, self.dcs, self.plants,
+                                           dc_cust_threshold=150, lt_threshold=100)
+        trans_df = result['trans_df']
+        assert result['graph'] is None
+        assert list(trans_df.columns) == ['from_node', 'to_node', 'dist', 'cost',
+                                          'lead_time', 'stage_time', 'kind']
+        dc_cust = trans_df[trans_df['kind'] == 'dc-cust']
+        expected = (self.service.calculate_distance_matrix(self.dcs, self.customers) <= 150).sum()
+        assert len(dc_cust) == expected
+        assert (dc_cust['dist'] <= 150).all()
+        assert (trans_df['kind'] == 'plnt-dc').sum() == len(self.dcs)
+        far = trans_df['dist'] > 100
+        np.testing.assert_array_equal(
+            trans_df.loc[far, 'lead_time'], 1 + np.ceil((trans_df.loc[far, 'dist'] - 100) / 100))
+
+    def test_graph_on_request(self):
+        result = self.service.make_network(self.customers, self.dcs, self.plants,
+                                           dc_cust_threshold=150, build_graph=True)
+        graph = result['graph']
+        assert graph.number_of_nodes() == 1 + 5 + 25
+        assert graph.number_of_edges() == len(result['trans_df'])
+        assert graph.nodes['plant_0']['type'] == 'plant'
+
+    def test_road_blocks(self):
+        n = 1 + 5 + 25
+        rng = np.random.default_rng(0)
+        distances = rng.uniform(1000, 500000, size=(n, n))
+        durations = rng.uniform(60, 20000, size=(n, n))
+        trans_df = self.service.make_network_using_road(
+            self.customers, self.dcs, self.plants, durations=durations,
+            distances=distances)['trans_df']
+        row = trans_df[(trans_df['from_node'] == 'dc_2') & (trans_df['to_node'] == 'cust_7')].iloc[0]
+        assert row['dist'] == distances[1 + 2, 6 + 7] / 1000
+        assert row['time'] == durations[1 + 2, 6 + 7] / 3600
+        assert len(trans_df) == 5 + 5 * 25
+
+    def test_road_approximation_uses_blocks_only(self):
+        """行列を与えない場合はプラント-DC・DC-顧客のブロックだけを大円距離から近似する"""
+        result = self.service.make_network_using_road(self.customers, self.dcs, self.plants)
+        assert result['distance_matrix'] is None and result['duration_matrix'] is None
+        gc = self.service.calculate_distance_matrix(self.dcs, self.customers)
+        row = result['trans_df'][(result['trans_df']['from_node'] == 'dc_2')
+                                 & (result['trans_df']['to_node'] == 'cust_7')].iloc[0]
+        assert row['dist'] == pytest.approx(gc[2, 7] * 1.3)
+        assert row['time'] == pytest.approx(gc[2, 7] / 60)
+        assert self.service.matrix_cache.stats()["entries"] == 2
+
+
+class TestExactLND:
+    """MILPによる厳密解法のテスト"""
+
+    def setup_method(self):
+        self.service = LogisticsOptimizationService()
+        self.customers = make_customers(20)
+        self.dcs = make_dcs(5, capacity=400.0)
+
+    def test_single_source_not_worse_than_heuristic(self):
+        heuristic = self.service.solve_single_source_lnd(self.customers, self.dcs, [])
+        exact = self.service.lnd_ss_exact(self.customers, self.dcs, [])
+        assert exact.solution_status == "Optimal"
+        assert exact.total_cost <= heuristic.total_cost + 1e-6
+        assert all(len(flows) == 1 for flows in exact.flow_assignments.values())
+        assert exact.total_cost == pytest.approx(
+            exact.cost_breakdown["fixed"] + exact.cost_breakdown["transportation"])
+        assert all(u <= 1 + 1e-6 for u in exact.facility_utilization.values())
+
+    def test_multi_source_bounded_by_single_source(self):
+        single = self.service.lnd_ss_exact(self.customers, self.dcs, [])
+        multi = self.service.lnd_ms_exact(self.customers, self.dcs, [], mip_gap=0.0)
+        assert multi.total_cost <= single.total_cost + 1e-6
+        for customer in self.customers:
+            assert sum(multi.flow_assignments[customer.name].values()) == pytest.approx(customer.demand)
+
+    def test_model_reuse_and_timings(self):
+        first = self.service.lnd_ms_exact(self.customers, self.dcs, [], threads=1)
+        second = self.service.lnd_ms_exact(self.customers, self.dcs, [], warm_start=False,
+                                           time_limit=30)
+        assert first.network_performance["model_reused"] == 0.0
+        assert second.network_performance["model_reused"] == 1.0
+        assert second.total_cost == pytest.approx(first.total_cost)
+        for result in (first, second):
+            assert result.network_performance["model_build_time"] >= 0
+            assert result.network_performance["solver_time"] > 0
+            assert result.solve_time >= result.network_performance["solver_time"]
+
+
+class TestLagrangianSingleSource:
+    """単一ソースLNDのラグランジュ分解のテスト"""
+
+    def setup_method(self):
+        self.service = LogisticsOptimizationService()
+        rng = np.random.default_rng(3)
+        self.customers = [
+            CustomerData(name=f"cust_{i}", latitude=float(rng.uniform(33.0, 36.5)),
+                         longitude=float(rng.uniform(133.0, 140.5)),
+                         demand=float(rng.integers(10, 100)))
+            for i in range(40)
+        ]
+        self.dcs = make_dcs(8, capacity=600.0)
+
+    def test_bounds_bracket_optimum(self):
+        progress = []
+        result = self.service.solve_single_source_lnd_lagrangian(
+            self.customers, self.dcs, [], progress_callback=progress.append,
+            progress_interval=0.0)
+        optimum = self.service.lnd_ss_exact(self.customers, self.dcs, []).total_cost
+        performance = result.network_performance
+        assert performance["lower_bound"] <= optimum + 1e-6
+        assert result.total_cost >= optimum - 1e-6
+        assert performance["upper_bound"] == pytest.approx(result.total_cost)
+        assert performance["gap"] == pytest.approx(
+            (result.total_cost - performance["lower_bound"]) / result.total_cost)
+        assert all(u <= 1 + 1e-9 for u in result.facility_utilization.values())
+        assert len(progress) == performance["iterations"]
+        lower_bounds = [p["lower_bound"] for p in progress]
+        assert lower_bounds == sorted(lower_bounds)
+
+    def test_greedy_knapsack_bound(self):
+        result = self.service.solve_single_source_lnd_lagrangian(
+            self.customers, self.dcs, [], knapsack="greedy", max_iterations=100)
+        optimum = self.service.lnd_ss_exact(self.customers, self.dcs, []).total_cost
+        assert result.network_performance["knapsack_method"] == "greedy"
+        assert result.network_performance["lower_bound"] <= optimum + 1e-6
+        assert all(len(flows) == 1 for flows in result.flow_assignments.values())
+
+    def test_knapsack_dp_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        values = -rng.uniform(1, 10, 10)
+        weights = rng.integers(1, 8, 10)
+        chosen = LogisticsOptimizationService._knapsack_dp(values, weights, 15)
+        best = min(
+            (sum(values[t] for t in range(10) if mask >> t & 1), mask)
+            for mask in range(1 << 10)
+            if sum(weights[t] for t in range(10) if mask >> t & 1) <= 15)
+        assert chosen @ values == pytest.approx(best[0])
+        assert chosen @ weights <= 15
+
+
+class TestScalableClustering:
+    """大規模顧客向けの階層クラスタリングとシルエット係数の標本推定"""
+
+    def test_auto_mode_uses_exact_within_budget(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(200)
+        auto = service.cluster_customers(customers, method="hierarchical", n_clusters=4)
+        exact = service.cluster_customers(customers, method="hierarchical", n_clusters=4,
+                                          clustering_mode="exact")
+        assert auto.clusters == exact.clusters
+        assert auto.silhouette_score == pytest.approx(exact.silhouette_score)
+
+    @pytest.mark.parametrize("mode", ["birch", "knn_ward"])
+    def test_scalable_modes_return_same_result_shape(self, mode):
+        service = LogisticsOptimizationService()
+        customers = make_customers(3000, seed=2)
+        result = service.cluster_customers(customers, method="hierarchical", n_clusters=5,
+                                           clustering_mode=mode, silhouette_sample_size=500)
+        assert len(result.clusters) == 3000
+        assert set(result.clusters.values()) <= set(range(5))
+        assert len(result.cluster_centers) == 5
+        total = sum(c.demand for c in result.aggregated_customers)
+        assert total == pytest.approx(sum(c.demand for c in customers))
+        assert -1.0 <= result.silhouette_score <= 1.0
+
+    def test_auto_mode_switches_to_birch_over_budget(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(2000, seed=3)
+        # 距離行列 8 n (n - 1) ≒ 32MB は 1MB の予算に収まらない
+        auto = service.cluster_customers(customers, method="hierarchical", n_clusters=3,
+                                         memory_budget_mb=1)
+        birch = service.cluster_customers(customers, method="hierarchical", n_clusters=3,
+                                          memory_budget_mb=1, clustering_mode="birch")
+        assert auto.clusters == birch.clusters
+
+    def test_sampled_silhouette_close_to_full(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(4000, seed=4)
+        full = service.cluster_customers(customers, n_clusters=4, silhouette_sample_size=4000)
+        sampled = service.cluster_customers(customers, n_clusters=4, silhouette_sample_size=1000)
+        assert sampled.clusters == full.clusters
+        assert sampled.silhouette_score == pytest.approx(full.silhouette_score, abs=0.05)
+
+
+class TestElbowSweep:
+    """エルボー法の k の一括実行"""
+
+    def test_partial_results_and_warm_start(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(300, seed=5)
+        partial = []
+        result = service.elbow_method(customers, max_k=8, max_workers=1,
+                                      partial_callback=partial.append)
+        assert sorted(r["k"] for r in partial) == result["k_range"] == list(range(1, 9))
+        assert [r["inertia"] for r in sorted(partial, key=lambda r: r["k"])] == result["inertias"]
+        # k=1 の inertia は重心からの距離の2乗和
+        features = np.array([[c.latitude, c.longitude, c.demand] for c in customers])
+        assert result["inertias"][0] == pytest.approx(((features - features.mean(axis=0)) ** 2).sum())
+        assert result["inertias"][-1] < result["inertias"][1]
+        # ブロックの先頭以外は直前の k の中心から開始
+        assert any(r["warm_start"] for r in partial)
+        assert result["optimal_k"] in result["k_range"]
+
+    def test_minibatch_and_sampled_silhouette(self):
+        service = LogisticsOptimizationService()
+        customers = make_customers(1500, seed=6)
+        result = service.elbow_method(customers, max_k=5, max_workers=1,
+                                      minibatch_threshold=1000, silhouette_sample_size=300)
+        assert len(result["silhouette_scores"]) == 5
+        assert all(-1.0 <= s <= 1.0 for s in result["silhouette_scores"])
+
+    def test_process_pool_matches_in_process(self, monkeypatch):
+        from app.utils import kmeans_sweep
+        features = np.array([[c.latitude, c.longitude, c.demand] for c in make_customers(400, seed=7)])
+        sequential = {r["k"]: r for r in kmeans_sweep.kmeans_sweep(features, range(1, 7), max_workers=1,
+                                                                   block_size=3)}
+        monkeypatch.setattr(kmeans_sweep, "PARALLEL_MIN_WORK", 0)
+        parallel = {r["k"]: r for r in kmeans_sweep.kmeans_sweep(features, range(1, 7), max_workers=2,
+                                                                 block_size=3)}
+        assert sorted(parallel) == list(range(1, 7))
+        for k in parallel:
+            assert parallel[k]["inertia"] == pytest.approx(sequential[k]["inertia"])
+
+
+class TestDecimatedVisualization:
+    """地図可視化の間引き・フロー線の統合・型付き配列"""
+
+    def make_lnd_result(self, customers, dcs):
+        from app.models.logistics import LNDResult
+        flows = {c.name: {dcs[i % len(dcs)].name: c.demand} for i, c in enumerate(customers)}
+        return LNDResult(selected_facilities=dcs, flow_assignments=flows, total_cost=1.0,
+                         cost_breakdown={}, facility_utilization={}, network_performance={},
+                         solution_status="Optimal", solve_time=0.0)
+
+    def test_small_network_keeps_all_markers(self):
+        from app.utils.plot_payload import encode_typed_array
+        service = LogisticsOptimizationService()
+        customers, dcs = make_customers(50), make_dcs(3)
+        result = service.create_network_visualization(self.make_lnd_result(customers, dcs), customers)
+        data = result.plotly_figure["data"]
+        # 顧客・施設・DC ごとのフロー線
+        assert len(data) == 2 + 3
+        assert data[0]["lat"] == encode_typed_array([c.latitude for c in customers])
+        assert result.network_stats["displayed_customer_markers"] == 50
+        assert result.zoom_layers == {}
+
+    def test_flow_lines_are_merged_per_dc(self):
+        service = LogisticsOptimizationService()
+        customers, dcs = make_customers(30), make_dcs(2)
+        result = service.create_network_visualization(self.make_lnd_result(customers, dcs), customers,
+                                                      typed_arrays=False)
+        flow_traces = result.plotly_figure["data"][2:]
+        assert len(flow_traces) == 2
+        # 1線分 = 顧客, DC, 区切り（NaN → None）
+        assert len(flow_traces[0]["lat"]) == 3 * 15
+        assert flow_traces[0]["lat"][2] is None or np.isnan(flow_traces[0]["lat"][2])
+
+    def test_large_network_is_binned_and_payload_limited(self):
+        service = LogisticsOptimizationService()
+        customers, dcs = make_customers(20000, seed=3), make_dcs(4)
+        lnd_result = self.make_lnd_result(customers, dcs)
+        result = service.create_network_visualization(lnd_result, customers, max_markers=2000)
+        stats = result.network_stats
+        assert stats["displayed_customer_markers"] <= 2000
+        assert stats["display_zoom"] > 0
+        assert len(result.zoom_layers) > 0
+
+        limited = service.create_network_visualization(lnd_result, customers, max_markers=2000,
+                                                       max_payload_bytes=50000)
+        assert limited.network_stats["payload_bytes"] <= 50000
+        assert limited.network_stats["payload_bytes"] < stats["payload_bytes"]
+
+    def test_bins_preserve_demand(self):
+        from app.utils.plot_payload import bin_markers
+        rng = np.random.default_rng(0)
+        lat, lon, demand = rng.uniform(34, 36, 5000), rng.uniform(138, 140, 5000), rng.uniform(1, 5, 5000)
+        labels = rng.integers(0, 3, 5000)
+        binned = bin_markers(lat, lon, demand, zoom=6, labels=labels)
+        assert binned["demand"].sum() == pytest.approx(demand.sum())
+        # ラベルの異なる顧客は同じビンにならない
+        np.testing.assert_array_equal(binned["label"][binned["cell_of_point"]], labels)
+
+    def test_plot_k_median(self):
+        service = LogisticsOptimizationService()
+        customers, dcs = make_customers(3000, seed=4), make_dcs(6)
+        result = service.plot_k_median(customers, dcs, k=2, max_markers=500)
+        stats = result["optimization_stats"]
+        assert stats["selected_facilities"] == 2
+        assert 0 < stats["displayed_customer_markers"] <= 500
+        assert stats["avg_distance"] > 0
+        assert result["plotly_figure"]["data"][0]["lon"]["dtype"] == "f4"
@@ -0,0 +1,115 @@
+"""
+OSRM table API クライアントのテスト（ローカルの代替サーバーを使用）
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from app.models.logistics import LocationData
+from app.services.logistics_service import LogisticsOptimizationService
+from app.services.vrp_service import compute_distance_table_for_vrp, make_time_df_for_vrp
+from app.utils.geo import great_circle_matrix
+from app.utils.osrm import OSRMError, OSRMTableClient
+
+
+def make_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(34.0, 36.0, n), rng.uniform(135.0, 140.0, n)])
+
+
+class TestOSRMTableClient:
+    """タイル分割・並列取得のテスト"""
+
+    def test_tiles_assemble_full_matrix(self, fake_osrm_server):
+        points = make_points(23)
+        client = OSRMTableClient(fake_osrm_server.host, fake_osrm_server.port, tile_size=5)
+        result = client.table(points)
+        expected = great_circle_matrix(points, points) * 1000
+        np.testing.assert_allclose(result["distances"], expected, rtol=1e-9)
+        np.testing.assert_allclose(result["durations"], expected / (60 / 3.6), rtol=1e-9)
+        # 5 × 5 タイル、各リクエストの座標数は 2 × tile_size 以下
+        assert len(fake_osrm_server.paths) == 25
+        for path in fake_osrm_server.paths:
+            coords = path.split("?")[0].rsplit("/", 1)[1]
+            assert len(coords.split(";")) <= 10
+
+    def test_tiles_run_concurrently(self, fake_osrm_server):
+        fake_osrm_server.delay = 0.05
+        client = OSRMTableClient(fake_osrm_server.host, fake_osrm_server.port,
+                                 tile_size=4, max_workers=4)
+        client.table(make_points(16))
+        assert fake_osrm_server.max_active > 1
+
+    def test_rectangular_and_exclude(self, fake_osrm_server):
+        sources, targets = make_points(7, seed=1), make_points(3, seed=2)
+        client = OSRMTableClient(fake_osrm_server.host, fake_osrm_server.port, tile_size=2)
+        result = client.table(sources, targets, exclude="toll")
+        expected = great_circle_matrix(sources, targets) * 1000
+        np.testing.assert_allclose(result["durations"], expected / (40 / 3.6), rtol=1e-9)
+
+    def test_retry_with_backoff(self, fake_osrm_server):
+        fake_osrm_server.fail_next = 2
+        client = OSRMTableClient(fake_osrm_server.host, fake_osrm_server.port,
+                                 retries=3, backoff_factor=0.01)
+        result = client.table(make_points(4))
+        assert np.isfinite(result["distances"]).all()
+        assert len(fake_osrm_server.paths) == 3
+
+    def test_error_after_retries(self, fake_osrm_server):
+        fake_osrm_server.fail_next = 10
+        client = OSRMTableClient(fake_osrm_server.host, fake_osrm_server.port,
+                                 retries=1, backoff_factor=0.01)
+        with pytest.raises(OSRMError, match="503"):
+            client.table(make_points(4))
+
+    def test_unreachable_is_nan(self, fake_osrm_server):
+        points = make_points(6)
+        points[2, 1] = 139.999
+        fake_osrm_server.unreachable_lon = 139.999
+        result = OSRMTableClient(fake_osrm_server.host, fake_osrm_server.port, tile_size=4).table(points)
+        assert np.isnan(result["durations"][2]).all()
+        assert np.isnan(result["durations"][:, 2]).all()
+        assert np.isfinite(np.delete(np.delete(result["durations"], 2, 0), 2, 1)).all()
+
+
+class TestOSRMConsumers:
+    """OSRM 行列を使う関数のテスト"""
+
+    def test_get_osrm_matrix(self, fake_osrm_server):
+        service = LogisticsOptimizationService()
+        points = make_points(12)
+        locations = [LocationData(name=f"loc_{i}", latitude=lat, longitude=lon)
+                     for i, (lat, lon) in enumerate(points)]
+        result = service.get_osrm_matrix(locations, fake_osrm_server.host, fake_osrm_server.port)
+        np.testing.assert_allclose(result["distances"], great_circle_matrix(points, points) * 1000)
+        cached = service.get_osrm_matrix(locations, fake_osrm_server.host, fake_osrm_server.port)
+        assert cached["cached"] is True
+
+    def test_get_osrm_matrix_error(self, fake_osrm_server):
+        fake_osrm_server.fail_next = 100
+        service = LogisticsOptimizationService()
+        locations = [LocationData(name="a", latitude=35.0, longitude=139.0),
+                     LocationData(name="b", latitude=35.1, longitude=139.1)]
+        result = service.get_osrm_matrix(locations, fake_osrm_server.host, fake_osrm_server.port)
+        assert result["distances"] is None
+        assert "503" in result["error"]
+
+    def test_vrp_time_df(self, fake_osrm_server):
+        points = make_points(5)
+        points[4, 1] = 139.999
+        fake_osrm_server.unreachable_lon = 139.999
+        node_df = pd.DataFrame({
+            "name": [f"node_{i}" for i in range(5)],
+            "location": [f"[{lon},{lat}]" for lat, lon in points]
+        })
+        durations, distances = compute_distance_table_for_vrp(
+            node_df, toll=True, host=fake_osrm_server.host, port=fake_osrm_server.port)
+        assert durations[0][4] is None
+        assert distances[1][2] == pytest.approx(great_circle_matrix(points[1], points[2])[0, 0] * 1000)
+
+        time_df = make_time_df_for_vrp(node_df, host=fake_osrm_server.host, port=fake_osrm_server.port)
+        assert len(time_df) == 25
+        row = time_df[(time_df.from_node == 1) & (time_df.to_node == 2)].iloc[0]
+        assert row["time(no toll)"] > row["time"]
+        assert (time_df[time_df.to_node == 4]["time"] == 100000).all()
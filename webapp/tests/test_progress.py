@@ -0,0 +1,189 @@
+"""
+ソルバーの進捗イベント（間引き・途中停止）と SSE / WebSocket ストリームのテスト
+"""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.logistics import CustomerData, DCData
+from app.services.inventory_service import InventoryOptimizationService
+from app.services.logistics_service import LogisticsOptimizationService
+from app.utils.executor import CPUBoundExecutor
+from app.utils.progress import ProgressListener, ProgressReporter, use_progress_listener
+
+
+def make_instance(n_customers=30, n_dcs=6, seed=0):
+    rng = np.random.default_rng(seed)
+    customers = [CustomerData(name=f"c{i}", latitude=float(rng.uniform(34.0, 36.0)),
+                              longitude=float(rng.uniform(135.0, 140.0)),
+                              demand=float(rng.integers(1, 50))) for i in range(n_customers)]
+    dcs = [DCData(name=f"d{j}", latitude=float(rng.uniform(34.0, 36.0)),
+                  longitude=float(rng.uniform(135.0, 140.0)), capacity=1000.0, fixed_cost=100.0)
+           for j in range(n_dcs)]
+    return customers, dcs
+
+
+def parse_sse(text):
+    """SSE の本文を (イベント名, データ) のリストにする（コメント行は除く）"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = [line for line in block.split("\n") if not line.startswith(":")]
+        if not lines:
+            continue
+        name = lines[0].removeprefix("event: ")
+        events.append((name, json.loads(lines[1].removeprefix("data: "))))
+    return events
+
+
+class TestProgressReporter:
+
+    def test_throttle_and_finish(self):
+        """間隔内の反復は送らず、最後の反復は finish() で送る"""
+        events = []
+        reporter = ProgressReporter(events.append, "test", max_iterations=100, min_interval=60.0)
+        for iteration in range(100):
+            reporter.report(iteration, lower_bound=float(iteration), upper_bound=100.0)
+        assert [event["iteration"] for event in events] == [0]
+        reporter.finish()
+        assert [event["iteration"] for event in events] == [0, 99]
+        last = events[-1]
+        assert last["solver"] == "test"
+        assert last["progress"] == 1.0
+        assert last["gap"] == pytest.approx(0.01)
+
+    def test_stop_request(self):
+        """コールバックが真を返すと以降の report() は True"""
+        reporter = ProgressReporter(lambda event: event["iteration"] >= 2, "test", min_interval=0.0)
+        assert [reporter.report(i) for i in range(4)] == [False, False, True, True]
+
+    def test_no_callback(self):
+        reporter = ProgressReporter(None, "test")
+        assert reporter.report(0, objective=1.0) is False
+        reporter.finish()
+
+
+class TestSolverEarlyStop:
+
+    def test_k_median_stop_returns_best(self):
+        """K-Median を途中で止めると、それまでの最良解（k 施設）を返す"""
+        customers, dcs = make_instance()
+        events = []
+
+        def callback(event):
+            events.append(event)
+            return event["iteration"] >= 5
+
+        result = LogisticsOptimizationService().solve_k_median(
+            customers, dcs, k=2, max_iterations=500, progress_callback=callback, progress_interval=0.0)
+        assert len(result.selected_facilities) == 2
+        assert len(result.objective_history) <= 10
+        assert all(event["solver"] == "k_median" for event in events)
+        assert all(event["lower_bound"] <= event["upper_bound"] + 1e-6 for event in events)
+
+    def test_base_stock_stop_returns_best(self):
+        """ベースストック最適化を途中で止めても、評価済みの最良レベルを返す"""
+        demands = list(np.random.default_rng(1).normal(100, 20, 60).clip(0))
+        events = []
+
+        def callback(event):
+            events.append(event)
+            return len(events) >= 3
+
+        result = InventoryOptimizationService().optimize_base_stock(
+            demands, progress_callback=callback, progress_interval=0.0)
+        assert len(events) == 3
+        assert result.base_stock_levels["product"] == pytest.approx(events[-1]["base_stock_level"])
+
+
+class TestRunWithProgress:
+
+    def test_listener_receives_events(self):
+        """リスナーを設定するとワーカーの進捗がリスナーに届く（未設定なら通常の実行）"""
+        customers, dcs = make_instance()
+
+        class Collect(ProgressListener):
+            interval = 0.0
+
+            def __init__(self):
+                self.events = []
+
+            def on_progress(self, event):
+                self.events.append(event)
+
+        executor = CPUBoundExecutor(mode="thread")
+        target = "app.services.logistics_service:logistics_service.solve_k_median"
+        try:
+            listener = Collect()
+
+            async def scenario():
+                with use_progress_listener(listener):
+                    with_listener = await executor.run_with_progress(
+                        "optimization", target, customers, dcs, k=2, max_iterations=30)
+                without = await executor.run_with_progress(
+                    "optimization", target, customers, dcs, k=2, max_iterations=30)
+                return with_listener, without
+
+            with_listener, without = asyncio.run(scenario())
+            assert len(listener.events) == len(with_listener.objective_history)
+            assert with_listener.selected_facilities == without.selected_facilities
+        finally:
+            executor.shutdown()
+
+
+class TestStreamAPI:
+
+    customers = [{"name": f"c{i}", "latitude": 35.0 + 0.01 * i, "longitude": 139.0 + 0.01 * (i % 3),
+                  "demand": 1.0 + i} for i in range(12)]
+    dcs = [{"name": f"d{i}", "latitude": 35.0 + 0.05 * i, "longitude": 139.0, "capacity": 100.0,
+            "fixed_cost": 10.0} for i in range(3)]
+
+    def test_sse_stream(self):
+        """SSE で started → progress → result の順に届き、進捗は OptimizationProgress"""
+        body = {"customers": self.customers, "dc_candidates": self.dcs, "k": 2, "max_iterations": 50}
+        with TestClient(app) as client:
+            with client.stream("POST", "/api/v1/stream/logistics/k-median",
+                               params={"interval": 0}, json=body) as response:
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("text/event-stream")
+                events = parse_sse(response.read().decode())
+        names = [name for name, _ in events]
+        assert names[0] == "started" and names[-1] == "result"
+        progress = [data for name, data in events if name == "progress"]
+        assert progress
+        assert all(item["task_id"] == events[0][1]["run_id"] for item in progress)
+        assert all(item["solver"] == "k_median" for item in progress)
+        assert progress[-1]["lower_bound"] <= progress[-1]["upper_bound"] + 1e-6
+        assert len(events[-1][1]["selected_facilities"]) == 2
+
+    def test_sse_invalid(self):
+        """未知の種類・不正なリクエストは 400、未知の実行の停止は 404"""
+        with TestClient(app) as client:
+            assert client.post("/api/v1/stream/unknown", json={}).status_code == 400
+            assert client.post("/api/v1/stream/logistics/k-median",
+                               json={"customers": self.customers}).status_code == 400
+            assert client.post("/api/v1/stream/runs/missing/stop").status_code == 404
+
+    def test_websocket_stream(self):
+        """WebSocket で進捗と結果を受け取る"""
+        with TestClient(app) as client:
+            with client.websocket_connect("/api/v1/stream/ws") as websocket:
+                websocket.send_json({"kind": "logistics/k-median", "interval": 0,
+                                     "request": {"customers": self.customers, "dc_candidates": self.dcs,
+                                                 "k": 2, "max_iterations": 50}})
+                messages = []
+                while not messages or messages[-1]["type"] not in ("result", "error"):
+                    messages.append(websocket.receive_json())
+        types = [message["type"] for message in messages]
+        assert types[0] == "started" and types[-1] == "result"
+        assert "progress" in types
+
+    def test_websocket_invalid_kind(self):
+        with TestClient(app) as client:
+            with client.websocket_connect("/api/v1/stream/ws") as websocket:
+                websocket.send_json({"kind": "unknown", "request": {}})
+                assert websocket.receive_json()["type"] == "error"
@@ -0,0 +1,132 @@
+"""
+最適化エンドポイントの結果キャッシュのテスト
+"""
+
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.result_cache import CACHE_HEADER, ResultCache, fingerprint, get_result_cache
+
+
+class TestFingerprint:
+
+    def test_canonical(self):
+        """キーの順序に依存せず、エンドポイント・コードのバージョン・値が違えば別のキー"""
+        key = fingerprint("inventory/eoq", {"a": 1.0, "b": [1, 2]}, version="v1")
+        assert key == fingerprint("inventory/eoq", {"b": [1, 2], "a": 1.0}, version="v1")
+        assert key != fingerprint("abc/analysis", {"a": 1.0, "b": [1, 2]}, version="v1")
+        assert key != fingerprint("inventory/eoq", {"a": 1.0, "b": [1, 2]}, version="v2")
+        assert key != fingerprint("inventory/eoq", {"a": 2.0, "b": [1, 2]}, version="v1")
+
+
+class TestResultCache:
+
+    def test_memory_lru_budget(self):
+        """容量を超えると最も古く使われたエントリを破棄"""
+        cache = ResultCache(max_bytes=250)
+        for key in ("a", "b"):
+            cache.put(key, b"x" * 100)
+        assert cache.get("a")[1] == "memory"
+        cache.put("c", b"x" * 100)
+        assert cache.get("b") == (None, "miss")
+        assert cache.get("a")[0] == b"x" * 100
+        stats = cache.stats()
+        assert stats["current_bytes"] == 200
+        assert stats["evictions"] == 1
+        assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_ttl(self):
+        """有効期限を過ぎたエントリは返さない"""
+        cache = ResultCache(ttl=0.05)
+        cache.put("a", b"{}")
+        assert cache.get("a")[0] == b"{}"
+        time.sleep(0.06)
+        assert cache.get("a") == (None, "miss")
+        assert cache.stats()["expired"] == 1
+
+    def test_disk_tier_shared(self, tmp_path):
+        """ディスク層は別のインスタンス（別のワーカー）からも読め、容量を超えると古い順に削除"""
+        writer = ResultCache(directory=str(tmp_path), disk_max_bytes=250)
+        writer.put("aa01", b"1" * 100)
+        reader = ResultCache(directory=str(tmp_path), disk_max_bytes=250)
+        assert reader.stats()["disk_bytes"] == 100
+        assert reader.get("aa01") == (b"1" * 100, "disk")
+        assert reader.get("aa01")[1] == "memory"
+
+        old = os.path.join(str(tmp_path), "aa", "aa01.json")
+        os.utime(old, (time.time() - 10, time.time() - 10))
+        writer.put("bb02", b"2" * 100)
+        writer.put("cc03", b"3" * 100)
+        assert not os.path.exists(old)
+        assert writer.stats()["disk_bytes"] == 200
+        writer.clear()
+        assert ResultCache(directory=str(tmp_path)).get("bb02") == (None, "miss")
+
+
+class TestCachedEndpoints:
+
+    customers = [{"name": f"c{i}", "latitude": 35.0 + 0.01 * i, "longitude": 139.0 + 0.01 * (i % 3),
+                  "demand": 1.0 + i} for i in range(12)]
+    dcs = [{"name": f"d{i}", "latitude": 35.0 + 0.05 * i, "longitude": 139.0, "capacity": 100.0,
+            "fixed_cost": 10.0} for i in range(3)]
+
+    def test_repeated_request_hits(self):
+        """同じリクエストの2回目は保存した応答をそのまま返す（キーの順序が違っても同じ）"""
+        with TestClient(app) as client:
+            first = client.post("/api/v1/inventory/eoq",
+                                json={"annual_demand": 1000, "order_cost": 50, "holding_cost": 2})
+            second = client.post("/api/v1/inventory/eoq",
+                                 json={"holding_cost": 2.0, "order_cost": 50.0, "annual_demand": 1000.0})
+            assert first.status_code == second.status_code == 200
+            assert CACHE_HEADER not in first.headers
+            assert second.headers[CACHE_HEADER] == "HIT-MEMORY"
+            assert second.json() == first.json()
+
+            stats = client.get("/api/v1/system/result-cache").json()
+            assert stats["hits"] == 1 and stats["misses"] == 1
+            assert stats["endpoints"]["inventory/eoq"]["hits"] == 1
+            cleared = client.delete("/api/v1/system/result-cache").json()
+            assert cleared["entries"] == 0
+
+    def test_seed_required_for_random_endpoint(self):
+        """乱数を使う Weiszfeld 法はシードを指定したときだけキャッシュする"""
+        body = {"customers": self.customers, "num_facilities": 2, "num_restarts": 2}
+        with TestClient(app) as client:
+            for _ in range(2):
+                response = client.post("/api/v1/logistics/weiszfeld", json=body)
+                assert response.status_code == 200
+                assert CACHE_HEADER not in response.headers
+            seeded = {**body, "random_seed": 7}
+            first = client.post("/api/v1/logistics/weiszfeld", json=seeded)
+            second = client.post("/api/v1/logistics/weiszfeld", json=seeded)
+            assert second.headers[CACHE_HEADER] == "HIT-MEMORY"
+            assert second.json() == first.json()
+        stats = get_result_cache().stats()["endpoints"]["logistics/weiszfeld"]
+        assert stats == {"hits": 1, "misses": 1, "bypassed": 2}
+
+    def test_errors_not_cached(self):
+        """エラーになったリクエストは保存しない"""
+        with TestClient(app) as client:
+            for _ in range(2):
+                response = client.post("/api/v1/inventory/wagner-whitin",
+                                       json={"demands": [], "fixed_costs": 1.0})
+                assert response.status_code == 400
+        assert get_result_cache().stats()["stores"] == 0
+
+    def test_job_uses_cached_result(self):
+        """キャッシュにある K-Median の結果はジョブでもそのまま使う"""
+        body = {"customers": self.customers, "dc_candidates": self.dcs, "k": 2, "max_iterations": 50}
+        with TestClient(app) as client:
+            direct = client.post("/api/v1/logistics/k-median", json=body).json()
+            job_id = client.post("/api/v1/jobs", json={"kind": "logistics/k-median",
+                                                       "request": body}).json()["job_id"]
+            deadline = time.monotonic() + 30
+            while client.get(f"/api/v1/jobs/{job_id}").json()["status"] != "completed":
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+            assert client.get(f"/api/v1/jobs/{job_id}/result").json() == direct
+        assert get_result_cache().stats()["hits"] == 1
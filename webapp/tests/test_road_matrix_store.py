@@ -0,0 +1,201 @@
+"""
+道路行列の永続ストアのテスト
+"""
+
+import pytest
+import numpy as np
+
+from app.models.logistics import LocationData
+from app.services.logistics_service import LogisticsOptimizationService
+from app.utils.geo import great_circle_matrix
+from app.utils.road_matrix_store import RoadMatrixStore, location_ids
+
+
+def make_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(34.0, 36.0, n), rng.uniform(135.0, 140.0, n)])
+
+
+class RecordingFetch:
+    """大円距離で部分行列を返し、呼び出し時の形状を記録する fetch 関数"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, sources, destinations):
+        if self.fail:
+            raise RuntimeError("fetch failed")
+        self.calls.append((len(sources), len(destinations)))
+        distances = great_circle_matrix(sources, destinations) * 1000
+        return {"distances": distances, "durations": distances / (60 / 3.6)}
+
+
+class TestRoadMatrixStore:
+    """差分取得・永続化のテスト"""
+
+    def test_incremental_extension(self, tmp_path):
+        points = make_points(13)
+        ids = [f"loc_{i}" for i in range(13)]
+        fetch = RecordingFetch()
+        store = RoadMatrixStore(str(tmp_path))
+        store.ensure(ids[:10], points[:10], fetch)
+        assert fetch.calls == [(10, 10)]
+
+        # 追加した3地点の行（3 × 13）と列（10 × 3）だけを取得
+        indices = store.ensure(ids, points, fetch)
+        assert fetch.calls[1:] == [(3, 13), (10, 3)]
+        np.testing.assert_allclose(store.submatrix("distances", indices),
+                                   great_circle_matrix(points, points) * 1000)
+
+        # 登録済みの地点だけなら取得しない
+        subset = store.ensure([ids[12], ids[3]], points[[12, 3]], fetch)
+        assert len(fetch.calls) == 3
+        np.testing.assert_allclose(store.submatrix("durations", subset, indices[:2]),
+                                   great_circle_matrix(points[[12, 3]], points[:2]) * 1000 / (60 / 3.6))
+
+    def test_fetches_only_requested_locations(self, tmp_path):
+        """新しい地点は要求された地点とだけ取得し、残りの組は一緒に要求されたときに取得する"""
+        points = make_points(14)
+        ids = [f"loc_{i}" for i in range(14)]
+        fetch = RecordingFetch()
+        store = RoadMatrixStore(str(tmp_path))
+        store.ensure(ids[:10], points[:10], fetch)
+
+        subset = [0, 1, 2, 10, 11]
+        indices = store.ensure([ids[i] for i in subset], points[subset], fetch)
+        assert fetch.calls[1:] == [(2, 5), (3, 2)]
+        np.testing.assert_allclose(store.submatrix("distances", indices),
+                                   great_circle_matrix(points[subset], points[subset]) * 1000)
+        assert np.isnan(store.matrix("distances")[10, 5])
+
+        # 別々に登録した地点どうしの組だけを後から取得
+        store.ensure(ids[12:], points[12:], fetch)
+        calls = len(fetch.calls)
+        indices = store.ensure(ids[10:], points[10:], fetch)
+        assert fetch.calls[calls:] == [(4, 4)]
+        np.testing.assert_allclose(store.submatrix("durations", indices),
+                                   great_circle_matrix(points[10:], points[10:]) * 1000 / (60 / 3.6))
+
+    def test_persistence_across_instances(self, tmp_path):
+        points = make_points(8)
+        ids = [f"loc_{i}" for i in range(8)]
+        RoadMatrixStore(str(tmp_path)).ensure(ids, points, RecordingFetch())
+
+        fetch = RecordingFetch()
+        reopened = RoadMatrixStore(str(tmp_path))
+        indices = reopened.ensure(ids[::-1], points[::-1], fetch)
+        assert fetch.calls == []
+        assert isinstance(reopened.matrix("distances").base, np.memmap)
+        np.testing.assert_allclose(reopened.submatrix("distances", indices),
+                                   great_circle_matrix(points[::-1], points[::-1]) * 1000)
+
+    def test_moved_location_is_refetched(self, tmp_path):
+        points = make_points(5)
+        ids = [f"loc_{i}" for i in range(5)]
+        fetch = RecordingFetch()
+        store = RoadMatrixStore(str(tmp_path))
+        store.ensure(ids, points, fetch)
+        points[2] = [35.5, 139.5]
+        indices = store.ensure(ids, points, fetch)
+        assert fetch.calls[1:] == [(1, 5), (4, 1)]
+        np.testing.assert_allclose(store.submatrix("distances", indices),
+                                   great_circle_matrix(points, points) * 1000)
+
+    def test_capacity_growth_keeps_values(self, tmp_path):
+        points = make_points(150, seed=3)
+        ids = [f"loc_{i}" for i in range(150)]
+        store = RoadMatrixStore(str(tmp_path))
+        store.ensure(ids[:40], points[:40], RecordingFetch())
+        assert store.capacity == 64
+        indices = store.ensure(ids, points, RecordingFetch())
+        assert store.capacity >= 150
+        np.testing.assert_allclose(store.submatrix("distances", indices),
+                                   great_circle_matrix(points, points) * 1000)
+
+    def test_failed_fetch_is_retried(self, tmp_path):
+        points = make_points(6)
+        ids = [f"loc_{i}" for i in range(6)]
+        fetch = RecordingFetch()
+        store = RoadMatrixStore(str(tmp_path))
+        store.ensure(ids[:4], points[:4], fetch)
+        fetch.fail = True
+        with pytest.raises(RuntimeError):
+            store.ensure(ids, points, fetch)
+
+        # 別インスタンスからも取得途中の地点は未取得として扱われる
+        fetch.fail = False
+        reopened = RoadMatrixStore(str(tmp_path))
+        indices = reopened.ensure(ids, points, fetch)
+        assert fetch.calls[-2:] == [(2, 6), (4, 2)]
+        np.testing.assert_allclose(reopened.submatrix("distances", indices),
+                                   great_circle_matrix(points, points) * 1000)
+
+    def test_reset_when_max_locations_exceeded(self, tmp_path):
+        """上限を超える地点を登録するときはストアを空にして作り直す（容量も上限まで）"""
+        points = make_points(10)
+        ids = [f"loc_{i}" for i in range(10)]
+        fetch = RecordingFetch()
+        store = RoadMatrixStore(str(tmp_path), max_locations=6)
+        store.ensure(ids[:4], points[:4], fetch)
+        assert store.capacity == 6
+        store.ensure(ids[2:6], points[2:6], fetch)
+        assert len(store) == 6 and store.stats()["resets"] == 0
+
+        indices = store.ensure(ids[6:], points[6:], fetch)
+        assert store.ids == ids[6:]
+        assert store.stats()["resets"] == 1
+        assert fetch.calls[-1] == (4, 4)
+        np.testing.assert_allclose(store.submatrix("distances", indices),
+                                   great_circle_matrix(points[6:], points[6:]) * 1000)
+        reopened = RoadMatrixStore(str(tmp_path), max_locations=6)
+        assert reopened.ids == ids[6:]
+        with pytest.raises(ValueError):
+            store.ensure(ids[:7], points[:7], fetch)
+
+    def test_conflicting_coordinates(self, tmp_path):
+        store = RoadMatrixStore(str(tmp_path))
+        with pytest.raises(ValueError):
+            store.ensure(["a", "a"], [[35.0, 139.0], [35.1, 139.1]], RecordingFetch())
+
+    def test_location_ids(self):
+        """地点名が同じでも座標が違えば別の地点ID"""
+        points = make_points(3)
+        ids = location_ids(["a", "b", "c"], points)
+        assert ids[0] == f"a@{points[0, 0]:.7f},{points[0, 1]:.7f}"
+        assert len(set(location_ids(["a", "a", "c"], points))) == 3
+        assert location_ids(["a"], points[:1]) == ids[:1]
+
+    def test_same_names_in_other_scenario_keep_entries(self, tmp_path):
+        """別のシナリオが同じ地点名を使っても、保存済みの行と列を取り直さない"""
+        first, second = make_points(4, seed=1), make_points(4, seed=2)
+        names = ["c1", "c2", "DC1", "DC2"]
+        fetch = RecordingFetch()
+        store = RoadMatrixStore(str(tmp_path))
+        store.ensure(location_ids(names, first), first, fetch)
+        store.ensure(location_ids(names, second), second, fetch)
+        calls = len(fetch.calls)
+        indices = store.ensure(location_ids(names, first), first, fetch)
+        assert len(fetch.calls) == calls
+        np.testing.assert_allclose(store.submatrix("distances", indices),
+                                   great_circle_matrix(first, first) * 1000)
+
+
+class TestOSRMWithStore:
+    """get_osrm_matrix がストアを使って差分だけを取得するテスト"""
+
+    def test_get_osrm_matrix_fetches_only_new_locations(self, fake_osrm_server, road_matrix_store_dir):
+        points = make_points(12)
+        locations = [LocationData(name=f"loc_{i}", latitude=lat, longitude=lon)
+                     for i, (lat, lon) in enumerate(points)]
+        LogisticsOptimizationService().get_osrm_matrix(
+            locations[:10], fake_osrm_server.host, fake_osrm_server.port)
+        assert len(fake_osrm_server.paths) == 1
+
+        # 別のサービス（メモリ上のキャッシュなし）でも追加分の2リクエストだけ
+        result = LogisticsOptimizationService().get_osrm_matrix(
+            locations, fake_osrm_server.host, fake_osrm_server.port)
+        assert len(fake_osrm_server.paths) == 3
+        assert "sources=0%3B1" in fake_osrm_server.paths[1]
+        np.testing.assert_allclose(result["distances"], great_circle_matrix(points, points) * 1000)
+        assert any(road_matrix_store_dir.iterdir())
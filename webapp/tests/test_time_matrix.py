@@ -0,0 +1,64 @@
+"""
+time_df と行列の相互変換のテスト
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from app.utils.time_matrix import matrices_from_time_df, read_time_df, time_df_from_matrices, write_time_df
+
+
+def make_matrices(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 1e5, (n, n)), rng.uniform(0, 1e6, (n, n))
+
+
+class TestTimeMatrix:
+    """縦持ち ↔ 行列の変換"""
+
+    def test_long_layout_matches_double_loop(self):
+        durations, distances = make_matrices(4)
+        names = ["a", "b", "c", "d"]
+        time_df = time_df_from_matrices(names, {"time": durations, "distance": distances})
+        expected = pd.DataFrame(
+            [(i, names[i], j, names[j], int(durations[i][j]), int(distances[i][j]))
+             for i in range(4) for j in range(4)],
+            columns=["from_node", "from_name", "to_node", "to_name", "time", "distance"])
+        pd.testing.assert_frame_equal(time_df, expected, check_dtype=False)
+        assert time_df["time"].dtype == np.int32
+        assert time_df["from_node"].dtype == np.int32
+
+    def test_round_trip(self):
+        durations, distances = make_matrices(30)
+        time_df = time_df_from_matrices([f"n{i}" for i in range(30)],
+                                        {"time": durations, "distance": distances})
+        matrices = matrices_from_time_df(time_df.sample(frac=1.0, random_state=0))
+        np.testing.assert_array_equal(matrices["time"], np.trunc(durations))
+        np.testing.assert_array_equal(matrices["distance"], np.trunc(distances))
+
+    def test_missing_pairs(self):
+        durations, distances = make_matrices(3)
+        distances[0, 2] = np.nan
+        time_df = time_df_from_matrices(["a", "b", "c"], {"time": durations, "distance": distances},
+                                        fill_value=100000)
+        row = time_df[(time_df.from_node == 0) & (time_df.to_node == 2)].iloc[0]
+        assert row["time"] == 100000 and row["distance"] == 100000
+        with pytest.raises(ValueError):
+            time_df_from_matrices(["a", "b", "c"], {"distance": distances})
+
+        # time_df にない組は fill_value
+        partial = time_df[time_df.from_node != 1]
+        matrix = matrices_from_time_df(partial, columns=("time",), n=4, fill_value=-1)["time"]
+        assert (matrix[1] == -1).all() and (matrix[3] == -1).all()
+
+    def test_parquet_round_trip(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        durations, distances = make_matrices(20)
+        time_df = time_df_from_matrices([f"n{i}" for i in range(20)],
+                                        {"time": durations, "distance": distances})
+        path = tmp_path / "time_df.parquet"
+        write_time_df(time_df, str(path))
+        loaded = read_time_df(str(path))
+        assert loaded["from_name"].dtype == "category"
+        pd.testing.assert_frame_equal(read_time_df(str(path), categorical_names=False), time_df)
@@ -0,0 +1,110 @@
+"""
+疎な輸送問題ソルバーのテスト
+"""
+
+import pytest
+import numpy as np
+from scipy.optimize import linprog
+
+from app.services.logistics_service import LogisticsOptimizationService
+from app.utils.transportation import TransportationProblem
+
+
+def dense_optimum(supply, demand, cost_matrix):
+    """全組の変数を持つ LP（釣り合わない場合は多い側を不等式）の最適値"""
+    n, m = cost_matrix.shape
+    supply_rows = np.kron(np.eye(n), np.ones(m))
+    demand_rows = np.tile(np.eye(m), n)
+    if sum(supply) >= sum(demand):
+        result = linprog(cost_matrix.ravel(), A_ub=supply_rows, b_ub=supply,
+                         A_eq=demand_rows, b_eq=demand, method="highs")
+    else:
+        result = linprog(cost_matrix.ravel(), A_ub=demand_rows, b_ub=demand,
+                         A_eq=supply_rows, b_eq=supply, method="highs")
+    return result.fun
+
+
+def make_instance(n, m, seed=0):
+    rng = np.random.default_rng(seed)
+    supply = rng.integers(10, 50, n).astype(float)
+    demand = rng.integers(5, 30, m).astype(float)
+    demand *= supply.sum() / demand.sum()
+    return supply, demand, rng.uniform(1, 100, (n, m))
+
+
+class TestTransportationProblem:
+    """枝リストの輸送問題と費用変更時の再求解"""
+
+    def test_matches_dense_lp(self):
+        supply, demand, costs = make_instance(8, 15)
+        problem = TransportationProblem.from_dense(supply, demand, costs)
+        result = problem.solve(problem.dense_costs(costs))
+        assert result["status"] == "Optimal"
+        assert result["total_cost"] == pytest.approx(dense_optimum(supply, demand, costs))
+        flows = problem.dense_flows(result["flows"])
+        np.testing.assert_allclose(flows.sum(axis=1), supply, atol=1e-6)
+        np.testing.assert_allclose(flows.sum(axis=0), demand, atol=1e-6)
+
+    def test_warm_resolve_matches_cold_solve(self):
+        supply, demand, costs = make_instance(20, 60, seed=1)
+        problem = TransportationProblem.from_dense(supply, demand, costs)
+        problem.solve(problem.dense_costs(costs))
+        rng = np.random.default_rng(2)
+        for _ in range(3):
+            costs = costs * rng.uniform(0.7, 1.3, costs.shape)
+            warm = problem.solve(problem.dense_costs(costs))
+            assert warm["status"] == "Optimal"
+            assert warm["total_cost"] == pytest.approx(dense_optimum(supply, demand, costs))
+            assert warm["restricted_arcs"] < problem.n_arcs
+
+    def test_sparse_arcs_and_capacity(self):
+        # 供給点 0 → 需要点 0 の枝だけ容量 5、残りは供給点 1 から高い費用で送る
+        problem = TransportationProblem([10, 10], [10], arc_from=[0, 1], arc_to=[0, 0],
+                                        arc_capacity=[5, np.inf])
+        result = problem.solve(np.array([1.0, 10.0]))
+        np.testing.assert_allclose(result["flows"], [5, 5])
+        assert result["total_cost"] == pytest.approx(55)
+
+    def test_infeasible(self):
+        problem = TransportationProblem([5], [10], arc_from=[0], arc_to=[0], arc_capacity=[3])
+        result = problem.solve(np.array([1.0]))
+        assert result["status"] == "Infeasible"
+        assert result["total_cost"] is None
+
+
+class TestTransportationSimplex:
+    """サービスの transportation_simplex"""
+
+    def test_unbalanced_does_not_mutate_inputs(self):
+        service = LogisticsOptimizationService()
+        supply, demand = [30.0, 20.0], [10.0, 15.0, 5.0]
+        costs = np.array([[4.0, 6.0, 9.0], [5.0, 3.0, 2.0]])
+        result = service.transportation_simplex(supply, demand, costs)
+        assert supply == [30.0, 20.0] and demand == [10.0, 15.0, 5.0]
+        assert result["status"] == "Optimal"
+        assert result["flows"].shape == (2, 3)
+        np.testing.assert_allclose(result["flows"].sum(axis=0), demand, atol=1e-6)
+        assert result["total_cost"] == pytest.approx(dense_optimum(supply, demand, costs))
+
+        # 需要が多い場合は供給を使い切る
+        result = service.transportation_simplex([5.0, 5.0], demand, costs)
+        np.testing.assert_allclose(result["flows"].sum(axis=1), [5, 5], atol=1e-6)
+
+    def test_infinite_cost_is_not_an_arc(self):
+        service = LogisticsOptimizationService()
+        costs = np.array([[1.0, np.inf], [2.0, 3.0]])
+        result = service.transportation_simplex([10.0, 10.0], [10.0, 10.0], costs)
+        assert result["n_arcs"] == 3
+        assert result["flows"][0, 1] == 0
+        assert result["total_cost"] == pytest.approx(10 * 1 + 10 * 3)
+
+    def test_reuses_problem_when_only_costs_change(self):
+        service = LogisticsOptimizationService()
+        supply, demand, costs = make_instance(15, 40, seed=3)
+        service.transportation_simplex(supply, demand, costs)
+        changed = costs.copy()
+        changed[0] *= 2
+        result = service.transportation_simplex(supply, demand, changed)
+        assert len(service._transportation_problems) == 1
+        assert result["restricted_arcs"] < result["n_arcs"]
+        assert result["total_cost"] == pytest.approx(dense_optimum(supply, demand, changed))